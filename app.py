@@ -1,16 +1,38 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Request, Response, g, request, jsonify, render_template, send_from_directory, stream_with_context
 import os
+import json
 import logging
+import math
 from werkzeug.utils import secure_filename
 from src.services.fileUploadService import FileUploadService
 from src.services.advancedSimilarityService import AdvancedSimilarityService
 from src.services.langchainPlagiarismService import LangChainPlagiarismService
 from src.services.textAnalysisService import TextAnalysisService
 from src.services.textHighlighter import TextHighlighter
+from src.services.fingerprintIndex import FingerprintIndex
+from src.services.scoringCascade import ScoringCascade
+from src.services.analysisPipeline import AnalysisPipeline
+from src.services.matchStore import MatchStore
+from src.services.featureBundle import FeatureStore
+from src.services.stylometryIndex import StyleIndex
+from src.services.shardedIndex import ShardedIndex, parse_addresses
+from src.utils.instrumentation import registry, start_request_timings, stop_request_timings, summarize_timings
+from src.utils.uploadStream import UploadSink
+
+
+class UploadRequest(Request):
+    """Request that parses uploaded files straight into the upload folder."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Werkzeug would spool the part to memory or a temp file first;
+        # the sink hashes, counts and sniffs it while writing instead
+        return UploadSink(app.config['UPLOAD_FOLDER'], app.config['MAX_CONTENT_LENGTH'])
+
 
 app = Flask(__name__, template_folder='templates', static_folder='public')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 app.config['UPLOAD_FOLDER'] = 'uploads'
+app.request_class = UploadRequest
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -25,6 +47,51 @@ similarity_service = AdvancedSimilarityService()
 langchain_service = None  # Lazy initialization to avoid startup delays
 text_analysis_service = TextAnalysisService()
 text_highlighter = TextHighlighter()  # Initialize text highlighter
+scoring_cascade = ScoringCascade(similarity_service)  # Cheap filters before the full ensemble
+chunk_index = None  # Lazy, needs the LangChain embeddings
+ghostwriting_detector = None  # Lazy, loads the detector model
+if os.environ.get('INDEX_SHARDS'):
+    # Sharded corpus index: shard processes listed as host:port,host:port,...
+    fingerprint_index = ShardedIndex(
+        parse_addresses(os.environ['INDEX_SHARDS']),
+        tokenizer=similarity_service.tokenize_with_offsets
+    )
+else:
+    fingerprint_index = FingerprintIndex(
+        os.path.join(app.config['UPLOAD_FOLDER'], 'index', 'fingerprints.db'),
+        tokenizer=similarity_service.tokenize_with_offsets
+    )
+
+# Incremental mode: uploads push their matches into the stored records of
+# the documents they match instead of requiring a corpus-wide re-analysis
+match_store = None
+if os.environ.get('INCREMENTAL_MATCHES', '1') != '0':
+    match_store = MatchStore(os.path.join(app.config['UPLOAD_FOLDER'], 'matches'), fingerprint_index)
+
+# Feature bundles: every document's features are extracted once at upload, so
+# stored documents are compared without re-tokenizing or re-embedding them
+feature_store = None
+if os.environ.get('FEATURE_BUNDLES', '1') != '0':
+    feature_store = FeatureStore(
+        os.path.join(app.config['UPLOAD_FOLDER'], 'features'), similarity_service, scoring_cascade
+    )
+
+# Stylometric fingerprints: per-window style vectors flag passages written in
+# a different style than the rest of a document (possible pasted content)
+style_index = None
+if os.environ.get('STYLE_INDEX', '1') != '0':
+    style_index = StyleIndex(os.path.join(app.config['UPLOAD_FOLDER'], 'style'))
+
+# Pre-fork mode: load models in the master so workers share them copy-on-write
+if os.environ.get('PRELOAD_MODELS') == '1':
+    try:
+        from src.services.langchainPlagiarismService import preload_shared_resources
+        preload_shared_resources()
+        langchain_service = LangChainPlagiarismService()
+        logger.info("LangChain service preloaded for pre-forked workers")
+    except Exception as e:
+        logger.error(f"Failed to preload LangChain service: {e}")
+        langchain_service = False
 
 def get_langchain_service():
     """Get or initialize LangChain service lazily."""
@@ -44,6 +111,187 @@ def get_langchain_service():
     else:
         return langchain_service
 
+def get_chunk_index():
+    """Get or initialize the persisted chunk vector index lazily."""
+    global chunk_index
+    if chunk_index is None:
+        langchain_svc = get_langchain_service()
+        if langchain_svc is None or not langchain_svc.embeddings:
+            return None
+        try:
+            if isinstance(fingerprint_index, ShardedIndex):
+                chunk_index = fingerprint_index.chunk_index(langchain_svc.embeddings, langchain_svc.split_chunks)
+            else:
+                from src.services.vectorIndexService import ChunkVectorIndex
+                chunk_index = ChunkVectorIndex(
+                    langchain_svc.embeddings,
+                    os.path.join(app.config['UPLOAD_FOLDER'], 'index'),
+                    chunker=langchain_svc.split_chunks
+                )
+            # Backfill documents uploaded before the index existed
+            backfill_index('Chunk', chunk_index)
+            logger.info(f"Chunk index ready: {chunk_index.stats()}")
+        except Exception as e:
+            logger.error(f"Failed to initialize chunk index: {e}")
+            chunk_index = False
+            return None
+    elif chunk_index is False:
+        return None
+    return chunk_index
+
+def get_ghostwriting_detector():
+    """Get or initialize the ghostwriting (machine-generated text) detector lazily."""
+    global ghostwriting_detector
+    if ghostwriting_detector is None:
+        if os.environ.get('GHOSTWRITING', '1') == '0':
+            ghostwriting_detector = False
+            return None
+        try:
+            from src.services.ghostwritingDetector import GhostwritingDetector, create_ghostwriting_backend
+            ghostwriting_detector = GhostwritingDetector(create_ghostwriting_backend())
+            logger.info(f"Ghostwriting detector initialized ({ghostwriting_detector.backend.name} backend)")
+        except Exception as e:
+            logger.error(f"Failed to initialize ghostwriting detector: {e}")
+            ghostwriting_detector = False
+    return ghostwriting_detector or None
+
+def backfill_index(name, index):
+    """Add stored documents missing from an index; returns the number added.
+
+    A document that fails is logged and skipped, so one bad file (or an
+    unreachable shard) does not stop the others from being indexed.
+    """
+    added = 0
+    for metadata in file_upload_service.list_documents():
+        doc_id = metadata.get('file_id')
+        if not doc_id:
+            continue
+        try:
+            if index.has_document(doc_id):
+                continue
+            text = file_upload_service.get_file_text(doc_id)
+            if text:
+                index.add_document(doc_id, text)
+                added += 1
+        except Exception as e:
+            logger.error(f"{name} backfill error for {doc_id}: {e}")
+    return added
+
+def backfill_indexes():
+    """Index documents uploaded before the fingerprint, match and style indexes existed.
+
+    Run once after an upgrade (`flask --app app backfill-indexes`), not at
+    import: under a pre-forking server the import happens in the master.
+    """
+    added = {}
+    for name, index in (('Fingerprint', fingerprint_index), ('Match', match_store), ('Style', style_index)):
+        if index:
+            added[name] = backfill_index(name, index)
+            logger.info(f"{name} backfill: {added[name]} documents added")
+    return added
+
+@app.cli.command('backfill-indexes')
+def backfill_indexes_command():
+    """Add previously uploaded documents to the corpus indexes."""
+    for name, count in backfill_indexes().items():
+        print(f"{name} index: {count} documents added")
+
+def index_document(file_id):
+    """Add a newly uploaded document to the fingerprint and chunk indexes"""
+    text = file_upload_service.get_file_text(file_id)
+    
+    # Fingerprint the new document for copied-passage detection
+    try:
+        fingerprint_index.add_document(file_id, text)
+    except Exception as e:
+        logger.error(f"Fingerprint indexing error for {file_id}: {e}")
+    
+    # Score it against the index only and push deltas into the matched documents
+    if match_store:
+        try:
+            match_store.add_document(file_id, text)
+        except Exception as e:
+            logger.error(f"Incremental matching error for {file_id}: {e}")
+    
+    # Add the new document's chunks to the semantic index
+    vector_index = get_chunk_index()
+    if vector_index:
+        try:
+            vector_index.add_document(file_id, text)
+        except Exception as e:
+            logger.error(f"Chunk indexing error for {file_id}: {e}")
+    
+    # Store the document's style vectors for style-shift and authorship lookups
+    if style_index:
+        try:
+            style_index.add_document(file_id, text)
+        except Exception as e:
+            logger.error(f"Style indexing error for {file_id}: {e}")
+    
+    # Extract the token-level feature bundle; embeddings are added on first use
+    if feature_store:
+        try:
+            feature_store.write(file_id, text)
+        except Exception as e:
+            logger.error(f"Feature bundle error for {file_id}: {e}")
+
+def unindex_document(file_id):
+    """Remove a deleted document from the indexes; returns the number of removed chunks"""
+    fingerprint_index.remove_document(file_id)
+    if match_store:
+        match_store.remove_document(file_id)
+    if feature_store:
+        feature_store.remove(file_id)
+    if style_index:
+        style_index.remove_document(file_id)
+    vector_index = get_chunk_index()
+    return vector_index.remove_document(file_id) if vector_index else 0
+
+def get_feature_bundle(file_id, langchain_svc=None):
+    """Open a document's feature bundle, (re)building it from the stored text if missing or stale.
+    
+    With a LangChain service, the chunk sections and embeddings are added to
+    the bundle the first time they are needed, so uploads never load the model.
+    """
+    bundle = feature_store.open(file_id)
+    if bundle is not None and feature_store.covers(bundle, langchain_svc):
+        return bundle
+    
+    text = file_upload_service.get_file_text(file_id)
+    if not text:
+        if bundle is not None:
+            bundle.close()
+        return None
+    if bundle is not None:
+        feature_store.add_langchain_sections(bundle, text, langchain_svc)
+        bundle.close()
+    else:
+        feature_store.write(file_id, text, langchain_svc)
+    return feature_store.open(file_id)
+
+analysis_pipeline = AnalysisPipeline(
+    similarity_service,
+    text_analysis_service,
+    scoring_cascade=scoring_cascade,
+    fingerprint_index=fingerprint_index,
+    langchain_provider=get_langchain_service,
+    chunk_index_provider=get_chunk_index,
+    match_store=match_store,
+    ghostwriting_provider=get_ghostwriting_detector,
+    logger=logger
+)
+# Thread-pool size for the streaming analysis endpoint
+STREAM_WORKERS = int(os.environ.get('STREAM_WORKERS', 4))
+
+@app.before_request
+def begin_request_timings():
+    """Collect per-stage timings for the request (returned when include_timings is set)"""
+    g.request_timings = start_request_timings()
+
+@app.teardown_request
+def end_request_timings(exc=None):
+    stop_request_timings()
+
 @app.route('/')
 def index():
     """Serve the main application page"""
@@ -58,6 +306,11 @@ def health_check():
         'version': '1.0.0'
     })
 
+@app.route('/api/metrics')
+def metrics():
+    """Per-stage latency, CPU and memory histograms in Prometheus text format"""
+    return Response(registry.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
     """Handle file upload"""
@@ -74,6 +327,7 @@ def upload_file():
         
         if result['success']:
             logger.info(f"File uploaded successfully: {result['file_id']}")
+            index_document(result['file_id'])
             return jsonify({
                 'success': True,
                 'file_id': result['file_id'],
@@ -94,8 +348,6 @@ def analyze_document():
     try:
         data = request.get_json()
         file_id = data.get('file_id')
-        comparison_text = data.get('comparison_text', '')
-        use_langchain = data.get('use_langchain', True)  # Default to LangChain
         
         if not file_id:
             return jsonify({'success': False, 'error': 'File ID required'}), 400
@@ -107,136 +359,12 @@ def analyze_document():
         
         document_text = file_data['text']
         
-        # Use LangChain service for enhanced semantic analysis
-        langchain_svc = None
-        if use_langchain:
-            logger.info(f"Using LangChain service for file: {file_id}")
-            langchain_svc = get_langchain_service()
-            if langchain_svc is None:
-                logger.warning("LangChain service failed to initialize, falling back to advanced similarity")
-                use_langchain = False
-        
-        if use_langchain and langchain_svc:
-            langchain_results = langchain_svc.calculate_plagiarism_score(
-                document_text, 
-                comparison_text if comparison_text else ""
-            )
-            
-            # Also get advanced similarity service results for comparison
-            advanced_data = similarity_service.calculate_overall_similarity(
-                document_text, 
-                comparison_text if comparison_text else "default analysis"
-            )
-            
-            # Handle both float and dict returns from calculate_overall_similarity
-            if isinstance(advanced_data, dict):
-                advanced_score = float(advanced_data.get('overall', 0.0))
-            else:
-                advanced_score = float(advanced_data)
-            
-            # Ensure advanced_score is a valid float
-            if not isinstance(advanced_score, (int, float)) or advanced_score < 0:
-                advanced_score = 0.0
-                
-            advanced_results = {
-                'overall': advanced_score,
-                'semantic': advanced_score * 0.9,
-                'chunk_level': advanced_score * 0.85,
-                'semantic_chunks': advanced_score * 0.88,
-                'sentence_semantic': advanced_score * 0.87,
-                'tfidf': advanced_score * 0.92,
-                'sequence_matching': advanced_score * 0.90,
-                'token_overlap': advanced_score * 0.80
-            }
-            
-            # Combine both analyses with LangChain weighted higher (65%)
-            combined_overall = (
-                langchain_results.get('overall', 0) * 0.65 +
-                advanced_results.get('overall', 0) * 0.35
-            )
-            
-            similarity_results = langchain_results
-            similarity_results['advanced_similarity'] = advanced_results.get('overall', 0)
-            similarity_results['combined_score'] = combined_overall
-        else:
-            # Fall back to advanced similarity service
-            logger.info(f"Using Advanced Similarity Service for file: {file_id}")
-            if not comparison_text:
-                comparison_text = "default analysis"
-            
-            advanced_data = similarity_service.calculate_overall_similarity(
-                document_text, 
-                comparison_text
-            )
-            
-            # Handle both float and dict returns from calculate_overall_similarity
-            if isinstance(advanced_data, dict):
-                advanced_score = float(advanced_data.get('overall', 0.0))
-            else:
-                advanced_score = float(advanced_data)
-                
-            similarity_results = {
-                'overall': advanced_score,
-                'semantic': advanced_score * 0.9,
-                'chunk_level': advanced_score * 0.85,
-                'semantic_chunks': advanced_score * 0.88,
-                'sentence_semantic': advanced_score * 0.87,
-                'tfidf': advanced_score * 0.92,
-                'sequence_matching': advanced_score * 0.90,
-                'token_overlap': advanced_score * 0.80,
-                'advanced_similarity': advanced_score,
-                'combined_score': advanced_score
-            }
-        
-        # Perform text analysis
-        text_stats = text_analysis_service.analyze_text(document_text)
-        
-        # Calculate overall score and risk assessment
-        overall_score = similarity_results.get('combined_score', similarity_results.get('overall', 0))
-        risk_level = 'low'
-        if overall_score > 0.7:
-            risk_level = 'high'
-        elif overall_score > 0.4:
-            risk_level = 'medium'
-        
-        analysis_result = {
-            'overall_score': overall_score,
-            'confidence_score': min(overall_score + 0.1, 1.0),  # Confidence slightly higher
-            'risk_level': risk_level,
-            'similarity_breakdown': {
-                'semantic': similarity_results.get('semantic', 0),
-                'chunk_level': similarity_results.get('chunk_level', 0),
-                'semantic_chunks': similarity_results.get('semantic_chunks', 0),
-                'sentence_semantic': similarity_results.get('sentence_semantic', 0),
-                'tfidf': similarity_results.get('tfidf', 0),
-                'sequence_matching': similarity_results.get('sequence_matching', 0),
-                'token_overlap': similarity_results.get('token_overlap', 0),
-                'advanced_similarity': similarity_results.get('advanced_similarity', 0)
-            },
-            'algorithms_count': similarity_results.get('algorithms_used', 8),
-            'methodology': 'LangChain Semantic + Advanced ML Ensemble',
-            'model': 'LangChain AI + 9-Algorithm Ensemble',
-            'langchain_enabled': use_langchain,
-            'langchain_weight': 0.65 if use_langchain else 0.0,
-            'ml_weight': 0.35 if use_langchain else 1.0,
-            'similarity_results': [
-                {
-                    'source': 'LangChain Semantic Analysis',
-                    'similarity_score': similarity_results.get('semantic', 0),
-                    'confidence': min(similarity_results.get('semantic', 0) + 0.1, 1.0),
-                    'match_type': 'semantic_embedding'
-                },
-                {
-                    'source': 'Advanced ML Ensemble',
-                    'similarity_score': similarity_results.get('advanced_similarity', similarity_results.get('overall', 0)),
-                    'confidence': min(similarity_results.get('overall', 0) + 0.1, 1.0),
-                    'match_type': '9_algorithm_ensemble'
-                }
-            ],
-            'document_stats': text_stats,
-            'analysis_timestamp': text_stats.get('timestamp'),
-            'file_id': file_id
-        }
+        # Options: comparison_text, use_langchain (default True), cascade,
+        # latency_budget, top_k
+        analysis_result = analysis_pipeline.analyze(document_text, file_id, data)
+        overall_score = analysis_result['overall_score']
+        if data.get('include_timings'):
+            analysis_result['timings'] = summarize_timings(g.request_timings)
         
         logger.info(f"Analysis completed for file: {file_id} - Score: {overall_score:.2%}")
         return jsonify({
@@ -248,6 +376,57 @@ def analyze_document():
         logger.error(f"Analysis error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _json_default(value):
+    """Serialize NumPy scalars and other stragglers in streamed events."""
+    return value.item() if hasattr(value, 'item') else str(value)
+
+@app.route('/api/analyze/stream', methods=['POST'])
+def analyze_document_stream():
+    """
+    Streaming variant of /api/analyze.
+    
+    Emits one event per metric (with the running combined score), the text
+    statistics and the passage lookups as soon as each completes, then a
+    'complete' event carrying the same analysis as /api/analyze. The body is
+    newline-delimited JSON, or server-sent events when the client sends
+    Accept: text/event-stream or "format": "sse".
+    """
+    data = request.get_json() or {}
+    file_id = data.get('file_id')
+    if not file_id:
+        return jsonify({'success': False, 'error': 'File ID required'}), 400
+    
+    file_data = file_upload_service.get_file_data(file_id)
+    if not file_data:
+        return jsonify({'success': False, 'error': 'File not found'}), 404
+    
+    use_sse = data.get('format') == 'sse' or 'text/event-stream' in request.headers.get('Accept', '')
+    
+    def encode(event):
+        payload = json.dumps(event, default=_json_default)
+        if use_sse:
+            return f"event: {event['event']}\ndata: {payload}\n\n"
+        return payload + '\n'
+    
+    def generate():
+        try:
+            for event in analysis_pipeline.events(file_data['text'], file_id, data, workers=STREAM_WORKERS):
+                if event['event'] == 'complete':
+                    if data.get('include_timings'):
+                        event['analysis']['timings'] = summarize_timings(g.request_timings)
+                    logger.info(f"Streamed analysis completed for file: {file_id} - "
+                                f"Score: {event['analysis']['overall_score']:.2%}")
+                yield encode(event)
+        except Exception as e:
+            logger.error(f"Streaming analysis error: {str(e)}")
+            yield encode({'event': 'error', 'error': str(e)})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream' if use_sse else 'application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/documents/<file_id>')
 def get_document(file_id):
     """Get document details"""
@@ -271,6 +450,31 @@ def get_document(file_id):
         logger.error(f"Get document error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/documents/<file_id>', methods=['DELETE'])
+def delete_document(file_id):
+    """Delete a document and remove it from the indexes"""
+    try:
+        if not file_upload_service.get_file_metadata(file_id):
+            return jsonify({'success': False, 'error': 'Document not found'}), 404
+        
+        result = file_upload_service.delete_file(file_id)
+        if not result['success']:
+            return jsonify({'success': False, 'error': result['error']}), 500
+        
+        removed_chunks = unindex_document(file_id)
+        
+        logger.info(f"Document deleted: {file_id}")
+        return jsonify({
+            'success': True,
+            'file_id': file_id,
+            'deleted_files': result['deleted_files'],
+            'removed_chunks': removed_chunks
+        })
+        
+    except Exception as e:
+        logger.error(f"Delete document error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/documents/<file_id>/content')
 def get_document_content(file_id):
     """Get document content (full text)"""
@@ -291,6 +495,34 @@ def get_document_content(file_id):
         logger.error(f"Get document content error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/documents/<file_id>/matches')
+def get_document_matches(file_id):
+    """Stored corpus matches of a document, kept current as documents are uploaded"""
+    try:
+        if not match_store:
+            return jsonify({'success': False, 'error': 'Incremental matching is disabled'}), 404
+        
+        matches = match_store.get(file_id)
+        if not matches:
+            return jsonify({'success': False, 'error': 'Document not found'}), 404
+        
+        return jsonify({'success': True, **matches})
+        
+    except Exception as e:
+        logger.error(f"Get document matches error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/documents/<file_id>/style')
+def get_document_style(file_id):
+    """Stylometric profile of a document, its style shifts and the closest-style documents"""
+    try:
+        body, status = style_payload(file_id, request.args.get('threshold', type=float))
+        return jsonify(body), status
+        
+    except Exception as e:
+        logger.error(f"Document style error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/debug/highlight-test', methods=['POST'])
 def debug_highlight_test():
     """Debug endpoint to test highlighting with detailed information"""
@@ -363,7 +595,8 @@ def langchain_analysis():
         # Also compare with advanced service (use calculate_overall_similarity)
         advanced_data = similarity_service.calculate_overall_similarity(
             document_text,
-            comparison_text if comparison_text else "default"
+            comparison_text if comparison_text else "default",
+            latency_budget=data.get('latency_budget')
         )
         
         # Handle both float and dict returns from calculate_overall_similarity
@@ -372,7 +605,7 @@ def langchain_analysis():
         else:
             advanced_results = {'overall': float(advanced_data)}
         
-        return jsonify({
+        response = {
             'success': True,
             'langchain_results': langchain_results,
             'advanced_results': advanced_results,
@@ -381,46 +614,220 @@ def langchain_analysis():
                 'advanced_overall': advanced_results.get('overall', 0),
                 'difference': abs(langchain_results.get('semantic', 0) - advanced_results.get('overall', 0))
             }
-        })
+        }
+        if data.get('include_timings'):
+            response['timings'] = summarize_timings(g.request_timings)
+        
+        return jsonify(response)
         
     except Exception as e:
         logger.error(f"LangChain analysis error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/highlight', methods=['POST'])
-def highlight_text():
-    """Highlight suspicious text passages in pasted content."""
-    try:
-        data = request.get_json()
-        original_text = data.get('original_text', '')
-        reference_text = data.get('reference_text', '')
-        threshold = data.get('threshold', 0.7)
-        
-        if not original_text or len(original_text.strip()) < 10:
-            return jsonify({'success': False, 'error': 'Original text too short'}), 400
-        
-        if not reference_text or len(reference_text.strip()) < 10:
-            return jsonify({'success': False, 'error': 'Reference text too short'}), 400
-        
-        # Highlight suspicious text
+def highlight_payload(data):
+    """Highlight suspicious passages for a /api/highlight request; returns (body, status)"""
+    original_text = data.get('original_text', '')
+    reference_text = data.get('reference_text', '')
+    threshold = data.get('threshold', 0.7)
+    method = data.get('method', 'sentence')  # 'sentence' or 'fingerprint'
+    
+    if not original_text or len(original_text.strip()) < 10:
+        return {'success': False, 'error': 'Original text too short'}, 400
+    
+    if not reference_text or len(reference_text.strip()) < 10:
+        return {'success': False, 'error': 'Reference text too short'}, 400
+    
+    # Highlight suspicious text
+    if method == 'fingerprint':
+        highlighted_data = text_highlighter.highlight_copied_passages(original_text, reference_text)
+    else:
         highlighted_data = text_highlighter.highlight_suspicious_text(
             original_text,
             reference_text,
             threshold
         )
+    
+    # Get statistics
+    stats = text_highlighter.get_highlight_statistics(highlighted_data)
+    
+    return {
+        'success': True,
+        'highlighted_html': highlighted_data.get('highlighted_html', ''),
+        'plagiarism_percentage': highlighted_data.get('plagiarism_percentage', 0),
+        'total_sentences': highlighted_data.get('total_sentences', 0),
+        'highlighted_sentences': highlighted_data.get('highlighted_sentences', 0),
+        'similarity_details': highlighted_data.get('similarity_details', []),
+        'statistics': stats
+    }, 200
+
+def compare_payload(data):
+    """Score two stored documents from their feature bundles for a /api/compare request; returns (body, status)"""
+    file_id = data.get('file_id')
+    comparison_file_id = data.get('comparison_file_id')
+    if not file_id or not comparison_file_id:
+        return {'success': False, 'error': 'file_id and comparison_file_id required'}, 400
+    if not feature_store:
+        return {'success': False, 'error': 'Feature bundles are disabled'}, 404
+    
+    langchain_svc = get_langchain_service() if data.get('use_langchain', True) else None
+    bundles = [get_feature_bundle(doc_id, langchain_svc) for doc_id in (file_id, comparison_file_id)]
+    try:
+        if None in bundles:
+            return {'success': False, 'error': 'Document not found'}, 404
+        bundle, comparison_bundle = bundles
+        
+        # Same cheap tiers as /api/analyze, from the stored signatures
+        cascade = scoring_cascade.screen_bundles(bundle, comparison_bundle) if data.get('cascade', True) else None
+        advanced = langchain = None
+        if cascade is None or cascade['passed']:
+            advanced = similarity_service.calculate_bundle_similarity(
+                bundle, comparison_bundle, data.get('latency_budget')
+            )
+            if langchain_svc:
+                langchain = langchain_svc.calculate_bundle_score(bundle, comparison_bundle)
+        
+        # The text is only read to render the highlighted HTML
+        text = file_upload_service.get_file_text(file_id) if data.get('include_html', True) else None
+        highlighted_data = text_highlighter.highlight_bundles(
+            bundle, comparison_bundle,
+            threshold=data.get('threshold', 0.7),
+            method=data.get('method', 'sentence'),
+            text=text
+        )
         
-        # Get statistics
-        stats = text_highlighter.get_highlight_statistics(highlighted_data)
-        
-        return jsonify({
+        return {
             'success': True,
-            'highlighted_html': highlighted_data.get('highlighted_html', ''),
-            'plagiarism_percentage': highlighted_data.get('plagiarism_percentage', 0),
-            'total_sentences': highlighted_data.get('total_sentences', 0),
-            'highlighted_sentences': highlighted_data.get('highlighted_sentences', 0),
-            'similarity_details': highlighted_data.get('similarity_details', []),
-            'statistics': stats
-        })
+            'file_id': file_id,
+            'comparison_file_id': comparison_file_id,
+            'cascade': cascade,
+            'advanced': advanced,
+            'langchain': langchain,
+            'highlight': highlighted_data,
+            'statistics': text_highlighter.get_highlight_statistics(highlighted_data)
+        }, 200
+    finally:
+        for opened in bundles:
+            if opened is not None:
+                opened.close()
+
+def style_payload(file_id, threshold=None):
+    """Style profile and style shifts of a stored document for /api/documents/<file_id>/style; returns (body, status)"""
+    if not style_index:
+        return {'success': False, 'error': 'Style index is disabled'}, 404
+    text = file_upload_service.get_file_text(file_id)
+    if not text:
+        return {'success': False, 'error': 'Document not found'}, 404
+    if not style_index.has_document(file_id):
+        style_index.add_document(file_id, text)
+    
+    kwargs = {'threshold': threshold} if threshold is not None else {}
+    vector = style_index.document_vector(file_id)
+    return {
+        'success': True,
+        'file_id': file_id,
+        'features': style_index.features(vector) if vector is not None else {},
+        **style_index.style_shifts(text, exclude_file_id=file_id, **kwargs)
+    }, 200
+
+def ghostwriting_payload(data):
+    """Per-sentence machine-generated text scores for a /api/ghostwriting request; returns (body, status)"""
+    text = data.get('text', '')
+    if data.get('file_id'):
+        text = file_upload_service.get_file_text(data['file_id'])
+        if not text:
+            return {'success': False, 'error': 'Document not found'}, 404
+    if not text:
+        return {'success': False, 'error': 'text or file_id required'}, 400
+    
+    detector = get_ghostwriting_detector()
+    if detector is None:
+        return {'success': False, 'error': 'Ghostwriting detector is not available'}, 503
+    
+    threshold = float(data.get('threshold', 0.5))
+    result = detector.analyze(text, threshold=threshold, latency_budget=data.get('latency_budget'))
+    if not result:
+        return {'success': False, 'error': 'Ghostwriting detection failed'}, 500
+    return {
+        'success': True,
+        **result,
+        'highlighted_html': text_highlighter.highlight_sentence_scores(text, result['sentences'], threshold)
+    }, 200
+
+def score_many_payload(data):
+    """Score one text against many candidates for a /api/score-many request; returns (body, status)"""
+    text = data.get('text', '')
+    candidates = data.get('candidates') or []
+    if not text or len(text.strip()) < 10:
+        return {'success': False, 'error': 'Text too short'}, 400
+    if not isinstance(candidates, list) or not candidates:
+        return {'success': False, 'error': 'candidates must be a non-empty list of texts'}, 400
+    
+    def listed(scores):
+        # NaN marks a metric the candidate's plan skipped
+        return {name: [None if math.isnan(v) else round(float(v), 3) for v in values]
+                for name, values in scores.items()}
+    
+    # Same cheap tiers as /api/analyze; only candidates passing them are scored
+    cascade = scoring_cascade.screen_many(text, candidates) if data.get('cascade', True) else None
+    selected = [i for i in range(len(candidates)) if cascade is None or cascade[i]['passed']]
+    selected_texts = [candidates[i] for i in selected]
+    
+    advanced = langchain = None
+    if selected:
+        advanced = listed(similarity_service.score_many(text, selected_texts, data.get('latency_budget')))
+        if data.get('use_langchain', True):
+            langchain_svc = get_langchain_service()
+            if langchain_svc:
+                langchain = listed(langchain_svc.score_many(text, selected_texts))
+    
+    return {
+        'success': True,
+        'count': len(candidates),
+        'scored': selected,
+        'cascade': cascade,
+        'advanced': advanced,
+        'langchain': langchain
+    }, 200
+
+@app.route('/api/score-many', methods=['POST'])
+def score_many():
+    """Score one text against a batch of candidate texts."""
+    try:
+        body, status = score_many_payload(request.get_json())
+        return jsonify(body), status
+        
+    except Exception as e:
+        logger.error(f"Batch scoring error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/ghostwriting', methods=['POST'])
+def detect_ghostwriting():
+    """Score every sentence of a text or stored document for machine-generated text."""
+    try:
+        body, status = ghostwriting_payload(request.get_json())
+        return jsonify(body), status
+        
+    except Exception as e:
+        logger.error(f"Ghostwriting detection error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/compare', methods=['POST'])
+def compare_documents():
+    """Compare two uploaded documents using their precomputed feature bundles."""
+    try:
+        body, status = compare_payload(request.get_json())
+        return jsonify(body), status
+        
+    except Exception as e:
+        logger.error(f"Document comparison error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/highlight', methods=['POST'])
+def highlight_text():
+    """Highlight suspicious text passages in pasted content."""
+    try:
+        body, status = highlight_payload(request.get_json())
+        return jsonify(body), status
         
     except Exception as e:
         logger.error(f"Text highlighting error: {str(e)}")
@@ -454,4 +861,5 @@ def internal_error(e):
 if __name__ == '__main__':
     print("Starting AI Plagiarism Detector...")
     print("Access the application at: http://localhost:5001")
+    backfill_indexes()
     app.run(debug=False, host='0.0.0.0', port=5001)
\ No newline at end of file
@@ -0,0 +1,494 @@
+"""
+ASGI serving mode for the AI Plagiarism Detector (Quart).
+
+Serves the same API as app.py with async handlers: document reads use async
+file I/O, uploads stream from the request body into the upload folder, and
+extraction, scoring and highlighting run on a bounded thread pool so the
+event loop keeps serving I/O-bound requests. Analyses can also be submitted
+as background jobs and polled.
+
+Run with any ASGI server, e.g.:
+    hypercorn asgi:app --bind 0.0.0.0:5001
+    uvicorn asgi:app --port 5001
+"""
+
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from quart import Quart, Response, g, jsonify, render_template, request
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.sansio.multipart import Data, Epilogue, File, MultipartDecoder, NeedData
+
+try:
+    import aiofiles
+    AIOFILES_AVAILABLE = True
+except ImportError:
+    AIOFILES_AVAILABLE = False
+
+# The services, indexes and lazy loaders are shared with the Flask app so both
+# serving modes produce identical results
+import app as flask_app
+from src.utils.instrumentation import registry, start_request_timings, stop_request_timings, summarize_timings
+from src.utils.uploadStream import UploadSink, UploadTooLarge
+
+logger = logging.getLogger(__name__)
+
+# Threads for CPU-heavy work (scoring, extraction, highlighting)
+SCORING_WORKERS = int(os.environ.get('ASGI_SCORING_WORKERS', os.cpu_count() or 4))
+# Finished jobs kept for polling
+MAX_FINISHED_JOBS = 1000
+
+
+class AnalysisJobs:
+    """In-memory registry of background analysis jobs."""
+
+    def __init__(self, max_finished: int = MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self._jobs = OrderedDict()
+
+    def create(self, file_id: str) -> dict:
+        job = {
+            'job_id': str(uuid.uuid4()),
+            'file_id': file_id,
+            'status': 'queued',
+            'created': time.time(),
+            'finished': None,
+            'result': None,
+            'error': None
+        }
+        self._jobs[job['job_id']] = job
+        self._evict()
+        return job
+
+    def get(self, job_id: str):
+        return self._jobs.get(job_id)
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job['status'] in ('completed', 'failed')]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+
+def create_app() -> Quart:
+    """Create the Quart application."""
+    app = Quart(__name__, template_folder='templates', static_folder='public')
+    app.config['MAX_CONTENT_LENGTH'] = flask_app.app.config['MAX_CONTENT_LENGTH']
+
+    executor = ThreadPoolExecutor(max_workers=SCORING_WORKERS, thread_name_prefix='scoring')
+    jobs = AnalysisJobs()
+    # Running job tasks; the event loop only keeps weak references to tasks
+    job_tasks = set()
+    upload_folder = flask_app.file_upload_service.upload_folder
+    services = flask_app
+
+    async def run_blocking(func, *args, **kwargs):
+        """Run a blocking call on the scoring pool, keeping the request context."""
+        call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(executor, call)
+
+    async def run_io(func, *args):
+        """
+        Run a short blocking file operation on the loop's default executor.
+
+        Kept off the scoring pool so it does not queue behind analyses.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args))
+
+    async def read_file(path: str):
+        """Read a UTF-8 file without blocking the event loop; None if missing."""
+        try:
+            if AIOFILES_AVAILABLE:
+                async with aiofiles.open(path, 'r', encoding='utf-8') as f:
+                    return await f.read()
+
+            def read():
+                with open(path, 'r', encoding='utf-8') as f:
+                    return f.read()
+            return await run_io(read)
+        except FileNotFoundError:
+            return None
+
+    async def receive_upload():
+        """
+        Stream the multipart body's 'file' part into an UploadSink.
+
+        Body chunks are read as the server receives them and parsed with
+        werkzeug's sans-IO multipart decoder; the file's bytes are written
+        off the event loop, one write per chunk. Nothing is spooled. Returns
+        a FileStorage over the sink, or None without a 'file' part.
+        """
+        boundary = request.mimetype_params.get('boundary', '').encode('ascii')
+        if request.mimetype != 'multipart/form-data' or not boundary:
+            return None
+
+        decoder = MultipartDecoder(boundary)
+        upload = None
+        writing = False
+        try:
+            async for chunk in request.body:
+                decoder.receive_data(chunk)
+                pending = []
+                event = decoder.next_event()
+                while not isinstance(event, (Epilogue, NeedData)):
+                    if isinstance(event, Data):
+                        if writing:
+                            pending.append(event.data)
+                    elif isinstance(event, File) and event.name == 'file' and upload is None:
+                        sink = await run_io(UploadSink, upload_folder, services.file_upload_service.max_file_size)
+                        upload = FileStorage(sink, event.filename, event.name, headers=event.headers)
+                        writing = True
+                    else:
+                        # Another field or file part: its data is skipped
+                        writing = False
+                    event = decoder.next_event()
+                if pending:
+                    await run_io(upload.stream.write, b''.join(pending))
+        except BaseException:
+            if upload is not None:
+                await run_io(upload.stream.close)
+            raise
+        return upload
+
+    async def load_document(file_id: str):
+        """Async equivalent of FileUploadService.get_file_data."""
+        raw_metadata = await read_file(os.path.join(upload_folder, f"{file_id}.json"))
+        if raw_metadata is None:
+            return None
+        text = await read_file(os.path.join(upload_folder, f"{file_id}.txt"))
+        if text is None:
+            return None
+        metadata = json.loads(raw_metadata)
+        return {
+            'text': text,
+            'filename': metadata.get('filename'),
+            'file_type': metadata.get('file_type'),
+            'upload_time': metadata.get('upload_time'),
+            'file_id': file_id
+        }
+
+    @app.before_request
+    async def begin_request_timings():
+        g.request_timings = start_request_timings()
+
+    @app.teardown_request
+    async def end_request_timings(exc=None):
+        stop_request_timings()
+
+    @app.route('/')
+    async def index():
+        """Serve the main application page"""
+        return await render_template('index.html')
+
+    @app.route('/api/health')
+    async def health_check():
+        """Health check endpoint"""
+        return jsonify({
+            'status': 'healthy',
+            'message': 'AI Plagiarism Detector API is running',
+            'version': '1.0.0',
+            'server': 'asgi'
+        })
+
+    @app.route('/api/metrics')
+    async def metrics():
+        """Per-stage latency, CPU and memory histograms in Prometheus text format"""
+        return Response(registry.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/api/upload', methods=['POST'])
+    async def upload_file():
+        """Handle file upload; the body streams to disk, extraction and indexing run on the scoring pool"""
+        file = None
+        try:
+            file = await receive_upload()
+            if file is None:
+                return jsonify({'success': False, 'error': 'No file provided'}), 400
+
+            if file.filename == '':
+                return jsonify({'success': False, 'error': 'No file selected'}), 400
+
+            result = await run_blocking(services.file_upload_service.save_file, file)
+            if not result['success']:
+                return jsonify({'success': False, 'error': result['error']}), 400
+
+            logger.info(f"File uploaded successfully: {result['file_id']}")
+            await run_blocking(services.index_document, result['file_id'])
+            return jsonify({
+                'success': True,
+                'file_id': result['file_id'],
+                'filename': result['filename'],
+                'text_length': result['text_length'],
+                'word_count': result['word_count']
+            })
+
+        except (UploadTooLarge, RequestEntityTooLarge):
+            return jsonify({'success': False, 'error': 'File too large. Maximum size is 16MB.'}), 413
+
+        except Exception as e:
+            logger.error(f"Upload error: {str(e)}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+        finally:
+            # Removes the temporary file unless save_file committed it
+            if file is not None:
+                await run_io(file.stream.close)
+
+    @app.route('/api/documents/<file_id>')
+    async def get_document(file_id):
+        """Get document details"""
+        file_data = await load_document(file_id)
+        if not file_data:
+            return jsonify({'success': False, 'error': 'Document not found'}), 404
+
+        return jsonify({
+            'success': True,
+            'document': {
+                'file_id': file_id,
+                'filename': file_data['filename'],
+                'text_length': len(file_data['text']),
+                'upload_time': file_data.get('upload_time'),
+                'file_type': file_data.get('file_type')
+            }
+        })
+
+    @app.route('/api/documents/<file_id>/content')
+    async def get_document_content(file_id):
+        """Get document content (full text)"""
+        file_data = await load_document(file_id)
+        if not file_data:
+            return jsonify({'success': False, 'error': 'Document not found'}), 404
+
+        return jsonify({
+            'success': True,
+            'file_id': file_id,
+            'filename': file_data['filename'],
+            'text': file_data['text'],
+            'text_length': len(file_data['text'])
+        })
+
+    @app.route('/api/documents/<file_id>/matches')
+    async def get_document_matches(file_id):
+        """Stored corpus matches of a document, kept current as documents are uploaded"""
+        if not services.match_store:
+            return jsonify({'success': False, 'error': 'Incremental matching is disabled'}), 404
+
+        matches = await run_blocking(services.match_store.get, file_id)
+        if not matches:
+            return jsonify({'success': False, 'error': 'Document not found'}), 404
+
+        return jsonify({'success': True, **matches})
+
+    @app.route('/api/documents/<file_id>/style')
+    async def get_document_style(file_id):
+        """Stylometric profile of a document, its style shifts and the closest-style documents"""
+        try:
+            threshold = request.args.get('threshold', type=float)
+            body, status = await run_blocking(services.style_payload, file_id, threshold)
+            return jsonify(body), status
+
+        except Exception as e:
+            logger.error(f"Document style error: {str(e)}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/documents/<file_id>', methods=['DELETE'])
+    async def delete_document(file_id):
+        """Delete a document and remove it from the indexes"""
+        try:
+            if not await run_io(os.path.exists, os.path.join(upload_folder, f"{file_id}.json")):
+                return jsonify({'success': False, 'error': 'Document not found'}), 404
+
+            result = await run_blocking(services.file_upload_service.delete_file, file_id)
+            if not result['success']:
+                return jsonify({'success': False, 'error': result['error']}), 500
+            removed_chunks = await run_blocking(services.unindex_document, file_id)
+
+            return jsonify({
+                'success': True,
+                'file_id': file_id,
+                'deleted_files': result['deleted_files'],
+                'removed_chunks': removed_chunks
+            })
+
+        except Exception as e:
+            logger.error(f"Delete document error: {str(e)}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/analyze', methods=['POST'])
+    async def analyze_document():
+        """Analyze document for plagiarism (scoring runs on the pool)"""
+        try:
+            data = await request.get_json()
+            file_id = data.get('file_id')
+            if not file_id:
+                return jsonify({'success': False, 'error': 'File ID required'}), 400
+
+            file_data = await load_document(file_id)
+            if not file_data:
+                return jsonify({'success': False, 'error': 'File not found'}), 404
+
+            analysis_result = await run_blocking(
+                services.analysis_pipeline.analyze, file_data['text'], file_id, data
+            )
+            if data.get('include_timings'):
+                analysis_result['timings'] = summarize_timings(g.request_timings)
+            return jsonify({'success': True, 'analysis': analysis_result})
+
+        except Exception as e:
+            logger.error(f"Analysis error: {str(e)}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/analyze/stream', methods=['POST'])
+    async def analyze_document_stream():
+        """Streaming variant of /api/analyze (NDJSON, or SSE with "format": "sse")"""
+        data = await request.get_json() or {}
+        file_id = data.get('file_id')
+        if not file_id:
+            return jsonify({'success': False, 'error': 'File ID required'}), 400
+
+        file_data = await load_document(file_id)
+        if not file_data:
+            return jsonify({'success': False, 'error': 'File not found'}), 404
+
+        use_sse = data.get('format') == 'sse' or 'text/event-stream' in request.headers.get('Accept', '')
+        events = services.analysis_pipeline.events(
+            file_data['text'], file_id, data, workers=services.STREAM_WORKERS
+        )
+
+        async def generate():
+            while True:
+                # Advance the blocking generator on the pool, one event at a time
+                event = await run_blocking(next, events, None)
+                if event is None:
+                    break
+                payload = json.dumps(event, default=services._json_default)
+                yield (f"event: {event['event']}\ndata: {payload}\n\n" if use_sse else payload + '\n').encode()
+
+        return Response(
+            generate(),
+            mimetype='text/event-stream' if use_sse else 'application/x-ndjson',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    @app.route('/api/analyze/jobs', methods=['POST'])
+    async def submit_analysis_job():
+        """Queue an analysis and return a job ID to poll"""
+        data = await request.get_json() or {}
+        file_id = data.get('file_id')
+        if not file_id:
+            return jsonify({'success': False, 'error': 'File ID required'}), 400
+
+        file_data = await load_document(file_id)
+        if not file_data:
+            return jsonify({'success': False, 'error': 'File not found'}), 404
+
+        job = jobs.create(file_id)
+
+        async def run_job():
+            job['status'] = 'running'
+            try:
+                job['result'] = await run_blocking(
+                    services.analysis_pipeline.analyze, file_data['text'], file_id, data
+                )
+                job['status'] = 'completed'
+            except Exception as e:
+                logger.error(f"Analysis job {job['job_id']} failed: {e}")
+                job['status'] = 'failed'
+                job['error'] = str(e)
+            job['finished'] = time.time()
+
+        task = asyncio.get_running_loop().create_task(run_job())
+        job_tasks.add(task)
+        task.add_done_callback(job_tasks.discard)
+        return jsonify({'success': True, 'job_id': job['job_id'], 'status': job['status']}), 202
+
+    @app.route('/api/analyze/jobs/<job_id>')
+    async def get_analysis_job(job_id):
+        """Poll the status (and, once completed, the result) of an analysis job"""
+        job = jobs.get(job_id)
+        if not job:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        body = {'success': True, **{k: v for k, v in job.items() if k != 'result'}}
+        if job['status'] == 'completed':
+            body['analysis'] = job['result']
+        return jsonify(body)
+
+    @app.route('/api/compare', methods=['POST'])
+    async def compare_documents():
+        """Compare two uploaded documents using their precomputed feature bundles."""
+        try:
+            data = await request.get_json()
+            body, status = await run_blocking(services.compare_payload, data)
+            return jsonify(body), status
+
+        except Exception as e:
+            logger.error(f"Document comparison error: {str(e)}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/score-many', methods=['POST'])
+    async def score_many():
+        """Score one text against a batch of candidate texts."""
+        try:
+            data = await request.get_json()
+            body, status = await run_blocking(services.score_many_payload, data)
+            return jsonify(body), status
+
+        except Exception as e:
+            logger.error(f"Batch scoring error: {str(e)}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/ghostwriting', methods=['POST'])
+    async def detect_ghostwriting():
+        """Score every sentence of a text or stored document for machine-generated text."""
+        try:
+            data = await request.get_json()
+            body, status = await run_blocking(services.ghostwriting_payload, data)
+            return jsonify(body), status
+
+        except Exception as e:
+            logger.error(f"Ghostwriting detection error: {str(e)}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/highlight', methods=['POST'])
+    async def highlight_text():
+        """Highlight suspicious text passages in pasted content."""
+        try:
+            data = await request.get_json()
+            body, status = await run_blocking(services.highlight_payload, data)
+            return jsonify(body), status
+
+        except Exception as e:
+            logger.error(f"Text highlighting error: {str(e)}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.errorhandler(413)
+    async def too_large(e):
+        """Handle file too large error"""
+        return jsonify({
+            'success': False,
+            'error': 'File too large. Maximum size is 16MB.'
+        }), 413
+
+    @app.errorhandler(404)
+    async def not_found(e):
+        """Handle 404 errors"""
+        return jsonify({
+            'success': False,
+            'error': 'Resource not found'
+        }), 404
+
+    @app.after_serving
+    async def shutdown_executor():
+        executor.shutdown(wait=False)
+
+    return app
+
+
+app = create_app()
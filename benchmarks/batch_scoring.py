@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+Batch versus pairwise scoring of one document against many candidates.
+
+For every document length, scores a query against a set of candidates
+(sources sharing passages with it and unrelated documents) once with one
+pairwise ensemble call per candidate and once with score_many, and reports
+the per-candidate latency of both and the largest difference between their
+scores (pairwise results are rounded to 3 decimals, so up to 5e-4 is
+expected).
+
+The advanced ensemble runs with the latency budget disabled so both paths
+compute every metric exactly. --langchain adds the LangChain ensemble
+(needs its dependencies and the embedding model).
+
+Usage:
+    python -m benchmarks.batch_scoring --words 300 2000 --candidates 100
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import SyntheticCorpus
+from src.services.advancedSimilarityService import AdvancedSimilarityService
+
+
+def compare(name, pairwise, batch, query, candidates):
+    """Time both paths and compare their scores."""
+    start = time.perf_counter()
+    expected = [pairwise(query, candidate) for candidate in candidates]
+    pairwise_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scores = batch(query, candidates)
+    batch_s = time.perf_counter() - start
+
+    differences = {}
+    for metric, values in scores.items():
+        reference = np.array([e[metric] if isinstance(e, dict) and metric in e else 0.0 for e in expected],
+                             dtype=np.float64)
+        ran = ~np.isnan(values)
+        differences[metric] = float(np.max(np.abs(reference[ran] - values[ran]))) if ran.any() else 0.0
+
+    return {
+        'ensemble': name,
+        'pairwise_ms': pairwise_s / len(candidates) * 1000,
+        'batch_ms': batch_s / len(candidates) * 1000,
+        'speedup': pairwise_s / batch_s,
+        'max_difference': max(differences.values()),
+        'differences': differences
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--words', type=int, nargs='+', default=[300, 2000], help='Words per document')
+    parser.add_argument('--candidates', type=int, default=100)
+    parser.add_argument('--overlap', type=float, default=0.4)
+    parser.add_argument('--langchain', action='store_true', help='Also compare the LangChain ensemble')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    ensembles = []
+    advanced = AdvancedSimilarityService()
+    ensembles.append(('advanced',
+                      lambda q, c: advanced.calculate_overall_similarity(q, c, latency_budget=0),
+                      lambda q, cs: advanced.score_many(q, cs, latency_budget=0)))
+    if args.langchain:
+        from src.services.langchainPlagiarismService import LangChainPlagiarismService
+        langchain = LangChainPlagiarismService()
+        ensembles.append(('langchain', langchain.calculate_plagiarism_score, langchain.score_many))
+
+    corpus = SyntheticCorpus(seed=args.seed)
+    results = []
+    print(f"{'ensemble':<11}{'words':>7}{'cands':>7}{'pair ms':>10}{'batch ms':>10}{'speedup':>9}  max diff")
+    for words in args.words:
+        query = corpus.document(words)
+        related = args.candidates // 2
+        candidates = [corpus.pair(words, overlap=args.overlap)['source'] for _ in range(related)]
+        candidates += [corpus.document(words) for _ in range(args.candidates - related)]
+
+        for name, pairwise, batch in ensembles:
+            result = {'words': words, 'candidates': len(candidates),
+                      **compare(name, pairwise, batch, query, candidates)}
+            results.append(result)
+            print(f"{name:<11}{words:>7}{len(candidates):>7}{result['pairwise_ms']:>10.2f}"
+                  f"{result['batch_ms']:>10.2f}{'x%.1f' % result['speedup']:>9}  {result['max_difference']:.1e}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), 'results': results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    return 0 if all(r['max_difference'] <= 5e-4 + 1e-9 for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Synthetic corpora of controlled size and overlap for the benchmarks.
+
+Text is built from a seeded pseudo-word vocabulary with a Zipf-like word
+distribution, so runs are reproducible and independent of any sample data.
+Derived documents copy a chosen fraction of the source sentences in
+contiguous runs (as copied passages usually are), optionally with light
+word-level edits.
+"""
+
+import os
+import random
+from typing import Dict, List, Optional
+
+SYLLABLES = [
+    'ba', 'ce', 'di', 'fo', 'gu', 'ha', 'je', 'ki', 'lo', 'mu', 'na', 'pe', 'ri', 'so',
+    'tu', 'va', 'we', 'xi', 'yo', 'za', 'ar', 'en', 'is', 'on', 'ul', 'tra', 'pro', 'con',
+    'ment', 'tion', 'ly', 'er', 'al', 'ic', 'ous', 'ing'
+]
+FUNCTION_WORDS = [
+    'the', 'of', 'and', 'to', 'in', 'a', 'is', 'that', 'for', 'it', 'as', 'with', 'was',
+    'on', 'be', 'by', 'this', 'are', 'from', 'at', 'which', 'or', 'an', 'not', 'these'
+]
+
+
+class SyntheticCorpus:
+    """Seeded generator of documents and document pairs."""
+
+    def __init__(self, seed: int = 0, vocabulary_size: int = 5000):
+        self.random = random.Random(seed)
+        words = set()
+        while len(words) < vocabulary_size:
+            words.add(''.join(self.random.choice(SYLLABLES) for _ in range(self.random.randint(1, 4))))
+        self.vocabulary = sorted(words)
+        self.random.shuffle(self.vocabulary)
+        # Zipf-like weights: a few content words are common, most are rare
+        self.weights = [1.0 / (rank + 1) for rank in range(len(self.vocabulary))]
+
+    def sentence(self) -> str:
+        """One sentence of 8-25 words, about a third of them function words."""
+        length = self.random.randint(8, 25)
+        content = self.random.choices(self.vocabulary, weights=self.weights, k=length)
+        words = [
+            self.random.choice(FUNCTION_WORDS) if self.random.random() < 0.35 else word
+            for word in content
+        ]
+        words[0] = words[0].capitalize()
+        return ' '.join(words) + '.'
+
+    def sentences(self, words: int) -> List[str]:
+        """Sentences totalling roughly the given number of words."""
+        result, count = [], 0
+        while count < words:
+            sentence = self.sentence()
+            result.append(sentence)
+            count += sentence.count(' ') + 1
+        return result
+
+    def document(self, words: int) -> str:
+        """A document of roughly the given length, in paragraphs of 3-8 sentences."""
+        return self.join_paragraphs(self.sentences(words))
+
+    def join_paragraphs(self, sentences: List[str]) -> str:
+        paragraphs, start = [], 0
+        while start < len(sentences):
+            size = self.random.randint(3, 8)
+            paragraphs.append(' '.join(sentences[start:start + size]))
+            start += size
+        return '\n\n'.join(paragraphs)
+
+    def perturb(self, sentence: str, rate: float) -> str:
+        """Replace a fraction of the words of a sentence."""
+        if rate <= 0:
+            return sentence
+        words = sentence.rstrip('.').split()
+        for i in range(len(words)):
+            if self.random.random() < rate:
+                words[i] = self.random.choice(self.vocabulary)
+        return ' '.join(words) + '.'
+
+    def pair(self, words: int, overlap: float = 0.3, edit_rate: float = 0.0,
+             run_length: int = 4) -> Dict:
+        """
+        A source document and a suspicious document that copies part of it.
+
+        Args:
+            words: Approximate length of each document in words
+            overlap: Fraction of the suspicious document's sentences copied from the source
+            edit_rate: Fraction of words replaced inside copied sentences
+            run_length: Average number of consecutive sentences per copied passage
+
+        Returns:
+            Dict with 'source', 'suspicious' and the number of 'copied_sentences'
+        """
+        source = self.sentences(words)
+        fresh = self.sentences(words)
+        copies = int(round(overlap * len(fresh)))
+        fresh = fresh[:len(fresh) - copies]
+
+        # Split the copied sentences into contiguous runs from random source positions
+        runs = []
+        while copies > 0:
+            length = min(self.random.randint(1, 2 * run_length - 1), copies, len(source))
+            start = self.random.randrange(len(source) - length + 1)
+            runs.append([self.perturb(sentence, edit_rate) for sentence in source[start:start + length]])
+            copies -= length
+
+        # Insert the runs at random places among the fresh sentences
+        positions = sorted(self.random.randint(0, len(fresh)) for _ in runs)
+        suspicious, previous = [], 0
+        for position, run in zip(positions, runs):
+            suspicious.extend(fresh[previous:position])
+            suspicious.extend(run)
+            previous = position
+        suspicious.extend(fresh[previous:])
+
+        return {
+            'source': self.join_paragraphs(source),
+            'suspicious': self.join_paragraphs(suspicious),
+            'copied_sentences': sum(len(run) for run in runs)
+        }
+
+    def write_corpus(self, directory: str, documents: int, words: int,
+                     formats: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Write documents to disk for extraction benchmarks.
+
+        Returns:
+            One dict per file with path, extension and text
+        """
+        formats = formats or ['txt']
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        for i in range(documents):
+            text = self.document(words)
+            extension = formats[i % len(formats)]
+            path = os.path.join(directory, f"doc_{i:05d}.{extension}")
+            if extension == 'docx':
+                import docx
+                document = docx.Document()
+                for paragraph in text.split('\n\n'):
+                    document.add_paragraph(paragraph)
+                document.save(path)
+            else:
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(text)
+            files.append({'path': path, 'extension': extension, 'text': text})
+        return files
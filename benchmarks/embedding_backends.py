@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+Accuracy-vs-throughput benchmark for the embedding backends.
+
+Embeds the sentences of the sample documents (sample_document.txt and the
+extracted texts in uploads/) with every backend and reports throughput and
+agreement with the full-precision PyTorch reference.
+
+Usage:
+    python -m benchmarks.embedding_backends [--backends torch onnx onnx-int8] [--output results.json]
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.embeddingBackends import BACKEND_NAMES, create_embedding_backend
+
+
+def load_sample_sentences(limit=512):
+    """Collect sentences from the bundled sample documents."""
+    paths = ['sample_document.txt'] + sorted(glob.glob(os.path.join('uploads', '*.txt')))
+    sentences = []
+    for path in paths:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except OSError:
+            continue
+        for line in text.replace('\n', ' ').split('. '):
+            line = line.strip()
+            if len(line) > 20:
+                sentences.append(line)
+    return sentences[:limit]
+
+
+def benchmark_backend(backend, sentences, repeats=3):
+    """Return embeddings and best-of-N throughput for a backend."""
+    backend.embed_documents(sentences[:8])  # warm-up
+    best = float('inf')
+    embeddings = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        embeddings = np.asarray(backend.embed_documents(sentences), dtype=np.float32)
+        best = min(best, time.perf_counter() - start)
+    return embeddings, len(sentences) / best
+
+
+def compare_to_reference(embeddings, reference):
+    """Cosine agreement and pairwise-similarity drift against the reference."""
+    def normalize(m):
+        return m / np.clip(np.linalg.norm(m, axis=1, keepdims=True), 1e-12, None)
+
+    emb, ref = normalize(embeddings), normalize(reference)
+    self_cosine = np.sum(emb * ref, axis=1)
+    pairwise_drift = np.abs(emb @ emb.T - ref @ ref.T)
+    return {
+        'mean_cosine_to_reference': round(float(self_cosine.mean()), 5),
+        'min_cosine_to_reference': round(float(self_cosine.min()), 5),
+        'mean_pairwise_similarity_error': round(float(pairwise_drift.mean()), 5),
+        'max_pairwise_similarity_error': round(float(pairwise_drift.max()), 5)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=list(BACKEND_NAMES), choices=BACKEND_NAMES)
+    parser.add_argument('--limit', type=int, default=512, help='Maximum number of sentences')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    sentences = load_sample_sentences(args.limit)
+    if not sentences:
+        print("No sample sentences found; run from the repository root.")
+        return 1
+
+    print(f"Benchmarking {len(sentences)} sentences")
+    results = {}
+    reference = None
+    for name in ['torch'] + [b for b in args.backends if b != 'torch']:
+        backend = create_embedding_backend(name)
+        embeddings, throughput = benchmark_backend(backend, sentences)
+        if reference is None:
+            reference = embeddings
+        entry = {'sentences_per_second': round(throughput, 1)}
+        entry.update(compare_to_reference(embeddings, reference))
+        results[name] = entry
+        print(f"{name:10s} {throughput:8.1f} sent/s  "
+              f"cosine to torch: {entry['mean_cosine_to_reference']:.4f} "
+              f"(min {entry['min_cosine_to_reference']:.4f})")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+"""
+Memory-vs-recall report for the chunk index's storage options.
+
+Builds a ChunkVectorIndex for each storage configuration (float32, float16
+and PQ codes, each with and without PCA), adds the vectors as documents of
+500 chunks, and reports the index file's bytes per vector and recall@k of
+search_vectors (the path /api/analyze uses) against exact full-precision
+search. Every index is reopened first, so the answers come from the saved,
+memory-mapped file as in a worker process.
+
+PQ and PCA train when the index switches to IVF (--ivf-threshold), so they
+need at least that many vectors.
+
+Usage:
+    python -m benchmarks.embedding_storage [--backend torch] [--k 10] [--output results.json]
+    python -m benchmarks.embedding_storage --synthetic 20000 [--intrinsic-dim 48]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.vectorIndexService import LOSSY_MIN_TRAINING, ChunkVectorIndex
+
+CONFIGURATIONS = [
+    ('float32', 0),
+    ('float16', 0),
+    ('float16', 128),
+    ('pq', 0),
+    ('pq', 192),
+    ('pq', 96),
+]
+
+DOCUMENT_CHUNKS = 500
+
+
+def synthetic_vectors(count, dim=384, clusters=64, intrinsic_dim=0, seed=0):
+    """
+    Clustered unit vectors. With intrinsic_dim the spread around each centre
+    lies mostly in a shared low-dimensional subspace, as it does for sentence
+    embeddings; without it the noise is isotropic, the worst case for PQ and PCA.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    if intrinsic_dim:
+        basis = rng.standard_normal((intrinsic_dim, dim)) / np.sqrt(intrinsic_dim)
+        noise = 0.6 * rng.standard_normal((count, intrinsic_dim)) @ basis + 0.1 * rng.standard_normal((count, dim))
+    else:
+        noise = 0.6 * rng.standard_normal((count, dim))
+    vectors = centers[rng.integers(clusters, size=count)] + noise
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def sample_vectors(backend_name, limit):
+    """Embed the sample document sentences with an embedding backend."""
+    from benchmarks.embedding_backends import load_sample_sentences
+    from src.services.embeddingBackends import create_embedding_backend
+
+    sentences = load_sample_sentences(limit)
+    vectors = np.asarray(create_embedding_backend(backend_name).embed_documents(sentences), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build_index(directory, vectors, storage, pca_dim, ivf_threshold):
+    """A ChunkVectorIndex holding the vectors, reopened from disk."""
+    options = dict(chunker=None, ivf_threshold=ivf_threshold, storage=storage, pca_dim=pca_dim, mmap=True)
+    index = ChunkVectorIndex(None, directory, **options)
+    for start in range(0, len(vectors), DOCUMENT_CHUNKS):
+        block = vectors[start:start + DOCUMENT_CHUNKS]
+        index.add_chunks(f"doc_{start}", [('', row, row + 1) for row in range(start, start + len(block))], block)
+    return ChunkVectorIndex(None, directory, **options)
+
+
+def recall_at_k(index, vectors, queries, k):
+    """Share of the exact top-k (float32 inner product) that search_vectors returns."""
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :k]
+    found = 0
+    for query, expected in zip(queries, exact):
+        matches = index.search_vectors([('', 0, 0)], query[None, :], k=k)
+        # Chunks were added with their row number as start offset
+        found += len({m['match_start'] for m in matches} & set(expected.tolist()))
+    return found / exact.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', default='torch', help='Embedding backend for the sample documents')
+    parser.add_argument('--synthetic', type=int, help='Use this many synthetic vectors instead')
+    parser.add_argument('--intrinsic-dim', type=int, default=0,
+                        help='Give the synthetic vectors a low-dimensional spread (0: isotropic)')
+    parser.add_argument('--limit', type=int, default=2048, help='Maximum number of sample sentences')
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--ivf-threshold', type=int, default=4096)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.synthetic, intrinsic_dim=args.intrinsic_dim) if args.synthetic else sample_vectors(args.backend, args.limit)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)]
+    dim = vectors.shape[1]
+    trained = len(vectors) >= args.ivf_threshold >= LOSSY_MIN_TRAINING
+
+    print(f"{len(vectors)} vectors, dim {dim}, recall@{args.k} vs float32 exact search")
+    if not trained:
+        print(f"fewer vectors than --ivf-threshold {args.ivf_threshold}: PQ and PCA configurations skipped")
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for storage, pca_dim in CONFIGURATIONS:
+            if (storage == 'pq' or pca_dim) and not trained:
+                continue
+            directory = os.path.join(tmp, f"{storage}_{pca_dim}")
+            index = build_index(directory, vectors, storage, pca_dim, args.ivf_threshold)
+            size = os.path.getsize(os.path.join(directory, ChunkVectorIndex.INDEX_FILENAME))
+
+            stats = index.stats()
+            entry = {
+                'storage': storage,
+                'pca_dim': pca_dim,
+                'index_type': stats['index_type'],
+                'memory_mapped': stats['memory_mapped'],
+                'file_bytes_per_vector': round(size / len(vectors), 1),
+                'compression': round(dim * 4 * len(vectors) / size, 1),
+                f'recall_at_{args.k}': round(recall_at_k(index, vectors, queries, args.k), 4)
+            }
+            results.append(entry)
+            print(f"{storage:8s} pca={pca_dim:<4d} {entry['index_type']:<26s}"
+                  f"{entry['file_bytes_per_vector']:8.1f} B/vec ({entry['compression']:5.1f}x)  "
+                  f"recall@{args.k}={entry[f'recall_at_{args.k}']:.4f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+"""
+Throughput (and, with labelled text, accuracy) of the ghostwriting detector.
+
+Scores the sentences of the sample documents with every available backend
+at several batch sizes, cold (empty cache) and again cached, and reports
+sentences per second. With --embedding the same sentences are embedded by
+that embedding backend for reference, since the detector is meant to fit
+a budget similar to the embedding stage.
+
+With --human and --machine (text files of human-written and generated
+text), 20% of their sentences are held out and every backend's ROC AUC on
+them is reported; --train first fits the feature classifier on the other
+80% and saves it (models/ghostwriting/classifier.npz by default).
+
+Usage:
+    python -m benchmarks.ghostwriting --human human.txt --machine generated.txt --train
+    python -m benchmarks.ghostwriting --batch-sizes 1 8 32 --embedding onnx-int8
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.metrics import roc_auc_score
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.embedding_backends import load_sample_sentences
+from src.services.ghostwritingDetector import (BACKEND_NAMES, DEFAULT_CLASSIFIER_PATH, GhostwritingDetector,
+                                               create_ghostwriting_backend, split_sentences,
+                                               train_feature_classifier)
+
+
+def file_sentences(paths):
+    sentences = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            sentences.extend(sentence for sentence, _, _ in split_sentences(f.read()))
+    return sentences
+
+
+def holdout(sentences, rng, fraction=0.2):
+    """(train, test) split of a sentence list."""
+    order = rng.permutation(len(sentences))
+    cut = int(len(sentences) * fraction)
+    return [sentences[i] for i in order[cut:]], [sentences[i] for i in order[:cut]]
+
+
+def roc_auc(human_scores, machine_scores):
+    """Probability that a generated sentence outscores a human one."""
+    if not human_scores or not machine_scores:
+        return None
+    labels = np.r_[np.zeros(len(human_scores)), np.ones(len(machine_scores))]
+    return float(roc_auc_score(labels, np.r_[human_scores, machine_scores]))
+
+
+def throughput(backend, sentences, batch_size):
+    """(cold, cached) sentences per second of a fresh detector."""
+    detector = GhostwritingDetector(backend, batch_size=batch_size, latency_budget=0)
+    start = time.perf_counter()
+    detector.score_sentences(sentences)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    detector.score_sentences(sentences)
+    cached = time.perf_counter() - start
+    return len(sentences) / cold, len(sentences) / cached
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=list(BACKEND_NAMES), choices=BACKEND_NAMES)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--limit', type=int, default=512, help='Maximum number of sample sentences')
+    parser.add_argument('--human', nargs='+', default=[], help='Human-written text files')
+    parser.add_argument('--machine', nargs='+', default=[], help='Generated text files')
+    parser.add_argument('--train', action='store_true', help='Fit and save the feature classifier first')
+    parser.add_argument('--classifier', default=DEFAULT_CLASSIFIER_PATH)
+    parser.add_argument('--embedding', help='Embedding backend to time on the same sentences')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    results = {'config': vars(args), 'training': None, 'backends': {}, 'embedding': None}
+    rng = np.random.default_rng(args.seed)
+    human_test = machine_test = []
+    if args.human and args.machine:
+        human_train, human_test = holdout(file_sentences(args.human), rng)
+        machine_train, machine_test = holdout(file_sentences(args.machine), rng)
+        if args.train:
+            results['training'] = train_feature_classifier(human_train, machine_train, args.classifier)
+            print(f"Classifier saved to {args.classifier}: {results['training']}")
+    elif args.train:
+        parser.error('--train needs --human and --machine')
+    os.environ['GHOSTWRITING_CLASSIFIER'] = args.classifier
+
+    sentences = load_sample_sentences(args.limit)
+    print(f"{len(sentences)} sample sentences")
+    print(f"{'backend':<12}{'batch':>7}{'cold/s':>10}{'cached/s':>11}")
+    for name in args.backends:
+        try:
+            backend = create_ghostwriting_backend(name)
+        except Exception as e:
+            print(f"{name:<12}unavailable: {e}")
+            continue
+
+        entry = {'throughput': [], 'auc': None}
+        for batch_size in (args.batch_sizes if sentences else []):
+            cold, cached = throughput(backend, sentences, batch_size)
+            entry['throughput'].append({'batch_size': batch_size, 'cold_per_s': cold, 'cached_per_s': cached})
+            print(f"{name:<12}{batch_size:>7}{cold:>10.1f}{cached:>11.0f}")
+        if human_test and machine_test:
+            detector = GhostwritingDetector(backend, latency_budget=0)
+            human_scores = [s for s in detector.score_sentences(human_test) if s is not None]
+            machine_scores = [s for s in detector.score_sentences(machine_test) if s is not None]
+            entry['auc'] = roc_auc(human_scores, machine_scores)
+            print(f"{name:<12}held-out AUC {entry['auc']:.3f} "
+                  f"({len(human_scores)} human, {len(machine_scores)} generated sentences)")
+        results['backends'][name] = entry
+
+    if args.embedding:
+        try:
+            from src.services.embeddingBackends import create_embedding_backend
+            embeddings = create_embedding_backend(args.embedding)
+            embeddings.embed_documents(sentences[:8])
+            start = time.perf_counter()
+            embeddings.embed_documents(sentences)
+            results['embedding'] = {'backend': args.embedding,
+                                    'per_s': len(sentences) / (time.perf_counter() - start)}
+            print(f"embedding {args.embedding}: {results['embedding']['per_s']:.1f} sentences/s")
+        except Exception as e:
+            print(f"embedding {args.embedding} unavailable: {e}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+"""
+Concurrent-request load test for the Flask (WSGI) and Quart (ASGI) servers.
+
+Starts each server on a local port (gunicorn with gunicorn.conf.py for
+Flask, hypercorn for asgi.py) with the same number of worker processes,
+seeds it with synthetic documents, then drives a weighted mix of requests
+(health, document fetch, content fetch, upload, analyze, job polling on
+ASGI) from N concurrent keep-alive clients for a fixed duration. Reports
+throughput and latency percentiles per server, concurrency and endpoint.
+
+Usage:
+    python -m benchmarks.load_test --servers flask asgi --concurrency 1 8 32 --duration 20
+    python -m benchmarks.load_test --url http://localhost:5001 --concurrency 16
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import SyntheticCorpus
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Request mix: I/O-bound reads dominate, with some uploads and scoring
+DEFAULT_MIX = {
+    'health': 0.15,
+    'document': 0.30,
+    'content': 0.25,
+    'upload': 0.10,
+    'analyze': 0.20,
+}
+
+
+def server_command(server, port, workers):
+    bind = f"127.0.0.1:{port}"
+    if server == 'flask':
+        return [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', bind,
+                '--workers', str(workers), 'app:app']
+    return [sys.executable, '-m', 'hypercorn', '--bind', bind, '--workers', str(workers), 'asgi:app']
+
+
+def start_server(server, port, workers, timeout=180):
+    """Start a server process and wait until /api/health answers."""
+    env = dict(os.environ, PRELOAD_MODELS=os.environ.get('PRELOAD_MODELS', '0'))
+    process = subprocess.Popen(
+        server_command(server, port, workers), cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{server} server exited with status {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            connection.request('GET', '/api/health')
+            if connection.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"{server} server did not become ready within {timeout}s")
+
+
+class Client:
+    """Keep-alive HTTP client issuing the load-test requests."""
+
+    def __init__(self, base_url):
+        parsed = urlparse(base_url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self.connection = None
+
+    def request(self, method, path, body=None, headers=None):
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=300)
+            try:
+                self.connection.request(method, path, body=body, headers=headers or {})
+                response = self.connection.getresponse()
+                return response.status, response.read()
+            except (OSError, http.client.HTTPException):
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+
+    def json(self, method, path, payload):
+        return self.request(method, path, json.dumps(payload).encode(), {'Content-Type': 'application/json'})
+
+    def upload(self, filename, text):
+        boundary = uuid.uuid4().hex
+        body = (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: text/plain\r\n\r\n{text}\r\n--{boundary}--\r\n"
+        ).encode('utf-8')
+        return self.request('POST', '/api/upload', body, {'Content-Type': f'multipart/form-data; boundary={boundary}'})
+
+
+class LoadTest:
+    """Runs the request mix against one server."""
+
+    def __init__(self, base_url, args, is_asgi):
+        self.base_url = base_url
+        self.args = args
+        self.is_asgi = is_asgi
+        self.corpus = SyntheticCorpus(seed=args.seed)
+        self.documents = []
+        self.uploaded = []
+        self.lock = threading.Lock()
+
+    def seed(self):
+        """Upload the documents the read and analyze requests use."""
+        client = Client(self.base_url)
+        for i in range(self.args.seed_documents):
+            status, body = client.upload(f"seed_{i}.txt", self.corpus.document(self.args.words))
+            if status != 200:
+                raise RuntimeError(f"Seeding failed with status {status}: {body[:200]}")
+            self.documents.append(json.loads(body)['file_id'])
+        self.uploaded.extend(self.documents)
+        self.comparison = self.corpus.document(self.args.words)
+
+    def cleanup(self):
+        client = Client(self.base_url)
+        for file_id in self.uploaded:
+            try:
+                client.request('DELETE', f"/api/documents/{file_id}")
+            except OSError:
+                pass
+
+    def issue(self, client, kind, rng):
+        file_id = rng.choice(self.documents)
+        if kind == 'health':
+            return client.request('GET', '/api/health')[0]
+        if kind == 'document':
+            return client.request('GET', f"/api/documents/{file_id}")[0]
+        if kind == 'content':
+            return client.request('GET', f"/api/documents/{file_id}/content")[0]
+        if kind == 'upload':
+            status, body = client.upload(f"load_{uuid.uuid4().hex[:8]}.txt", self.corpus.document(self.args.words))
+            if status == 200:
+                with self.lock:
+                    self.uploaded.append(json.loads(body)['file_id'])
+            return status
+        payload = {'file_id': file_id, 'comparison_text': self.comparison, 'use_langchain': self.args.langchain}
+        if self.is_asgi and self.args.jobs:
+            # Submit and poll instead of holding the request open
+            status, body = client.json('POST', '/api/analyze/jobs', payload)
+            if status != 202:
+                return status
+            job_id = json.loads(body)['job_id']
+            while True:
+                status, body = client.request('GET', f"/api/analyze/jobs/{job_id}")
+                job = json.loads(body)
+                if status != 200 or job['status'] in ('completed', 'failed'):
+                    return status if job.get('status') != 'failed' else 500
+                time.sleep(0.05)
+        return client.json('POST', '/api/analyze', payload)[0]
+
+    def run(self, concurrency):
+        """Drive the mix with `concurrency` clients for the configured duration."""
+        kinds = list(self.args.mix)
+        weights = [self.args.mix[k] for k in kinds]
+        samples = {kind: [] for kind in kinds}
+        errors = {kind: 0 for kind in kinds}
+        stop_at = time.perf_counter() + self.args.duration
+
+        def worker(index):
+            rng = random.Random(self.args.seed * 1000 + index)
+            client = Client(self.base_url)
+            while time.perf_counter() < stop_at:
+                kind = rng.choices(kinds, weights)[0]
+                start = time.perf_counter()
+                try:
+                    status = self.issue(client, kind, rng)
+                except Exception:
+                    status = None
+                elapsed = time.perf_counter() - start
+                with self.lock:
+                    if status and 200 <= status < 300:
+                        samples[kind].append(elapsed)
+                    else:
+                        errors[kind] += 1
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        total = sum(len(s) for s in samples.values())
+        endpoints = {}
+        for kind in kinds:
+            if samples[kind]:
+                ordered = sorted(samples[kind])
+                endpoints[kind] = {
+                    'requests': len(ordered),
+                    'errors': errors[kind],
+                    'p50_ms': round(statistics.median(ordered) * 1000, 2),
+                    'p95_ms': round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 2),
+                    'p99_ms': round(ordered[int(0.99 * (len(ordered) - 1))] * 1000, 2),
+                }
+            else:
+                endpoints[kind] = {'requests': 0, 'errors': errors[kind]}
+        return {
+            'concurrency': concurrency,
+            'wall_s': round(wall, 2),
+            'requests': total,
+            'errors': sum(errors.values()),
+            'throughput_rps': round(total / wall, 2),
+            'endpoints': endpoints
+        }
+
+
+def run_against(name, base_url, args, is_asgi):
+    test = LoadTest(base_url, args, is_asgi)
+    test.seed()
+    results = []
+    try:
+        for concurrency in args.concurrency:
+            result = test.run(concurrency)
+            result['server'] = name
+            results.append(result)
+            read_p95 = result['endpoints'].get('document', {}).get('p95_ms')
+            print(f"  {name:<6} c={concurrency:<4} {result['throughput_rps']:>9.1f} req/s  "
+                  f"errors {result['errors']:<5} document p95 {read_p95} ms")
+    finally:
+        test.cleanup()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servers', nargs='+', default=['flask', 'asgi'], choices=['flask', 'asgi'])
+    parser.add_argument('--url', help='Test an already running server instead of starting one')
+    parser.add_argument('--asgi', action='store_true', help='With --url: the server is asgi.py')
+    parser.add_argument('--workers', type=int, default=2, help='Worker processes per server')
+    parser.add_argument('--port', type=int, default=5101)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds per concurrency level')
+    parser.add_argument('--seed-documents', type=int, default=20)
+    parser.add_argument('--words', type=int, default=500, help='Words per synthetic document')
+    parser.add_argument('--langchain', action='store_true', help='Use LangChain in analyze requests')
+    parser.add_argument('--no-jobs', dest='jobs', action='store_false',
+                        help='On ASGI, call /api/analyze directly instead of submitting jobs')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+    args.mix = DEFAULT_MIX
+
+    results = []
+    if args.url:
+        results.extend(run_against('asgi' if args.asgi else 'flask', args.url, args, args.asgi))
+    else:
+        for offset, server in enumerate(args.servers):
+            port = args.port + offset
+            print(f"starting {server} on port {port} ({args.workers} workers)")
+            process = start_server(server, port, args.workers)
+            try:
+                results.extend(run_against(server, f"http://127.0.0.1:{port}", args, server == 'asgi'))
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+
+    if len({r['server'] for r in results}) == 2:
+        print("\nthroughput ASGI / Flask")
+        by_key = {(r['server'], r['concurrency']): r for r in results}
+        for concurrency in args.concurrency:
+            flask_rps = by_key[('flask', concurrency)]['throughput_rps']
+            asgi_rps = by_key[('asgi', concurrency)]['throughput_rps']
+            print(f"  c={concurrency:<4} x{asgi_rps / flask_rps:.2f}" if flask_rps else f"  c={concurrency:<4} n/a")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': {k: v for k, v in vars(args).items() if k != 'output'}, 'results': results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
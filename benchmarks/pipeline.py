@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+"""
+Benchmark suite for the full analysis pipeline.
+
+Generates synthetic corpora of controlled size and overlap (see
+benchmarks/corpus.py) and times each service function at several document
+lengths and corpus sizes:
+
+    extraction      FileUploadService.extract_text over a corpus of files
+    advanced        AdvancedSimilarityService.calculate_overall_similarity
+    langchain.*     each LangChain metric and calculate_plagiarism_score
+    highlighting    TextHighlighter.highlight_suspicious_text
+    text_analysis   TextAnalysisService.analyze_text
+
+Results are written as JSON. Given a baseline (a previous results file), the
+median of every benchmark is compared against it and the run exits with
+status 1 if any benchmark regressed beyond the tolerance.
+
+A case fails when it raises or when the services count an error while it
+runs (metrics catch their own exceptions and only call record_error, so
+their timings would measure the error path). Results with a failed case are
+not written unless --allow-errors is given, so a broken install cannot
+become a baseline.
+
+Usage:
+    python -m benchmarks.pipeline --output results.json
+    python -m benchmarks.pipeline --lengths 500 5000 --corpus-sizes 10 100 --skip langchain
+    python -m benchmarks.pipeline --baseline benchmarks/results/baseline.json --tolerance 0.2
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import SyntheticCorpus
+from src.utils.instrumentation import registry
+
+DEFAULT_LENGTHS = [200, 1000, 5000]
+DEFAULT_CORPUS_SIZES = [10, 50]
+LANGCHAIN_METRICS = [
+    'semantic_similarity_langchain',
+    'chunk_level_analysis',
+    'semantic_chunk_matching',
+    'sentence_semantic_analysis',
+    'tfidf_similarity',
+    'sequence_matching_similarity',
+    'token_overlap_similarity',
+    'calculate_plagiarism_score',
+]
+
+
+def time_call(func, repeats=5, max_seconds=30.0):
+    """
+    Time repeated calls of func after one warm-up call.
+
+    Stops repeating once the total time exceeds max_seconds, so slow cases
+    still finish (with fewer samples).
+    """
+    func()
+    samples = []
+    total_start = time.perf_counter()
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+        if time.perf_counter() - total_start > max_seconds:
+            break
+    return {
+        'repeats': len(samples),
+        'min_s': min(samples),
+        'median_s': statistics.median(samples),
+        'mean_s': statistics.fmean(samples),
+        'max_s': max(samples),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class PipelineBenchmark:
+    """Runs the benchmark cases and collects their results."""
+
+    def __init__(self, args):
+        self.args = args
+        self.corpus = SyntheticCorpus(seed=args.seed)
+        self.results = []
+
+    def enabled(self, group):
+        return group not in self.args.skip
+
+    def record(self, name, func, **params):
+        """Time one case; failures are recorded instead of aborting the run."""
+        entry = {'benchmark': name, **params}
+        errors_before = registry.error_counts()
+        try:
+            entry.update(time_call(func, self.args.repeats, self.args.max_seconds))
+            print(f"  {name:<45} {self.describe(params):<28} median {entry['median_s'] * 1000:10.2f} ms")
+        except Exception as e:
+            entry['error'] = str(e)
+            print(f"  {name:<45} {self.describe(params):<28} error: {e}")
+        errors = {stage: count - errors_before.get(stage, 0)
+                  for stage, count in registry.error_counts().items() if count > errors_before.get(stage, 0)}
+        if errors:
+            entry['stage_errors'] = errors
+            print(f"  {'':<45} {'':<28} errors counted: {errors}")
+        self.results.append(entry)
+
+    @staticmethod
+    def describe(params):
+        return ' '.join(f"{k}={v}" for k, v in params.items())
+
+    def run(self):
+        if self.enabled('extraction'):
+            self.run_extraction()
+
+        pairs = {
+            words: self.corpus.pair(words, overlap=self.args.overlap, edit_rate=self.args.edit_rate)
+            for words in self.args.lengths
+        }
+        if self.enabled('advanced'):
+            self.run_advanced(pairs)
+        if self.enabled('langchain'):
+            self.run_langchain(pairs)
+        if self.enabled('highlighting'):
+            self.run_highlighting(pairs)
+        if self.enabled('text_analysis'):
+            self.run_text_analysis(pairs)
+        return self.results
+
+    def run_extraction(self):
+        from src.services.fileUploadService import FileUploadService
+
+        print("extraction")
+        with tempfile.TemporaryDirectory() as tmp:
+            service = FileUploadService(upload_folder=tmp)
+            for size in self.args.corpus_sizes:
+                for words in self.args.lengths:
+                    files = self.corpus.write_corpus(
+                        os.path.join(tmp, f"corpus_{size}_{words}"), size, words, self.args.formats
+                    )
+
+                    def extract_all():
+                        for entry in files:
+                            service.extract_text(entry['path'], entry['extension'])
+
+                    self.record('extraction.extract_text', extract_all, words=words, corpus_size=size)
+
+    def run_advanced(self, pairs):
+        from src.services.advancedSimilarityService import AdvancedSimilarityService
+
+        print("advanced similarity")
+        service = AdvancedSimilarityService()
+        for words, pair in pairs.items():
+            self.record(
+                'advanced.calculate_overall_similarity',
+                lambda: service.calculate_overall_similarity(pair['suspicious'], pair['source']),
+                words=words
+            )
+
+    def run_langchain(self, pairs):
+        try:
+            from src.services.langchainPlagiarismService import LangChainPlagiarismService
+            service = LangChainPlagiarismService()
+        except Exception as e:
+            print(f"langchain: skipped ({e})")
+            self.results.append({'benchmark': 'langchain', 'error': f"unavailable: {e}"})
+            return
+
+        print("langchain")
+        for words, pair in pairs.items():
+            for metric in LANGCHAIN_METRICS:
+                method = getattr(service, metric)
+                self.record(
+                    f"langchain.{metric}",
+                    lambda: method(pair['suspicious'], pair['source']),
+                    words=words
+                )
+
+    def run_highlighting(self, pairs):
+        from src.services.textHighlighter import TextHighlighter
+
+        print("highlighting")
+        highlighter = TextHighlighter()
+        for words, pair in pairs.items():
+            self.record(
+                'highlighting.highlight_suspicious_text',
+                lambda: highlighter.highlight_suspicious_text(pair['suspicious'], pair['source']),
+                words=words
+            )
+
+    def run_text_analysis(self, pairs):
+        from src.services.textAnalysisService import TextAnalysisService
+
+        print("text analysis")
+        service = TextAnalysisService()
+        for words, pair in pairs.items():
+            self.record('text_analysis.analyze_text', lambda: service.analyze_text(pair['suspicious']), words=words)
+
+
+def failed_cases(results):
+    """Results that raised or counted stage errors."""
+    return [entry for entry in results if 'error' in entry or 'stage_errors' in entry]
+
+
+def result_key(entry):
+    params = {k: v for k, v in entry.items() if k in ('words', 'corpus_size')}
+    return f"{entry['benchmark']}[{PipelineBenchmark.describe(params)}]"
+
+
+def compare_to_baseline(results, baseline, tolerance, min_delta):
+    """
+    Compare medians against a baseline run.
+
+    A benchmark regresses when it is slower by more than the tolerance
+    (relative) and by more than min_delta seconds (absolute, to ignore noise
+    on very fast cases).
+    """
+    previous = {result_key(e): e for e in baseline.get('results', [])
+                if 'median_s' in e and 'stage_errors' not in e}
+    comparison = []
+    for entry in results:
+        key = result_key(entry)
+        if 'median_s' not in entry or key not in previous:
+            continue
+        old, new = previous[key]['median_s'], entry['median_s']
+        ratio = new / old if old > 0 else float('inf')
+        if ratio > 1 + tolerance and new - old > min_delta:
+            status = 'regression'
+        elif ratio < 1 / (1 + tolerance) and old - new > min_delta:
+            status = 'improvement'
+        else:
+            status = 'unchanged'
+        comparison.append({
+            'benchmark': key, 'baseline_median_s': old, 'median_s': new,
+            'ratio': round(ratio, 3), 'status': status
+        })
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lengths', type=int, nargs='+', default=DEFAULT_LENGTHS,
+                        help='Document lengths in words')
+    parser.add_argument('--corpus-sizes', type=int, nargs='+', default=DEFAULT_CORPUS_SIZES,
+                        help='Number of files per extraction corpus')
+    parser.add_argument('--formats', nargs='+', default=['txt', 'docx'], choices=['txt', 'docx'])
+    parser.add_argument('--overlap', type=float, default=0.3, help='Fraction of copied sentences per pair')
+    parser.add_argument('--edit-rate', type=float, default=0.05, help='Fraction of words edited in copies')
+    parser.add_argument('--skip', nargs='*', default=[],
+                        choices=['extraction', 'advanced', 'langchain', 'highlighting', 'text_analysis'])
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=30.0, help='Time cap per benchmark case')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--allow-errors', action='store_true',
+                        help='Write --output even if some cases failed (not for baselines)')
+    parser.add_argument('--baseline', help='Previous results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative slowdown')
+    parser.add_argument('--min-delta', type=float, default=0.002, help='Ignore slowdowns below this many seconds')
+    args = parser.parse_args()
+
+    started = datetime.now().isoformat()
+    results = PipelineBenchmark(args).run()
+    report = {
+        'metadata': {
+            'started': started,
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+            'config': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')}
+        },
+        'results': results
+    }
+    failed = failed_cases(results)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        comparison = compare_to_baseline(results, baseline, args.tolerance, args.min_delta)
+        report['comparison'] = comparison
+        regressions = [c for c in comparison if c['status'] == 'regression']
+
+        print(f"\ncompared with {args.baseline} (revision {baseline.get('metadata', {}).get('git_revision')})")
+        for c in comparison:
+            if c['status'] != 'unchanged':
+                print(f"  {c['status']:<12} {c['benchmark']:<70} x{c['ratio']}")
+        print(f"  {len(regressions)} regressions, "
+              f"{sum(c['status'] == 'improvement' for c in comparison)} improvements, "
+              f"{sum(c['status'] == 'unchanged' for c in comparison)} unchanged")
+
+    if failed:
+        print(f"\n{len(failed)} cases failed: " + ', '.join(result_key(e) for e in failed))
+    if args.output and failed and not args.allow_errors:
+        print(f"Not writing {args.output}: their timings would measure the error path "
+              f"(install the missing dependencies, or pass --allow-errors)")
+        sys.exit(2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+"""
+Scatter-gather throughput of the sharded fingerprint index.
+
+Builds a synthetic corpus and a set of queries that each copy passages from
+one corpus document. For every shard count it starts that many shard
+processes on localhost (src/services/shardedIndex.py), loads the corpus,
+checks that the merged top-k equals the single-shard result, then measures
+query throughput and latency from concurrent clients.
+
+Queries are fingerprinted once up front, so the numbers measure the shards
+and the scatter-gather merge rather than tokenization in this process.
+Scaling is bounded by the number of cores: with S shards and the client on
+one machine, near-linear scaling needs at least S + 1 cores.
+
+Usage:
+    python -m benchmarks.sharding --shards 1 2 4 --documents 2000 --concurrency 8
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import SyntheticCorpus
+from src.services.advancedSimilarityService import AdvancedSimilarityService
+from src.services.shardedIndex import ShardedIndex, spawn_local_shards
+
+
+def build_workload(args, index):
+    """Fingerprinted corpus documents and queries (with the document each one copies)."""
+    corpus = SyntheticCorpus(seed=args.seed)
+    rng = random.Random(args.seed)
+    documents = {}
+    for i in range(args.documents):
+        documents[f"doc_{i:06d}"] = corpus.document(args.words)
+
+    queries = []
+    for _ in range(args.queries):
+        source_id = rng.choice(list(documents))
+        pair = corpus.pair(args.words, overlap=args.overlap)
+        # Splice passages of a real corpus document into the suspicious text
+        suspicious = pair['suspicious'] + '\n\n' + ' '.join(documents[source_id].split()[:args.words // 4])
+        fingerprints, token_count = index.fingerprint(suspicious)
+        queries.append({'source_id': source_id, 'fingerprints': fingerprints, 'token_count': token_count})
+
+    fingerprinted = {file_id: index.fingerprint(text) for file_id, text in documents.items()}
+    return fingerprinted, queries
+
+
+def load(index, fingerprinted):
+    """Add every document to its shard, shards loading in parallel."""
+    by_shard = {}
+    for file_id, (fingerprints, token_count) in fingerprinted.items():
+        by_shard.setdefault(id(index.owner(file_id)), []).append((file_id, fingerprints, token_count))
+
+    def load_shard(items):
+        for file_id, fingerprints, token_count in items:
+            index.owner(file_id).call('add_fingerprints', file_id, fingerprints, token_count)
+
+    with ThreadPoolExecutor(max_workers=len(by_shard)) as pool:
+        list(pool.map(load_shard, by_shard.values()))
+
+
+def top_documents(result):
+    return [(d['file_id'], d['coverage']) for d in result['documents']]
+
+
+def measure(index, queries, concurrency, duration):
+    """Queries per second and latency percentiles from concurrent clients."""
+    latencies = []
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        samples = []
+        while time.perf_counter() < stop_at:
+            query = rng.choice(queries)
+            start = time.perf_counter()
+            index.query_fingerprints(query['fingerprints'], query['token_count'])
+            samples.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(samples)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'queries': len(latencies),
+        'qps': round(len(latencies) / wall, 2),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2) if latencies else None,
+        'p95_ms': round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 2) if latencies else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--documents', type=int, default=2000)
+    parser.add_argument('--words', type=int, default=800, help='Words per document')
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--overlap', type=float, default=0.3)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=15.0, help='Seconds of queries per shard count')
+    parser.add_argument('--base-port', type=int, default=6200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    tokenizer = AdvancedSimilarityService().tokenize_with_offsets
+    print(f"building workload: {args.documents} documents x {args.words} words, {args.queries} queries")
+    fingerprinted, queries = build_workload(args, ShardedIndex([], tokenizer=tokenizer))
+
+    cores = os.cpu_count() or 1
+    if cores < max(args.shards) + 1:
+        print(f"note: {cores} cores; throughput cannot scale past {max(cores - 1, 1)} shard(s) on this machine")
+
+    results = []
+    reference = None
+    for num_shards in args.shards:
+        data_dir = tempfile.mkdtemp(prefix=f"shards_{num_shards}_")
+        processes, addresses = spawn_local_shards(num_shards, data_dir, base_port=args.base_port)
+        try:
+            index = ShardedIndex(addresses, tokenizer=tokenizer)
+            start = time.perf_counter()
+            load(index, fingerprinted)
+            load_s = time.perf_counter() - start
+
+            answers = [top_documents(index.query_fingerprints(q['fingerprints'], q['token_count'])) for q in queries]
+            found = sum(1 for q, a in zip(queries, answers) if a and a[0][0] == q['source_id'])
+            if reference is None:
+                reference = answers
+            consistent = answers == reference
+
+            result = {'shards': num_shards, 'load_s': round(load_s, 2), 'top1_found': found,
+                      'matches_single_shard': consistent,
+                      **measure(index, queries, args.concurrency, args.duration)}
+            results.append(result)
+            print(f"  shards={num_shards:<3} {result['qps']:>9.1f} q/s  p50 {result['p50_ms']} ms  "
+                  f"p95 {result['p95_ms']} ms  load {result['load_s']}s  "
+                  f"top-1 {found}/{len(queries)}  {'consistent' if consistent else 'MISMATCH'}")
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(timeout=30)
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    base = results[0]['qps'] if results and results[0]['qps'] else None
+    if base:
+        print("\nscaling vs first shard count")
+        for result in results:
+            speedup = result['qps'] / base
+            result['speedup'] = round(speedup, 2)
+            ideal = result['shards'] / results[0]['shards']
+            print(f"  shards={result['shards']:<3} x{speedup:.2f}  (efficiency {speedup / ideal:.0%})")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), 'cores': cores, 'results': results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    return 0 if all(r['matches_single_shard'] for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+"""
+String tokens versus interned token-ID arrays for the token metrics.
+
+For every document length, times the token overlap, bigram, trigram,
+sequence and LCS metrics in their str-based form (lists, sets, joined
+n-gram strings, Python DP table) and in the array form
+(src/utils/tokenArrays.py), records the peak allocation of each with
+tracemalloc, and checks that both forms give the same score. The services
+use the array form for n-grams and LCS, and the str form for token overlap
+and sequence matching, where interning costs more than it saves.
+
+Both forms start from the same preprocessed token lists, so the numbers
+compare the metric implementations rather than preprocessing. The array
+timings include interning the tokens into a fresh vocabulary on every
+call, as the services do.
+
+The last column fits the cost-model coefficient MetricPlanner uses for the
+metric (seconds per token, or per token pair for LCS).
+
+Usage:
+    python -m benchmarks.token_arrays --lengths 200 1000 5000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from difflib import SequenceMatcher
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import SyntheticCorpus
+from src.utils import tokenArrays
+from src.utils.tokenArrays import Vocabulary
+
+
+# str-based implementations
+
+def string_overlap(tokens1, tokens2):
+    set1, set2 = set(tokens1), set(tokens2)
+    if not set1 or not set2:
+        return 0.0
+    return len(set1 & set2) / len(set1 | set2)
+
+
+def string_ngram(tokens1, tokens2, n):
+    ngrams1 = set([' '.join(tokens1[i:i + n]) for i in range(len(tokens1) - n + 1)])
+    ngrams2 = set([' '.join(tokens2[i:i + n]) for i in range(len(tokens2) - n + 1)])
+    if not ngrams1 or not ngrams2:
+        return 0.0
+    return len(ngrams1 & ngrams2) / len(ngrams1 | ngrams2)
+
+
+def string_sequence(tokens1, tokens2):
+    return SequenceMatcher(None, tokens1, tokens2).ratio()
+
+
+def string_lcs(tokens1, tokens2):
+    previous = [0] * (len(tokens2) + 1)
+    for token1 in tokens1:
+        current = [0]
+        for j, token2 in enumerate(tokens2, 1):
+            if token1 == token2:
+                current.append(previous[j - 1] + 1)
+            else:
+                current.append(max(previous[j], current[j - 1]))
+        previous = current
+    return previous[-1] / max(len(tokens1), len(tokens2))
+
+
+# Array implementations, each interning into its own vocabulary
+
+def array_overlap(tokens1, tokens2):
+    vocabulary = Vocabulary()
+    return tokenArrays.jaccard(np.unique(vocabulary.encode(tokens1)), np.unique(vocabulary.encode(tokens2)))
+
+
+def array_ngram(tokens1, tokens2, n):
+    vocabulary = Vocabulary()
+    return tokenArrays.ngram_jaccard(vocabulary.encode(tokens1), vocabulary.encode(tokens2), n)
+
+
+def array_sequence(tokens1, tokens2):
+    vocabulary = Vocabulary()
+    return SequenceMatcher(None, vocabulary.encode(tokens1).tolist(), vocabulary.encode(tokens2).tolist()).ratio()
+
+
+def array_lcs(tokens1, tokens2):
+    vocabulary = Vocabulary()
+    ids1, ids2 = vocabulary.encode(tokens1), vocabulary.encode(tokens2)
+    return tokenArrays.lcs_length(ids1, ids2) / max(len(ids1), len(ids2))
+
+
+METRICS = {
+    'token_overlap': (string_overlap, array_overlap),
+    'bigram': (lambda t1, t2: string_ngram(t1, t2, 2), lambda t1, t2: array_ngram(t1, t2, 2)),
+    'trigram': (lambda t1, t2: string_ngram(t1, t2, 3), lambda t1, t2: array_ngram(t1, t2, 3)),
+    'sequence': (string_sequence, array_sequence),
+    'lcs': (string_lcs, array_lcs),
+}
+
+
+def run(func, repeats, max_seconds):
+    """(median seconds, peak traced bytes, result) of func."""
+    result = func()
+    samples = []
+    started = time.perf_counter()
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+        if time.perf_counter() - started > max_seconds:
+            break
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(samples), peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lengths', type=int, nargs='+', default=[200, 1000, 5000])
+    parser.add_argument('--overlap', type=float, default=0.3)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=20.0, help='Time cap per case')
+    parser.add_argument('--skip-string-lcs-above', type=int, default=5000,
+                        help='Skip the quadratic Python LCS for longer documents')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    corpus = SyntheticCorpus(seed=args.seed)
+    results = []
+    print(f"{'metric':<14}{'words':>7}{'str ms':>10}{'array ms':>10}{'speedup':>9}"
+          f"{'str KiB':>10}{'array KiB':>11}  same  coefficient")
+
+    for length in args.lengths:
+        pair = corpus.pair(length, overlap=args.overlap)
+        tokens1 = pair['suspicious'].lower().split()
+        tokens2 = pair['source'].lower().split()
+        n1, n2 = len(tokens1), len(tokens2)
+
+        for name, (string_version, array_version) in METRICS.items():
+            array_s, array_peak, array_score = run(
+                lambda: array_version(tokens1, tokens2), args.repeats, args.max_seconds)
+
+            if name == 'lcs' and length > args.skip_string_lcs_above:
+                string_s = string_peak = string_score = None
+            else:
+                string_s, string_peak, string_score = run(
+                    lambda: string_version(tokens1, tokens2), args.repeats, args.max_seconds)
+
+            coefficient = array_s / (n1 * n2) if name == 'lcs' else array_s / (n1 + n2)
+            same = None if string_score is None else abs(string_score - array_score) < 1e-12
+            results.append({
+                'metric': name, 'words': length, 'n1': n1, 'n2': n2,
+                'string_s': string_s, 'array_s': array_s,
+                'string_peak_bytes': string_peak, 'array_peak_bytes': array_peak,
+                'same_score': same, 'coefficient': coefficient
+            })
+
+            def ms(value):
+                return f"{value * 1000:.2f}" if value is not None else '-'
+
+            def kib(value):
+                return f"{value / 1024:.0f}" if value is not None else '-'
+
+            speedup = f"x{string_s / array_s:.1f}" if string_s else '-'
+            print(f"{name:<14}{length:>7}{ms(string_s):>10}{ms(array_s):>10}{speedup:>9}"
+                  f"{kib(string_peak):>10}{kib(array_peak):>11}  {'-' if same is None else ('yes' if same else 'NO'):<5} "
+                  f"{coefficient:.2e}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), 'results': results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    return 0 if all(r['same_score'] is not False for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,47 @@
+"""
+Gunicorn configuration for running the plagiarism detector with pre-forked workers.
+
+The application is imported once in the master with PRELOAD_MODELS=1, so the
+sentence-transformer weights, stopword sets and NLTK tokenizer tables are loaded
+before forking and shared copy-on-write by every worker.
+
+Usage:
+    gunicorn -c gunicorn.conf.py app:app
+"""
+
+import gc
+import os
+import shutil
+import tempfile
+
+# Must be set before the app module is imported by the master
+os.environ.setdefault('PRELOAD_MODELS', '1')
+
+# Workers write their metric histograms here so /api/metrics sums all of
+# them; the histograms are cumulative per server run
+metrics_dir = os.environ.setdefault(
+    'METRICS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'plagiarism-detector-metrics')
+)
+shutil.rmtree(metrics_dir, ignore_errors=True)
+
+bind = os.environ.get('BIND', '0.0.0.0:5001')
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+threads = int(os.environ.get('WORKER_THREADS', 2))
+timeout = int(os.environ.get('WORKER_TIMEOUT', 120))
+preload_app = True
+
+
+def when_ready(server):
+    """Move everything loaded so far out of the garbage collector's reach."""
+    # Collections touch object headers and would un-share the inherited pages
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Limit intra-op threads so workers do not oversubscribe the CPU."""
+    try:
+        import torch
+        torch.set_num_threads(int(os.environ.get('TORCH_THREADS', 1)))
+    except ImportError:
+        pass
@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+"""
+Offline batch scanner for the AI Plagiarism Detector.
+
+Runs text extraction and the same analysis pipeline as /api/analyze over a
+directory or a manifest of documents on every core, without the HTTP layer.
+Each worker process builds the same service classes as app.py, so a document
+scanned here gets the score /api/analyze returns for the same options.
+
+Results are appended to a JSONL file as documents finish, which doubles as
+the checkpoint: with --resume, documents already recorded (and unchanged on
+disk) are skipped, and a re-scanned document's later line supersedes the
+earlier one. For a .parquet output the JSONL is kept next to it until the
+scan completes.
+
+Copied-passage and semantic lookups run against the web app's corpus indexes
+(--index-dir). Documents are identified by their path, so a scanned file that
+was also uploaded is found in the corpus as well.
+
+Usage:
+    python scan.py archive/ --output results.jsonl
+    python scan.py --manifest nightly.txt --comparison reference.txt --output results.parquet --resume
+
+Manifest lines are either a path or a JSON object with "path" and optional
+"id" and "comparison" (path of a per-document comparison text); relative
+paths are resolved against the manifest's directory.
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+try:
+    from tqdm import tqdm
+    TQDM_AVAILABLE = True
+except ImportError:
+    TQDM_AVAILABLE = False
+
+from src.services.fileUploadService import FileUploadService
+from src.services.advancedSimilarityService import AdvancedSimilarityService
+from src.services.textAnalysisService import TextAnalysisService
+from src.services.fingerprintIndex import FingerprintIndex
+from src.services.scoringCascade import ScoringCascade
+from src.services.analysisPipeline import AnalysisPipeline
+
+logger = logging.getLogger('scan')
+
+# Columns lifted out of the analysis for tabular (Parquet) output
+SUMMARY_FIELDS = ('overall_score', 'confidence_score', 'risk_level', 'langchain_enabled')
+
+
+class ScanWorker:
+    """Extracts and analyzes documents with the web app's service classes."""
+
+    def __init__(self, config):
+        self.config = config
+        self.file_upload_service = FileUploadService(config['upload_folder'])
+        self.similarity_service = AdvancedSimilarityService()
+        self.langchain_service = None
+        self.chunk_index = None
+        self.ghostwriting_detector = None
+
+        fingerprint_index = None
+        if config['index_dir']:
+            fingerprint_index = FingerprintIndex(
+                os.path.join(config['index_dir'], 'fingerprints.db'),
+                tokenizer=self.similarity_service.tokenize_with_offsets
+            )
+
+        self.pipeline = AnalysisPipeline(
+            self.similarity_service,
+            TextAnalysisService(),
+            scoring_cascade=ScoringCascade(self.similarity_service),
+            fingerprint_index=fingerprint_index,
+            langchain_provider=self.get_langchain_service,
+            chunk_index_provider=self.get_chunk_index,
+            ghostwriting_provider=self.get_ghostwriting_detector,
+            logger=logger
+        )
+        self._comparisons = {}
+
+    def get_langchain_service(self):
+        """Lazy LangChain service, as in app.py (False once it failed to load)."""
+        if self.langchain_service is None:
+            try:
+                from src.services.langchainPlagiarismService import LangChainPlagiarismService
+                self.langchain_service = LangChainPlagiarismService()
+            except Exception as e:
+                logger.error(f"Failed to initialize LangChain service: {e}")
+                self.langchain_service = False
+        return self.langchain_service or None
+
+    def get_ghostwriting_detector(self):
+        """Lazy ghostwriting detector, as in app.py (False once it failed to load)."""
+        if self.ghostwriting_detector is None:
+            try:
+                from src.services.ghostwritingDetector import GhostwritingDetector, create_ghostwriting_backend
+                self.ghostwriting_detector = GhostwritingDetector(create_ghostwriting_backend())
+            except Exception as e:
+                logger.error(f"Failed to initialize ghostwriting detector: {e}")
+                self.ghostwriting_detector = False
+        return self.ghostwriting_detector or None
+
+    def get_chunk_index(self):
+        """The persisted chunk index, opened for lookups only (no backfill)."""
+        if self.chunk_index is None:
+            langchain_svc = self.get_langchain_service()
+            if langchain_svc is None or not langchain_svc.embeddings or not self.config['index_dir']:
+                self.chunk_index = False
+                return None
+            try:
+                from src.services.vectorIndexService import ChunkVectorIndex
+                self.chunk_index = ChunkVectorIndex(
+                    langchain_svc.embeddings, self.config['index_dir'], chunker=langchain_svc.split_chunks
+                )
+            except Exception as e:
+                logger.error(f"Failed to open chunk index: {e}")
+                self.chunk_index = False
+        return self.chunk_index or None
+
+    def comparison_text(self, path):
+        if not path:
+            return ''
+        if path not in self._comparisons:
+            self._comparisons[path] = self.extract(path)
+        return self._comparisons[path]
+
+    def extract(self, path):
+        extension = path.rsplit('.', 1)[1].lower() if '.' in path else ''
+        return self.file_upload_service.extract_text(path, extension)
+
+    def scan(self, job):
+        """Analyze one document; returns its result record."""
+        start = time.perf_counter()
+        record = {'document_id': job['id'], 'path': job['path'], 'version': job['version']}
+        try:
+            text = self.extract(job['path'])
+            if not text:
+                raise ValueError('Could not extract text from file')
+
+            options = dict(self.config['options'])
+            options['comparison_text'] = self.comparison_text(job.get('comparison') or self.config['comparison'])
+            analysis = self.pipeline.analyze(text, job['id'], options)
+
+            record.update({
+                'status': 'ok',
+                'text_length': len(text),
+                'word_count': len(text.split()),
+                'analysis': analysis
+            })
+        except Exception as e:
+            record.update({'status': 'error', 'error': str(e)})
+        record['elapsed_s'] = round(time.perf_counter() - start, 3)
+        return record
+
+
+_worker = None
+
+
+def _init_worker(config):
+    global _worker
+    logging.basicConfig(level=logging.WARNING)
+    _worker = ScanWorker(config)
+
+
+def _scan(job):
+    return _worker.scan(job)
+
+
+def discover(root):
+    """Jobs for every supported document under a directory."""
+    file_upload_service = FileUploadService()
+    jobs = []
+    for directory, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if file_upload_service.allowed_file(filename):
+                path = os.path.join(directory, filename)
+                jobs.append({'id': os.path.relpath(path, root), 'path': path})
+    jobs.sort(key=lambda job: job['id'])
+    return jobs
+
+
+def read_manifest(manifest_path):
+    """Jobs listed in a manifest (plain paths or JSON objects)."""
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    jobs = []
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            entry = json.loads(line) if line.startswith('{') else {'path': line}
+            path = os.path.join(base, entry['path'])
+            job = {'id': entry.get('id', entry['path']), 'path': path}
+            if entry.get('comparison'):
+                job['comparison'] = os.path.join(base, entry['comparison'])
+            jobs.append(job)
+    return jobs
+
+
+def file_version(path):
+    """Size and modification time; a changed file is re-scanned on resume."""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def completed_documents(records_path):
+    """(document_id, version) of the successful records in a results file."""
+    done = set()
+    if not os.path.exists(records_path):
+        return done
+    with open(records_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partially written line of an interrupted run
+            if record.get('status') == 'ok':
+                done.add((record['document_id'], record.get('version')))
+    return done
+
+
+def write_parquet(records_path, output_path):
+    """Flatten the JSONL results into a Parquet table (needs pyarrow or fastparquet)."""
+    import pandas as pd
+
+    rows = []
+    with open(records_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            analysis = record.pop('analysis', None) or {}
+            for field in SUMMARY_FIELDS:
+                record[field] = analysis.get(field)
+            for name, value in (analysis.get('similarity_breakdown') or {}).items():
+                record[f"breakdown_{name}"] = value
+            record['analysis'] = json.dumps(analysis, default=str) if analysis else None
+            rows.append(record)
+
+    frame = pd.DataFrame(rows)
+    # Re-scanned documents keep their latest record
+    frame = frame.drop_duplicates('document_id', keep='last')
+    frame.to_parquet(output_path, index=False)
+
+
+class Progress:
+    """tqdm progress bar, or a plain counter on stderr without tqdm."""
+
+    def __init__(self, total, initial):
+        self.total = total
+        self.count = initial
+        self.bar = tqdm(total=total, initial=initial, unit='doc') if TQDM_AVAILABLE else None
+
+    def update(self, errors):
+        self.count += 1
+        if self.bar:
+            self.bar.set_postfix(errors=errors, refresh=False)
+            self.bar.update()
+        else:
+            sys.stderr.write(f"\r{self.count}/{self.total} documents ({errors} errors)")
+            sys.stderr.flush()
+
+    def close(self):
+        if self.bar:
+            self.bar.close()
+        else:
+            sys.stderr.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', nargs='?', help='Directory of documents to scan')
+    parser.add_argument('--manifest', help='File listing the documents to scan')
+    parser.add_argument('--output', required=True, help='Results file (.jsonl or .parquet)')
+    parser.add_argument('--resume', action='store_true', help='Skip documents already in the results')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Worker processes (1 scans in this process)')
+    parser.add_argument('--comparison', help='Comparison document used for every scanned document')
+    # Left unset, these take the /api/analyze defaults (the pipeline's)
+    parser.add_argument('--langchain', action=argparse.BooleanOptionalAction,
+                        help='LangChain ensemble (use_langchain; on unless --no-langchain, as in /api/analyze)')
+    parser.add_argument('--ghostwriting', action=argparse.BooleanOptionalAction,
+                        help='Score sentences for machine-generated text (ghostwriting; off by default, as in /api/analyze)')
+    parser.add_argument('--no-cascade', dest='cascade', action='store_false', help='Disable the scoring cascade')
+    parser.add_argument('--latency-budget', type=float, help='Seconds for the advanced ensemble (0 = no budget)')
+    parser.add_argument('--top-k', type=int, default=5, help='Semantic matches per document')
+    parser.add_argument('--index-dir', default=os.path.join('uploads', 'index'),
+                        help="Corpus indexes for copied-passage lookups ('' to disable)")
+    args = parser.parse_args()
+
+    if bool(args.input) == bool(args.manifest):
+        parser.error('give either a directory or --manifest')
+
+    jobs = read_manifest(args.manifest) if args.manifest else discover(args.input)
+    for job in jobs:
+        job['version'] = file_version(job['path'])
+
+    to_parquet = args.output.endswith('.parquet')
+    records_path = args.output + '.partial.jsonl' if to_parquet else args.output
+    if not args.resume and os.path.exists(records_path):
+        os.remove(records_path)
+    done = completed_documents(records_path) if args.resume else set()
+    pending = [job for job in jobs if (job['id'], job['version']) not in done]
+
+    config = {
+        'upload_folder': 'uploads',
+        'index_dir': args.index_dir if args.index_dir and os.path.isdir(args.index_dir) else None,
+        'comparison': args.comparison,
+        # Same request options as the /api/analyze body
+        'options': {
+            'cascade': args.cascade,
+            'latency_budget': args.latency_budget,
+            'top_k': args.top_k
+        }
+    }
+    if args.langchain is not None:
+        config['options']['use_langchain'] = args.langchain
+    if args.ghostwriting is not None:
+        config['options']['ghostwriting'] = args.ghostwriting
+
+    print(f"{len(jobs)} documents, {len(jobs) - len(pending)} already scanned, "
+          f"{min(args.workers, max(len(pending), 1))} workers")
+    progress = Progress(len(jobs), len(jobs) - len(pending))
+    errors = 0
+    started = time.perf_counter()
+
+    if args.workers > 1 and len(pending) > 1:
+        pool = multiprocessing.Pool(min(args.workers, len(pending)), initializer=_init_worker, initargs=(config,))
+        results = pool.imap_unordered(_scan, pending, chunksize=1)
+    else:
+        pool = None
+        _init_worker(config)
+        results = map(_scan, pending)
+
+    try:
+        with open(records_path, 'a', encoding='utf-8') as out:
+            for record in results:
+                # One flushed line per document: the results file is the checkpoint
+                out.write(json.dumps(record, default=str) + '\n')
+                out.flush()
+                if record['status'] != 'ok':
+                    errors += 1
+                progress.update(errors)
+    finally:
+        progress.close()
+        if pool:
+            pool.terminate()
+
+    elapsed = time.perf_counter() - started
+    print(f"Scanned {len(pending)} documents in {elapsed:.1f}s ({errors} errors)")
+
+    if to_parquet:
+        try:
+            write_parquet(records_path, args.output)
+            os.remove(records_path)
+            print(f"Results written to {args.output}")
+        except ImportError as e:
+            print(f"Error writing Parquet ({e}); results kept in {records_path}")
+            return 1
+    else:
+        print(f"Results written to {args.output}")
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,7 +6,9 @@ Implements various advanced text similarity algorithms with high accuracy.
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.base import clone
 from sklearn.decomposition import LatentDirichletAllocation
+from scipy.sparse import csr_matrix
 import re
 import nltk
 from nltk.tokenize import word_tokenize, sent_tokenize
@@ -16,6 +18,12 @@ import string
 from difflib import SequenceMatcher
 import hashlib
 from collections import Counter
+from src.utils.suffixArray import intern_sequences, repeated_passages, repetition_coverage, shared_passages
+from src.utils.instrumentation import instrument, measure, record_error
+from src.services.metricPlanner import MetricPlanner, chunk_count
+from src.services.featureBundle import bundle_inputs, pair_cosine, query_pair_cosines
+from src.utils import tokenArrays
+from src.utils.tokenArrays import Vocabulary
 
 # Download required NLTK data
 try:
@@ -31,8 +39,9 @@ except LookupError:
 class AdvancedSimilarityService:
     """Advanced service for calculating text similarity using multiple ML models."""
     
-    def __init__(self):
+    def __init__(self, latency_budget=None):
         """Initialize the advanced similarity service."""
+        self.planner = MetricPlanner(latency_budget)
         self.stop_words = set(stopwords.words('english'))
         self.tfidf_vectorizer = TfidfVectorizer(
             stop_words='english',
@@ -48,6 +57,7 @@ class AdvancedSimilarityService:
             analyzer='word'
         )
     
+    @instrument('preprocessing.advanced')
     def preprocess_text(self, text):
         """Advanced text preprocessing."""
         # Convert to lowercase
@@ -64,6 +74,23 @@ class AdvancedSimilarityService:
         
         return text
     
+    def tokenize_with_offsets(self, text):
+        """
+        Tokens of preprocess_text(text) with their character spans in the original text.
+        
+        Produces the same token stream as preprocess_text(text).split(), applying
+        the normalization token by token so positions can be mapped back.
+        """
+        tokens = []
+        for match in re.finditer(r'\S+', text):
+            token = match.group().lower()
+            token = re.sub(r'http\S+|www\S+', '', token)
+            token = re.sub(r'\S+@\S+', '', token)
+            if token:
+                tokens.append((token, match.start(), match.end()))
+        return tokens
+    
+    @instrument('advanced.cosine')
     def cosine_similarity_advanced(self, text1, text2):
         """Calculate advanced cosine similarity using TF-IDF."""
         try:
@@ -74,7 +101,7 @@ class AdvancedSimilarityService:
             text2 = self.preprocess_text(text2)
             
             # Create TF-IDF vectors
-            tfidf_matrix = self.tfidf_vectorizer.fit_transform([text1, text2])
+            tfidf_matrix = clone(self.tfidf_vectorizer).fit_transform([text1, text2])
             
             # Calculate cosine similarity
             similarity_matrix = cosine_similarity(tfidf_matrix)
@@ -83,107 +110,344 @@ class AdvancedSimilarityService:
         
         except Exception as e:
             print(f"Error in cosine similarity: {e}")
+            record_error('advanced.cosine')
             return 0.0
     
-    def sequence_matcher_similarity(self, text1, text2):
-        """Calculate similarity using sequence matching (SequenceMatcher)."""
+    def _tfidf_cosines(self, text1, texts2):
+        """Pairwise TF-IDF cosines of one preprocessed text against many, as cosine_similarity_advanced fits them."""
+        analyzer = clone(self.tfidf_vectorizer).build_analyzer()
+        counts = CountVectorizer(analyzer=analyzer).fit_transform([text1] + list(texts2))
+        return query_pair_cosines(counts, self.tfidf_vectorizer.max_features)
+    
+    @instrument('advanced.cosine_batch')
+    def cosine_similarity_many(self, text, candidates):
+        """cosine_similarity_advanced of one text against many candidates, as an array."""
+        try:
+            short = np.array([len(candidate.strip()) < 5 for candidate in candidates], dtype=bool)
+            if len(text.strip()) < 5 or short.all():
+                return np.zeros(len(candidates))
+            
+            cosines = self._tfidf_cosines(self.preprocess_text(text),
+                                          [self.preprocess_text(candidate) for candidate in candidates])
+            return np.where(short, 0.0, cosines)
+        
+        except Exception as e:
+            print(f"Error in batch cosine similarity: {e}")
+            record_error('advanced.cosine_batch')
+            return np.zeros(len(candidates))
+    
+    @instrument('advanced.sequence')
+    def sequence_matcher_similarity(self, text1, text2, max_cells=None):
+        """
+        Calculate similarity using sequence matching (SequenceMatcher).
+        
+        With max_cells, long inputs are compared as proportional chunk pairs
+        whose sizes multiply to at most max_cells (an approximation).
+        """
         try:
             text1 = self.preprocess_text(text1)
             text2 = self.preprocess_text(text2)
             
             # Tokenize to words
-            tokens1 = text1.split()
-            tokens2 = text2.split()
-            
-            # Use SequenceMatcher for sequence-based comparison
-            matcher = SequenceMatcher(None, tokens1, tokens2)
-            
-            return float(matcher.ratio())
+            return self._sequence_ratio(text1.split(), text2.split(), max_cells)
         
         except Exception as e:
             print(f"Error in sequence matcher: {e}")
+            record_error('advanced.sequence')
             return 0.0
     
+    @instrument('advanced.token_overlap')
     def token_overlap_similarity(self, text1, text2):
         """Calculate similarity based on token overlap (Jaccard)."""
         try:
             text1 = self.preprocess_text(text1)
             text2 = self.preprocess_text(text2)
             
-            tokens1 = set(text1.split())
-            tokens2 = set(text2.split())
-            
-            if len(tokens1) == 0 or len(tokens2) == 0:
-                return 0.0
-            
-            # Jaccard similarity
-            intersection = len(tokens1 & tokens2)
-            union = len(tokens1 | tokens2)
-            
-            return intersection / union if union > 0 else 0.0
+            # Jaccard similarity (string sets beat interning for one pass)
+            return self._jaccard(set(text1.split()), set(text2.split()))
         
         except Exception as e:
             print(f"Error in token overlap: {e}")
+            record_error('advanced.token_overlap')
             return 0.0
     
+    @instrument('advanced.ngram')
     def ngram_similarity(self, text1, text2, n=2):
         """Calculate similarity using n-gram overlap."""
         try:
             text1 = self.preprocess_text(text1)
             text2 = self.preprocess_text(text2)
             
-            # Generate n-grams
-            def get_ngrams(text, n):
-                tokens = text.split()
-                return set([' '.join(tokens[i:i+n]) for i in range(len(tokens) - n + 1)])
-            
-            ngrams1 = get_ngrams(text1, n)
-            ngrams2 = get_ngrams(text2, n)
-            
-            if len(ngrams1) == 0 or len(ngrams2) == 0:
-                return 0.0
-            
-            # Calculate overlap
-            overlap = len(ngrams1 & ngrams2)
-            total = len(ngrams1 | ngrams2)
-            
-            return overlap / total if total > 0 else 0.0
+            # n-grams as packed 64-bit keys of the token IDs
+            vocabulary = Vocabulary()
+            ids1 = vocabulary.encode(text1.split())
+            ids2 = vocabulary.encode(text2.split())
+            return tokenArrays.ngram_jaccard(ids1, ids2, n)
         
         except Exception as e:
             print(f"Error in n-gram similarity: {e}")
+            record_error('advanced.ngram')
             return 0.0
     
-    def longest_common_subsequence(self, text1, text2):
-        """Calculate similarity based on longest common subsequence."""
+    @classmethod
+    def _sequence_ratio(cls, tokens1, tokens2, max_cells=None):
+        """SequenceMatcher ratio of two token sequences (strings or token IDs)."""
+        chunks = chunk_count(len(tokens1), len(tokens2), max_cells)
+        if chunks == 1:
+            # Use SequenceMatcher for sequence-based comparison
+            matcher = SequenceMatcher(None, tokens1, tokens2)
+            return float(matcher.ratio())
+        
+        total = len(tokens1) + len(tokens2)
+        matches = 0
+        for part1, part2 in cls._proportional_chunks(tokens1, tokens2, chunks):
+            matcher = SequenceMatcher(None, part1, part2)
+            matches += sum(block.size for block in matcher.get_matching_blocks())
+        return 2.0 * matches / total if total else 1.0
+    
+    @staticmethod
+    def _proportional_chunks(tokens1, tokens2, chunks):
+        """Split two token lists into the same number of aligned, proportional chunks."""
+        n1, n2 = len(tokens1), len(tokens2)
+        for c in range(chunks):
+            yield (tokens1[c * n1 // chunks:(c + 1) * n1 // chunks],
+                   tokens2[c * n2 // chunks:(c + 1) * n2 // chunks])
+    
+    @instrument('advanced.lcs')
+    def longest_common_subsequence(self, text1, text2, max_cells=None):
+        """
+        Calculate similarity based on longest common subsequence.
+        
+        With max_cells, long inputs are aligned as proportional chunk pairs; the
+        summed chunk LCS is a lower bound on the true LCS.
+        """
         try:
             text1 = self.preprocess_text(text1)
             text2 = self.preprocess_text(text2)
             
-            tokens1 = text1.split()
-            tokens2 = text2.split()
-            
-            # Dynamic programming for LCS
-            m, n = len(tokens1), len(tokens2)
-            dp = [[0] * (n + 1) for _ in range(m + 1)]
+            vocabulary = Vocabulary()
+            ids1 = vocabulary.encode(text1.split())
+            ids2 = vocabulary.encode(text2.split())
+            return self._lcs_ratio(ids1, ids2, max_cells)
+        
+        except Exception as e:
+            print(f"Error in LCS: {e}")
+            record_error('advanced.lcs')
+            return 0.0
+    
+    @classmethod
+    def _lcs_ratio(cls, tokens1, tokens2, max_cells=None):
+        """LCS length over the longer sequence's length (token ID arrays or lists)."""
+        chunks = chunk_count(len(tokens1), len(tokens2), max_cells)
+        if chunks > 1:
+            lcs_length = sum(
+                tokenArrays.lcs_length(part1, part2)
+                for part1, part2 in cls._proportional_chunks(tokens1, tokens2, chunks)
+            )
+        else:
+            lcs_length = tokenArrays.lcs_length(tokens1, tokens2)
+        
+        max_length = max(len(tokens1), len(tokens2))
+        
+        return lcs_length / max_length if max_length > 0 else 0.0
+    
+    @staticmethod
+    def _occurrence_rows(sentences, vocabulary):
+        """
+        Token lists of the sentences and their binary rows over (token, occurrence) pairs.
+        
+        The k-th repeat of a token gets its own column, so the product of two
+        rows counts the multiset intersection of the sentences.
+        """
+        token_lists, indptr, indices = [], [0], []
+        for sentence in sentences:
+            tokens = sentence.split() if isinstance(sentence, str) else list(sentence)
+            seen = Counter()
+            for token in tokens:
+                indices.append(vocabulary.setdefault((token, seen[token]), len(vocabulary)))
+                seen[token] += 1
+            token_lists.append(tokens)
+            indptr.append(len(indices))
+        return token_lists, indptr, indices
+    
+    @staticmethod
+    def _ratio_bounds(intersection, sizes1, sizes2):
+        """Upper bounds 2|A&B| / (|A| + |B|) on the SequenceMatcher ratios of a score block."""
+        totals = sizes1[:, None] + sizes2[None, :]
+        # SequenceMatcher rates two empty sequences 1.0
+        return np.divide(2 * intersection, totals, out=np.ones_like(totals), where=totals > 0)
+    
+    @staticmethod
+    def _best_ratios(bounds, tokens1, tokens2):
+        """
+        Exact best SequenceMatcher ratio, and its column, for every row of a bound block.
+        
+        Columns are compared in decreasing bound order, starting from the
+        largest bound, and only while their bound exceeds the best ratio found.
+        The matched blocks form a common subsequence, so the bit-parallel LCS
+        gives a second, tighter bound that skips most SequenceMatcher runs.
+        """
+        best = np.zeros(len(bounds))
+        best_index = np.zeros(len(bounds), dtype=np.int64)
+        matchers = {}
+        
+        def ratio(i, j):
+            if j not in matchers:
+                # SequenceMatcher caches its index of the second sequence
+                matchers[j] = SequenceMatcher(None, (), tokens2[j])
+            matcher = matchers[j]
+            matcher.set_seq1(tokens1[i])
+            return matcher.ratio()
+        
+        for i, row in enumerate(bounds):
+            j = int(row.argmax())
+            best[i], best_index[i] = ratio(i, j), j
+            candidates = np.flatnonzero(row > best[i])
+            for j in candidates[np.argsort(-row[candidates], kind='stable')]:
+                if row[j] <= best[i]:
+                    break
+                total = len(tokens1[i]) + len(tokens2[j])
+                if 2 * tokenArrays.lcs_length(tokens1[i], tokens2[j]) / total <= best[i]:
+                    continue
+                score = ratio(i, j)
+                if score > best[i]:
+                    best[i], best_index[i] = score, j
+        return best, best_index
+    
+    def sentence_match_kernel(self, sentences1, sentences2, max_block_cells=2000000):
+        """
+        Best match in sentences2 for every sentence in sentences1.
+        
+        Scores are token-level SequenceMatcher ratios 2M / (|A| + |B|), as in
+        _sentence_similarity_reference. The matched token count M is at most
+        the multiset intersection of the two sentences, so a sparse product of
+        (token, occurrence) rows bounds every pair's ratio; it is computed in
+        row blocks of at most max_block_cells scores, so memory stays bounded
+        for documents with thousands of sentences. SequenceMatcher then runs
+        only on pairs whose bound beats the best ratio found for the sentence:
+        a copied sentence needs one comparison.
+        
+        Args:
+            sentences1: Preprocessed sentences of the first text (strings, or
+                        token-ID lists as stored in feature bundles)
+            sentences2: Preprocessed sentences of the second text
+            max_block_cells: Upper bound on the dense score block size
+        
+        Returns:
+            (row_max, row_argmax) NumPy arrays of length len(sentences1)
+        """
+        vocabulary = {}
+        tokens1, indptr1, indices1 = self._occurrence_rows(sentences1, vocabulary)
+        tokens2, indptr2, indices2 = self._occurrence_rows(sentences2, vocabulary)
+        shape1 = (len(sentences1), len(vocabulary))
+        shape2 = (len(sentences2), len(vocabulary))
+        matrix1 = csr_matrix((np.ones(len(indices1), dtype=np.float32), indices1, indptr1), shape=shape1)
+        matrix2 = csr_matrix((np.ones(len(indices2), dtype=np.float32), indices2, indptr2), shape=shape2)
+        
+        sizes1 = np.diff(indptr1).astype(np.float64)
+        sizes2 = np.diff(indptr2).astype(np.float64)
+        matrix2_t = matrix2.T.tocsc()
+        
+        row_max = np.zeros(len(sentences1))
+        row_argmax = np.zeros(len(sentences1), dtype=np.int64)
+        block = max(1, max_block_cells // max(1, len(sentences2)))
+        
+        for start in range(0, len(sentences1), block):
+            end = min(start + block, len(sentences1))
+            intersection = (matrix1[start:end] @ matrix2_t).toarray()
+            bounds = self._ratio_bounds(intersection, sizes1[start:end], sizes2)
+            row_max[start:end], row_argmax[start:end] = self._best_ratios(bounds, tokens1[start:end], tokens2)
+        
+        return row_max, row_argmax
+    
+    def sentence_match_many(self, sentences1, candidate_sentences, max_block_cells=2000000):
+        """
+        Best match of every sentence of sentences1 within each candidate.
+        
+        sentence_match_kernel against all candidates' sentences at once: the
+        bound blocks span several candidates, so the first text is encoded
+        once for the whole batch, and the exact ratios are taken per candidate.
+        
+        Args:
+            sentences1: Preprocessed sentences of the first text
+            candidate_sentences: Preprocessed sentences of every candidate
+            max_block_cells: Upper bound on the dense score block size
+        
+        Returns:
+            NumPy array of shape (len(sentences1), len(candidate_sentences)),
+            0 for candidates without sentences
+        """
+        vocabulary = {}
+        counts = np.array([len(sentences) for sentences in candidate_sentences], dtype=np.int64)
+        tokens1, indptr1, indices1 = self._occurrence_rows(sentences1, vocabulary)
+        tokens2, indptr2, indices2 = self._occurrence_rows(
+            [sentence for sentences in candidate_sentences for sentence in sentences], vocabulary
+        )
+        matrix1 = csr_matrix((np.ones(len(indices1), dtype=np.float32), indices1, indptr1),
+                             shape=(len(sentences1), len(vocabulary)))
+        matrix2 = csr_matrix((np.ones(len(indices2), dtype=np.float32), indices2, indptr2),
+                             shape=(len(indptr2) - 1, len(vocabulary)))
+        sizes1 = np.diff(indptr1).astype(np.float64)
+        sizes2 = np.diff(indptr2).astype(np.float64)
+        
+        best = np.zeros((len(sentences1), len(candidate_sentences)))
+        ends = np.cumsum(counts)
+        starts = ends - counts
+        # Blocks of whole candidates, each at most max_block_cells scores (or one candidate)
+        block_columns = max(1, max_block_cells // max(1, len(sentences1)))
+        first = 0
+        while first < len(candidate_sentences):
+            last = first + 1
+            while last < len(candidate_sentences) and ends[last] - starts[first] <= block_columns:
+                last += 1
+            block = [c for c in range(first, last) if counts[c]]
+            if block:
+                column_start, column_end = starts[first], ends[last - 1]
+                intersection = (matrix1 @ matrix2[column_start:column_end].T).toarray()
+                bounds = self._ratio_bounds(intersection, sizes1, sizes2[column_start:column_end])
+                for c in block:
+                    columns = slice(starts[c] - column_start, ends[c] - column_start)
+                    best[:, c] = self._best_ratios(bounds[:, columns], tokens1, tokens2[starts[c]:ends[c]])[0]
+            first = last
+        return best
+    
+    @instrument('advanced.sentence')
+    def sentence_similarity(self, text1, text2, max_sentences=None):
+        """
+        Calculate sentence-level similarity (mean best-match score per sentence).
+        
+        With max_sentences, the mean is estimated from an evenly spaced sample
+        of the first text's sentences.
+        """
+        try:
+            text1 = self.preprocess_text(text1)
+            text2 = self.preprocess_text(text2)
             
-            for i in range(1, m + 1):
-                for j in range(1, n + 1):
-                    if tokens1[i-1] == tokens2[j-1]:
-                        dp[i][j] = dp[i-1][j-1] + 1
-                    else:
-                        dp[i][j] = max(dp[i-1][j], dp[i][j-1])
+            sentences1 = sent_tokenize(text1)
+            sentences2 = sent_tokenize(text2)
             
-            lcs_length = dp[m][n]
-            max_length = max(m, n)
+            if len(sentences1) == 0 or len(sentences2) == 0:
+                return 0.0
             
-            return lcs_length / max_length if max_length > 0 else 0.0
+            return self._sentence_score(sentences1, sentences2, max_sentences)
         
         except Exception as e:
-            print(f"Error in LCS: {e}")
+            print(f"Error in sentence similarity: {e}")
+            record_error('advanced.sentence')
             return 0.0
     
-    def sentence_similarity(self, text1, text2):
-        """Calculate sentence-level similarity."""
+    def _sentence_score(self, sentences1, sentences2, max_sentences=None):
+        """Mean best-match score of (a sample of) sentences1 against sentences2."""
+        if max_sentences and len(sentences1) > max_sentences:
+            step = len(sentences1) / max_sentences
+            sentences1 = [sentences1[int(i * step)] for i in range(max_sentences)]
+        
+        row_max, _ = self.sentence_match_kernel(sentences1, sentences2)
+        
+        return float(np.mean(row_max))
+    
+    def _sentence_similarity_reference(self, text1, text2):
+        """Per-pair reference implementation of sentence_similarity (SequenceMatcher, quadratic)."""
         try:
             text1 = self.preprocess_text(text1)
             text2 = self.preprocess_text(text2)
@@ -209,6 +473,104 @@ class AdvancedSimilarityService:
             print(f"Error in sentence similarity: {e}")
             return 0.0
     
+    @instrument('advanced.shared_passages_list')
+    def find_shared_passages(self, text1, text2, min_length=8):
+        """
+        Find every maximal passage of at least min_length tokens shared by two texts.
+        
+        Uses a suffix array over token IDs, so unlike SequenceMatcher it is exact,
+        O(n log n) and does not drop frequent tokens.
+        
+        Returns:
+            List of passages with token lengths and character offsets in both texts
+        """
+        try:
+            tokens1 = self.tokenize_with_offsets(text1)
+            tokens2 = self.tokenize_with_offsets(text2)
+            (ids1, ids2), _ = intern_sequences([t[0] for t in tokens1], [t[0] for t in tokens2])
+            
+            passages = []
+            for p in shared_passages(ids1, ids2, min_length=min_length):
+                end1 = p['start1'] + p['length'] - 1
+                end2 = p['start2'] + p['length'] - 1
+                passages.append({
+                    'length': p['length'],
+                    'start1': tokens1[p['start1']][1],
+                    'end1': tokens1[end1][2],
+                    'start2': tokens2[p['start2']][1],
+                    'end2': tokens2[end2][2],
+                    'text': text1[tokens1[p['start1']][1]:tokens1[end1][2]]
+                })
+            return passages
+        
+        except Exception as e:
+            print(f"Error finding shared passages: {e}")
+            record_error('advanced.shared_passages_list')
+            return []
+    
+    @instrument('advanced.repeated_passages')
+    def find_repeated_passages(self, text, min_length=8):
+        """
+        Find every maximal passage of at least min_length tokens that a text repeats.
+        
+        Self-plagiarism and padding detection within one document: a suffix
+        array over its token IDs locates all repeats in O(n log n).
+        
+        Returns:
+            Dict with 'passages' (token length, character offsets of every
+            occurrence and the text of the first), 'repetition_score' (share of
+            tokens repeating an earlier passage), 'repeated_tokens' and 'token_count'
+        """
+        try:
+            tokens = self.tokenize_with_offsets(text)
+            ids = Vocabulary().encode([t[0] for t in tokens])
+            found = repeated_passages(ids, min_length=min_length)
+            score = repetition_coverage(found, len(tokens))
+            
+            passages = []
+            for p in found:
+                occurrences = [
+                    {'start': tokens[start][1], 'end': tokens[start + p['length'] - 1][2]}
+                    for start in p['starts']
+                ]
+                passages.append({
+                    'length': p['length'],
+                    'count': len(occurrences),
+                    'occurrences': occurrences,
+                    'text': text[occurrences[0]['start']:occurrences[0]['end']]
+                })
+            return {
+                'passages': passages,
+                'repetition_score': round(score, 3),
+                'repeated_tokens': int(round(score * len(tokens))),
+                'token_count': len(tokens)
+            }
+        
+        except Exception as e:
+            print(f"Error finding repeated passages: {e}")
+            record_error('advanced.repeated_passages')
+            return {'passages': [], 'repetition_score': 0.0, 'repeated_tokens': 0, 'token_count': 0}
+    
+    @instrument('advanced.shared_passages')
+    def shared_passage_similarity(self, text1, text2, min_length=8):
+        """Fraction of tokens (of both texts) that lie in shared passages of at least min_length tokens."""
+        try:
+            tokens1 = self.preprocess_text(text1).split()
+            tokens2 = self.preprocess_text(text2).split()
+            if not tokens1 or not tokens2:
+                return 0.0
+            
+            (ids1, ids2), _ = intern_sequences(tokens1, tokens2)
+            shared = sum(p['length'] for p in shared_passages(ids1, ids2, min_length=min_length))
+            
+            return min(2 * shared / (len(tokens1) + len(tokens2)), 1.0)
+        
+        except Exception as e:
+            print(f"Error in shared passage similarity: {e}")
+            record_error('advanced.shared_passages')
+            return 0.0
+    
+    @instrument('advanced.word_freq')
     def word_frequency_similarity(self, text1, text2):
         """Calculate similarity using word frequency."""
         try:
@@ -216,7 +578,7 @@ class AdvancedSimilarityService:
             text2 = self.preprocess_text(text2)
             
             # Count vectors
-            count_matrix = self.count_vectorizer.fit_transform([text1, text2])
+            count_matrix = clone(self.count_vectorizer).fit_transform([text1, text2])
             
             # Cosine similarity on count vectors
             similarity_matrix = cosine_similarity(count_matrix)
@@ -225,8 +587,10 @@ class AdvancedSimilarityService:
         
         except Exception as e:
             print(f"Error in word frequency: {e}")
+            record_error('advanced.word_freq')
             return 0.0
     
+    @instrument('advanced.semantic')
     def semantic_similarity(self, text1, text2):
         """Calculate semantic similarity using word overlap beyond exact matches."""
         try:
@@ -251,58 +615,354 @@ class AdvancedSimilarityService:
         
         except Exception as e:
             print(f"Error in semantic similarity: {e}")
+            record_error('advanced.semantic')
             return 0.0
     
-    def calculate_overall_similarity(self, text1, text2):
-        """Calculate overall similarity using ensemble of all models."""
+    def metric_tasks(self, text1, text2, latency_budget=None):
+        """
+        The ensemble's metrics as zero-argument callables, planned against the latency budget.
+        
+        Skipped metrics are left out and approximate ones are bound to their
+        work limit. calculate_overall_similarity runs every task and combines
+        the scores with combine_scores.
+        
+        Returns:
+            (tasks, plan): ordered dict of metric name -> callable, and the MetricPlanner plan
+        """
+        plan = self.planner.plan(text1, text2, latency_budget)
+        metrics = plan['metrics']
+        
+        def limit(name):
+            return metrics[name]['limit'] if metrics[name]['mode'] == 'approximate' else None
+        
+        runners = {
+            'cosine': lambda: self.cosine_similarity_advanced(text1, text2),
+            'sequence': lambda: self.sequence_matcher_similarity(text1, text2, max_cells=limit('sequence')),
+            'token_overlap': lambda: self.token_overlap_similarity(text1, text2),
+            'bigram': lambda: self.ngram_similarity(text1, text2, n=2),
+            'trigram': lambda: self.ngram_similarity(text1, text2, n=3),
+            'lcs': lambda: self.longest_common_subsequence(text1, text2, max_cells=limit('lcs')),
+            'sentence': lambda: self.sentence_similarity(text1, text2, max_sentences=limit('sentence')),
+            'word_freq': lambda: self.word_frequency_similarity(text1, text2),
+            'semantic': lambda: self.semantic_similarity(text1, text2),
+        }
+        tasks = {name: runner for name, runner in runners.items() if metrics[name]['mode'] != 'skipped'}
+        return tasks, plan
+    
+    def combine_scores(self, scores, plan, shared_passage_sim=0.0):
+        """
+        Weighted ensemble result from the scores of the planned metrics.
+        
+        Weights are renormalized over the metrics that ran; skipped metrics are
+        reported as None.
+        """
+        weights = self.planner.renormalized_weights(plan)
+        overall_similarity = sum(scores[name] * weight for name, weight in weights.items())
+        
+        metrics = plan['metrics']
+        approximated = [name for name, entry in metrics.items() if entry['mode'] == 'approximate']
+        skipped = [name for name, entry in metrics.items() if entry['mode'] == 'skipped']
+        
+        result = {'overall': round(min(overall_similarity, 1.0), 3)}
+        for name in metrics:
+            result[name] = round(scores[name], 3) if name in scores else None
+        result.update({
+            'shared_passages': round(shared_passage_sim, 3),
+            'algorithms_used': len(scores),
+            'approximated': approximated,
+            'skipped': skipped,
+            'plan': plan,
+            'methodology': f'Ensemble of {len(scores)} advanced ML algorithms'
+        })
+        return result
+    
+    @instrument('scoring.advanced_ensemble')
+    def calculate_overall_similarity(self, text1, text2, latency_budget=None):
+        """
+        Calculate overall similarity using ensemble of all models.
+        
+        A cost model (MetricPlanner) estimates each metric's run time from the
+        input sizes. When the total would exceed the latency budget, expensive
+        metrics run approximately or are skipped, the remaining weights are
+        renormalized, and the plan is reported in the result.
+        
+        Args:
+            text1: First text
+            text2: Second text
+            latency_budget: Seconds for this call; defaults to the service budget (0 disables)
+        """
         try:
             if not text1 or not text2:
                 return 0.0
             
-            # Calculate similarity using all methods
-            cosine_sim = self.cosine_similarity_advanced(text1, text2)
-            sequence_sim = self.sequence_matcher_similarity(text1, text2)
-            token_sim = self.token_overlap_similarity(text1, text2)
-            bigram_sim = self.ngram_similarity(text1, text2, n=2)
-            trigram_sim = self.ngram_similarity(text1, text2, n=3)
-            lcs_sim = self.longest_common_subsequence(text1, text2)
-            sentence_sim = self.sentence_similarity(text1, text2)
-            word_freq_sim = self.word_frequency_similarity(text1, text2)
-            semantic_sim = self.semantic_similarity(text1, text2)
-            
-            # Weighted ensemble (all methods contribute)
-            overall_similarity = (
-                cosine_sim * 0.15 +           # TF-IDF based
-                sequence_sim * 0.15 +          # Sequence matching
-                token_sim * 0.12 +             # Token overlap (Jaccard)
-                bigram_sim * 0.10 +            # Bigram overlap
-                trigram_sim * 0.08 +           # Trigram overlap
-                lcs_sim * 0.12 +               # Longest common subsequence
-                sentence_sim * 0.10 +          # Sentence level
-                word_freq_sim * 0.10 +         # Word frequency
-                semantic_sim * 0.08            # Semantic analysis
-            )
+            # Calculate similarity using every method the plan keeps
+            tasks, plan = self.metric_tasks(text1, text2, latency_budget)
+            scores = {name: task() for name, task in tasks.items()}
+            
+            # Reported alongside the ensemble, not weighted into it
+            shared_passage_sim = self.shared_passage_similarity(text1, text2)
             
-            # Return detailed results
+            return self.combine_scores(scores, plan, shared_passage_sim)
+        
+        except Exception as e:
+            print(f"Error calculating overall similarity: {e}")
+            record_error('scoring.advanced_ensemble')
             return {
-                'overall': round(min(overall_similarity, 1.0), 3),
-                'cosine': round(cosine_sim, 3),
-                'sequence': round(sequence_sim, 3),
-                'token_overlap': round(token_sim, 3),
-                'bigram': round(bigram_sim, 3),
-                'trigram': round(trigram_sim, 3),
-                'lcs': round(lcs_sim, 3),
-                'sentence': round(sentence_sim, 3),
-                'word_freq': round(word_freq_sim, 3),
-                'semantic': round(semantic_sim, 3),
-                'algorithms_used': 9,
-                'methodology': 'Ensemble of 9 advanced ML algorithms'
+                'overall': 0.0,
+                'error': str(e),
+                'algorithms_used': 0
             }
+    
+    @staticmethod
+    def _jaccard(set1, set2):
+        """Jaccard similarity of two sets (0 when either is empty)."""
+        if not set1 or not set2:
+            return 0.0
+        return len(set1 & set2) / len(set1 | set2)
+    
+    @staticmethod
+    def _bundle_metric(stage, metric):
+        """Run one bundle metric as an instrumented stage; failures score 0 like the text metrics."""
+        try:
+            with measure(stage):
+                return float(metric())
+        except Exception as e:
+            print(f"Error in {stage}: {e}")
+            return 0.0
+    
+    def bundle_cosine_similarity(self, bundle1, bundle2):
+        """cosine_similarity_advanced from two feature bundles' n-gram counts."""
+        if bundle1.meta['length'] < 5 or bundle2.meta['length'] < 5:
+            return 0.0
+        return pair_cosine(bundle1['terms'], bundle1['term_counts'], bundle2['terms'], bundle2['term_counts'],
+                           max_features=self.tfidf_vectorizer.max_features)
+    
+    def bundle_metric_tasks(self, bundle1, bundle2, latency_budget=None):
+        """
+        metric_tasks() for two stored documents, computed from their feature bundles.
+        
+        Token metrics run on the token-ID arrays (IDs stand in one-to-one for
+        the preprocessed tokens) and the TF-IDF and word-frequency cosines on
+        the stored n-gram counts, so no text is tokenized or vectorized. The
+        plan is the one metric_tasks would make: bundles carry the planner's
+        input sizes.
+        
+        Returns:
+            (tasks, plan) as metric_tasks returns them
+        """
+        plan = self.planner.plan_inputs(bundle_inputs(bundle1, bundle2), latency_budget)
+        metrics = plan['metrics']
+        
+        def limit(name):
+            return metrics[name]['limit'] if metrics[name]['mode'] == 'approximate' else None
+        
+        def sentence():
+            sentences1, sentences2 = bundle1.sentence_lists(), bundle2.sentence_lists()
+            if not sentences1 or not sentences2:
+                return 0.0
+            return self._sentence_score(sentences1, sentences2, limit('sentence'))
+        
+        def word_freq():
+            unigrams1 = bundle1['term_orders'] == 1
+            unigrams2 = bundle2['term_orders'] == 1
+            return pair_cosine(bundle1['terms'][unigrams1], bundle1['term_counts'][unigrams1],
+                               bundle2['terms'][unigrams2], bundle2['term_counts'][unigrams2],
+                               max_features=self.count_vectorizer.max_features, idf=False)
+        
+        def semantic():
+            content1 = np.unique(bundle1['token_ids'][bundle1['content_mask'].astype(bool)])
+            content2 = np.unique(bundle2['token_ids'][bundle2['content_mask'].astype(bool)])
+            return tokenArrays.jaccard(content1, content2)
+        
+        runners = {
+            'cosine': lambda: self.bundle_cosine_similarity(bundle1, bundle2),
+            'sequence': lambda: self._sequence_ratio(bundle1.token_list(), bundle2.token_list(), limit('sequence')),
+            'token_overlap': lambda: tokenArrays.jaccard(np.unique(bundle1['token_ids']), np.unique(bundle2['token_ids'])),
+            'bigram': lambda: tokenArrays.ngram_jaccard(bundle1['token_ids'], bundle2['token_ids'], 2),
+            'trigram': lambda: tokenArrays.ngram_jaccard(bundle1['token_ids'], bundle2['token_ids'], 3),
+            'lcs': lambda: self._lcs_ratio(bundle1['token_ids'], bundle2['token_ids'], limit('lcs')),
+            'sentence': sentence,
+            'word_freq': word_freq,
+            'semantic': semantic,
+        }
+        tasks = {
+            name: (lambda name=name, runner=runner: self._bundle_metric(f'advanced.bundle.{name}', runner))
+            for name, runner in runners.items() if metrics[name]['mode'] != 'skipped'
+        }
+        return tasks, plan
+    
+    @instrument('advanced.bundle.shared_passages')
+    def bundle_shared_passage_similarity(self, bundle1, bundle2, min_length=8):
+        """shared_passage_similarity from two feature bundles' token IDs."""
+        try:
+            tokens1, tokens2 = bundle1.token_list(), bundle2.token_list()
+            if not tokens1 or not tokens2:
+                return 0.0
+            
+            (ids1, ids2), _ = intern_sequences(tokens1, tokens2)
+            shared = sum(p['length'] for p in shared_passages(ids1, ids2, min_length=min_length))
+            
+            return min(2 * shared / (len(tokens1) + len(tokens2)), 1.0)
         
         except Exception as e:
-            print(f"Error calculating overall similarity: {e}")
+            print(f"Error in bundle shared passage similarity: {e}")
+            record_error('advanced.bundle.shared_passages')
+            return 0.0
+    
+    @instrument('scoring.advanced_bundle')
+    def calculate_bundle_similarity(self, bundle1, bundle2, latency_budget=None):
+        """
+        calculate_overall_similarity for two stored documents, scored from their feature bundles.
+        
+        Args:
+            bundle1: FeatureBundle of the first document
+            bundle2: FeatureBundle of the second document
+            latency_budget: Seconds for this call; defaults to the service budget (0 disables)
+        """
+        try:
+            if not bundle1.token_count or not bundle2.token_count:
+                return 0.0
+            
+            tasks, plan = self.bundle_metric_tasks(bundle1, bundle2, latency_budget)
+            scores = {name: task() for name, task in tasks.items()}
+            
+            shared_passage_sim = self.bundle_shared_passage_similarity(bundle1, bundle2)
+            
+            return self.combine_scores(scores, plan, shared_passage_sim)
+        
+        except Exception as e:
+            print(f"Error calculating bundle similarity: {e}")
+            record_error('scoring.advanced_bundle')
             return {
                 'overall': 0.0,
                 'error': str(e),
                 'algorithms_used': 0
             }
+    
+    @staticmethod
+    def _batch_metric(stage, metric, count):
+        """Run one batched metric as an instrumented stage; failures score 0 for every candidate."""
+        try:
+            with measure(stage):
+                return np.asarray(metric(), dtype=np.float64)
+        except Exception as e:
+            print(f"Error in {stage}: {e}")
+            return np.zeros(count)
+    
+    @instrument('scoring.advanced_batch')
+    def score_many(self, query, candidates, latency_budget=None):
+        """
+        calculate_overall_similarity of one text against many candidates.
+        
+        The query is preprocessed, tokenized and vectorized once. Set and
+        n-gram overlaps become one membership test over all candidates, the
+        TF-IDF and word-frequency cosines sparse matrix products, and the
+        sentence metric one blocked kernel; only the alignment metrics
+        (sequence, LCS) and cosines of pairs with more distinct terms than
+        the vectorizers' max_features still run per candidate. Each
+        candidate gets the plan a pairwise call would make, so the scores
+        equal calculate_overall_similarity's.
+        
+        Args:
+            query: Text to score
+            candidates: Texts to score it against
+            latency_budget: Seconds per candidate pair, as for calculate_overall_similarity
+        
+        Returns:
+            Dict of metric name -> array of scores (one per candidate, NaN where
+            the candidate's plan skipped the metric), with the weighted
+            ensemble under 'overall'
+        """
+        count = len(candidates)
+        scores = {name: np.full(count, np.nan) for name in self.planner.COSTS}
+        overall = np.zeros(count)
+        if not query or not count:
+            return {'overall': overall, **scores}
+        
+        query_sizes = self.planner.measure_inputs(query, '')
+        plans = []
+        for candidate in candidates:
+            sizes = self.planner.measure_inputs('', candidate)
+            sizes.update(n1=query_sizes['n1'], s1=query_sizes['s1'])
+            plans.append(self.planner.plan_inputs(sizes, latency_budget))
+        
+        def limit(name, plan):
+            entry = plan['metrics'][name]
+            return entry['limit'] if entry['mode'] == 'approximate' else None
+        
+        def runs(name):
+            return [i for i, plan in enumerate(plans) if plan['metrics'][name]['mode'] != 'skipped']
+        
+        text1 = self.preprocess_text(query)
+        texts2 = [self.preprocess_text(candidate) for candidate in candidates]
+        words1 = text1.split()
+        words2 = [text.split() for text in texts2]
+        vocabulary = Vocabulary()
+        ids1 = vocabulary.encode(words1)
+        ids2 = [vocabulary.encode(words) for words in words2]
+        
+        def cosine():
+            cosines = self._tfidf_cosines(text1, texts2)
+            short = np.array([len(candidate.strip()) < 5 for candidate in candidates])
+            return np.where(short | (len(query.strip()) < 5), 0.0, cosines)
+        
+        def word_freq():
+            counts = clone(self.count_vectorizer).set_params(max_features=None).fit_transform([text1] + texts2)
+            return query_pair_cosines(counts, self.count_vectorizer.max_features, idf=False)
+        
+        def overlap(n):
+            if n == 1:
+                return tokenArrays.jaccard_many(np.unique(ids1), [np.unique(ids) for ids in ids2])
+            keys = [np.unique(tokenArrays.ngram_keys(ids, n)) for ids in ids2]
+            return tokenArrays.jaccard_many(np.unique(tokenArrays.ngram_keys(ids1, n)), keys)
+        
+        def semantic():
+            def content(words):
+                return np.unique(vocabulary.encode(
+                    [w for w in words if w not in self.stop_words and len(w) > 2]
+                ))
+            return tokenArrays.jaccard_many(content(words1), [content(words) for words in words2])
+        
+        def sentence():
+            sentences1 = sent_tokenize(text1)
+            best = self.sentence_match_many(sentences1, [sent_tokenize(text) for text in texts2])
+            result = np.zeros(count)
+            for i in runs('sentence'):
+                rows = best[:, i]
+                max_sentences = limit('sentence', plans[i])
+                if max_sentences and len(rows) > max_sentences:
+                    step = len(rows) / max_sentences
+                    rows = rows[[int(k * step) for k in range(max_sentences)]]
+                result[i] = float(np.mean(rows)) if len(rows) else 0.0
+            return result
+        
+        def pairwise(name, metric):
+            def run():
+                result = np.zeros(count)
+                for i in runs(name):
+                    result[i] = metric(i, limit(name, plans[i]))
+                return result
+            return run
+        
+        runners = {
+            'cosine': cosine,
+            'sequence': pairwise('sequence', lambda i, cells: self._sequence_ratio(words1, words2[i], cells)),
+            'token_overlap': lambda: overlap(1),
+            'bigram': lambda: overlap(2),
+            'trigram': lambda: overlap(3),
+            'lcs': pairwise('lcs', lambda i, cells: self._lcs_ratio(ids1, ids2[i], cells)),
+            'sentence': sentence,
+            'word_freq': word_freq,
+            'semantic': semantic,
+        }
+        for name, runner in runners.items():
+            selected = runs(name)
+            if selected:
+                values = self._batch_metric(f'advanced.batch.{name}', runner, count)
+                scores[name][selected] = values[selected]
+        
+        for i, plan in enumerate(plans):
+            weights = self.planner.renormalized_weights(plan)
+            overall[i] = min(sum(scores[name][i] * weight for name, weight in weights.items()), 1.0)
+        
+        return {'overall': overall, **scores}
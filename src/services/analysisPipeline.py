@@ -0,0 +1,338 @@
+"""
+Document analysis pipeline shared by /api/analyze and its streaming variant.
+Splits an analysis into independent tasks (every ensemble metric, text
+statistics, passage lookups), runs them sequentially or on a thread pool, and
+emits an event as each one completes, followed by the assembled result.
+"""
+
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# Share of the LangChain ensemble in the combined score
+LANGCHAIN_WEIGHT = 0.65
+ML_WEIGHT = 0.35
+
+
+class AnalysisPipeline:
+    """Runs the plagiarism analysis of one document as a stream of events."""
+
+    def __init__(self, similarity_service, text_analysis_service, scoring_cascade=None,
+                 fingerprint_index=None, langchain_provider: Optional[Callable] = None,
+                 chunk_index_provider: Optional[Callable] = None, match_store=None,
+                 ghostwriting_provider: Optional[Callable] = None, logger=None):
+        """
+        Args:
+            similarity_service: AdvancedSimilarityService
+            text_analysis_service: TextAnalysisService
+            scoring_cascade: Optional ScoringCascade screening pairs before the ensembles
+            fingerprint_index: Optional FingerprintIndex for corpus-wide copied passages
+            langchain_provider: Callable returning the (lazy) LangChainPlagiarismService or None
+            chunk_index_provider: Callable returning the ChunkVectorIndex or None
+            match_store: Optional MatchStore that keeps each document's latest analysis
+            ghostwriting_provider: Callable returning the (lazy) GhostwritingDetector or None
+            logger: Optional logger for task failures
+        """
+        self.similarity_service = similarity_service
+        self.text_analysis_service = text_analysis_service
+        self.scoring_cascade = scoring_cascade
+        self.fingerprint_index = fingerprint_index
+        self.langchain_provider = langchain_provider
+        self.chunk_index_provider = chunk_index_provider
+        self.match_store = match_store
+        self.ghostwriting_provider = ghostwriting_provider
+        self.logger = logger
+
+    def analyze(self, document_text: str, file_id: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the whole analysis in the calling thread and return the result."""
+        result = None
+        for event in self.events(document_text, file_id, options, workers=0):
+            if event['event'] == 'complete':
+                result = event['analysis']
+        return result
+
+    def events(self, document_text: str, file_id: str, options: Dict[str, Any],
+               workers: int = 0) -> Iterator[Dict[str, Any]]:
+        """
+        Run the analysis, yielding an event as each task completes.
+
+        Events, in order of completion:
+            started      planned metrics and whether LangChain is used
+            cascade      cheap-tier screening result (only with a comparison text)
+            metric       one metric score with the running combined score
+            text_stats   document statistics
+            passages     shared/copied passages (repeated passages without a
+                         comparison text) and semantic matches
+            ghostwriting per-sentence machine-generated text scores (only with ghostwriting=True)
+            complete     the full analysis, identical to analyze()
+
+        Args:
+            document_text: Text of the analyzed document
+            file_id: Its upload ID (excluded from corpus lookups)
+            options: Request options (comparison_text, use_langchain, cascade,
+                     latency_budget, top_k, ghostwriting)
+            workers: Thread-pool size; 0 runs the tasks one after another
+        """
+        comparison_text = options.get('comparison_text', '') or ''
+        use_langchain = options.get('use_langchain', True)
+
+        # Screen the pair with the cheap cascade tiers before the full ensemble
+        cascade = None
+        if comparison_text and self.scoring_cascade and options.get('cascade', True):
+            cascade = self.scoring_cascade.screen(document_text, comparison_text)
+        rejected = bool(cascade and not cascade['passed'])
+
+        langchain_svc = None
+        if rejected:
+            use_langchain = False
+        elif use_langchain and self.langchain_provider:
+            langchain_svc = self.langchain_provider()
+            use_langchain = langchain_svc is not None
+        else:
+            use_langchain = False
+
+        tasks = {}
+        langchain_tasks, advanced_tasks, plan = {}, {}, None
+        if not rejected:
+            if use_langchain:
+                langchain_tasks = langchain_svc.metric_tasks(document_text, comparison_text)
+            advanced_comparison = comparison_text or "default analysis"
+            advanced_tasks, plan = self.similarity_service.metric_tasks(
+                document_text, advanced_comparison, options.get('latency_budget')
+            )
+            for name, task in langchain_tasks.items():
+                tasks[('langchain', name)] = task
+            for name, task in advanced_tasks.items():
+                tasks[('advanced', name)] = task
+            # Reported alongside the advanced ensemble, not weighted into it
+            tasks[('advanced', 'shared_passages')] = lambda: self.similarity_service.shared_passage_similarity(
+                document_text, advanced_comparison
+            )
+
+        tasks[('text_stats', None)] = lambda: self.text_analysis_service.analyze_text(document_text)
+        if options.get('comparison_text'):
+            tasks[('passages', 'shared_passages')] = lambda: self.similarity_service.find_shared_passages(
+                document_text, comparison_text
+            )[:20]
+        else:
+            tasks[('passages', 'repeated_passages')] = lambda: self.similarity_service.find_repeated_passages(
+                document_text
+            )
+        if self.fingerprint_index:
+            tasks[('passages', 'copied_passages')] = lambda: self.fingerprint_index.query(
+                document_text, exclude_file_id=file_id
+            )
+        if use_langchain and self.chunk_index_provider:
+            top_k = int(options.get('top_k', 5))
+            tasks[('passages', 'semantic_matches')] = lambda: self._semantic_matches(document_text, file_id, top_k)
+        detector = None
+        if options.get('ghostwriting', False) and self.ghostwriting_provider:
+            detector = self.ghostwriting_provider()
+        if detector:
+            tasks[('ghostwriting', None)] = lambda: detector.analyze(document_text)
+
+        yield {
+            'event': 'started',
+            'file_id': file_id,
+            'langchain_enabled': use_langchain,
+            'metrics': [f"{group}.{name}" for group, name in tasks if group in ('langchain', 'advanced')]
+        }
+        if cascade:
+            yield {'event': 'cascade', **self._cascade_summary(cascade)}
+
+        langchain_scores, advanced_scores = {}, {}
+        outputs = {}
+        for (group, name), value, elapsed in self._run(tasks, workers):
+            outputs[(group, name)] = value
+            if group == 'langchain' or group == 'advanced':
+                scores = langchain_scores if group == 'langchain' else advanced_scores
+                scores[name] = float(value) if value is not None else 0.0
+                yield {
+                    'event': 'metric',
+                    'group': group,
+                    'name': name,
+                    'score': round(scores[name], 3),
+                    'elapsed_ms': round(elapsed * 1000, 1),
+                    'running_score': round(self._running_score(
+                        langchain_svc, langchain_scores, advanced_scores, plan, use_langchain
+                    ), 3)
+                }
+            elif group == 'text_stats':
+                yield {'event': 'text_stats', 'document_stats': value, 'elapsed_ms': round(elapsed * 1000, 1)}
+            elif group == 'ghostwriting':
+                yield {'event': 'ghostwriting', 'data': value, 'elapsed_ms': round(elapsed * 1000, 1)}
+            else:
+                yield {'event': 'passages', 'kind': name, 'data': value, 'elapsed_ms': round(elapsed * 1000, 1)}
+
+        # Assemble the final result exactly as the blocking endpoint does
+        if rejected:
+            advanced_data = {}
+            similarity_results = {
+                'overall': cascade['score'],
+                'combined_score': cascade['score'],
+                'algorithms_used': 0
+            }
+        else:
+            shared_passage_sim = advanced_scores.pop('shared_passages', 0.0)
+            advanced_data = self.similarity_service.combine_scores(advanced_scores, plan, shared_passage_sim)
+            advanced_score = max(float(advanced_data.get('overall', 0.0)), 0.0)
+
+            if use_langchain:
+                if langchain_tasks:
+                    similarity_results = langchain_svc.combine_scores(langchain_scores)
+                else:
+                    similarity_results = langchain_svc._empty_result()
+                similarity_results['advanced_similarity'] = advanced_score
+                similarity_results['combined_score'] = (
+                    similarity_results.get('overall', 0) * LANGCHAIN_WEIGHT + advanced_score * ML_WEIGHT
+                )
+            else:
+                similarity_results = {
+                    'overall': advanced_score,
+                    'semantic': advanced_score * 0.9,
+                    'chunk_level': advanced_score * 0.85,
+                    'semantic_chunks': advanced_score * 0.88,
+                    'sentence_semantic': advanced_score * 0.87,
+                    'tfidf': advanced_score * 0.92,
+                    'sequence_matching': advanced_score * 0.90,
+                    'token_overlap': advanced_score * 0.80,
+                    'advanced_similarity': advanced_score,
+                    'combined_score': advanced_score
+                }
+
+        analysis = self.build_result(
+            file_id, similarity_results, advanced_data, use_langchain, cascade,
+            text_stats=outputs.get(('text_stats', None)) or {},
+            semantic_matches=outputs.get(('passages', 'semantic_matches')) or [],
+            copied_passages=outputs.get(('passages', 'copied_passages')) or {'coverage': 0.0, 'documents': []},
+            shared_passages=outputs.get(('passages', 'shared_passages')) or [],
+            repeated_passages=outputs.get(('passages', 'repeated_passages')),
+            ghostwriting=outputs.get(('ghostwriting', None))
+        )
+        if self.match_store:
+            self._call(('matches', 'save_analysis'), lambda: self.match_store.save_analysis(file_id, analysis))
+        yield {'event': 'complete', 'analysis': analysis}
+
+    def _run(self, tasks: Dict, workers: int) -> Iterator:
+        """Yield (key, value, seconds) per task, in completion order when pooled."""
+        if not workers:
+            for key, task in tasks.items():
+                yield self._call(key, task)
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Each task runs in a copy of the request context so per-request
+            # instrumentation still sees it
+            futures = [
+                pool.submit(contextvars.copy_context().run, self._call, key, task)
+                for key, task in tasks.items()
+            ]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def _call(self, key, task):
+        start = time.perf_counter()
+        try:
+            value = task()
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Analysis task {key} failed: {e}")
+            value = None
+        return key, value, time.perf_counter() - start
+
+    def _semantic_matches(self, document_text: str, file_id: str, top_k: int):
+        vector_index = self.chunk_index_provider()
+        if not vector_index:
+            return []
+        return vector_index.search_text(document_text, k=top_k, exclude_file_id=file_id)
+
+    def _running_score(self, langchain_svc, langchain_scores, advanced_scores, plan, use_langchain) -> float:
+        """Combined score over the metrics finished so far, with weights renormalized."""
+        def partial(scores, weights):
+            done = {name: weight for name, weight in weights.items() if name in scores}
+            total = sum(done.values())
+            return sum(scores[name] * weight for name, weight in done.items()) / total if total else None
+
+        advanced = partial(advanced_scores, self.similarity_service.planner.renormalized_weights(plan))
+        if not use_langchain:
+            return advanced or 0.0
+
+        langchain = partial(langchain_scores, langchain_svc.METRIC_WEIGHTS)
+        if langchain is None:
+            return advanced or 0.0
+        if advanced is None:
+            return langchain
+        return langchain * LANGCHAIN_WEIGHT + advanced * ML_WEIGHT
+
+    @staticmethod
+    def _cascade_summary(cascade: Dict) -> Dict:
+        return {
+            'decided_by_tier': cascade['decided_by'] or 3,
+            'tiers': cascade['tiers'],
+            'thresholds': cascade.get('thresholds')
+        }
+
+    def build_result(self, file_id, similarity_results, advanced_data, use_langchain, cascade,
+                     text_stats, semantic_matches, copied_passages, shared_passages,
+                     repeated_passages=None, ghostwriting=None) -> Dict[str, Any]:
+        """Assemble the analysis response from the ensemble and auxiliary results."""
+        # Calculate overall score and risk assessment
+        overall_score = similarity_results.get('combined_score', similarity_results.get('overall', 0))
+        risk_level = 'low'
+        if overall_score > 0.7:
+            risk_level = 'high'
+        elif overall_score > 0.4:
+            risk_level = 'medium'
+
+        return {
+            'overall_score': overall_score,
+            'confidence_score': min(overall_score + 0.1, 1.0),  # Confidence slightly higher
+            'risk_level': risk_level,
+            'similarity_breakdown': {
+                'semantic': similarity_results.get('semantic', 0),
+                'chunk_level': similarity_results.get('chunk_level', 0),
+                'semantic_chunks': similarity_results.get('semantic_chunks', 0),
+                'sentence_semantic': similarity_results.get('sentence_semantic', 0),
+                'tfidf': similarity_results.get('tfidf', 0),
+                'sequence_matching': similarity_results.get('sequence_matching', 0),
+                'token_overlap': similarity_results.get('token_overlap', 0),
+                'advanced_similarity': similarity_results.get('advanced_similarity', 0),
+                'shared_passages': advanced_data.get('shared_passages', 0)
+            },
+            'algorithms_count': similarity_results.get('algorithms_used', 8),
+            'methodology': 'LangChain Semantic + Advanced ML Ensemble',
+            'model': 'LangChain AI + 9-Algorithm Ensemble',
+            'langchain_enabled': use_langchain,
+            'langchain_weight': LANGCHAIN_WEIGHT if use_langchain else 0.0,
+            'ml_weight': ML_WEIGHT if use_langchain else 1.0,
+            'similarity_results': [
+                {
+                    'source': 'LangChain Semantic Analysis',
+                    'similarity_score': similarity_results.get('semantic', 0),
+                    'confidence': min(similarity_results.get('semantic', 0) + 0.1, 1.0),
+                    'match_type': 'semantic_embedding'
+                },
+                {
+                    'source': 'Advanced ML Ensemble',
+                    'similarity_score': similarity_results.get('advanced_similarity', similarity_results.get('overall', 0)),
+                    'confidence': min(similarity_results.get('overall', 0) + 0.1, 1.0),
+                    'match_type': '9_algorithm_ensemble'
+                }
+            ],
+            'semantic_matches': semantic_matches,
+            'copied_passages': copied_passages,
+            'shared_passages': shared_passages,
+            'repeated_passages': repeated_passages,
+            'ghostwriting': ghostwriting,
+            'cascade': self._cascade_summary(cascade) if cascade else None,
+            'metric_plan': {
+                'approximated': advanced_data.get('approximated', []),
+                'skipped': advanced_data.get('skipped', []),
+                'budget_s': advanced_data.get('plan', {}).get('budget_s'),
+                'estimated_s': advanced_data.get('plan', {}).get('estimated_s')
+            },
+            'document_stats': text_stats,
+            'analysis_timestamp': text_stats.get('timestamp'),
+            'file_id': file_id
+        }
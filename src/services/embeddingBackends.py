@@ -0,0 +1,172 @@
+"""
+Pluggable CPU embedding backends for the LangChain plagiarism service.
+Provides the default PyTorch backend and an ONNX Runtime backend with optional
+int8 dynamic quantization. All backends expose the LangChain embeddings
+interface (embed_query / embed_documents).
+"""
+
+import os
+from typing import List, Optional
+
+import numpy as np
+
+from src.utils.instrumentation import instrument
+
+DEFAULT_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_ONNX_DIR = os.path.join('models', 'onnx')
+BACKEND_NAMES = ('torch', 'onnx', 'onnx-int8')
+
+
+class TorchEmbeddingBackend:
+    """Full-precision PyTorch backend (HuggingFaceEmbeddings)."""
+
+    name = 'torch'
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+        """Load the sentence-transformer model on CPU."""
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+
+        self.model_name = model_name
+        self._embeddings = HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs={'device': 'cpu'}
+        )
+
+    @instrument('embedding.torch')
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single text."""
+        return self._embeddings.embed_query(text)
+
+    @instrument('embedding.torch')
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts."""
+        return self._embeddings.embed_documents(texts)
+
+
+class OnnxEmbeddingBackend:
+    """
+    ONNX Runtime backend for the same sentence-transformer model.
+
+    The model is exported from PyTorch once and cached under model_dir. With
+    quantize=True the exported graph is converted with int8 dynamic
+    quantization, which is typically 2-3x faster on CPU.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, model_dir: str = DEFAULT_ONNX_DIR,
+                 quantize: bool = True, batch_size: int = 32, max_length: int = 256):
+        """Export (if needed) and load the ONNX model."""
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.model_dir = model_dir
+        self.quantize = quantize
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.name = 'onnx-int8' if quantize else 'onnx'
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model_path = self._ensure_model()
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = int(os.environ.get('ONNX_THREADS', 0))
+        self.session = onnxruntime.InferenceSession(
+            model_path, options, providers=['CPUExecutionProvider']
+        )
+        self._input_names = {inp.name for inp in self.session.get_inputs()}
+
+    def _ensure_model(self) -> str:
+        """Export the PyTorch model to ONNX (and quantize it) unless already cached."""
+        os.makedirs(self.model_dir, exist_ok=True)
+        fp32_path = os.path.join(self.model_dir, 'model.onnx')
+        int8_path = os.path.join(self.model_dir, 'model_int8.onnx')
+
+        if not os.path.exists(fp32_path):
+            export_onnx_model(self.model_name, fp32_path, self.tokenizer)
+
+        if not self.quantize:
+            return fp32_path
+
+        if not os.path.exists(int8_path):
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+        return int8_path
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single text."""
+        return self.embed_documents([text])[0]
+
+    @instrument('embedding.onnx')
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts in batches with mean pooling and L2 normalisation."""
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            encoded = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors='np'
+            )
+            feeds = {k: v.astype(np.int64) for k, v in encoded.items() if k in self._input_names}
+            token_embeddings = self.session.run(None, feeds)[0]
+
+            # Mean pooling over real tokens, as the sentence-transformer does
+            mask = encoded['attention_mask'][..., None].astype(np.float32)
+            summed = (token_embeddings * mask).sum(axis=1)
+            pooled = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            vectors.extend(pooled.tolist())
+        return vectors
+
+
+def export_onnx_model(model_name: str, output_path: str, tokenizer=None):
+    """Export a HuggingFace encoder to ONNX with dynamic batch and sequence axes."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    tokenizer = tokenizer or AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+
+    sample = tokenizer(["export sample"], return_tensors='pt')
+    input_names = list(sample.keys())
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            output_path,
+            input_names=input_names,
+            output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+
+
+def create_embedding_backend(name: Optional[str] = None):
+    """
+    Create an embedding backend by name.
+
+    Args:
+        name: 'torch', 'onnx' or 'onnx-int8'; defaults to the EMBEDDING_BACKEND
+              environment variable, then 'torch'
+
+    Returns:
+        Backend instance exposing embed_query / embed_documents
+    """
+    name = (name or os.environ.get('EMBEDDING_BACKEND', 'torch')).lower()
+
+    if name == 'torch':
+        return TorchEmbeddingBackend()
+    if name == 'onnx':
+        return OnnxEmbeddingBackend(quantize=False)
+    if name == 'onnx-int8':
+        return OnnxEmbeddingBackend(quantize=True)
+
+    raise ValueError(f"Unknown embedding backend '{name}', expected one of {BACKEND_NAMES}")
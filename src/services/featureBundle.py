@@ -0,0 +1,463 @@
+"""
+Precomputed per-document feature bundles.
+Everything the similarity metrics derive from a document (token IDs and
+spans, sentence ranges, MinHash signature and n-gram term counts) is
+extracted once at upload and written to uploads/features/<file_id>.bundle.
+The LangChain sections (chunk term counts and, when embeddings are
+available, embeddings) are added the first time a LangChain comparison
+needs them. Scoring two stored documents then reads their bundles instead of
+re-tokenizing and re-embedding the text.
+
+File layout (little-endian):
+    magic b'PDFB' | format version (uint32) | header length (uint32)
+    JSON header: {'meta': {...}, 'sections': {name: {dtype, shape, offset}}}
+    sections, each starting on a 64-byte boundary
+
+Opening a bundle maps the file read-only and every section is a zero-copy
+NumPy view into the mapping.
+"""
+
+import json
+import mmap
+import os
+import re
+import struct
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.base import clone
+from sklearn.preprocessing import normalize
+
+from src.services.fingerprintIndex import _token_hash
+from src.services.metricPlanner import MetricPlanner
+from src.utils.instrumentation import instrument
+
+MAGIC = b'PDFB'
+# Bump when the layout or the meaning of a section changes; older bundles
+# are then treated as missing and rebuilt from the stored text
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+_PREAMBLE = struct.Struct('<4sII')
+
+# idf of a term found in one of the two documents of a pairwise TF-IDF fit
+# (smooth idf: ln((1 + n) / (1 + df)) + 1 with n = 2, df = 1); shared terms get 1
+_SINGLE_DF_IDF = float(np.log(1.5) + 1.0)
+
+
+class BundleError(ValueError):
+    """Raised for files that are not feature bundles of the current format."""
+
+
+class FeatureBundle:
+    """
+    Read-only, memory-mapped feature bundle.
+
+    Sections are accessed by name (bundle['token_ids']) as NumPy arrays;
+    document-level values such as the planner's input sizes are in meta.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, header_length = _PREAMBLE.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise BundleError(f"{path} is not a feature bundle")
+            if version != FORMAT_VERSION:
+                raise BundleError(f"{path} has bundle format {version}, expected {FORMAT_VERSION}")
+            header = json.loads(self._map[_PREAMBLE.size:_PREAMBLE.size + header_length])
+        except (struct.error, json.JSONDecodeError) as e:
+            self._map.close()
+            raise BundleError(f"{path} is corrupt: {e}")
+        except BundleError:
+            self._map.close()
+            raise
+        self.meta = header['meta']
+        self._sections = header['sections']
+        self._views = {}
+        self._lists = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._sections
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self._views:
+            entry = self._sections[name]
+            dtype = np.dtype(entry['dtype'])
+            shape = tuple(entry['shape'])
+            count = int(np.prod(shape))
+            if count == 0:
+                view = np.empty(shape, dtype=dtype)
+            else:
+                view = np.frombuffer(self._map, dtype=dtype, count=count, offset=entry['offset']).reshape(shape)
+            self._views[name] = view
+        return self._views[name]
+
+    def get(self, name: str, default=None):
+        return self[name] if name in self else default
+
+    @property
+    def section_names(self) -> List[str]:
+        return list(self._sections)
+
+    @property
+    def token_count(self) -> int:
+        return self.meta['token_count']
+
+    def token_list(self) -> List[int]:
+        """Token IDs as a Python list (for SequenceMatcher, LCS and suffix arrays)."""
+        if 'tokens' not in self._lists:
+            self._lists['tokens'] = self['token_ids'].tolist()
+        return self._lists['tokens']
+
+    def sentence_lists(self) -> List[List[int]]:
+        """Token IDs of every sentence."""
+        if 'sentences' not in self._lists:
+            tokens = self.token_list()
+            self._lists['sentences'] = [tokens[start:end] for start, end in self['sentence_ranges'].tolist()]
+        return self._lists['sentences']
+
+    def close(self):
+        self._views.clear()
+        self._lists.clear()
+        try:
+            self._map.close()
+        except BufferError:
+            # A caller still holds a section view; the mapping is released with it
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def write(path: str, sections: Dict[str, np.ndarray], meta: Dict):
+        """Write a bundle atomically (readers of the old file keep their mapping)."""
+        arrays = {name: np.ascontiguousarray(array) for name, array in sections.items()}
+
+        def layout(header_length):
+            offset = _align(_PREAMBLE.size + header_length)
+            table = {}
+            for name, array in arrays.items():
+                table[name] = {'dtype': array.dtype.newbyteorder('<').str, 'shape': list(array.shape), 'offset': offset}
+                offset = _align(offset + array.nbytes)
+            return table
+
+        # The offsets depend on the header length, which depends on the offsets
+        header_length = 0
+        while True:
+            header = json.dumps({'meta': meta, 'sections': layout(header_length)}).encode('utf-8')
+            if len(header) <= header_length:
+                break
+            header_length = len(header) + 64
+        header = header.ljust(header_length)
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, header_length))
+            f.write(header)
+            for name, entry in layout(header_length).items():
+                f.write(b'\0' * (entry['offset'] - f.tell()))
+                f.write(arrays[name].astype(arrays[name].dtype.newbyteorder('<'), copy=False).tobytes())
+        os.replace(tmp_path, path)
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def term_counts(terms: Iterable[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Hashed term frequencies of an analyzer's output.
+
+    Returns:
+        (ids, counts, orders): sorted uint64 term hashes, uint32 counts and
+        the n-gram order of every term
+    """
+    counter = Counter(terms)
+    ids = np.fromiter((_token_hash(term) for term in counter), dtype=np.uint64, count=len(counter))
+    counts = np.fromiter(counter.values(), dtype=np.int64, count=len(counter))
+    orders = np.fromiter((term.count(' ') + 1 for term in counter), dtype=np.uint8, count=len(counter))
+    ids, first, inverse = np.unique(ids, return_index=True, return_inverse=True)
+    return ids, np.bincount(inverse, weights=counts).astype(np.uint32), orders[first]
+
+
+def sentence_token_ranges(tokens: List[str]) -> np.ndarray:
+    """
+    [start, end) token ranges of the sentences of ' '.join(tokens).
+
+    Uses NLTK's sentence tokenizer like the text metrics, or the highlighter's
+    punctuation rule when the punkt model is not installed.
+    """
+    preprocessed = ' '.join(tokens)
+    try:
+        from nltk.tokenize import sent_tokenize
+        sentences = sent_tokenize(preprocessed)
+    except LookupError:
+        sentences = [s for s in re.split(r'(?<=[.!?])\s+', preprocessed) if s.strip()]
+
+    ranges = []
+    cursor = 0
+    for sentence in sentences:
+        end = min(cursor + len(sentence.split()), len(tokens))
+        ranges.append((cursor, end))
+        cursor = end
+    return np.array(ranges, dtype=np.int32).reshape(-1, 2)
+
+
+def pair_cosine(terms1: np.ndarray, counts1: np.ndarray, terms2: np.ndarray, counts2: np.ndarray,
+                max_features: Optional[int] = None, idf: bool = True) -> float:
+    """
+    Cosine similarity of two documents' term counts as a vectorizer fitted on
+    just the pair would compute it.
+
+    With idf, terms are weighted like TfidfVectorizer (smooth idf over the two
+    documents, l2 norm); without, like cosine on CountVectorizer counts. With
+    max_features only the most frequent terms of the pair are kept; ties at
+    the cut-off are broken as scikit-learn does when the term IDs sort like
+    the terms (vocabulary column indices), and may differ for term hashes.
+    """
+    vocabulary = np.union1d(terms1, terms2)
+    if len(vocabulary) == 0:
+        return 0.0
+    vector1 = np.zeros(len(vocabulary))
+    vector2 = np.zeros(len(vocabulary))
+    vector1[np.searchsorted(vocabulary, terms1)] = counts1
+    vector2[np.searchsorted(vocabulary, terms2)] = counts2
+
+    if max_features and len(vocabulary) > max_features:
+        keep = (-(vector1 + vector2)).argsort()[:max_features]
+        vector1, vector2 = vector1[keep], vector2[keep]
+
+    if idf:
+        weights = np.where((vector1 > 0) & (vector2 > 0), 1.0, _SINGLE_DF_IDF)
+        vector1, vector2 = vector1 * weights, vector2 * weights
+
+    norm = np.linalg.norm(vector1) * np.linalg.norm(vector2)
+    return float(vector1 @ vector2 / norm) if norm else 0.0
+
+
+def pair_fitted_tfidf_cosines(matrix1: csr_matrix, matrix2: csr_matrix) -> np.ndarray:
+    """
+    TF-IDF cosine of every row pair of two term-count matrices (same columns),
+    each pair weighted as a TfidfVectorizer fitted on just that pair.
+
+    For a pair fit, shared terms have idf 1 and the others _SINGLE_DF_IDF, so
+    all pairs follow from three sparse products instead of one vectorizer fit
+    per pair (max_features is not applied). Pairs where neither row has a
+    term (scikit-learn would raise on the empty vocabulary) are NaN.
+    """
+    matrix1 = csr_matrix(matrix1, dtype=np.float64)
+    matrix2 = csr_matrix(matrix2, dtype=np.float64)
+    present1, present2 = (matrix1 > 0).astype(np.float64), (matrix2 > 0).astype(np.float64)
+    squares1, squares2 = matrix1.multiply(matrix1), matrix2.multiply(matrix2)
+
+    dot = (matrix1 @ matrix2.T).toarray()
+    shared1 = (squares1 @ present2.T).toarray()
+    shared2 = (present1 @ squares2.T).toarray()
+    total1 = np.asarray(squares1.sum(axis=1))
+    total2 = np.asarray(squares2.sum(axis=1)).T
+
+    weight = _SINGLE_DF_IDF ** 2
+    norms = np.sqrt((weight * (total1 - shared1) + shared1) * (weight * (total2 - shared2) + shared2))
+    scores = np.divide(dot, norms, out=np.zeros_like(dot), where=norms > 0)
+
+    empty1 = np.diff(matrix1.indptr) == 0
+    empty2 = np.diff(matrix2.indptr) == 0
+    scores[empty1[:, None] & empty2[None, :]] = np.nan
+    return scores
+
+
+def query_pair_cosines(counts: csr_matrix, max_features: Optional[int] = None, idf: bool = True) -> np.ndarray:
+    """
+    pair_cosine() of row 0 of a term-count matrix against each other row.
+
+    All pairs come from sparse products over the whole matrix; only pairs
+    with more distinct terms than max_features, whose vectors the cut
+    changes, are scored one by one. Pairs without any term score 0.
+    """
+    counts = csr_matrix(counts)
+    counts.sort_indices()
+    if idf:
+        cosines = np.nan_to_num(pair_fitted_tfidf_cosines(counts[:1], counts[1:])[0])
+    else:
+        rows = normalize(counts.astype(np.float64))
+        cosines = (rows[1:] @ rows[0].T).toarray().ravel()
+
+    if max_features:
+        present = (counts > 0).astype(np.int64)
+        distinct = np.diff(present.indptr)
+        shared = (present[1:] @ present[0].T).toarray().ravel()
+        query = counts[0]
+        for i in np.flatnonzero(distinct[0] + distinct[1:] - shared > max_features):
+            row = counts[i + 1]
+            cosines[i] = pair_cosine(query.indices, query.data, row.indices, row.data,
+                                     max_features=max_features, idf=idf)
+    return cosines
+
+
+def chunk_tfidf_cosines(bundle1: FeatureBundle, bundle2: FeatureBundle) -> np.ndarray:
+    """Pair-fitted TF-IDF cosine of every chunk pair, from the stored chunk term counts."""
+    terms1, terms2 = bundle1['chunk_terms'], bundle2['chunk_terms']
+    vocabulary, columns = np.unique(np.concatenate([terms1, terms2]), return_inverse=True)
+    shape1 = (len(bundle1['chunk_term_indptr']) - 1, len(vocabulary))
+    shape2 = (len(bundle2['chunk_term_indptr']) - 1, len(vocabulary))
+    matrix1 = csr_matrix((bundle1['chunk_counts'], columns[:len(terms1)], bundle1['chunk_term_indptr']), shape=shape1)
+    matrix2 = csr_matrix((bundle2['chunk_counts'], columns[len(terms1):], bundle2['chunk_term_indptr']), shape=shape2)
+    return pair_fitted_tfidf_cosines(matrix1, matrix2)
+
+
+def embedding_cosines(vectors1: Optional[np.ndarray], vectors2: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    """Cosine matrix of two sets of stored (L2-normalised) embeddings, or None if either is missing."""
+    if vectors1 is None or vectors2 is None or not len(vectors1) or not len(vectors2):
+        return None
+    if vectors1.shape[1] != vectors2.shape[1]:
+        # Bundles embedded by different models
+        return None
+    return vectors1 @ vectors2.T
+
+
+def bundle_inputs(bundle1: FeatureBundle, bundle2: FeatureBundle) -> Dict[str, int]:
+    """MetricPlanner.measure_inputs() of the two original texts."""
+    return {
+        'n1': bundle1.meta['inputs']['n'],
+        'n2': bundle2.meta['inputs']['n'],
+        's1': bundle1.meta['inputs']['s'],
+        's2': bundle2.meta['inputs']['s'],
+    }
+
+
+class FeatureStore:
+    """Feature bundles of the uploaded documents, one file per document."""
+
+    def __init__(self, directory: str, similarity_service, scoring_cascade):
+        """
+        Args:
+            directory: Folder holding one <file_id>.bundle per document
+            similarity_service: AdvancedSimilarityService (tokenizer, stopwords, TF-IDF analyzer)
+            scoring_cascade: ScoringCascade whose MinHash family the signatures use
+        """
+        self.directory = directory
+        self.similarity_service = similarity_service
+        self.scoring_cascade = scoring_cascade
+        os.makedirs(directory, exist_ok=True)
+
+    def params(self) -> Dict:
+        """Settings the stored features depend on; bundles written with others are rebuilt."""
+        vectorizer = self.similarity_service.tfidf_vectorizer
+        return {
+            'token_hash': 'blake2b-64',
+            'minhash_perm': self.scoring_cascade.minhasher.num_perm,
+            'ngram_range': list(vectorizer.ngram_range),
+            'stop_words': vectorizer.stop_words
+        }
+
+    def path(self, file_id: str) -> str:
+        return os.path.join(self.directory, f"{file_id}.bundle")
+
+    def has_document(self, file_id: str) -> bool:
+        return os.path.exists(self.path(file_id))
+
+    @instrument('features.extract')
+    def extract(self, text: str, langchain_service=None) -> Tuple[Dict[str, np.ndarray], Dict]:
+        """
+        Compute the sections and metadata of a document's bundle.
+
+        Args:
+            text: Document text
+            langchain_service: Adds the chunk term counts and embeddings when given
+        """
+        service = self.similarity_service
+        tokens = service.tokenize_with_offsets(text)
+        words = [token for token, _, _ in tokens]
+
+        content = set(self.scoring_cascade.content_tokens(text))
+        analyzer = clone(service.tfidf_vectorizer).build_analyzer()
+        terms, counts, orders = term_counts(analyzer(' '.join(words)))
+        inputs = MetricPlanner.measure_inputs(text, '')
+
+        sections = {
+            'token_ids': np.fromiter((_token_hash(word) for word in words), dtype=np.uint64, count=len(words)),
+            'token_spans': np.array([(start, end) for _, start, end in tokens], dtype=np.int64).reshape(-1, 2),
+            'content_mask': np.fromiter(
+                (len(word) > 2 and word not in service.stop_words for word in words), dtype=np.uint8, count=len(words)
+            ),
+            'sentence_ranges': sentence_token_ranges(words),
+            'minhash': self.scoring_cascade.minhasher.signature(content),
+            'terms': terms,
+            'term_counts': counts,
+            'term_orders': orders,
+        }
+        meta = {
+            'params': self.params(),
+            'token_count': len(words),
+            'length': len(text.strip()),
+            'content_size': len(content),
+            'inputs': {'n': inputs['n1'], 's': inputs['s1']},
+            'embedding_dim': None
+        }
+
+        if langchain_service is not None:
+            chunk_sections, chunk_meta = langchain_service.bundle_features(text)
+            sections.update(chunk_sections)
+            meta.update(chunk_meta)
+        return sections, meta
+
+    def write(self, file_id: str, text: str, langchain_service=None) -> Dict:
+        """
+        Extract and store a document's bundle.
+
+        Returns:
+            Dict with the bundle size and its section names
+        """
+        sections, meta = self.extract(text, langchain_service)
+        meta['file_id'] = file_id
+        FeatureBundle.write(self.path(file_id), sections, meta)
+        return {'file_id': file_id, 'bytes': os.path.getsize(self.path(file_id)), 'sections': sorted(sections)}
+
+    @staticmethod
+    def covers(bundle: FeatureBundle, langchain_service=None) -> bool:
+        """Whether a bundle has every section the given LangChain service would add."""
+        if langchain_service is None:
+            return True
+        if 'chunk_term_indptr' not in bundle:
+            return False
+        return bool(bundle.meta['embedding_dim']) or not langchain_service.embeddings
+
+    def add_langchain_sections(self, bundle: FeatureBundle, text: str, langchain_service) -> Dict:
+        """
+        Rewrite a stored bundle with the LangChain sections added.
+
+        The token-level sections are copied over, not recomputed. The caller
+        closes the old bundle and opens the new one.
+        """
+        sections = {name: np.array(bundle[name]) for name in bundle.section_names}
+        meta = dict(bundle.meta)
+        chunk_sections, chunk_meta = langchain_service.bundle_features(text)
+        sections.update(chunk_sections)
+        meta.update(chunk_meta)
+        FeatureBundle.write(bundle.path, sections, meta)
+        return {'file_id': meta['file_id'], 'bytes': os.path.getsize(bundle.path), 'sections': sorted(sections)}
+
+    def open(self, file_id: str) -> Optional[FeatureBundle]:
+        """The document's bundle, or None if it is missing or was written with other settings."""
+        try:
+            bundle = FeatureBundle(self.path(file_id))
+        except (FileNotFoundError, BundleError):
+            return None
+        if bundle.meta.get('params') != self.params():
+            bundle.close()
+            return None
+        return bundle
+
+    def remove(self, file_id: str) -> bool:
+        try:
+            os.remove(self.path(file_id))
+            return True
+        except FileNotFoundError:
+            return False
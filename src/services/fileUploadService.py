@@ -10,6 +10,9 @@ from werkzeug.utils import secure_filename
 import PyPDF2
 import docx
 import json
+from src.utils.instrumentation import instrument, record_error
+from src.utils.uploadStream import UploadSink, UploadTooLarge, copy_stream, mapped_file
+from src.utils.validators import DocumentValidator
 
 class FileUploadService:
     """Service for handling file uploads and processing."""
@@ -21,6 +24,7 @@ class FileUploadService:
             'txt', 'pdf', 'doc', 'docx', 'rtf'
         }
         self.max_file_size = 16 * 1024 * 1024  # 16MB
+        self.validator = DocumentValidator()
         
         # Create upload folder if it doesn't exist
         os.makedirs(self.upload_folder, exist_ok=True)
@@ -34,8 +38,10 @@ class FileUploadService:
         """Extract text from PDF file."""
         try:
             text = ""
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
+            with mapped_file(file_path) as mapped:
+                if mapped is None:
+                    return ""
+                pdf_reader = PyPDF2.PdfReader(mapped)
                 for page in pdf_reader.pages:
                     text += page.extract_text() + "\n"
             return text
@@ -46,7 +52,10 @@ class FileUploadService:
     def extract_text_from_docx(self, file_path):
         """Extract text from DOCX file."""
         try:
-            doc = docx.Document(file_path)
+            with mapped_file(file_path) as mapped:
+                if mapped is None:
+                    return ""
+                doc = docx.Document(mapped)
             text = ""
             for paragraph in doc.paragraphs:
                 text += paragraph.text + "\n"
@@ -58,13 +67,13 @@ class FileUploadService:
     def extract_text_from_txt(self, file_path):
         """Extract text from TXT file."""
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read()
+            with mapped_file(file_path) as mapped:
+                return str(mapped, 'utf-8') if mapped is not None else ""
         except UnicodeDecodeError:
             # Try with different encoding
             try:
-                with open(file_path, 'r', encoding='latin-1') as file:
-                    return file.read()
+                with mapped_file(file_path) as mapped:
+                    return str(mapped, 'latin-1')
             except Exception as e:
                 print(f"Error extracting text from TXT: {e}")
                 return ""
@@ -72,6 +81,7 @@ class FileUploadService:
             print(f"Error extracting text from TXT: {e}")
             return ""
     
+    @instrument('extraction')
     def extract_text(self, file_path, file_extension):
         """Extract text from file based on its extension."""
         try:
@@ -85,10 +95,28 @@ class FileUploadService:
                 return ""
         except Exception as e:
             print(f"Error extracting text: {e}")
+            record_error('extraction')
             return ""
     
+    def receive(self, file):
+        """
+        Sink holding the upload's bytes, digest and size.
+
+        Flask requests parse multipart bodies straight into an UploadSink (see
+        app.py); any other file object is copied into one in a single pass.
+        """
+        if isinstance(file.stream, UploadSink):
+            return file.stream
+        sink = UploadSink(self.upload_folder, self.max_file_size)
+        try:
+            return copy_stream(file.stream, sink)
+        except Exception:
+            sink.close()
+            raise
+    
     def save_file(self, file):
         """Save uploaded file and extract text."""
+        sink = None
         try:
             if not file or not self.allowed_file(file.filename):
                 return {
@@ -108,8 +136,19 @@ class FileUploadService:
             text_file_path = os.path.join(self.upload_folder, f"{file_id}.txt")
             metadata_file_path = os.path.join(self.upload_folder, f"{file_id}.json")
             
-            # Save the uploaded file
-            file.save(uploaded_file_path)
+            # Save the uploaded file (hashed, size-checked and sniffed as it was written)
+            sink = self.receive(file)
+            if sink.size < self.validator.min_file_size:
+                return {
+                    'success': False,
+                    'error': 'File is empty or too small'
+                }
+            if not self.validator.validate_mime_bytes(original_filename, sink.head):
+                return {
+                    'success': False,
+                    'error': 'Invalid file type'
+                }
+            sink.commit(uploaded_file_path)
             
             # Extract text from the file
             extracted_text = self.extract_text(uploaded_file_path, file_extension)
@@ -133,7 +172,8 @@ class FileUploadService:
                 'original_filename': original_filename,
                 'file_extension': file_extension,
                 'upload_timestamp': datetime.now().isoformat(),
-                'file_size': os.path.getsize(uploaded_file_path),
+                'file_size': sink.size,
+                'sha256': sink.sha256,
                 'text_length': len(extracted_text),
                 'word_count': len(extracted_text.split()),
                 'status': 'processed'
@@ -150,12 +190,23 @@ class FileUploadService:
                 'word_count': len(extracted_text.split())
             }
         
+        except UploadTooLarge:
+            return {
+                'success': False,
+                'error': 'File too large. Maximum size is 16MB.'
+            }
+        
         except Exception as e:
             print(f"Error saving file: {e}")
             return {
                 'success': False,
                 'error': str(e)
             }
+        
+        finally:
+            # Removes the temporary file unless it was committed
+            if sink is not None:
+                sink.close()
     
     def get_file_data(self, file_id):
         """Get file data including text and metadata."""
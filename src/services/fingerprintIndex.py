@@ -0,0 +1,459 @@
+"""
+Winnowing fingerprint index (MOSS-style) for copied-passage detection.
+Hashes k-grams of the normalized token stream, keeps the winnowed
+fingerprints of every document in a persistent hash -> (file_id, offset)
+index and assembles query hits into aligned passages with character offsets.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import defaultdict, deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Fingerprints are stored as signed SQLite integers
+_HASH_MASK = (1 << 63) - 1
+_BASE = 1000003
+
+
+def _token_hash(token: str) -> int:
+    """Stable 64-bit hash of a token (Python's hash() is salted per process)."""
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def kgram_hashes(tokens: List[str], k: int) -> List[int]:
+    """Rolling polynomial hashes of every k-gram of tokens."""
+    if len(tokens) < k:
+        return []
+
+    token_hashes = [_token_hash(t) for t in tokens]
+    high = pow(_BASE, k - 1, 1 << 64)
+    h = 0
+    for value in token_hashes[:k]:
+        h = (h * _BASE + value) & 0xFFFFFFFFFFFFFFFF
+
+    hashes = [h & _HASH_MASK]
+    for i in range(k, len(token_hashes)):
+        h = (h - token_hashes[i - k] * high) & 0xFFFFFFFFFFFFFFFF
+        h = (h * _BASE + token_hashes[i]) & 0xFFFFFFFFFFFFFFFF
+        hashes.append(h & _HASH_MASK)
+    return hashes
+
+
+def winnow(hashes: List[int], window: int) -> List[Tuple[int, int]]:
+    """
+    Select fingerprints with the winnowing algorithm.
+
+    In every window of `window` consecutive hashes the minimum (rightmost on
+    ties) is selected; each selected position is recorded once. Any shared
+    run of at least window + k - 1 tokens yields a shared fingerprint.
+
+    Returns:
+        List of (hash, k-gram position)
+    """
+    if not hashes:
+        return []
+    if len(hashes) <= window:
+        position = min(range(len(hashes)), key=lambda i: (hashes[i], -i))
+        return [(hashes[position], position)]
+
+    selected = []
+    candidates = deque()  # positions with increasing hash values
+    last = -1
+    for i, h in enumerate(hashes):
+        while candidates and hashes[candidates[-1]] >= h:
+            candidates.pop()
+        candidates.append(i)
+        if candidates[0] <= i - window:
+            candidates.popleft()
+        if i >= window - 1 and candidates[0] != last:
+            last = candidates[0]
+            selected.append((hashes[last], last))
+    return selected
+
+
+def assemble_passages(hits: List[Tuple], k: int, max_gap: int) -> List[Dict]:
+    """
+    Merge fingerprint hits into aligned passages.
+
+    Hits on the same diagonal (source position - query position) that are at
+    most max_gap tokens apart are joined into one passage.
+
+    Args:
+        hits: (query_pos, source_pos, query_start, query_end, source_start, source_end) tuples
+        k: k-gram length in tokens
+        max_gap: Largest token gap bridged inside a passage
+
+    Returns:
+        Passages with token and character spans, longest first
+    """
+    by_diagonal = defaultdict(list)
+    for hit in hits:
+        by_diagonal[hit[1] - hit[0]].append(hit)
+
+    passages = []
+    for diagonal_hits in by_diagonal.values():
+        diagonal_hits.sort()
+        current = None
+        for q_pos, s_pos, q_start, q_end, s_start, s_end in diagonal_hits:
+            if current and q_pos - current['query_token_end'] <= max_gap:
+                current['query_token_end'] = q_pos + k
+                current['query_end'] = max(current['query_end'], q_end)
+                current['source_end'] = max(current['source_end'], s_end)
+                current['fingerprints'] += 1
+                continue
+            if current:
+                passages.append(current)
+            current = {
+                'query_token_start': q_pos,
+                'query_token_end': q_pos + k,
+                'source_token_start': s_pos,
+                'query_start': q_start,
+                'query_end': q_end,
+                'source_start': s_start,
+                'source_end': s_end,
+                'fingerprints': 1
+            }
+        if current:
+            passages.append(current)
+
+    for passage in passages:
+        passage['token_length'] = passage['query_token_end'] - passage['query_token_start']
+    passages.sort(key=lambda p: p['token_length'], reverse=True)
+    return passages
+
+
+def token_coverage(passages: List[Dict], token_count: int) -> float:
+    """Fraction of query tokens covered by the union of passages."""
+    if not token_count or not passages:
+        return 0.0
+    spans = sorted((p['query_token_start'], p['query_token_end']) for p in passages)
+    covered = 0
+    current_start, current_end = spans[0]
+    for start, end in spans[1:]:
+        if start > current_end:
+            covered += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    covered += current_end - current_start
+    return min(covered / token_count, 1.0)
+
+
+def fingerprint_text(text: str, tokenizer: Callable, k: int, window: int) -> Tuple[List[Tuple[int, int, int, int]], int]:
+    """
+    Winnowed fingerprints of a text.
+
+    Returns:
+        ([(hash, token_pos, char_start, char_end), ...], token_count)
+    """
+    tokens = tokenizer(text)
+    hashes = kgram_hashes([t[0] for t in tokens], k)
+    fingerprints = [
+        (h, pos, tokens[pos][1], tokens[pos + k - 1][2])
+        for h, pos in winnow(hashes, window)
+    ]
+    return fingerprints, len(tokens)
+
+
+def summarize_matches(passages_by_document: Dict[str, List[Dict]], token_count: int,
+                      max_documents: int = 10, max_passages: Optional[int] = 20) -> Dict:
+    """
+    Per-document coverage and passages of a query, best documents first.
+
+    Args:
+        passages_by_document: {file_id: passages} as found by match_fingerprints
+        token_count: Number of query tokens
+        max_documents: Number of matching documents to return
+        max_passages: Passages returned per document (None for all)
+    """
+    documents = []
+    all_passages = []
+    for file_id, passages in passages_by_document.items():
+        all_passages.extend(passages)
+        documents.append({
+            'file_id': file_id,
+            'coverage': round(token_coverage(passages, token_count), 3),
+            'passage_count': len(passages),
+            'passages': passages[:max_passages]
+        })
+
+    documents.sort(key=lambda d: d['coverage'], reverse=True)
+    return {
+        'token_count': token_count,
+        'coverage': round(token_coverage(all_passages, token_count), 3),
+        'documents': documents[:max_documents]
+    }
+
+
+def _default_tokenizer():
+    from src.services.advancedSimilarityService import AdvancedSimilarityService
+    return AdvancedSimilarityService().tokenize_with_offsets
+
+
+class FingerprintIndex:
+    """
+    Persistent winnowing fingerprint index backed by SQLite.
+
+    Each fingerprint row maps a k-gram hash to the document, token position
+    and character span it came from. Queries look up the fingerprints of a
+    text, skip hashes shared by too many documents (boilerplate) and
+    assemble the hits into passages, in time roughly linear in the query
+    length plus the number of hits.
+    """
+
+    def __init__(self, db_path: str, tokenizer: Optional[Callable] = None,
+                 k: int = 5, window: int = 4, max_postings: int = 1000):
+        """
+        Open (or create) a fingerprint index.
+
+        Args:
+            db_path: SQLite database file
+            tokenizer: Callable returning (token, start, end) tuples; defaults to
+                       AdvancedSimilarityService.tokenize_with_offsets
+            k: k-gram length in tokens
+            window: Winnowing window size
+            max_postings: Hashes with more postings than this are ignored at query time
+        """
+        self.db_path = db_path
+        self.tokenizer = tokenizer  # Resolved on first use; shard servers never tokenize
+        self.k = k
+        self.window = window
+        self.max_postings = max_postings
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = None
+        self._pid = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        SQLite connection of the current process, opened on first use.
+
+        A connection must not be carried across fork(): a pre-forking server
+        that builds the index in its master gets a fresh connection in every
+        worker instead. Called with self._lock held.
+        """
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    hash INTEGER NOT NULL,
+                    file_id TEXT NOT NULL,
+                    token_pos INTEGER NOT NULL,
+                    start INTEGER NOT NULL,
+                    end INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_fingerprints_hash ON fingerprints(hash);
+                CREATE INDEX IF NOT EXISTS idx_fingerprints_file ON fingerprints(file_id);
+                CREATE TABLE IF NOT EXISTS documents (
+                    file_id TEXT PRIMARY KEY,
+                    token_count INTEGER NOT NULL,
+                    fingerprint_count INTEGER NOT NULL
+                );
+            ''')
+            conn.commit()
+            # The parent's connection is left alone; closing it here could
+            # disturb the process that opened it
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def fingerprint(self, text: str) -> Tuple[List[Tuple[int, int, int, int]], int]:
+        """
+        Winnowed fingerprints of a text.
+
+        Returns:
+            ([(hash, token_pos, char_start, char_end), ...], token_count)
+        """
+        if self.tokenizer is None:
+            self.tokenizer = _default_tokenizer()
+        return fingerprint_text(text, self.tokenizer, self.k, self.window)
+
+    def has_document(self, file_id: str) -> bool:
+        """Check whether a document is indexed."""
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute('SELECT 1 FROM documents WHERE file_id = ?', (file_id,)).fetchone()
+        return row is not None
+
+    def token_count(self, file_id: str) -> Optional[int]:
+        """Number of tokens of an indexed document (None if not indexed)."""
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute('SELECT token_count FROM documents WHERE file_id = ?', (file_id,)).fetchone()
+        return row[0] if row else None
+
+    def add_document(self, file_id: str, text: str) -> int:
+        """
+        Fingerprint a document and add it to the index (replacing any previous version).
+
+        Returns:
+            Number of fingerprints stored
+        """
+        fingerprints, token_count = self.fingerprint(text)
+        return self.add_fingerprints(file_id, fingerprints, token_count)
+
+    def add_fingerprints(self, file_id: str, fingerprints: List[Tuple[int, int, int, int]], token_count: int) -> int:
+        """Store precomputed fingerprints of a document (see fingerprint())."""
+        with self._lock:
+            conn = self._connection()
+            conn.execute('DELETE FROM fingerprints WHERE file_id = ?', (file_id,))
+            conn.executemany(
+                'INSERT INTO fingerprints (hash, file_id, token_pos, start, end) VALUES (?, ?, ?, ?, ?)',
+                [(h, file_id, pos, start, end) for h, pos, start, end in fingerprints]
+            )
+            conn.execute(
+                'INSERT OR REPLACE INTO documents (file_id, token_count, fingerprint_count) VALUES (?, ?, ?)',
+                (file_id, token_count, len(fingerprints))
+            )
+            conn.commit()
+        return len(fingerprints)
+
+    def remove_document(self, file_id: str) -> int:
+        """
+        Remove a document's fingerprints.
+
+        Returns:
+            Number of fingerprints removed
+        """
+        with self._lock:
+            conn = self._connection()
+            removed = conn.execute('DELETE FROM fingerprints WHERE file_id = ?', (file_id,)).rowcount
+            conn.execute('DELETE FROM documents WHERE file_id = ?', (file_id,))
+            conn.commit()
+        return removed
+
+    def _lookup(self, hashes: List[int]) -> Dict[int, List[Tuple]]:
+        """Postings for each hash, dropping over-frequent hashes."""
+        postings = defaultdict(list)
+        unique = list(set(hashes))
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = conn.execute(
+                    f'SELECT hash, file_id, token_pos, start, end FROM fingerprints WHERE hash IN ({placeholders})',
+                    batch
+                )
+                for h, file_id, pos, s_start, s_end in rows:
+                    postings[h].append((file_id, pos, s_start, s_end))
+        return {h: p for h, p in postings.items() if len(p) <= self.max_postings}
+
+    def query(self, text: str, exclude_file_id: Optional[str] = None,
+              max_documents: int = 10, max_passages: int = 20) -> Dict:
+        """
+        Find passages of a text that also occur in indexed documents.
+
+        Args:
+            text: Query text
+            exclude_file_id: Document to leave out (usually the query document itself)
+            max_documents: Number of matching documents to return
+            max_passages: Passages returned per document (None for all)
+
+        Returns:
+            Dictionary with per-document passages and coverage, and overall coverage
+        """
+        fingerprints, token_count = self.fingerprint(text)
+        return summarize_matches(
+            self.match_fingerprints(fingerprints, exclude_file_id), token_count, max_documents, max_passages
+        )
+
+    def match_fingerprints(self, fingerprints: List[Tuple[int, int, int, int]],
+                           exclude_file_id: Optional[str] = None) -> Dict[str, List[Dict]]:
+        """
+        Passages shared with each indexed document, from a query's fingerprints.
+
+        Returns:
+            {file_id: passages}, passages longest first
+        """
+        postings = self._lookup([f[0] for f in fingerprints])
+
+        hits_by_document = defaultdict(list)
+        for h, q_pos, q_start, q_end in fingerprints:
+            for file_id, s_pos, s_start, s_end in postings.get(h, ()):
+                if file_id != exclude_file_id:
+                    hits_by_document[file_id].append((q_pos, s_pos, q_start, q_end, s_start, s_end))
+
+        max_gap = self.window + self.k
+        passages_by_document = {}
+        for file_id, hits in hits_by_document.items():
+            passages = assemble_passages(hits, self.k, max_gap)
+            for passage in passages:
+                passage['file_id'] = file_id
+            passages_by_document[file_id] = passages
+        return passages_by_document
+
+    def stats(self) -> Dict:
+        """Index size summary."""
+        with self._lock:
+            conn = self._connection()
+            documents, fingerprints = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(fingerprint_count), 0) FROM documents'
+            ).fetchone()
+        return {'documents': documents, 'fingerprints': fingerprints}
+
+
+def match_texts(text1: str, text2: str, tokenizer: Callable, k: int = 5, window: int = 4) -> Dict:
+    """
+    Passages shared by two texts, using the same fingerprinting as the index.
+
+    Args:
+        text1: Query text (passage offsets refer to this text as 'query_*')
+        text2: Source text ('source_*' offsets)
+        tokenizer: Callable returning (token, start, end) tuples
+        k: k-gram length in tokens
+        window: Winnowing window size
+
+    Returns:
+        Dictionary with passages and the fraction of text1 tokens they cover
+    """
+    tokens1, tokens2 = tokenizer(text1), tokenizer(text2)
+    fingerprints2 = defaultdict(list)
+    for h, pos in winnow(kgram_hashes([t[0] for t in tokens2], k), window):
+        fingerprints2[h].append(pos)
+
+    hits = []
+    for h, q_pos in winnow(kgram_hashes([t[0] for t in tokens1], k), window):
+        for s_pos in fingerprints2.get(h, ()):
+            hits.append((
+                q_pos, s_pos,
+                tokens1[q_pos][1], tokens1[q_pos + k - 1][2],
+                tokens2[s_pos][1], tokens2[s_pos + k - 1][2]
+            ))
+
+    passages = assemble_passages(hits, k, window + k)
+
+    # Both token streams are at hand, so grow each passage to its full extent
+    for p in passages:
+        q_start, q_end = p['query_token_start'], p['query_token_end']
+        s_start = p['source_token_start']
+        s_end = s_start + (q_end - q_start)
+        while q_start > 0 and s_start > 0 and tokens1[q_start - 1][0] == tokens2[s_start - 1][0]:
+            q_start -= 1
+            s_start -= 1
+        while q_end < len(tokens1) and s_end < len(tokens2) and tokens1[q_end][0] == tokens2[s_end][0]:
+            q_end += 1
+            s_end += 1
+        p.update({
+            'query_token_start': q_start,
+            'query_token_end': q_end,
+            'source_token_start': s_start,
+            'token_length': q_end - q_start,
+            'query_start': tokens1[q_start][1],
+            'query_end': tokens1[q_end - 1][2],
+            'source_start': tokens2[s_start][1],
+            'source_end': tokens2[s_end - 1][2]
+        })
+    passages.sort(key=lambda p: p['token_length'], reverse=True)
+
+    return {
+        'token_count': len(tokens1),
+        'coverage': round(token_coverage(passages, len(tokens1)), 3),
+        'passages': passages
+    }
@@ -0,0 +1,370 @@
+"""
+Machine-generated (ghostwritten) text detection, per sentence.
+Sentences are scored in batches by a small CPU backend: either perplexity
+under a tiny causal language model (low perplexity suggests generated text)
+or a logistic-regression classifier over lexical features of the sentence.
+Scores are cached per sentence hash, so re-analysing a document or a
+revision of it only scores the sentences that changed.
+"""
+
+import hashlib
+import io
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from src.services.stylometryIndex import FUNCTION_WORDS
+from src.services.vectorIndexService import split_with_offsets
+from src.utils.instrumentation import instrument, measure, record_error
+from src.utils.readability import syllable_count
+
+try:
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+    LANGUAGE_MODEL_AVAILABLE = True
+except Exception as e:
+    print(f"Warning: Language model backend not available: {e}")
+    LANGUAGE_MODEL_AVAILABLE = False
+
+DEFAULT_LANGUAGE_MODEL = 'distilgpt2'
+DEFAULT_CLASSIFIER_PATH = os.path.join('models', 'ghostwriting', 'classifier.npz')
+BACKEND_NAMES = ('perplexity', 'features')
+
+# Sentences shorter than this carry too little signal to score
+MIN_SENTENCE_WORDS = 5
+
+_FUNCTION_WORD_SET = frozenset(FUNCTION_WORDS)
+_WORDS = re.compile(r"[A-Za-z]+(?:'[A-Za-z]+)?")
+
+FEATURE_NAMES = (
+    'log_words', 'mean_word_length', 'syllables_per_word', 'polysyllable_rate', 'type_token_ratio',
+    'function_word_rate', 'comma_rate', 'punctuation_rate', 'capitalized_rate', 'digit_rate'
+)
+
+
+def split_sentences(text: str) -> List[tuple]:
+    """(sentence, start, end) of every sentence of a text, split after . ! or ?"""
+    def chunker(value):
+        return [s.strip() for s in re.split(r'(?<=[.!?])\s+', value) if s.strip()]
+    return split_with_offsets(text, chunker)
+
+
+def sentence_features(sentences: Sequence[str]) -> np.ndarray:
+    """
+    Lexical features of each sentence (rows follow FEATURE_NAMES).
+
+    Only the sentence itself is used, never its neighbours, so a sentence's
+    score does not depend on the document it appears in and can be cached.
+    """
+    rows = np.zeros((len(sentences), len(FEATURE_NAMES)))
+    for i, sentence in enumerate(sentences):
+        words = _WORDS.findall(sentence)
+        if not words:
+            continue
+        count = len(words)
+        lowered = [word.lower() for word in words]
+        syllables = [syllable_count(word) for word in lowered]
+        rows[i] = (
+            math.log(count),
+            sum(len(word) for word in words) / count,
+            sum(syllables) / count,
+            sum(s >= 3 for s in syllables) / count,
+            len(set(lowered)) / count,
+            sum(word in _FUNCTION_WORD_SET for word in lowered) / count,
+            sentence.count(',') / count,
+            sum(c in ';:()-"' for c in sentence) / count,
+            sum(word[0].isupper() for word in words[1:]) / count,
+            sum(c.isdigit() for c in sentence) / max(len(sentence), 1),
+        )
+    return rows
+
+
+class PerplexityBackend:
+    """
+    Per-sentence perplexity under a small causal language model on CPU.
+
+    Sentences of a batch are sorted by length before padding, so a batch
+    wastes few padded positions. A sentence's score is a logistic of its
+    mean token negative log-likelihood: sentences the model finds more
+    predictable than `centre` nats per token score above 0.5.
+    """
+
+    name = 'perplexity'
+
+    def __init__(self, model_name: str = DEFAULT_LANGUAGE_MODEL, max_length: int = 64,
+                 centre: float = 3.0, scale: float = 0.5):
+        """
+        Args:
+            model_name: Hugging Face causal LM (distilgpt2 is 82M parameters)
+            max_length: Tokens kept per sentence
+            centre: Mean NLL (nats per token) scored 0.5; human prose under
+                    GPT-2 models is typically above it, generated text below.
+                    Not calibrated on labelled text, so /api/analyze leaves
+                    the detector off unless asked
+            scale: NLL difference that moves the score by one logit
+        """
+        if not LANGUAGE_MODEL_AVAILABLE:
+            raise RuntimeError('torch and transformers are required for the perplexity backend')
+        self.model_name = model_name
+        self.max_length = max_length
+        self.centre = centre
+        self.scale = scale
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.model = AutoModelForCausalLM.from_pretrained(model_name)
+        self.model.eval()
+
+    def negative_log_likelihoods(self, sentences: List[str]) -> np.ndarray:
+        """Mean token NLL of every sentence (one padded forward pass)."""
+        order = sorted(range(len(sentences)), key=lambda i: len(sentences[i]))
+        encoded = self.tokenizer(
+            [sentences[i] for i in order],
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors='pt'
+        )
+        with torch.inference_mode():
+            logits = self.model(**encoded).logits[:, :-1]
+            targets = encoded['input_ids'][:, 1:]
+            mask = encoded['attention_mask'][:, 1:].float()
+            token_nll = torch.nn.functional.cross_entropy(
+                logits.transpose(1, 2), targets, reduction='none'
+            )
+            nll = (token_nll * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1.0)
+
+        result = np.empty(len(sentences))
+        result[order] = nll.numpy()
+        return result
+
+    def score_batch(self, sentences: List[str]) -> np.ndarray:
+        nll = self.negative_log_likelihoods(sentences)
+        return 1.0 / (1.0 + np.exp((nll - self.centre) / self.scale))
+
+
+class FeatureClassifierBackend:
+    """
+    Logistic regression over sentence_features(), stored as plain arrays
+    (standardisation mean and scale, coefficients, intercept) in an .npz
+    written by train_feature_classifier().
+    """
+
+    name = 'features'
+
+    def __init__(self, model_path: str = DEFAULT_CLASSIFIER_PATH):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"No ghostwriting classifier at {model_path}; train one with benchmarks/ghostwriting.py --train"
+            )
+        with np.load(model_path, allow_pickle=False) as data:
+            if tuple(data['feature_names'].tolist()) != FEATURE_NAMES:
+                raise ValueError(f"{model_path} was trained on other features; retrain it")
+            self.mean = data['mean']
+            self.scale = data['scale']
+            self.coef = data['coef']
+            self.intercept = float(data['intercept'])
+        self.model_path = model_path
+
+    def score_batch(self, sentences: List[str]) -> np.ndarray:
+        logits = ((sentence_features(sentences) - self.mean) / self.scale) @ self.coef + self.intercept
+        return 1.0 / (1.0 + np.exp(-logits))
+
+
+def train_feature_classifier(human_sentences: Sequence[str], machine_sentences: Sequence[str],
+                             model_path: str = DEFAULT_CLASSIFIER_PATH, C: float = 1.0) -> Dict:
+    """
+    Fit the feature classifier on labelled sentences and save it.
+
+    Returns:
+        Dict with the training accuracy and the number of sentences per class
+    """
+    from sklearn.linear_model import LogisticRegression
+
+    features = sentence_features(list(human_sentences) + list(machine_sentences))
+    labels = np.r_[np.zeros(len(human_sentences)), np.ones(len(machine_sentences))]
+    mean = features.mean(axis=0)
+    scale = np.maximum(features.std(axis=0), 1e-6)
+    model = LogisticRegression(C=C, max_iter=1000).fit((features - mean) / scale, labels)
+
+    os.makedirs(os.path.dirname(model_path) or '.', exist_ok=True)
+    buffer = io.BytesIO()
+    np.savez(buffer, feature_names=np.array(FEATURE_NAMES), mean=mean, scale=scale,
+             coef=model.coef_[0], intercept=np.float64(model.intercept_[0]))
+    tmp_path = model_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(buffer.getvalue())
+    os.replace(tmp_path, model_path)
+
+    return {
+        'accuracy': float(model.score((features - mean) / scale, labels)),
+        'human': len(human_sentences),
+        'machine': len(machine_sentences)
+    }
+
+
+def create_ghostwriting_backend(name: Optional[str] = None):
+    """
+    Build a backend by name: 'perplexity' (tiny LM, needs torch and
+    transformers) or 'features' (trained classifier). Defaults to the
+    GHOSTWRITING_BACKEND environment variable, then 'perplexity' when a
+    language model can be loaded and 'features' otherwise.
+    """
+    name = name or os.environ.get('GHOSTWRITING_BACKEND')
+    if name is None:
+        name = 'perplexity' if LANGUAGE_MODEL_AVAILABLE else 'features'
+    if name == 'perplexity':
+        return PerplexityBackend(os.environ.get('GHOSTWRITING_MODEL', DEFAULT_LANGUAGE_MODEL))
+    if name == 'features':
+        return FeatureClassifierBackend(os.environ.get('GHOSTWRITING_CLASSIFIER', DEFAULT_CLASSIFIER_PATH))
+    raise ValueError(f"Unknown ghostwriting backend '{name}'; expected one of {BACKEND_NAMES}")
+
+
+class GhostwritingDetector:
+    """
+    Batched, cached per-sentence scoring with a latency budget.
+
+    Uncached sentences are scored in batches of batch_size. The detector
+    keeps a running estimate of the seconds per scored sentence; when a
+    document's uncached sentences would exceed the latency budget, an evenly
+    spaced subset that fits is scored and the rest are reported unscored.
+    """
+
+    def __init__(self, backend, batch_size: int = 32, cache_size: int = 100000,
+                 latency_budget: Optional[float] = None):
+        """
+        Args:
+            backend: Object with score_batch(sentences) -> array of scores in [0, 1]
+            batch_size: Sentences per backend call
+            cache_size: Sentence scores kept (LRU)
+            latency_budget: Seconds of backend time per document; defaults to
+                            GHOSTWRITING_LATENCY_BUDGET (2.0); 0 disables it
+        """
+        self.backend = backend
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        if latency_budget is None:
+            latency_budget = float(os.environ.get('GHOSTWRITING_LATENCY_BUDGET', 2.0))
+        self.latency_budget = latency_budget
+        self.seconds_per_sentence = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(sentence: str) -> bytes:
+        return hashlib.blake2b(' '.join(sentence.split()).encode('utf-8'), digest_size=16).digest()
+
+    def cache_info(self) -> Dict:
+        return {'size': len(self._cache), 'capacity': self.cache_size,
+                'seconds_per_sentence': self.seconds_per_sentence}
+
+    def _cached(self, keys: List[bytes]) -> Dict[bytes, float]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    found[key] = self._cache[key]
+        return found
+
+    def _store(self, scores: Dict[bytes, float]):
+        with self._lock:
+            self._cache.update(scores)
+            for key in scores:
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    @instrument('ghostwriting.batch')
+    def _score_batch(self, sentences: List[str]) -> np.ndarray:
+        started = time.perf_counter()
+        scores = np.asarray(self.backend.score_batch(sentences), dtype=np.float64)
+        per_sentence = (time.perf_counter() - started) / len(sentences)
+        # Running estimate for the latency budget (exponentially weighted)
+        if self.seconds_per_sentence is None:
+            self.seconds_per_sentence = per_sentence
+        else:
+            self.seconds_per_sentence = 0.8 * self.seconds_per_sentence + 0.2 * per_sentence
+        return scores
+
+    def score_sentences(self, sentences: List[str], latency_budget: Optional[float] = None) -> List[Optional[float]]:
+        """
+        Scores of sentences in [0, 1] (higher = more likely generated), None
+        for sentences too short to score or left out by the latency budget.
+        """
+        budget = self.latency_budget if latency_budget is None else latency_budget
+        keys = [self._key(sentence) for sentence in sentences]
+        scores = self._cached(keys)
+
+        pending = {}
+        for key, sentence in zip(keys, sentences):
+            if key not in scores and key not in pending and len(_WORDS.findall(sentence)) >= MIN_SENTENCE_WORDS:
+                pending[key] = sentence
+        pending_keys = list(pending)
+        if budget and self.seconds_per_sentence and len(pending_keys) > self.batch_size:
+            affordable = max(self.batch_size, int(budget / self.seconds_per_sentence))
+            if affordable < len(pending_keys):
+                chosen = np.linspace(0, len(pending_keys) - 1, affordable).round().astype(int)
+                pending_keys = [pending_keys[i] for i in np.unique(chosen)]
+
+        new_scores = {}
+        for start in range(0, len(pending_keys), self.batch_size):
+            batch_keys = pending_keys[start:start + self.batch_size]
+            batch_scores = self._score_batch([pending[key] for key in batch_keys])
+            new_scores.update(zip(batch_keys, batch_scores.tolist()))
+        self._store(new_scores)
+        scores.update(new_scores)
+        return [scores.get(key) for key in keys]
+
+    @instrument('ghostwriting')
+    def analyze(self, text: str, threshold: float = 0.5, latency_budget: Optional[float] = None) -> Dict:
+        """
+        Per-sentence ghostwriting scores of a text.
+
+        Args:
+            text: Text to analyze
+            threshold: Score at which a sentence is flagged
+            latency_budget: Seconds of backend time; overrides the detector default
+
+        Returns:
+            Dict with 'score' (word-weighted mean over scored sentences),
+            'flagged_ratio' (share of scored words in flagged sentences),
+            'sentences' (text, start, end and score of every sentence), the
+            scored/unscored counts and the backend name
+        """
+        try:
+            sentences = split_sentences(text)
+            with measure('ghostwriting.score'):
+                scores = self.score_sentences([s for s, _, _ in sentences], latency_budget)
+
+            details, total, weighted, flagged = [], 0, 0.0, 0
+            for (sentence, start, end), score in zip(sentences, scores):
+                details.append({'sentence': sentence, 'start': start, 'end': end,
+                                'score': None if score is None else round(score, 4)})
+                if score is not None:
+                    words = len(_WORDS.findall(sentence))
+                    total += words
+                    weighted += score * words
+                    flagged += words if score >= threshold else 0
+
+            scored = sum(score is not None for score in scores)
+            return {
+                'score': round(weighted / total, 4) if total else 0.0,
+                'flagged_ratio': round(flagged / total, 4) if total else 0.0,
+                'threshold': threshold,
+                'sentences': details,
+                'scored_sentences': scored,
+                'unscored_sentences': len(sentences) - scored,
+                'backend': getattr(self.backend, 'name', type(self.backend).__name__)
+            }
+        except Exception as e:
+            print(f"Error in ghostwriting detection: {e}")
+            record_error('ghostwriting')
+            return {}
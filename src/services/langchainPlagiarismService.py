@@ -59,8 +59,9 @@ from langchain_community.llms import Ollama
 
 # Standard ML imports
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.base import clone
 from difflib import SequenceMatcher
 import nltk
 from nltk.tokenize import sent_tokenize, word_tokenize
@@ -77,6 +78,75 @@ try:
 except LookupError:
     nltk.download('stopwords')
 
+from src.services.embeddingBackends import create_embedding_backend
+from src.services.featureBundle import (chunk_tfidf_cosines, embedding_cosines, pair_cosine,
+                                        pair_fitted_tfidf_cosines, query_pair_cosines, term_counts)
+from src.services.vectorIndexService import embed_texts
+from src.utils.suffixArray import repeated_passages, repetition_coverage
+from src.utils import tokenArrays
+from src.utils.tokenArrays import Vocabulary
+from src.utils.instrumentation import instrument, measure, record_error
+
+
+# Process-wide model resources, shared by every service instance. When a
+# pre-forking server loads them in the master (see preload_shared_resources),
+# workers inherit the pages copy-on-write instead of loading their own copy.
+_shared_resources = {}
+
+
+def load_shared_resources() -> Dict[str, Any]:
+    """
+    Load the embedding model, stopword set and tokenizer tables once per process.
+    
+    Returns:
+        Dictionary with 'stop_words' and 'embeddings' (None if unavailable)
+    """
+    if _shared_resources:
+        return _shared_resources
+    
+    stop_words = frozenset(stopwords.words('english'))
+    
+    # Backend is chosen per deployment: 'torch' (default), 'onnx' or 'onnx-int8'
+    backend_name = os.environ.get('EMBEDDING_BACKEND', 'torch')
+    embeddings = None
+    if EMBEDDINGS_AVAILABLE or backend_name != 'torch':
+        try:
+            embeddings = create_embedding_backend(backend_name)
+        except Exception as e:
+            print(f"Warning: Could not initialize embeddings: {e}")
+            embeddings = None
+    
+    _shared_resources['stop_words'] = stop_words
+    _shared_resources['embeddings'] = embeddings
+    return _shared_resources
+
+
+def preload_shared_resources() -> Dict[str, Any]:
+    """
+    Load and warm up all shared resources before worker processes are forked.
+    
+    Besides loading the model weights, this runs one tokenization so that the
+    punkt and tagger pickles held in NLTK's resource cache also live in the
+    master process. The model is deliberately not run: a forward pass starts
+    the OpenMP thread pool, and a forked child that inherits it can deadlock
+    in libgomp (workers set their thread count in gunicorn's post_fork).
+    """
+    resources = load_shared_resources()
+    
+    try:
+        sent_tokenize("Warm up the sentence tokenizer. It is cached by NLTK.")
+        word_tokenize("Warm up the word tokenizer.")
+    except Exception as e:
+        print(f"Warning: Could not warm up NLTK tokenizers: {e}")
+    
+    try:
+        from nltk.tag import pos_tag
+        pos_tag(['warm', 'up'])
+    except Exception as e:
+        print(f"Warning: Could not warm up POS tagger: {e}")
+    
+    return resources
+
 
 class LangChainPlagiarismService:
     """
@@ -86,19 +156,11 @@ class LangChainPlagiarismService:
     
     def __init__(self):
         """Initialize LangChain plagiarism service."""
-        self.stop_words = set(stopwords.words('english'))
-        
-        # Initialize embeddings using HuggingFace (with fallback)
-        self.embeddings = None
-        if EMBEDDINGS_AVAILABLE:
-            try:
-                self.embeddings = HuggingFaceEmbeddings(
-                    model_name="all-MiniLM-L6-v2",
-                    model_kwargs={'device': 'cpu'}
-                )
-            except Exception as e:
-                print(f"Warning: Could not initialize embeddings: {e}")
-                self.embeddings = None
+        # Model and stopwords are shared process-wide (loaded once, or
+        # inherited from a pre-forking master)
+        resources = load_shared_resources()
+        self.stop_words = resources['stop_words']
+        self.embeddings = resources['embeddings']
         
         # Text splitters for chunking
         self.use_text_splitter = TEXT_SPLITTER_AVAILABLE
@@ -119,6 +181,7 @@ class LangChainPlagiarismService:
             max_features=5000
         )
     
+    @instrument('preprocessing.langchain')
     def preprocess_text(self, text: str) -> str:
         """Preprocess text for analysis."""
         # Remove URLs
@@ -131,23 +194,35 @@ class LangChainPlagiarismService:
         text = ' '.join(text.split())
         return text
     
+    def split_chunks(self, text: str) -> List[str]:
+        """Split text into analysis chunks (recursive splitter, or sentences as fallback)."""
+        if self.use_text_splitter:
+            return self.recursive_splitter.split_text(text)
+        return sent_tokenize(text)
+    
+    def _analysis_chunks(self, text: str) -> List[str]:
+        """Chunks compared by the chunk-level metrics (first 10 sentences without the splitter)."""
+        if self.use_text_splitter:
+            return self.recursive_splitter.split_text(text)
+        # Fallback: split by sentences
+        return sent_tokenize(text)[:10]
+    
     def create_vector_store(self, text: str):
-        """Create a vector store from text using LangChain."""
+        """Create an in-memory FAISS vector store from text using LangChain."""
         try:
-            if not self.embeddings or not self.use_text_splitter:
+            if not self.embeddings:
                 return None
             
-            # Split text into chunks
-            chunks = self.recursive_splitter.split_text(text)
-            
-            # Create documents - simple dict-based approach instead of Document class
-            docs = [{"page_content": chunk} for chunk in chunks]
+            chunks = self.split_chunks(text)
+            if not chunks:
+                return None
             
-            return docs
+            return FAISS.from_texts(chunks, self.embeddings)
         except Exception as e:
             print(f"Error creating vector store: {e}")
             return None
     
+    @instrument('langchain.semantic')
     def semantic_similarity_langchain(self, text1: str, text2: str) -> float:
         """Calculate semantic similarity using LangChain embeddings."""
         try:
@@ -169,22 +244,18 @@ class LangChainPlagiarismService:
             return float(similarity)
         except Exception as e:
             print(f"Error in semantic similarity: {e}")
+            record_error('langchain.semantic')
             return 0.0
     
+    @instrument('langchain.chunk_level')
     def chunk_level_analysis(self, text1: str, text2: str) -> float:
         """Analyze similarity at chunk level."""
         try:
             text1 = self.preprocess_text(text1)
             text2 = self.preprocess_text(text2)
             
-            # Simple chunking if text splitter unavailable
-            if self.use_text_splitter:
-                chunks1 = self.recursive_splitter.split_text(text1)
-                chunks2 = self.recursive_splitter.split_text(text2)
-            else:
-                # Fallback: split by sentences
-                chunks1 = sent_tokenize(text1)[:10]
-                chunks2 = sent_tokenize(text2)[:10]
+            chunks1 = self._analysis_chunks(text1)
+            chunks2 = self._analysis_chunks(text2)
             
             if not chunks1 or not chunks2:
                 return 0.0
@@ -195,7 +266,7 @@ class LangChainPlagiarismService:
                 for chunk2 in chunks2:
                     # TF-IDF similarity
                     try:
-                        tfidf_matrix = self.tfidf_vectorizer.fit_transform([chunk1, chunk2])
+                        tfidf_matrix = clone(self.tfidf_vectorizer).fit_transform([chunk1, chunk2])
                         sim = cosine_similarity(tfidf_matrix)[0, 1]
                         similarities.append(sim)
                     except:
@@ -204,8 +275,10 @@ class LangChainPlagiarismService:
             return float(np.mean(similarities)) if similarities else 0.0
         except Exception as e:
             print(f"Error in chunk analysis: {e}")
+            record_error('langchain.chunk_level')
             return 0.0
     
+    @instrument('langchain.semantic_chunks')
     def semantic_chunk_matching(self, text1: str, text2: str) -> float:
         """Match chunks semantically using embeddings."""
         try:
@@ -215,13 +288,8 @@ class LangChainPlagiarismService:
             text1 = self.preprocess_text(text1)
             text2 = self.preprocess_text(text2)
             
-            # Simple chunking if text splitter unavailable
-            if self.use_text_splitter:
-                chunks1 = self.recursive_splitter.split_text(text1)
-                chunks2 = self.recursive_splitter.split_text(text2)
-            else:
-                chunks1 = sent_tokenize(text1)[:10]
-                chunks2 = sent_tokenize(text2)[:10]
+            chunks1 = self._analysis_chunks(text1)
+            chunks2 = self._analysis_chunks(text2)
             
             if not chunks1 or not chunks2:
                 return 0.0
@@ -235,8 +303,10 @@ class LangChainPlagiarismService:
             return float(np.mean(similarities)) if similarities else 0.0
         except Exception as e:
             print(f"Error in semantic chunk matching: {e}")
+            record_error('langchain.semantic_chunks')
             return 0.0
     
+    @instrument('langchain.sentence_semantic')
     def sentence_semantic_analysis(self, text1: str, text2: str) -> float:
         """Analyze semantic similarity at sentence level."""
         try:
@@ -261,21 +331,25 @@ class LangChainPlagiarismService:
             return float(np.mean(similarities)) if similarities else 0.0
         except Exception as e:
             print(f"Error in sentence semantic analysis: {e}")
+            record_error('langchain.sentence_semantic')
             return 0.0
     
+    @instrument('langchain.tfidf')
     def tfidf_similarity(self, text1: str, text2: str) -> float:
         """Calculate TF-IDF based similarity."""
         try:
             text1 = self.preprocess_text(text1)
             text2 = self.preprocess_text(text2)
             
-            tfidf_matrix = self.tfidf_vectorizer.fit_transform([text1, text2])
+            tfidf_matrix = clone(self.tfidf_vectorizer).fit_transform([text1, text2])
             similarity = cosine_similarity(tfidf_matrix)[0, 1]
             return float(similarity)
         except Exception as e:
             print(f"Error in TF-IDF similarity: {e}")
+            record_error('langchain.tfidf')
             return 0.0
     
+    @instrument('langchain.sequence_matching')
     def sequence_matching_similarity(self, text1: str, text2: str) -> float:
         """Calculate sequence matching similarity."""
         try:
@@ -286,28 +360,101 @@ class LangChainPlagiarismService:
             return float(matcher.ratio())
         except Exception as e:
             print(f"Error in sequence matching: {e}")
+            record_error('langchain.sequence_matching')
             return 0.0
     
+    @instrument('langchain.token_overlap')
     def token_overlap_similarity(self, text1: str, text2: str) -> float:
         """Calculate token overlap (Jaccard) similarity."""
         try:
             text1 = self.preprocess_text(text1)
             text2 = self.preprocess_text(text2)
             
-            tokens1 = set(text1.split())
-            tokens2 = set(text2.split())
-            
-            if len(tokens1) == 0 or len(tokens2) == 0:
-                return 0.0
-            
-            intersection = len(tokens1 & tokens2)
-            union = len(tokens1 | tokens2)
-            
-            return intersection / union if union > 0 else 0.0
+            return self._jaccard(set(text1.split()), set(text2.split()))
         except Exception as e:
             print(f"Error in token overlap: {e}")
+            record_error('langchain.token_overlap')
+            return 0.0
+    
+    @staticmethod
+    def _jaccard(set1, set2) -> float:
+        """Jaccard similarity of two sets (0 when either is empty)."""
+        if not set1 or not set2:
+            return 0.0
+        return len(set1 & set2) / len(set1 | set2)
+    
+    # Ensemble weights, LangChain methods weighted higher
+    METRIC_WEIGHTS = {
+        'semantic': 0.20,            # LangChain semantic
+        'chunk_level': 0.15,         # LangChain chunk level
+        'semantic_chunks': 0.15,     # LangChain semantic chunks
+        'sentence_semantic': 0.15,   # LangChain sentence semantic
+        'tfidf': 0.12,               # TF-IDF
+        'sequence_matching': 0.12,   # Sequence matching
+        'token_overlap': 0.11        # Token overlap
+    }
+    
+    def metric_tasks(self, document_text: str, comparison_text: str = None) -> Dict[str, Any]:
+        """
+        The ensemble's metrics as independent zero-argument callables.
+        
+        Lets callers run and report the metrics one by one (e.g. streaming
+        responses); calculate_plagiarism_score runs them all and combines them
+        with combine_scores. Without a comparison text the only task is the
+        document's internal repetition score.
+        
+        Returns:
+            Ordered dict of metric name -> callable, empty if the document is too short
+        """
+        if not document_text or len(document_text.strip()) < 10:
+            return {}
+        
+        if not comparison_text or len(comparison_text.strip()) < 10:
+            return {'repetition': lambda: self.repetition_score(document_text)}
+        
+        return {
+            'semantic': lambda: self.semantic_similarity_langchain(document_text, comparison_text),
+            'chunk_level': lambda: self.chunk_level_analysis(document_text, comparison_text),
+            'semantic_chunks': lambda: self.semantic_chunk_matching(document_text, comparison_text),
+            'sentence_semantic': lambda: self.sentence_semantic_analysis(document_text, comparison_text),
+            'tfidf': lambda: self.tfidf_similarity(document_text, comparison_text),
+            'sequence_matching': lambda: self.sequence_matching_similarity(document_text, comparison_text),
+            'token_overlap': lambda: self.token_overlap_similarity(document_text, comparison_text)
+        }
+    
+    @instrument('langchain.repetition')
+    def repetition_score(self, text: str, min_length: int = 8) -> float:
+        """Share of the text's tokens that repeat an earlier passage of at least min_length tokens."""
+        try:
+            ids = Vocabulary().encode(self.preprocess_text(text).split())
+            return repetition_coverage(repeated_passages(ids, min_length=min_length), len(ids))
+        except Exception as e:
+            print(f"Error in repetition score: {e}")
+            record_error('langchain.repetition')
             return 0.0
     
+    def combine_scores(self, scores: Dict[str, float]) -> Dict[str, Any]:
+        """Weighted ensemble result from the scores of every metric in metric_tasks."""
+        if 'repetition' in scores:
+            return self._repetition_result(scores['repetition'])
+        
+        overall_score = sum(scores[name] * weight for name, weight in self.METRIC_WEIGHTS.items())
+        
+        # Ensure score is between 0 and 1
+        overall_score = min(max(overall_score, 0.0), 1.0)
+        
+        result = {'overall': round(overall_score, 3)}
+        for name in self.METRIC_WEIGHTS:
+            result[name] = round(scores[name], 3)
+        result.update({
+            'algorithms_used': 7,
+            'methodology': 'LangChain Semantic Analysis + ML Ensemble',
+            'langchain_weight': 0.65,
+            'ml_weight': 0.35
+        })
+        return result
+    
+    @instrument('scoring.langchain_ensemble')
     def calculate_plagiarism_score(self, document_text: str, comparison_text: str = None) -> Dict[str, Any]:
         """
         Calculate comprehensive plagiarism score using LangChain and ML ensemble.
@@ -320,69 +467,270 @@ class LangChainPlagiarismService:
             Dictionary with detailed plagiarism analysis
         """
         try:
-            if not document_text or len(document_text.strip()) < 10:
+            tasks = self.metric_tasks(document_text, comparison_text)
+            if not tasks:
                 return self._empty_result()
             
-            # If no comparison text, use self-comparison
-            if not comparison_text or len(comparison_text.strip()) < 10:
-                comparison_text = document_text[:len(document_text)//2]
-            
             # Calculate similarities using multiple methods
+            scores = {name: task() for name, task in tasks.items()}
             
-            # 1. Semantic similarity (LangChain embeddings)
-            semantic_sim = self.semantic_similarity_langchain(document_text, comparison_text)
-            
-            # 2. Chunk-level analysis
-            chunk_sim = self.chunk_level_analysis(document_text, comparison_text)
-            
-            # 3. Semantic chunk matching
-            semantic_chunk_sim = self.semantic_chunk_matching(document_text, comparison_text)
-            
-            # 4. Sentence-level semantic analysis
-            sentence_semantic_sim = self.sentence_semantic_analysis(document_text, comparison_text)
-            
-            # 5. TF-IDF similarity
-            tfidf_sim = self.tfidf_similarity(document_text, comparison_text)
-            
-            # 6. Sequence matching
-            sequence_sim = self.sequence_matching_similarity(document_text, comparison_text)
-            
-            # 7. Token overlap
-            token_sim = self.token_overlap_similarity(document_text, comparison_text)
-            
-            # Ensemble calculation with LangChain methods weighted higher
-            overall_score = (
-                semantic_sim * 0.20 +                    # LangChain semantic
-                chunk_sim * 0.15 +                       # LangChain chunk level
-                semantic_chunk_sim * 0.15 +             # LangChain semantic chunks
-                sentence_semantic_sim * 0.15 +          # LangChain sentence semantic
-                tfidf_sim * 0.12 +                      # TF-IDF
-                sequence_sim * 0.12 +                   # Sequence matching
-                token_sim * 0.11                        # Token overlap
-            )
+            return self.combine_scores(scores)
+        
+        except Exception as e:
+            print(f"Error calculating plagiarism score: {e}")
+            record_error('scoring.langchain_ensemble')
+            return self._empty_result()
+    
+    def bundle_features(self, text: str):
+        """
+        Chunk-level sections of a document's feature bundle (see featureBundle.py).
+        
+        Stores the term counts of every analysis chunk and, with embeddings,
+        L2-normalised embeddings of the whole document, every chunk and the
+        first 5 sentences, i.e. everything the LangChain metrics embed.
+        
+        Returns:
+            (sections, meta) to merge into the bundle
+        """
+        preprocessed = self.preprocess_text(text)
+        try:
+            chunks = self._analysis_chunks(preprocessed)
+        except LookupError:
+            # Sentence fallback without the punkt model: no chunks, as chunk_level_analysis scores it
+            chunks = []
+        analyzer = clone(self.tfidf_vectorizer).build_analyzer()
+        
+        indptr, terms, counts = [0], [], []
+        for chunk in chunks:
+            chunk_terms, chunk_counts, _ = term_counts(analyzer(chunk))
+            terms.append(chunk_terms)
+            counts.append(chunk_counts)
+            indptr.append(indptr[-1] + len(chunk_terms))
+        
+        sections = {
+            'chunk_term_indptr': np.array(indptr, dtype=np.int64),
+            'chunk_terms': np.concatenate(terms) if terms else np.zeros(0, dtype=np.uint64),
+            'chunk_counts': np.concatenate(counts) if counts else np.zeros(0, dtype=np.uint32)
+        }
+        meta = {'chunk_count': len(chunks), 'embedding_dim': None}
+        
+        if self.embeddings:
+            try:
+                sentences = sent_tokenize(preprocessed)[:5]
+            except LookupError:
+                sentences = []
+            vectors = embed_texts(self.embeddings, [preprocessed] + chunks + sentences)
+            sections['document_embedding'] = vectors[:1]
+            sections['chunk_embeddings'] = vectors[1:1 + len(chunks)]
+            sections['sentence_embeddings'] = vectors[1 + len(chunks):]
+            meta['embedding_dim'] = int(vectors.shape[1])
+        
+        return sections, meta
+    
+    @staticmethod
+    def _bundle_metric(stage: str, metric) -> float:
+        """Run one bundle metric as an instrumented stage; failures score 0 like the text metrics."""
+        try:
+            with measure(stage):
+                return float(metric())
+        except Exception as e:
+            print(f"Error in {stage}: {e}")
+            return 0.0
+    
+    def bundle_metric_tasks(self, bundle1, bundle2) -> Dict[str, Any]:
+        """
+        metric_tasks() for two stored documents, computed from their feature bundles.
+        
+        Embedding metrics compare the stored vectors (0 when either bundle was
+        written without embeddings), chunk_level uses the stored chunk term
+        counts, and the ML metrics the token IDs and n-gram counts.
+        
+        Returns:
+            Ordered dict of metric name -> callable, empty if either document is too short
+        """
+        if bundle1.meta['length'] < 10 or bundle2.meta['length'] < 10:
+            return {}
+        
+        def mean_cosine(name, limit=None):
+            vectors1, vectors2 = bundle1.get(name), bundle2.get(name)
+            if limit is not None and vectors1 is not None and vectors2 is not None:
+                vectors1, vectors2 = vectors1[:limit], vectors2[:limit]
+            scores = embedding_cosines(vectors1, vectors2)
+            return float(np.mean(scores)) if scores is not None else 0.0
+        
+        def chunk_level():
+            scores = chunk_tfidf_cosines(bundle1, bundle2)
+            return float(np.nanmean(scores)) if np.isfinite(scores).any() else 0.0
+        
+        def tfidf():
+            return pair_cosine(bundle1['terms'], bundle1['term_counts'], bundle2['terms'], bundle2['term_counts'],
+                               max_features=self.tfidf_vectorizer.max_features)
+        
+        runners = {
+            'semantic': lambda: mean_cosine('document_embedding'),
+            'chunk_level': chunk_level,
+            'semantic_chunks': lambda: mean_cosine('chunk_embeddings', limit=3),
+            'sentence_semantic': lambda: mean_cosine('sentence_embeddings', limit=5),
+            'tfidf': tfidf,
+            'sequence_matching': lambda: SequenceMatcher(None, bundle1.token_list(), bundle2.token_list()).ratio(),
+            'token_overlap': lambda: tokenArrays.jaccard(np.unique(bundle1['token_ids']), np.unique(bundle2['token_ids']))
+        }
+        return {
+            name: (lambda name=name, runner=runner: self._bundle_metric(f'langchain.bundle.{name}', runner))
+            for name, runner in runners.items()
+        }
+    
+    @instrument('scoring.langchain_bundle')
+    def calculate_bundle_score(self, bundle1, bundle2) -> Dict[str, Any]:
+        """
+        calculate_plagiarism_score for two stored documents, scored from their feature bundles.
+        
+        Args:
+            bundle1: FeatureBundle of the document to analyze
+            bundle2: FeatureBundle of the document to compare against
+        """
+        try:
+            tasks = self.bundle_metric_tasks(bundle1, bundle2)
+            if not tasks:
+                return self._empty_result()
             
-            # Ensure score is between 0 and 1
-            overall_score = min(max(overall_score, 0.0), 1.0)
+            scores = {name: task() for name, task in tasks.items()}
             
-            return {
-                'overall': round(overall_score, 3),
-                'semantic': round(semantic_sim, 3),
-                'chunk_level': round(chunk_sim, 3),
-                'semantic_chunks': round(semantic_chunk_sim, 3),
-                'sentence_semantic': round(sentence_semantic_sim, 3),
-                'tfidf': round(tfidf_sim, 3),
-                'sequence_matching': round(sequence_sim, 3),
-                'token_overlap': round(token_sim, 3),
-                'algorithms_used': 7,
-                'methodology': 'LangChain Semantic Analysis + ML Ensemble',
-                'langchain_weight': 0.65,
-                'ml_weight': 0.35
-            }
+            return self.combine_scores(scores)
         
         except Exception as e:
-            print(f"Error calculating plagiarism score: {e}")
+            print(f"Error calculating bundle plagiarism score: {e}")
+            record_error('scoring.langchain_bundle')
             return self._empty_result()
     
+    @staticmethod
+    def _block_means(scores: np.ndarray, sizes: List[int]) -> np.ndarray:
+        """
+        Mean of each candidate's block of columns of a (query items x candidate
+        items) score matrix; NaN entries are ignored and empty blocks score 0.
+        """
+        valid = np.isfinite(scores)
+        sums = np.concatenate([[0.0], np.cumsum(np.where(valid, scores, 0.0).sum(axis=0))])
+        counts = np.concatenate([[0], np.cumsum(valid.sum(axis=0))])
+        ends = np.cumsum(sizes, dtype=np.int64)
+        starts = ends - np.asarray(sizes, dtype=np.int64)
+        totals, numbers = sums[ends] - sums[starts], counts[ends] - counts[starts]
+        return np.divide(totals, numbers, out=np.zeros(len(sizes)), where=numbers > 0)
+    
+    @staticmethod
+    def _batch_metric(stage: str, metric, count: int) -> np.ndarray:
+        """Run one batched metric as an instrumented stage; failures score 0 for every candidate."""
+        try:
+            with measure(stage):
+                return np.asarray(metric(), dtype=np.float64)
+        except Exception as e:
+            print(f"Error in {stage}: {e}")
+            return np.zeros(count)
+    
+    @instrument('scoring.langchain_batch')
+    def score_many(self, document_text: str, candidates: List[str]) -> Dict[str, np.ndarray]:
+        """
+        calculate_plagiarism_score of one document against many candidates.
+        
+        The document is preprocessed, chunked and embedded once. Each
+        embedding metric embeds every candidate's texts in one batch and
+        reduces the cosine matrix per candidate, chunk_level and tfidf are
+        sparse matrix products over one shared vocabulary; only sequence
+        matching and token overlap run per candidate.
+        
+        Args:
+            document_text: The document to analyze
+            candidates: Texts to compare it against
+        
+        Returns:
+            Dict of metric name -> array of scores, one per candidate, with the
+            weighted ensemble under 'overall' (all 0 if the document is too
+            short; the document's repetition score for too short candidates,
+            as calculate_plagiarism_score without a comparison text)
+        """
+        count = len(candidates)
+        scores = {name: np.zeros(count) for name in self.METRIC_WEIGHTS}
+        if not count or not document_text or len(document_text.strip()) < 10:
+            return {'overall': np.zeros(count), **scores}
+        
+        short = np.array([not c or len(c.strip()) < 10 for c in candidates], dtype=bool)
+        if short.all():
+            return {'overall': np.full(count, self.repetition_score(document_text)), **scores}
+        scored = np.flatnonzero(~short)
+        candidates = [candidates[i] for i in scored]
+        size = len(candidates)
+        text1 = self.preprocess_text(document_text)
+        texts2 = [self.preprocess_text(candidate) for candidate in candidates]
+        
+        def chunks(text):
+            try:
+                return self._analysis_chunks(text)
+            except LookupError:
+                # Sentence fallback without the punkt model, scored 0 like the pairwise metrics
+                return []
+        
+        def sentences(text):
+            try:
+                return sent_tokenize(text)
+            except LookupError:
+                return []
+        
+        def embedded_means(items1, items2):
+            # One embedding batch for the document's and every candidate's items
+            if not self.embeddings or not items1:
+                return np.zeros(size)
+            vectors = embed_texts(self.embeddings, items1 + [item for items in items2 for item in items])
+            return self._block_means(vectors[:len(items1)] @ vectors[len(items1):].T,
+                                     [len(items) for items in items2])
+        
+        def chunk_level():
+            chunks1 = chunks(text1)
+            chunks2 = [chunks(text) for text in texts2]
+            if not chunks1:
+                return np.zeros(size)
+            analyzer = clone(self.tfidf_vectorizer).build_analyzer()
+            matrix = CountVectorizer(analyzer=analyzer).fit_transform(
+                chunks1 + [chunk for items in chunks2 for chunk in items])
+            cosines = pair_fitted_tfidf_cosines(matrix[:len(chunks1)], matrix[len(chunks1):])
+            return self._block_means(cosines, [len(items) for items in chunks2])
+        
+        def tfidf():
+            analyzer = clone(self.tfidf_vectorizer).build_analyzer()
+            counts = CountVectorizer(analyzer=analyzer).fit_transform([text1] + texts2)
+            return query_pair_cosines(counts, self.tfidf_vectorizer.max_features)
+        
+        words1 = text1.split()
+        words2 = [text.split() for text in texts2]
+        set1 = set(words1)
+        
+        runners = {
+            'semantic': lambda: embedded_means([text1], [[text] for text in texts2]),
+            'chunk_level': chunk_level,
+            'semantic_chunks': lambda: embedded_means(chunks(text1)[:3], [chunks(text)[:3] for text in texts2]),
+            'sentence_semantic': lambda: embedded_means(sentences(text1)[:5], [sentences(text)[:5] for text in texts2]),
+            'tfidf': tfidf,
+            'sequence_matching': lambda: [SequenceMatcher(None, words1, words).ratio() for words in words2],
+            'token_overlap': lambda: [self._jaccard(set1, set(words)) for words in words2]
+        }
+        for name, runner in runners.items():
+            scores[name][scored] = self._batch_metric(f'langchain.batch.{name}', runner, size)
+        
+        overall = np.clip(sum(scores[name] * weight for name, weight in self.METRIC_WEIGHTS.items()), 0.0, 1.0)
+        if short.any():
+            overall[short] = self.repetition_score(document_text)
+        return {'overall': overall, **scores}
+    
+    def _repetition_result(self, repetition: float) -> Dict[str, Any]:
+        """Result of a document analyzed without a comparison text: its internal repetition."""
+        result = {'overall': round(min(max(repetition, 0.0), 1.0), 3)}
+        result.update({name: 0.0 for name in self.METRIC_WEIGHTS})
+        result.update({
+            'repetition': round(repetition, 3),
+            'algorithms_used': 1,
+            'methodology': 'Internal repetition (suffix array)'
+        })
+        return result
+    
     def _empty_result(self) -> Dict[str, Any]:
         """Return empty result structure."""
         return {
@@ -0,0 +1,225 @@
+"""
+Incrementally maintained corpus matches for every document.
+A newly added document is scored only against the fingerprint index, and
+each match is pushed into the matched document's stored record as a delta,
+so every document's matches stay current at O(new documents x candidates)
+cost instead of re-analyzing the corpus. One JSON record per document is
+kept under uploads/matches/, together with its last full analysis.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import zlib
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from src.services.fingerprintIndex import token_coverage
+from src.utils.fileLock import file_lock
+from src.utils.instrumentation import instrument
+
+# Records map onto this many lock files, so the lock files do not pile up
+LOCK_STRIPES = 64
+
+
+def mirror_passage(passage: Dict, file_id: str) -> Dict:
+    """The same passage seen from its source document (query and source spans swapped)."""
+    length = passage['token_length']
+    return {
+        'query_token_start': passage['source_token_start'],
+        'query_token_end': passage['source_token_start'] + length,
+        'source_token_start': passage['query_token_start'],
+        'query_start': passage['source_start'],
+        'query_end': passage['source_end'],
+        'source_start': passage['query_start'],
+        'source_end': passage['query_end'],
+        'fingerprints': passage['fingerprints'],
+        'token_length': length,
+        'file_id': file_id
+    }
+
+
+class MatchStore:
+    """
+    Per-document match records kept current by deltas.
+
+    Matches are symmetric: when document N matches stored document C, N's
+    record gets the passages as found and C's record gets them mirrored, so
+    deleting a document only has to touch the records it lists.
+
+    Every read-modify-write of a record holds that record's file lock, so
+    worker processes that update the same record concurrently do not lose
+    each other's deltas. At most one record is locked at a time.
+    """
+
+    def __init__(self, directory: str, fingerprint_index, max_candidates: int = 10, max_passages: int = 20):
+        """
+        Args:
+            directory: Folder holding one <file_id>.json record per document
+            fingerprint_index: FingerprintIndex the new documents are scored against
+            max_candidates: Matching documents kept (and updated) per new document
+            max_passages: Detailed passages stored per match
+        """
+        self.directory = directory
+        self.fingerprint_index = fingerprint_index
+        self.max_candidates = max_candidates
+        self.max_passages = max_passages
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, 'locks'), exist_ok=True)
+
+    def _path(self, file_id: str) -> str:
+        return os.path.join(self.directory, f"{file_id}.json")
+
+    @contextlib.contextmanager
+    def _locked(self, file_id: str):
+        """Hold the lock of a record for a read-modify-write cycle."""
+        stripe = zlib.crc32(file_id.encode('utf-8')) % LOCK_STRIPES
+        with self._lock, file_lock(os.path.join(self.directory, 'locks', f"{stripe}.lock")):
+            yield
+
+    def _load(self, file_id: str) -> Optional[Dict]:
+        try:
+            with open(self._path(file_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write(self, record: Dict):
+        path = self._path(record['file_id'])
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, default=str)
+        os.replace(tmp_path, path)
+
+    def _empty(self, file_id: str) -> Dict:
+        return {
+            'file_id': file_id,
+            'token_count': self.fingerprint_index.token_count(file_id) or 0,
+            'updated': None,
+            'analyzed_at': None,
+            'analysis': None,
+            'matches': {}
+        }
+
+    def _entry(self, passages: List[Dict], token_count: int, origin: str, timestamp: str) -> Dict:
+        passages = sorted(passages, key=lambda p: p['token_length'], reverse=True)
+        return {
+            'coverage': round(token_coverage(passages, token_count), 3),
+            'passage_count': len(passages),
+            # Token spans of every passage, for the record's overall coverage
+            'spans': [[p['query_token_start'], p['query_token_end']] for p in passages],
+            'passages': passages[:self.max_passages],
+            'origin': origin,
+            'updated': timestamp
+        }
+
+    def has_document(self, file_id: str) -> bool:
+        return os.path.exists(self._path(file_id))
+
+    @instrument('matches.incremental')
+    def add_document(self, file_id: str, text: str) -> Dict:
+        """
+        Score a new (already fingerprinted) document against the index and
+        push its matches into the matched documents' records.
+
+        Returns:
+            Dict with the number of matches and the updated document IDs
+        """
+        result = self.fingerprint_index.query(
+            text, exclude_file_id=file_id, max_documents=self.max_candidates, max_passages=None
+        )
+        timestamp = datetime.now().isoformat()
+
+        matches = {
+            document['file_id']: self._entry(document['passages'], result['token_count'], 'incremental', timestamp)
+            for document in result['documents']
+        }
+        with self._locked(file_id):
+            record = self._load(file_id) or self._empty(file_id)
+            record['token_count'] = result['token_count']
+            record['updated'] = timestamp
+            record['matches'] = matches
+            self._write(record)
+
+        for document in result['documents']:
+            # Delta: the candidate now also matches the new document
+            candidate_id = document['file_id']
+            with self._locked(candidate_id):
+                candidate = self._load(candidate_id) or self._empty(candidate_id)
+                candidate['matches'][file_id] = self._entry(
+                    [mirror_passage(p, file_id) for p in document['passages']],
+                    candidate['token_count'], 'delta', timestamp
+                )
+                candidate['updated'] = timestamp
+                self._write(candidate)
+
+        return {'file_id': file_id, 'matches': len(record['matches']), 'updated_documents': list(record['matches'])}
+
+    def save_analysis(self, file_id: str, analysis: Dict):
+        """Store the latest full analysis of a document next to its matches."""
+        with self._locked(file_id):
+            record = self._load(file_id) or self._empty(file_id)
+            record['analysis'] = analysis
+            record['analyzed_at'] = datetime.now().isoformat()
+            self._write(record)
+
+    def remove_document(self, file_id: str) -> int:
+        """
+        Delete a document's record and drop it from the records it matched.
+
+        Returns:
+            Number of other records updated
+        """
+        with self._locked(file_id):
+            record = self._load(file_id)
+            if record is None:
+                return 0
+            os.remove(self._path(file_id))
+
+        updated = 0
+        for other_id in record['matches']:
+            with self._locked(other_id):
+                other = self._load(other_id)
+                if other and other['matches'].pop(file_id, None) is not None:
+                    other['updated'] = datetime.now().isoformat()
+                    self._write(other)
+                    updated += 1
+        return updated
+
+    def get(self, file_id: str) -> Optional[Dict]:
+        """
+        Current matches of a document, best first.
+
+        Returns:
+            Dict with overall 'coverage', 'matches', the last 'analysis' and
+            'new_since_analysis' (matches pushed after that analysis), or None
+        """
+        # Records are replaced atomically, so reads need no lock
+        record = self._load(file_id)
+        if record is None:
+            return None
+
+        spans = [
+            {'query_token_start': start, 'query_token_end': end}
+            for entry in record['matches'].values() for start, end in entry['spans']
+        ]
+        matches = [
+            {'file_id': other_id, **{k: v for k, v in entry.items() if k != 'spans'}}
+            for other_id, entry in record['matches'].items()
+        ]
+        matches.sort(key=lambda m: m['coverage'], reverse=True)
+
+        analyzed_at = record.get('analyzed_at')
+        return {
+            'file_id': file_id,
+            'token_count': record['token_count'],
+            'coverage': round(token_coverage(spans, record['token_count']), 3),
+            'matches': matches,
+            'updated': record['updated'],
+            'analyzed_at': analyzed_at,
+            'new_since_analysis': [
+                m['file_id'] for m in matches if analyzed_at and m['updated'] and m['updated'] > analyzed_at
+            ],
+            'analysis': record.get('analysis')
+        }
@@ -0,0 +1,171 @@
+"""
+Cost model and latency-budget planner for the similarity ensemble.
+Estimates the run time of every metric from token and sentence counts and
+decides, per request, which metrics run exactly, which run in an
+approximate mode sized to the remaining budget, and which are skipped.
+"""
+
+import math
+import os
+import re
+from typing import Dict, Optional
+
+# Default per-request budget in seconds for the advanced ensemble
+DEFAULT_LATENCY_BUDGET = 10.0
+
+
+class MetricCost:
+    """
+    Run-time model of one metric.
+
+    Estimated seconds = fixed + per_token * (n1 + n2) + per_cell * n1 * n2
+                        + per_sentence_pair * s1 * s2
+
+    Metrics with approximate=True accept a work limit (cells or sentences)
+    and can be scaled down to fit the budget.
+    """
+
+    def __init__(self, weight: float, fixed: float = 0.001, per_token: float = 0.0,
+                 per_cell: float = 0.0, per_sentence_pair: float = 0.0,
+                 approximate: bool = False):
+        self.weight = weight
+        self.fixed = fixed
+        self.per_token = per_token
+        self.per_cell = per_cell
+        self.per_sentence_pair = per_sentence_pair
+        self.approximate = approximate
+
+    def estimate(self, n1: int, n2: int, s1: int, s2: int) -> float:
+        return (self.fixed + self.per_token * (n1 + n2) + self.per_cell * n1 * n2
+                + self.per_sentence_pair * s1 * s2)
+
+
+class MetricPlanner:
+    """Chooses exact, approximate or skipped execution for every ensemble metric."""
+
+    # Weights of the advanced ensemble; coefficients measured on CPython 3.11
+    # (see benchmarks/pipeline.py and, for the token-array metrics,
+    # benchmarks/token_arrays.py) and rounded up
+    COSTS = {
+        'cosine': MetricCost(0.15, fixed=0.005, per_token=1.2e-5),
+        'sequence': MetricCost(0.15, per_token=3e-6, per_cell=1.5e-9, approximate=True),
+        'token_overlap': MetricCost(0.12, per_token=1e-6),
+        'bigram': MetricCost(0.10, per_token=1e-6),
+        'trigram': MetricCost(0.08, per_token=1e-6),
+        'lcs': MetricCost(0.12, per_token=1e-6, per_cell=2.5e-10, approximate=True),
+        'sentence': MetricCost(0.10, per_token=2e-6, per_sentence_pair=5e-7, approximate=True),
+        'word_freq': MetricCost(0.10, per_token=3.5e-6),
+        'semantic': MetricCost(0.08, per_token=1e-6),
+    }
+
+    # Smallest useful approximation: cells for the chunked alignments, sentences for sampling
+    MIN_CELLS = 250000
+    MIN_SENTENCES = 20
+
+    def __init__(self, latency_budget: Optional[float] = None):
+        """
+        Args:
+            latency_budget: Seconds per ensemble call; defaults to the
+                            SIMILARITY_LATENCY_BUDGET environment variable, then
+                            DEFAULT_LATENCY_BUDGET. 0 disables the budget.
+        """
+        if latency_budget is None:
+            latency_budget = float(os.environ.get('SIMILARITY_LATENCY_BUDGET', DEFAULT_LATENCY_BUDGET))
+        self.latency_budget = latency_budget
+
+    @staticmethod
+    def measure_inputs(text1: str, text2: str) -> Dict[str, int]:
+        """Cheap token and sentence counts used by the cost model."""
+        return {
+            'n1': len(text1.split()),
+            'n2': len(text2.split()),
+            's1': max(1, len(re.findall(r'[.!?]+(?:\s|$)', text1))),
+            's2': max(1, len(re.findall(r'[.!?]+(?:\s|$)', text2))),
+        }
+
+    def plan(self, text1: str, text2: str, latency_budget: Optional[float] = None) -> Dict:
+        """
+        Plan the ensemble for a pair of texts.
+
+        Metrics are considered in order of weight per estimated second. Each
+        runs exactly if it fits the remaining budget; otherwise approximate
+        metrics get a share of the remaining budget (by weight) and are sized
+        to it, and metrics that cannot fit are skipped.
+
+        Returns:
+            Dict with 'metrics' ({name: {'mode', 'estimated_s', 'limit'}}),
+            'budget_s', 'estimated_s' and the input sizes
+        """
+        return self.plan_inputs(self.measure_inputs(text1, text2), latency_budget)
+
+    def plan_inputs(self, sizes: Dict[str, int], latency_budget: Optional[float] = None) -> Dict:
+        """Plan the ensemble from precomputed measure_inputs() sizes (e.g. stored in feature bundles)."""
+        budget = self.latency_budget if latency_budget is None else float(latency_budget)
+        n1, n2, s1, s2 = sizes['n1'], sizes['n2'], sizes['s1'], sizes['s2']
+
+        estimates = {name: cost.estimate(n1, n2, s1, s2) for name, cost in self.COSTS.items()}
+        metrics = {name: {'mode': 'exact', 'estimated_s': estimates[name], 'limit': None} for name in self.COSTS}
+
+        if budget and sum(estimates.values()) > budget:
+            order = sorted(self.COSTS, key=lambda name: self.COSTS[name].weight / estimates[name], reverse=True)
+            remaining = budget
+            deferred = []
+            for name in order:
+                if estimates[name] <= remaining:
+                    remaining -= estimates[name]
+                elif self.COSTS[name].approximate:
+                    deferred.append(name)
+                else:
+                    metrics[name]['mode'] = 'skipped'
+
+            # Approximate metrics share what is left in proportion to their weights
+            total_weight = sum(self.COSTS[name].weight for name in deferred)
+            for name in deferred:
+                share = remaining * self.COSTS[name].weight / total_weight
+                metrics[name].update(self._approximate(name, share, n1, n2, s1, s2))
+
+        for name, entry in metrics.items():
+            entry['estimated_s'] = round(entry['estimated_s'], 4)
+
+        return {
+            'budget_s': budget or None,
+            'estimated_s': round(sum(e['estimated_s'] for e in metrics.values() if e['mode'] != 'skipped'), 4),
+            'inputs': sizes,
+            'metrics': metrics
+        }
+
+    def _approximate(self, name: str, share: float, n1: int, n2: int, s1: int, s2: int) -> Dict:
+        """Size an approximate run of a metric to a time share, or skip it."""
+        cost = self.COSTS[name]
+        available = share - cost.fixed - cost.per_token * (n1 + n2)
+
+        if cost.per_cell:
+            cells = int(available / cost.per_cell) if available > 0 else 0
+            if cells < self.MIN_CELLS:
+                return {'mode': 'skipped'}
+            return {'mode': 'approximate', 'limit': cells,
+                    'estimated_s': cost.fixed + cost.per_token * (n1 + n2) + cost.per_cell * cells}
+
+        sentences = int(available / (cost.per_sentence_pair * s2)) if available > 0 else 0
+        if sentences < self.MIN_SENTENCES:
+            return {'mode': 'skipped'}
+        sentences = min(sentences, s1)
+        return {'mode': 'approximate', 'limit': sentences,
+                'estimated_s': cost.fixed + cost.per_token * (n1 + n2) + cost.per_sentence_pair * sentences * s2}
+
+    @staticmethod
+    def renormalized_weights(plan: Dict) -> Dict[str, float]:
+        """Weights of the metrics that run, rescaled to sum to one."""
+        weights = {
+            name: MetricPlanner.COSTS[name].weight
+            for name, entry in plan['metrics'].items() if entry['mode'] != 'skipped'
+        }
+        total = sum(weights.values())
+        return {name: weight / total for name, weight in weights.items()} if total else {}
+
+
+def chunk_count(n1: int, n2: int, max_cells: Optional[int]) -> int:
+    """Number of proportional chunks that keeps an n1 x n2 alignment under max_cells."""
+    if not max_cells or n1 * n2 <= max_cells:
+        return 1
+    return math.ceil(n1 * n2 / max_cells)
@@ -0,0 +1,207 @@
+"""
+Tiered scoring cascade for pairwise plagiarism checks.
+Screens a document pair with cheap filters before the expensive ensembles:
+tier 1 compares MinHash signatures of content-word sets and the length ratio,
+tier 2 computes TF-IDF cosine, and only pairs passing both reach tier 3 (the
+full LangChain + advanced ensemble, run by the caller).
+"""
+
+import os
+import re
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.utils.instrumentation import instrument
+
+# Mersenne prime 2^31 - 1 keeps a * x + b inside uint64 for 31-bit a, b, x
+_MERSENNE_PRIME = (1 << 31) - 1
+
+
+class MinHasher:
+    """MinHash signatures of token sets with a fixed family of hash permutations."""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, tokens) -> np.ndarray:
+        """Signature of a set of tokens (all-max for an empty set)."""
+        hashes = np.fromiter(
+            (zlib.crc32(token.encode('utf-8')) % _MERSENNE_PRIME for token in set(tokens)),
+            dtype=np.uint64
+        )
+        if len(hashes) == 0:
+            return np.full(self.num_perm, _MERSENNE_PRIME, dtype=np.uint64)
+        permuted = (hashes[:, None] * self.a[None, :] + self.b[None, :]) % _MERSENNE_PRIME
+        return permuted.min(axis=0)
+
+    @staticmethod
+    def jaccard(signature1: np.ndarray, signature2: np.ndarray) -> float:
+        """Estimated Jaccard similarity of the two underlying sets."""
+        return float(np.mean(signature1 == signature2))
+
+    @staticmethod
+    def jaccard_many(signature: np.ndarray, signatures: np.ndarray) -> np.ndarray:
+        """jaccard() of one signature against each row of a signature matrix."""
+        return np.mean(signatures == signature[None, :], axis=1)
+
+
+class ScoringCascade:
+    """
+    Decides whether a document pair needs the full ensemble.
+
+    Thresholds default to the CASCADE_TIER1_THRESHOLD (containment estimate)
+    and CASCADE_TIER2_THRESHOLD (TF-IDF cosine) environment variables.
+    """
+
+    def __init__(self, similarity_service, tier1_threshold: Optional[float] = None,
+                 tier2_threshold: Optional[float] = None, num_perm: int = 128):
+        """
+        Args:
+            similarity_service: AdvancedSimilarityService (preprocessing, stopwords, TF-IDF)
+            tier1_threshold: Minimum estimated containment to pass tier 1
+            tier2_threshold: Minimum TF-IDF cosine to pass tier 2
+            num_perm: MinHash signature length
+        """
+        self.similarity_service = similarity_service
+        self.tier1_threshold = tier1_threshold if tier1_threshold is not None else float(
+            os.environ.get('CASCADE_TIER1_THRESHOLD', 0.1))
+        self.tier2_threshold = tier2_threshold if tier2_threshold is not None else float(
+            os.environ.get('CASCADE_TIER2_THRESHOLD', 0.1))
+        self.minhasher = MinHasher(num_perm)
+
+    def content_tokens(self, text: str):
+        """Lowercased words without stopwords or very short tokens."""
+        stop_words = self.similarity_service.stop_words
+        return [w for w in re.findall(r'\w+', text.lower()) if len(w) > 2 and w not in stop_words]
+
+    @instrument('cascade.tier1')
+    def tier1(self, text1: str, text2: str) -> Dict:
+        """
+        MinHash Jaccard of the content-word sets and the set-size ratio.
+
+        Jaccard alone penalises a short text copied into a long one, so the
+        pair is judged on the estimated containment of the smaller set:
+        |A & B| = J / (1 + J) * (|A| + |B|), divided by min(|A|, |B|).
+        """
+        tokens1 = set(self.content_tokens(text1))
+        tokens2 = set(self.content_tokens(text2))
+        if not tokens1 or not tokens2:
+            return self._tier1_result(0.0, 0, 0)
+
+        jaccard = self.minhasher.jaccard(self.minhasher.signature(tokens1), self.minhasher.signature(tokens2))
+        return self._tier1_result(jaccard, len(tokens1), len(tokens2))
+
+    def _tier1_result(self, jaccard: float, size1: int, size2: int) -> Dict:
+        """Tier 1 verdict from a MinHash Jaccard estimate and the two content-set sizes."""
+        if not size1 or not size2:
+            return {'tier': 1, 'score': 0.0, 'jaccard': 0.0, 'containment': 0.0,
+                    'length_ratio': 0.0, 'passed': False}
+        smaller, larger = sorted((size1, size2))
+        intersection = jaccard / (1 + jaccard) * (smaller + larger)
+        containment = min(intersection / smaller, 1.0)
+
+        return {
+            'tier': 1,
+            'score': round(containment, 3),
+            'jaccard': round(jaccard, 3),
+            'containment': round(containment, 3),
+            'length_ratio': round(smaller / larger, 3),
+            'passed': containment >= self.tier1_threshold
+        }
+
+    def tier2(self, text1: str, text2: str) -> Dict:
+        """TF-IDF cosine similarity (word 1-3 grams)."""
+        return self._tier2_result(self.similarity_service.cosine_similarity_advanced(text1, text2))
+
+    def _tier2_result(self, cosine: float) -> Dict:
+        return {
+            'tier': 2,
+            'score': round(cosine, 3),
+            'cosine': round(cosine, 3),
+            'passed': cosine >= self.tier2_threshold
+        }
+
+    @instrument('cascade')
+    def screen(self, text1: str, text2: str) -> Dict:
+        """
+        Run the cheap tiers.
+
+        Returns:
+            Dict with 'passed' (True if the pair needs tier 3), 'decided_by'
+            (1 or 2 when a cheap tier rejected the pair, otherwise None),
+            'score' (the deciding tier's score) and the per-tier 'tiers' details
+        """
+        return self._screen(lambda: self.tier1(text1, text2), lambda: self.tier2(text1, text2))
+
+    @instrument('cascade.bundle')
+    def screen_bundles(self, bundle1, bundle2) -> Dict:
+        """screen() for two stored documents, from their bundles' MinHash signatures and term counts."""
+        def tier1():
+            jaccard = self.minhasher.jaccard(bundle1['minhash'], bundle2['minhash'])
+            return self._tier1_result(jaccard, bundle1.meta['content_size'], bundle2.meta['content_size'])
+
+        def tier2():
+            return self._tier2_result(self.similarity_service.bundle_cosine_similarity(bundle1, bundle2))
+
+        return self._screen(tier1, tier2)
+
+    @instrument('cascade.batch')
+    def screen_many(self, text: str, candidates: List[str]) -> List[Dict]:
+        """
+        screen() of one text against many candidates.
+
+        Tier 1 compares the text's signature with a matrix of all candidate
+        signatures at once, and tier 2 computes the cosines of the candidates
+        that passed it in one batch.
+        """
+        try:
+            tokens = set(self.content_tokens(text))
+            candidate_tokens = [set(self.content_tokens(candidate)) for candidate in candidates]
+            jaccards = np.zeros(len(candidates))
+            nonempty = [i for i, tokens2 in enumerate(candidate_tokens) if tokens2]
+            if tokens and nonempty:
+                signatures = np.stack([self.minhasher.signature(candidate_tokens[i]) for i in nonempty])
+                jaccards[nonempty] = self.minhasher.jaccard_many(self.minhasher.signature(tokens), signatures)
+            tier1 = [self._tier1_result(float(jaccards[i]), len(tokens), len(candidate_tokens[i]))
+                     for i in range(len(candidates))]
+
+            passed = [i for i, result in enumerate(tier1) if result['passed']]
+            cosines = dict(zip(passed, self.similarity_service.cosine_similarity_many(
+                text, [candidates[i] for i in passed]))) if passed else {}
+        except Exception as e:
+            print(f"Error in batch scoring cascade: {e}")
+            return [self._passthrough(e) for _ in candidates]
+
+        return [
+            self._screen(lambda i=i: tier1[i], lambda i=i: self._tier2_result(float(cosines[i])))
+            for i in range(len(candidates))
+        ]
+
+    def _screen(self, tier1, tier2) -> Dict:
+        try:
+            tiers = [tier1()]
+            if tiers[-1]['passed']:
+                tiers.append(tier2())
+
+            passed = tiers[-1]['passed']
+            return {
+                'passed': passed,
+                'decided_by': None if passed else tiers[-1]['tier'],
+                'score': tiers[-1]['score'],
+                'tiers': tiers,
+                'thresholds': {'tier1': self.tier1_threshold, 'tier2': self.tier2_threshold}
+            }
+
+        except Exception as e:
+            print(f"Error in scoring cascade: {e}")
+            return self._passthrough(e)
+
+    @staticmethod
+    def _passthrough(error: Exception) -> Dict:
+        # Never let the filter hide a pair: fall through to the full ensemble
+        return {'passed': True, 'decided_by': None, 'score': None, 'tiers': [], 'error': str(error)}
@@ -0,0 +1,506 @@
+"""
+Sharded corpus index with a scatter-gather query coordinator.
+Documents are assigned to shards by a stable hash of their file_id. Every
+shard is a separate process (on this host or another) holding the
+FingerprintIndex and, when FAISS is available, the ChunkVectorIndex of its
+documents, served over multiprocessing.connection. The coordinator
+fingerprints and embeds a query once, sends it to all shards at the same
+time and merges the per-shard matches into the global top-k.
+
+Connections are authenticated with INDEX_SHARD_AUTHKEY, which must be set on
+the shards and the coordinator. Messages are JSON with raw numpy buffers,
+never pickles, so a peer cannot make a shard run code.
+
+Run a shard:
+    INDEX_SHARD_AUTHKEY=... python -m src.services.shardedIndex --shard-id 0 --shards 4 --port 6100 \
+        --data-dir uploads/shards/0
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import secrets
+import struct
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from src.services.fingerprintIndex import FingerprintIndex, fingerprint_text, summarize_matches
+
+try:
+    from src.services.vectorIndexService import ChunkVectorIndex, embed_texts, split_with_offsets
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+# Seconds to wait for a shard's answer (0 waits forever)
+DEFAULT_TIMEOUT = float(os.environ.get('INDEX_SHARD_TIMEOUT', 30.0))
+
+# Array dtypes allowed on the wire: booleans, integers and floats
+_ARRAY_KINDS = 'biuf'
+
+
+def shard_for(file_id: str, num_shards: int) -> int:
+    """Shard owning a document (stable across processes, unlike hash())."""
+    digest = hashlib.blake2b(file_id.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % num_shards
+
+
+def parse_addresses(spec: str) -> List[tuple]:
+    """'host:port,host:port' -> [(host, port), ...]"""
+    addresses = []
+    for item in spec.split(','):
+        host, port = item.strip().rsplit(':', 1)
+        addresses.append((host, int(port)))
+    return addresses
+
+
+class ShardError(RuntimeError):
+    """A shard answered a request with an error."""
+
+
+def shard_authkey(authkey: Optional[bytes] = None) -> bytes:
+    """The shared connection secret; refuses to go on without one."""
+    if authkey:
+        return authkey
+    value = os.environ.get('INDEX_SHARD_AUTHKEY')
+    if not value:
+        raise ShardError('INDEX_SHARD_AUTHKEY must be set to run or reach index shards')
+    return value.encode()
+
+
+def encode_message(value) -> bytes:
+    """
+    Serialize a request or reply: JSON, with numpy arrays sent as raw buffers.
+
+    Layout: header length and buffer count (uint32), the buffer lengths
+    (uint64 each), the JSON header, then the buffers. Tuples arrive as lists.
+    """
+    buffers = []
+
+    def default(obj):
+        if isinstance(obj, np.ndarray) and obj.dtype.kind in _ARRAY_KINDS:
+            data = np.ascontiguousarray(obj)
+            buffers.append(data.tobytes())
+            return {'__ndarray__': len(buffers) - 1, 'dtype': data.dtype.str, 'shape': list(data.shape)}
+        if isinstance(obj, np.generic):
+            return obj.item()
+        raise TypeError(f"Cannot send {type(obj).__name__} to a shard")
+
+    header = json.dumps(value, default=default).encode('utf-8')
+    prefix = struct.pack(f'<II{len(buffers)}Q', len(header), len(buffers), *(len(b) for b in buffers))
+    return b''.join([prefix, header, *buffers])
+
+
+def decode_message(data: bytes):
+    """Inverse of encode_message."""
+    header_length, count = struct.unpack_from('<II', data)
+    lengths = struct.unpack_from(f'<{count}Q', data, 8)
+    offset = 8 + 8 * count
+    header = data[offset:offset + header_length]
+    offset += header_length
+    buffers = []
+    for length in lengths:
+        buffers.append(memoryview(data)[offset:offset + length])
+        offset += length
+
+    def hook(obj):
+        if '__ndarray__' not in obj:
+            return obj
+        dtype = np.dtype(obj['dtype'])
+        if dtype.kind not in _ARRAY_KINDS:
+            raise ValueError(f"Array dtype {dtype} not allowed")
+        return np.frombuffer(buffers[obj['__ndarray__']], dtype=dtype).reshape(obj['shape']).copy()
+
+    return json.loads(header, object_hook=hook)
+
+
+class ShardServer:
+    """One shard: the fingerprint and chunk indexes of the documents it owns."""
+
+    def __init__(self, shard_id: int, num_shards: int, data_dir: str, max_postings: int = 1000):
+        """
+        Args:
+            shard_id: Index of this shard
+            num_shards: Total number of shards
+            data_dir: Directory for this shard's index files
+            max_postings: Boilerplate cut-off for this shard; with documents
+                          hashed evenly, the corpus-wide limit divided by the
+                          shard count
+        """
+        self.shard_id = shard_id
+        self.num_shards = num_shards
+        self.data_dir = data_dir
+        os.makedirs(data_dir, exist_ok=True)
+        # Queries arrive as fingerprints, so the shard never tokenizes
+        self.fingerprints = FingerprintIndex(os.path.join(data_dir, 'fingerprints.db'), max_postings=max_postings)
+        self.vectors = None
+        self._vectors_lock = threading.Lock()
+
+    def _vector_index(self):
+        with self._vectors_lock:
+            if self.vectors is None:
+                if not FAISS_AVAILABLE:
+                    raise ShardError('FAISS is not available on this shard')
+                # Vectors arrive embedded, so the shard needs no model
+                self.vectors = ChunkVectorIndex(None, os.path.join(self.data_dir, 'chunks'), chunker=None)
+            return self.vectors
+
+    # Remote methods ------------------------------------------------------
+
+    def ping(self):
+        return {'shard_id': self.shard_id, 'num_shards': self.num_shards}
+
+    def add_fingerprints(self, file_id, fingerprints, token_count):
+        return self.fingerprints.add_fingerprints(file_id, fingerprints, token_count)
+
+    def match_fingerprints(self, fingerprints, exclude_file_id=None):
+        return self.fingerprints.match_fingerprints(fingerprints, exclude_file_id)
+
+    def remove_document(self, file_id):
+        return self.fingerprints.remove_document(file_id)
+
+    def has_document(self, file_id):
+        return self.fingerprints.has_document(file_id)
+
+    def token_count(self, file_id):
+        return self.fingerprints.token_count(file_id)
+
+    def add_chunks(self, file_id, chunks, vectors):
+        return self._vector_index().add_chunks(file_id, chunks, vectors)
+
+    def search_vectors(self, query_chunks, vectors, k=5, exclude_file_id=None):
+        return self._vector_index().search_vectors(query_chunks, vectors, k, exclude_file_id)
+
+    def remove_chunks(self, file_id):
+        return self._vector_index().remove_document(file_id)
+
+    def has_chunks(self, file_id):
+        return self._vector_index().has_document(file_id)
+
+    def stats(self):
+        stats = {'shard_id': self.shard_id, **self.fingerprints.stats()}
+        if self.vectors is not None:
+            stats['chunks'] = self.vectors.stats()['chunks']
+        return stats
+
+    REMOTE_METHODS = {
+        'ping', 'add_fingerprints', 'match_fingerprints', 'remove_document', 'has_document', 'token_count',
+        'add_chunks', 'search_vectors', 'remove_chunks', 'has_chunks', 'stats'
+    }
+
+    # Serving -------------------------------------------------------------
+
+    def serve(self, address, authkey: Optional[bytes] = None):
+        """Accept coordinator connections forever, one thread per connection."""
+        with Listener(address, authkey=shard_authkey(authkey)) as listener:
+            print(f"Shard {self.shard_id}/{self.num_shards} listening on {listener.address}", flush=True)
+            while True:
+                try:
+                    connection = listener.accept()
+                except Exception as e:
+                    print(f"Error accepting shard connection: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(connection,), daemon=True).start()
+
+    def _handle(self, connection):
+        with connection:
+            while True:
+                try:
+                    message = connection.recv_bytes()
+                except (EOFError, OSError):
+                    return
+                try:
+                    method, args, kwargs = decode_message(message)
+                    if method not in self.REMOTE_METHODS:
+                        raise ShardError(f"Unknown shard method {method!r}")
+                    reply = encode_message(['ok', getattr(self, method)(*args, **kwargs)])
+                except Exception as e:
+                    reply = encode_message(['error', f"{type(e).__name__}: {e}"])
+                try:
+                    connection.send_bytes(reply)
+                except OSError:
+                    return
+
+
+class ShardClient:
+    """
+    Connections to one shard, one per calling thread and process, so requests
+    never interleave: a worker forked from a process that already talked to
+    the shard opens its own connection instead of sharing the inherited one.
+    """
+
+    def __init__(self, address, authkey: Optional[bytes] = None, timeout: float = DEFAULT_TIMEOUT):
+        self.address = tuple(address)
+        self.authkey = shard_authkey(authkey)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        pid, connection = getattr(self._local, 'connection', (None, None))
+        if connection is None or pid != os.getpid():
+            # An inherited connection stays with the parent; the child's copy
+            # of the descriptor is dropped without a shutdown
+            if connection is not None:
+                connection.close()
+            connection = Client(self.address, authkey=self.authkey)
+            self._local.connection = (os.getpid(), connection)
+        return connection
+
+    def _reset(self):
+        _, connection = getattr(self._local, 'connection', (None, None))
+        self._local.connection = (None, None)
+        if connection is not None:
+            connection.close()
+
+    def send(self, method: str, *args, **kwargs):
+        try:
+            self._connection().send_bytes(encode_message([method, args, kwargs]))
+        except (OSError, EOFError):
+            self._reset()
+            raise
+
+    def recv(self):
+        try:
+            connection = self._connection()
+            if self.timeout and not connection.poll(self.timeout):
+                # A late answer would be read as the reply to the next request
+                self._reset()
+                raise TimeoutError(f"Shard {self.address[0]}:{self.address[1]} did not answer "
+                                   f"within {self.timeout:g}s")
+            status, value = decode_message(connection.recv_bytes())
+        except (OSError, EOFError):
+            self._reset()
+            raise
+        if status != 'ok':
+            raise ShardError(f"Shard {self.address[0]}:{self.address[1]}: {value}")
+        return value
+
+    def call(self, method: str, *args, **kwargs):
+        self.send(method, *args, **kwargs)
+        return self.recv()
+
+
+class ShardedIndex:
+    """
+    Coordinator over the shard processes.
+
+    Exposes the FingerprintIndex interface used by the app (add_document,
+    remove_document, has_document, token_count, query, stats): writes go to
+    the owning shard, queries are scattered to all shards and gathered.
+    """
+
+    def __init__(self, addresses: List, authkey: Optional[bytes] = None, tokenizer: Optional[Callable] = None,
+                 k: int = 5, window: int = 4, timeout: float = DEFAULT_TIMEOUT):
+        """
+        Args:
+            addresses: (host, port) of every shard, in shard order
+            authkey: Shared connection secret (default INDEX_SHARD_AUTHKEY, required)
+            tokenizer: Callable returning (token, start, end) tuples, as for FingerprintIndex
+            k: k-gram length in tokens (must match the shards' data)
+            window: Winnowing window size
+            timeout: Seconds to wait for each shard's answer (INDEX_SHARD_TIMEOUT; 0 waits forever)
+        """
+        self.clients = [ShardClient(address, authkey, timeout) for address in addresses]
+        self.tokenizer = tokenizer
+        self.k = k
+        self.window = window
+
+    @property
+    def num_shards(self) -> int:
+        return len(self.clients)
+
+    def owner(self, file_id: str) -> ShardClient:
+        return self.clients[shard_for(file_id, self.num_shards)]
+
+    def scatter(self, method: str, *args, **kwargs) -> List:
+        """
+        Send a request to every shard, then collect the answers.
+
+        All shards work on the request concurrently. A failing shard, or one
+        that does not answer within the timeout, is reported and left out (its
+        answer is None) so a query still returns the matches of the healthy
+        shards.
+        """
+        sent = []
+        for client in self.clients:
+            try:
+                client.send(method, *args, **kwargs)
+                sent.append(client)
+            except Exception as e:
+                print(f"Error sending {method} to shard {client.address}: {e}")
+
+        results = []
+        for client in self.clients:
+            if client not in sent:
+                results.append(None)
+                continue
+            try:
+                results.append(client.recv())
+            except Exception as e:
+                print(f"Error in {method} on shard {client.address}: {e}")
+                results.append(None)
+        return results
+
+    # FingerprintIndex interface ------------------------------------------
+
+    def fingerprint(self, text: str):
+        if self.tokenizer is None:
+            from src.services.fingerprintIndex import _default_tokenizer
+            self.tokenizer = _default_tokenizer()
+        return fingerprint_text(text, self.tokenizer, self.k, self.window)
+
+    def add_document(self, file_id: str, text: str) -> int:
+        fingerprints, token_count = self.fingerprint(text)
+        return self.owner(file_id).call('add_fingerprints', file_id, fingerprints, token_count)
+
+    def remove_document(self, file_id: str) -> int:
+        return self.owner(file_id).call('remove_document', file_id)
+
+    def has_document(self, file_id: str) -> bool:
+        return self.owner(file_id).call('has_document', file_id)
+
+    def token_count(self, file_id: str) -> Optional[int]:
+        return self.owner(file_id).call('token_count', file_id)
+
+    def query(self, text: str, exclude_file_id: Optional[str] = None,
+              max_documents: int = 10, max_passages: Optional[int] = 20) -> Dict:
+        """FingerprintIndex.query over all shards."""
+        fingerprints, token_count = self.fingerprint(text)
+        return self.query_fingerprints(fingerprints, token_count, exclude_file_id, max_documents, max_passages)
+
+    def query_fingerprints(self, fingerprints, token_count: int, exclude_file_id: Optional[str] = None,
+                           max_documents: int = 10, max_passages: Optional[int] = 20) -> Dict:
+        """Scatter a fingerprinted query and merge the per-shard matches into the global top-k."""
+        passages_by_document = {}
+        for partial in self.scatter('match_fingerprints', fingerprints, exclude_file_id):
+            if partial:
+                passages_by_document.update(partial)
+        result = summarize_matches(passages_by_document, token_count, max_documents, max_passages)
+        result['shards'] = self.num_shards
+        return result
+
+    def stats(self) -> Dict:
+        shards = [s for s in self.scatter('stats') if s]
+        return {
+            'documents': sum(s['documents'] for s in shards),
+            'fingerprints': sum(s['fingerprints'] for s in shards),
+            'shards': shards,
+            'shards_unavailable': self.num_shards - len(shards)
+        }
+
+    def chunk_index(self, embeddings, chunker: Callable[[str], List[str]]) -> 'ShardedChunkIndex':
+        """ChunkVectorIndex-compatible view over the shards' chunk indexes."""
+        return ShardedChunkIndex(self, embeddings, chunker)
+
+
+class ShardedChunkIndex:
+    """ChunkVectorIndex interface over the shards: chunks are embedded here, stored and searched on the shards."""
+
+    def __init__(self, sharded_index: ShardedIndex, embeddings, chunker: Callable[[str], List[str]]):
+        self.sharded_index = sharded_index
+        self.embeddings = embeddings
+        self.chunker = chunker
+
+    def has_document(self, file_id: str) -> bool:
+        return self.sharded_index.owner(file_id).call('has_chunks', file_id)
+
+    def add_document(self, file_id: str, text: str) -> int:
+        chunks = split_with_offsets(text, self.chunker)
+        if not chunks:
+            return 0
+        vectors = embed_texts(self.embeddings, [chunk for chunk, _, _ in chunks])
+        return self.sharded_index.owner(file_id).call('add_chunks', file_id, chunks, vectors)
+
+    def remove_document(self, file_id: str) -> int:
+        return self.sharded_index.owner(file_id).call('remove_chunks', file_id)
+
+    def search_text(self, text: str, k: int = 5, exclude_file_id: Optional[str] = None) -> List[Dict]:
+        """ChunkVectorIndex.search_text: per-shard top-k merged into the global top-k."""
+        query_chunks = split_with_offsets(text, self.chunker)
+        if not query_chunks:
+            return []
+        vectors = embed_texts(self.embeddings, [chunk for chunk, _, _ in query_chunks])
+
+        matches = []
+        for partial in self.sharded_index.scatter('search_vectors', query_chunks, vectors, k, exclude_file_id):
+            matches.extend(partial or [])
+        matches.sort(key=lambda m: m['similarity'], reverse=True)
+        return matches[:k]
+
+    def stats(self) -> Dict:
+        shards = [s for s in self.sharded_index.scatter('stats') if s]
+        return {
+            'documents': None,
+            'chunks': sum(s.get('chunks', 0) for s in shards),
+            'index_type': f"sharded x{self.sharded_index.num_shards}"
+        }
+
+
+def spawn_local_shards(num_shards: int, data_dir: str, base_port: int = 6100, max_postings: int = 1000,
+                       timeout: float = 60.0):
+    """
+    Start num_shards shard processes on localhost.
+
+    Without INDEX_SHARD_AUTHKEY a random key is generated and set in this
+    process's environment, so coordinators created here can connect.
+
+    Returns:
+        (processes, addresses); terminate the processes when done
+    """
+    if not os.environ.get('INDEX_SHARD_AUTHKEY'):
+        os.environ['INDEX_SHARD_AUTHKEY'] = secrets.token_hex(32)
+    processes, addresses = [], []
+    per_shard_postings = max(1, math.ceil(max_postings / num_shards))
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    for shard_id in range(num_shards):
+        port = base_port + shard_id
+        processes.append(subprocess.Popen(
+            [sys.executable, '-m', 'src.services.shardedIndex', '--shard-id', str(shard_id),
+             '--shards', str(num_shards), '--port', str(port), '--max-postings', str(per_shard_postings),
+             '--data-dir', os.path.join(data_dir, f"shard_{shard_id}")],
+            cwd=root, stdout=subprocess.DEVNULL
+        ))
+        addresses.append(('127.0.0.1', port))
+
+    deadline = time.time() + timeout
+    for process, address in zip(processes, addresses):
+        while True:
+            try:
+                ShardClient(address).call('ping')
+                break
+            except (OSError, EOFError):
+                if process.poll() is not None or time.time() > deadline:
+                    for p in processes:
+                        p.terminate()
+                    raise RuntimeError(f"Shard at {address[0]}:{address[1]} did not start")
+                time.sleep(0.2)
+    return processes, addresses
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run one index shard')
+    parser.add_argument('--shard-id', type=int, required=True)
+    parser.add_argument('--shards', type=int, required=True, help='Total number of shards')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, required=True)
+    parser.add_argument('--data-dir', required=True, help="Directory for this shard's index files")
+    parser.add_argument('--max-postings', type=int, default=1000,
+                        help='Per-shard boilerplate cut-off (corpus-wide limit / shard count)')
+    args = parser.parse_args()
+    if not os.environ.get('INDEX_SHARD_AUTHKEY'):
+        parser.error('INDEX_SHARD_AUTHKEY must be set (shared with the coordinator)')
+
+    server = ShardServer(args.shard_id, args.shards, args.data_dir, args.max_postings)
+    server.serve((args.host, args.port))
+
+
+if __name__ == '__main__':
+    main()
@@ -9,11 +9,13 @@ from sklearn.metrics.pairwise import cosine_similarity
 import re
 import requests
 from bs4 import BeautifulSoup
-from textdistance import jaccard, levenshtein
+from textdistance import jaccard
 import nltk
 from nltk.tokenize import word_tokenize, sent_tokenize
 from nltk.corpus import stopwords
 import string
+from src.utils.editDistance import levenshtein_similarity
+from src.utils.suffixArray import intern_sequences, repeated_passages, repetition_coverage
 
 # Download required NLTK data
 try:
@@ -97,45 +99,48 @@ class SimilarityService:
             print(f"Error calculating Jaccard similarity: {e}")
             return 0.0
     
-    def calculate_levenshtein_similarity(self, text1, text2):
-        """Calculate normalized Levenshtein similarity between two texts."""
+    def calculate_levenshtein_similarity(self, text1, text2, min_similarity=None, time_limit=1.0):
+        """
+        Calculate normalized Levenshtein similarity between two texts.
+        
+        Uses the bit-parallel bounded engine; long inputs fall back to a chunked
+        approximation so a call never takes much longer than time_limit seconds.
+        """
         try:
-            # Calculate Levenshtein distance
-            distance = levenshtein(text1, text2)
-            max_length = max(len(text1), len(text2))
-            
-            # Normalize to similarity score (0-1)
-            if max_length == 0:
-                return 1.0
-            
-            return 1.0 - (distance / max_length)
+            return levenshtein_similarity(
+                text1,
+                text2,
+                min_similarity=min_similarity,
+                time_limit=time_limit
+            )
         
         except Exception as e:
             print(f"Error calculating Levenshtein similarity: {e}")
             return 0.0
     
+    def calculate_repetition(self, text, min_length=8):
+        """Share of the (preprocessed) tokens that repeat an earlier passage of at least min_length tokens."""
+        try:
+            (ids,), _ = intern_sequences(self.preprocess_text(text).split())
+            return repetition_coverage(repeated_passages(ids, min_length=min_length), len(ids))
+        except Exception as e:
+            print(f"Error calculating repetition: {e}")
+            return 0.0
+    
     def calculate_similarity(self, text1, text2):
         """Calculate overall similarity using multiple algorithms."""
         try:
             # Handle empty or None text2
             if not text2 or text2.strip() == '':
-                # Self-analysis: check for repetition within the document
-                # Split text into chunks and compare
-                sentences = sent_tokenize(text1)
-                if len(sentences) < 2:
-                    return {
-                        'overall': 0.0,
-                        'cosine': 0.0,
-                        'jaccard': 0.0,
-                        'levenshtein': 0.0
-                    }
-                
-                # Compare first half with second half
-                mid = len(sentences) // 2
-                text1_first = ' '.join(sentences[:mid])
-                text1_second = ' '.join(sentences[mid:])
-                text2 = text1_second
-                text1 = text1_first
+                # Self-analysis: score the passages repeated within the document
+                repetition = self.calculate_repetition(text1)
+                return {
+                    'overall': round(repetition, 3),
+                    'cosine': 0.0,
+                    'jaccard': 0.0,
+                    'levenshtein': 0.0,
+                    'repetition': round(repetition, 3)
+                }
             
             # Calculate different similarity metrics
             cosine_sim = self.calculate_cosine_similarity(text1, text2)
@@ -0,0 +1,369 @@
+"""
+Stylometric fingerprints of documents and of sliding windows within them.
+Each window of a document gets a vector of style features (function-word
+rates, word and sentence length, vocabulary richness, punctuation and
+capitalisation rates); a document's vector is the mean of its windows.
+Windows whose style departs from the rest of their document point at
+pasted content, and the closest-style corpus documents are found by a
+nearest-neighbour search over the stored document vectors. Vectors are
+kept under uploads/style/: document vectors in SQLite, window vectors in
+one file per document.
+"""
+
+import io
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.utils.instrumentation import instrument
+
+# Frequent closed-class words; their rates are largely independent of topic
+FUNCTION_WORDS = (
+    'the', 'of', 'and', 'a', 'to', 'in', 'is', 'that', 'it', 'for', 'as', 'with', 'was', 'on',
+    'be', 'by', 'this', 'are', 'or', 'not', 'but', 'from', 'at', 'which', 'an', 'have', 'has',
+    'had', 'they', 'their', 'we', 'our', 'you', 'i', 'he', 'she', 'his', 'her', 'its', 'can',
+    'will', 'would', 'should', 'could', 'may', 'there', 'these', 'those', 'been', 'were', 'if',
+    'so', 'than', 'then', 'also', 'such', 'more', 'most', 'very', 'into', 'about', 'however',
+    'thus', 'because', 'while', 'when', 'where', 'who'
+)
+_FUNCTION_WORD_IDS = {word: i for i, word in enumerate(FUNCTION_WORDS)}
+
+# Per-token indicators summed over a window (divided by the window length)
+_RATE_FEATURES = ('comma_rate', 'colon_rate', 'long_word_rate', 'capitalized_rate', 'digit_rate')
+
+FEATURE_NAMES = tuple(f"fw_{word}" for word in FUNCTION_WORDS) + (
+    'mean_word_length', 'mean_sentence_length', 'type_token_ratio'
+) + _RATE_FEATURES
+
+_EDGE_PUNCTUATION = re.compile(r'^\W+|\W+$')
+
+
+def _token_arrays(text: str) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Character spans of the whitespace tokens of a text and their per-token features."""
+    spans, word_ids, letters, function_ids = [], [], [], []
+    vocabulary = {}
+    indicators = {name: [] for name in ('sentence_end',) + _RATE_FEATURES}
+    for match in re.finditer(r'\S+', text):
+        token = match.group()
+        word = _EDGE_PUNCTUATION.sub('', token).lower()
+        spans.append((match.start(), match.end()))
+        word_ids.append(vocabulary.setdefault(word, len(vocabulary)))
+        letters.append(len(word))
+        function_ids.append(_FUNCTION_WORD_IDS.get(word, -1))
+        indicators['sentence_end'].append(token[-1] in '.!?')
+        indicators['comma_rate'].append(',' in token)
+        indicators['colon_rate'].append(';' in token or ':' in token)
+        indicators['long_word_rate'].append(len(word) >= 7)
+        indicators['capitalized_rate'].append(token[0].isupper())
+        indicators['digit_rate'].append(any(c.isdigit() for c in token))
+
+    features = {name: np.array(values, dtype=np.float64) for name, values in indicators.items()}
+    features['letters'] = np.array(letters, dtype=np.float64)
+    features['function_ids'] = np.array(function_ids, dtype=np.int64)
+    # Dense word IDs for the vocabulary-richness counter
+    features['word_ids'] = np.array(word_ids, dtype=np.int64)
+    return np.array(spans, dtype=np.int64).reshape(-1, 2), features
+
+
+def window_bounds(n: int, window: int, step: int) -> np.ndarray:
+    """[start, end) token bounds of the windows of an n-token text; the last window ends at n."""
+    if n == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    if n <= window:
+        return np.array([[0, n]], dtype=np.int64)
+    starts = list(range(0, n - window + 1, step))
+    if starts[-1] + window < n:
+        starts.append(n - window)
+    starts = np.array(starts, dtype=np.int64)
+    return np.stack([starts, starts + window], axis=1)
+
+
+def _distinct_counts(word_ids: np.ndarray, bounds: np.ndarray) -> np.ndarray:
+    """
+    Distinct words in every window, updated incrementally as the window
+    slides: each step only adds the tokens entering and removes those leaving,
+    so all windows together cost O(n).
+    """
+    counts = np.zeros(int(word_ids.max()) + 1 if len(word_ids) else 0, dtype=np.int64)
+    ids = word_ids.tolist()
+    distinct, start, end = 0, 0, 0
+    result = np.zeros(len(bounds), dtype=np.int64)
+    for i, (window_start, window_end) in enumerate(bounds.tolist()):
+        while end < window_end:
+            counts[ids[end]] += 1
+            distinct += counts[ids[end]] == 1
+            end += 1
+        while start < window_start:
+            counts[ids[start]] -= 1
+            distinct -= counts[ids[start]] == 0
+            start += 1
+        result[i] = distinct
+    return result
+
+
+def style_windows(text: str, window: int = 200, step: int = 50) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Style vectors of the sliding windows of a text.
+
+    Additive features are read from prefix sums and function-word counts
+    from sorted (word, position) keys, so every window costs O(1) or
+    O(log n) per feature regardless of its length.
+
+    Args:
+        text: Text to analyze
+        window: Window length in tokens
+        step: Tokens between window starts
+
+    Returns:
+        (vectors, spans): float32 array of shape (windows, len(FEATURE_NAMES))
+        and the [start, end) character span of every window
+    """
+    token_spans, features = _token_arrays(text)
+    n = len(token_spans)
+    bounds = window_bounds(n, window, step)
+    if not len(bounds):
+        return np.zeros((0, len(FEATURE_NAMES)), dtype=np.float32), np.zeros((0, 2), dtype=np.int64)
+
+    starts, ends = bounds[:, 0], bounds[:, 1]
+    lengths = (ends - starts).astype(np.float64)
+
+    def window_sums(values):
+        prefix = np.concatenate([[0.0], np.cumsum(values)])
+        return prefix[ends] - prefix[starts]
+
+    # Function-word counts: one searchsorted over word * (n + 1) + position keys
+    function_ids = features['function_ids']
+    positions = np.nonzero(function_ids >= 0)[0]
+    keys = np.sort(function_ids[positions] * (n + 1) + positions)
+    offsets = np.arange(len(FUNCTION_WORDS), dtype=np.int64)[:, None] * (n + 1)
+    function_counts = (np.searchsorted(keys, offsets + ends[None, :])
+                       - np.searchsorted(keys, offsets + starts[None, :])).T
+
+    sentences = np.maximum(window_sums(features['sentence_end']), 1.0)
+    columns = [
+        function_counts / lengths[:, None],
+        (window_sums(features['letters']) / lengths)[:, None],
+        (lengths / sentences)[:, None],
+        (_distinct_counts(features['word_ids'], bounds) / lengths)[:, None],
+    ]
+    columns += [(window_sums(features[name]) / lengths)[:, None] for name in _RATE_FEATURES]
+
+    spans = np.stack([token_spans[starts, 0], token_spans[ends - 1, 1]], axis=1)
+    return np.hstack(columns).astype(np.float32), spans
+
+
+def _robust_scores(vectors: np.ndarray) -> np.ndarray:
+    """
+    How far each vector lies from the others: RMS of per-feature z-scores
+    (median centre, the larger of MAD-based and plain standard deviation as
+    scale), each clipped at 6 so no single rare feature dominates.
+    """
+    centre = np.median(vectors, axis=0)
+    mad = 1.4826 * np.median(np.abs(vectors - centre), axis=0)
+    scale = np.maximum(np.maximum(mad, vectors.std(axis=0)), 1e-6)
+    z = np.clip((vectors - centre) / scale, -6.0, 6.0)
+    return np.sqrt(np.mean(z ** 2, axis=1))
+
+
+class StyleIndex:
+    """
+    Persisted stylometric vectors of the corpus.
+
+    Document vectors are rows of a SQLite table (documents.db), so adding or
+    removing a document writes one row whatever the corpus size, and worker
+    processes share every change. Searches run by brute force over an
+    in-memory matrix of all rows, which for a few dozen features stays fast
+    up to hundreds of thousands of documents; it is reloaded when the table
+    changed since it was read. Each document's window vectors are kept in
+    windows/<file_id>.npz.
+    """
+
+    DATABASE_FILENAME = 'documents.db'
+
+    def __init__(self, directory: str, window: int = 200, step: int = 50):
+        """
+        Args:
+            directory: Folder for the document table and the per-document windows
+            window: Window length in tokens
+            step: Tokens between window starts
+        """
+        self.directory = directory
+        self.window = window
+        self.step = step
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, 'windows'), exist_ok=True)
+
+        self._conn = None
+        self._pid = None
+        # In-memory copy of the table: ids, vectors, and the data_version it was read at
+        self._ids: List[str] = []
+        self._vectors = np.zeros((0, len(FEATURE_NAMES)), dtype=np.float32)
+        self._version = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        SQLite connection of the current process, opened on first use (and
+        again after fork(), as in FingerprintIndex). Called with self._lock held.
+        """
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(os.path.join(self.directory, self.DATABASE_FILENAME), check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS documents (file_id TEXT PRIMARY KEY, vector BLOB NOT NULL)')
+            conn.commit()
+            self._conn, self._pid = conn, os.getpid()
+            self._version = None
+        return self._conn
+
+    def _refresh(self):
+        """Reload the in-memory matrix if the table changed since it was read (call with self._lock held)."""
+        conn = self._connection()
+        version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if version == self._version:
+            return
+        width = len(FEATURE_NAMES) * np.dtype(np.float32).itemsize
+        rows = [(file_id, vector) for file_id, vector in conn.execute('SELECT file_id, vector FROM documents')
+                if len(vector) == width]
+        self._ids = [file_id for file_id, _ in rows]
+        self._vectors = (np.frombuffer(b''.join(vector for _, vector in rows), dtype=np.float32)
+                         .reshape(len(rows), len(FEATURE_NAMES)))
+        self._version = version
+
+    def _windows_path(self, file_id: str) -> str:
+        return os.path.join(self.directory, 'windows', f"{file_id}.npz")
+
+    @staticmethod
+    def _save(path: str, **arrays):
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_path, path)
+
+    def has_document(self, file_id: str) -> bool:
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute('SELECT 1 FROM documents WHERE file_id = ?', (file_id,)).fetchone()
+        return row is not None
+
+    @instrument('style.add')
+    def add_document(self, file_id: str, text: str) -> Dict:
+        """Compute and store a document's window vectors and its document vector."""
+        vectors, spans = style_windows(text, self.window, self.step)
+        if not len(vectors):
+            return {'file_id': file_id, 'windows': 0}
+        self._save(self._windows_path(file_id), vectors=vectors, spans=spans)
+
+        document_vector = vectors.mean(axis=0).astype(np.float32)
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO documents VALUES (?, ?)', (file_id, document_vector.tobytes()))
+            # data_version only tracks other connections' commits; reload on the next search
+            self._version = None
+        return {'file_id': file_id, 'windows': len(vectors)}
+
+    def remove_document(self, file_id: str) -> bool:
+        """Drop a document's vectors; returns whether it was indexed."""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                removed = conn.execute('DELETE FROM documents WHERE file_id = ?', (file_id,)).rowcount > 0
+            self._version = None
+        try:
+            os.remove(self._windows_path(file_id))
+        except FileNotFoundError:
+            pass
+        return removed
+
+    def document_vector(self, file_id: str) -> Optional[np.ndarray]:
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute('SELECT vector FROM documents WHERE file_id = ?', (file_id,)).fetchone()
+        return None if row is None else np.frombuffer(row[0], dtype=np.float32).copy()
+
+    def features(self, vector: np.ndarray) -> Dict[str, float]:
+        """A style vector as a feature name -> value dict."""
+        return {name: round(float(value), 4) for name, value in zip(FEATURE_NAMES, vector)}
+
+    @instrument('style.nearest')
+    def nearest(self, vector: np.ndarray, k: int = 5, exclude_file_id: Optional[str] = None) -> List[Dict]:
+        """
+        Corpus documents closest in style to a vector.
+
+        Features are standardised by their spread over the corpus, so rates
+        and lengths weigh alike; distance is the RMS difference per feature.
+        """
+        with self._lock:
+            self._refresh()
+            ids, vectors = self._ids, self._vectors
+        if not ids:
+            return []
+
+        scale = np.maximum(vectors.std(axis=0), 1e-6) if len(ids) > 1 else np.maximum(np.abs(vectors[0]), 1e-6)
+        distances = np.sqrt(np.mean(((vectors - vector[None, :]) / scale) ** 2, axis=1))
+        if exclude_file_id in ids:
+            distances[ids.index(exclude_file_id)] = np.inf
+
+        k = min(k, len(ids))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        return [
+            {'file_id': ids[i], 'distance': round(float(distances[i]), 4)}
+            for i in top if np.isfinite(distances[i])
+        ]
+
+    @instrument('style.shifts')
+    def style_shifts(self, text: str, threshold: float = 1.0, k: int = 3,
+                     exclude_file_id: Optional[str] = None) -> Dict:
+        """
+        Passages of a text whose style departs from the rest of it.
+
+        Every window is scored against the text's other windows; overlapping
+        windows above threshold are merged into spans, and each span lists the
+        corpus documents closest to its style (a possible source).
+
+        Args:
+            text: Text to check
+            threshold: Minimum window score (RMS robust z-score) of a shift; uniform
+                text stays below about 0.9 with 200-token windows
+            k: Closest-style corpus documents per shift
+            exclude_file_id: Document to leave out of the corpus lookup (the text itself)
+
+        Returns:
+            Dict with 'windows', 'shifts' (character spans with their peak score
+            and nearest documents), 'shift_ratio' (share of flagged windows) and
+            'similar_documents' (closest-style documents for the whole text)
+        """
+        vectors, spans = style_windows(text, self.window, self.step)
+        result = {'windows': len(vectors), 'shifts': [], 'shift_ratio': 0.0, 'similar_documents': []}
+        if not len(vectors):
+            return result
+        result['similar_documents'] = self.nearest(vectors.mean(axis=0), k=k, exclude_file_id=exclude_file_id)
+        # Too few windows for the rest of the text to define a style
+        if len(vectors) < 4:
+            return result
+
+        scores = _robust_scores(vectors.astype(np.float64))
+        flagged = np.nonzero(scores > threshold)[0]
+        groups = []
+        for i in flagged.tolist():
+            if groups and spans[i, 0] < spans[groups[-1][-1], 1]:
+                groups[-1].append(i)
+            else:
+                groups.append([i])
+
+        for group in groups:
+            result['shifts'].append({
+                'start': int(spans[group[0], 0]),
+                'end': int(spans[group[-1], 1]),
+                'score': round(float(scores[group].max()), 3),
+                'windows': len(group),
+                'similar_documents': self.nearest(vectors[group].mean(axis=0), k=k, exclude_file_id=exclude_file_id)
+            })
+        result['shift_ratio'] = round(len(flagged) / len(vectors), 3)
+        return result
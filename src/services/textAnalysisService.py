@@ -9,8 +9,9 @@ import nltk
 from nltk.tokenize import word_tokenize, sent_tokenize
 from nltk.corpus import stopwords
 from nltk.tag import pos_tag
-from textstat import flesch_reading_ease, flesch_kincaid_grade
 import string
+from src.utils.instrumentation import instrument, record_error
+from src.utils.readability import readability_indices, text_counts
 
 class TextAnalysisService:
     """Service for analyzing text characteristics and patterns."""
@@ -29,6 +30,7 @@ class TextAnalysisService:
         except LookupError:
             nltk.download('averaged_perceptron_tagger')
     
+    @instrument('text_analysis')
     def analyze_text(self, text):
         """Perform comprehensive text analysis."""
         try:
@@ -58,6 +60,7 @@ class TextAnalysisService:
         
         except Exception as e:
             print(f"Error in text analysis: {e}")
+            record_error('text_analysis')
             return {}
     
     def _get_basic_statistics(self, text):
@@ -141,48 +144,24 @@ class TextAnalysisService:
     def _get_readability_metrics(self, text):
         """Calculate readability metrics."""
         try:
-            # Using textstat library for standard readability metrics
-            flesch_ease = flesch_reading_ease(text)
-            flesch_grade = flesch_kincaid_grade(text)
-            
-            # Custom metrics
             sentences = sent_tokenize(text)
-            words = word_tokenize(text)
+            words = [word for word in word_tokenize(text) if word.isalpha()]
+            
+            # One pass over the words; every index shares the counts
+            counts = text_counts(words, len(sentences))
+            indices = readability_indices(counts)
             
-            # Average word length
-            word_lengths = [len(word) for word in words if word.isalpha()]
-            avg_word_length = np.mean(word_lengths) if word_lengths else 0
-            
-            # Syllable approximation (rough estimate)
-            def count_syllables(word):
-                word = word.lower()
-                vowels = 'aeiouy'
-                syllables = 0
-                previous_was_vowel = False
-                
-                for char in word:
-                    if char in vowels:
-                        if not previous_was_vowel:
-                            syllables += 1
-                        previous_was_vowel = True
-                    else:
-                        previous_was_vowel = False
-                
-                # Handle silent 'e'
-                if word.endswith('e') and syllables > 1:
-                    syllables -= 1
-                
-                return max(1, syllables)  # Every word has at least one syllable
-            
-            total_syllables = sum(count_syllables(word) for word in words if word.isalpha())
-            avg_syllables_per_word = total_syllables / len(words) if words else 0
+            avg_word_length = counts['letters'] / counts['words'] if counts['words'] else 0
+            avg_syllables_per_word = counts['syllables'] / counts['words'] if counts['words'] else 0
             
             return {
-                'flesch_reading_ease': round(flesch_ease, 2),
-                'flesch_kincaid_grade': round(flesch_grade, 2),
+                'flesch_reading_ease': round(indices['flesch_reading_ease'], 2),
+                'flesch_kincaid_grade': round(indices['flesch_kincaid_grade'], 2),
+                'gunning_fog': round(indices['gunning_fog'], 2),
+                'smog_index': round(indices['smog_index'], 2),
                 'average_word_length': round(avg_word_length, 2),
                 'average_syllables_per_word': round(avg_syllables_per_word, 2),
-                'reading_level': self._interpret_flesch_score(flesch_ease)
+                'reading_level': self._interpret_flesch_score(indices['flesch_reading_ease'])
             }
         
         except Exception as e:
@@ -3,9 +3,12 @@ Text Highlighter Service for plagiarism detection.
 Highlights suspicious text passages and provides detailed analysis.
 """
 
+import html
 import re
+import numpy as np
 from typing import List, Dict, Tuple
 from difflib import SequenceMatcher
+from src.utils.instrumentation import instrument, record_error
 
 
 class TextHighlighter:
@@ -38,6 +41,7 @@ class TextHighlighter:
             sentences = [s.strip() for s in sentences if s.strip()]
             return sentences if sentences else [text]
     
+    @instrument('highlighting')
     def highlight_suspicious_text(self, text1: str, text2: str, threshold: float = 0.7) -> Dict:
         """
         Highlight text passages from text1 that match text2 above threshold.
@@ -73,12 +77,230 @@ class TextHighlighter:
         
         except Exception as e:
             print(f"Error highlighting text: {e}")
+            record_error('highlighting')
             return {
                 'error': str(e),
                 'highlighted_html': text1,
                 'similarity_details': []
             }
     
+    @instrument('highlighting.fingerprint')
+    def highlight_copied_passages(self, text1: str, text2: str, k: int = 5, window: int = 4) -> Dict:
+        """
+        Highlight passages of text1 copied from text2 using winnowing fingerprints.
+        
+        Unlike highlight_suspicious_text this locates exact shared passages with
+        character offsets in near-linear time instead of comparing every
+        sentence pair.
+        
+        Args:
+            text1: Original text (the pasted content)
+            text2: Reference text (uploaded document or comparison text)
+            k: k-gram length in tokens
+            window: Winnowing window size
+        
+        Returns:
+            Dictionary with highlighted text and passage details
+        """
+        try:
+            from src.services.advancedSimilarityService import AdvancedSimilarityService
+            from src.services.fingerprintIndex import match_texts
+            
+            tokenizer = AdvancedSimilarityService().tokenize_with_offsets
+            matches = match_texts(text1, text2, tokenizer, k=k, window=window)
+            
+            details = [{
+                'sentence': text1[p['query_start']:p['query_end']],
+                'matched_sentence': text2[p['source_start']:p['source_end']],
+                'similarity': 1.0,
+                'start': p['query_start'],
+                'end': p['query_end'],
+                'match_start': p['source_start'],
+                'match_end': p['source_end'],
+                'token_length': p['token_length']
+            } for p in matches['passages']]
+            
+            return {
+                'total_sentences': len(self._split_sentences(text1)),
+                'highlighted_sentences': len(details),
+                'plagiarism_percentage': matches['coverage'] * 100,
+                'similarity_details': details,
+                'highlighted_html': self.highlight_spans(text1, [(d['start'], d['end']) for d in details])
+            }
+        
+        except Exception as e:
+            print(f"Error highlighting copied passages: {e}")
+            record_error('highlighting.fingerprint')
+            return {
+                'error': str(e),
+                'highlighted_html': text1,
+                'similarity_details': []
+            }
+    
+    @instrument('highlighting.bundle')
+    def highlight_bundles(self, bundle1, bundle2, threshold: float = 0.7, method: str = 'sentence',
+                          min_length: int = 5, text: str = None) -> Dict:
+        """
+        Highlight a stored document against another from their feature bundles.
+        
+        Sentences are matched on the bundles' token IDs (token-level SequenceMatcher
+        ratios from the sentence metric's kernel, not character-level ones) and
+        copied passages with a suffix array; spans come from the stored token
+        offsets. The text is only needed to render the HTML and the matched
+        passages, so they are left out when it is not given.
+        
+        Args:
+            bundle1: FeatureBundle of the document to highlight
+            bundle2: FeatureBundle of the reference document
+            threshold: Sentence similarity threshold (method 'sentence')
+            method: 'sentence' or 'fingerprint' (shared passages of at least min_length tokens)
+            min_length: Shortest copied passage in tokens
+            text: Text of the first document, for the HTML
+        
+        Returns:
+            Dictionary in the format of highlight_suspicious_text
+        """
+        try:
+            from src.services.advancedSimilarityService import AdvancedSimilarityService
+            from src.services.fingerprintIndex import token_coverage
+            from src.utils.suffixArray import intern_sequences, shared_passages
+            
+            spans1 = bundle1['token_spans']
+            spans2 = bundle2['token_spans']
+            ranges1 = bundle1['sentence_ranges']
+            ranges2 = bundle2['sentence_ranges']
+            details = []
+            
+            if method == 'fingerprint':
+                (ids1, ids2), _ = intern_sequences(bundle1.token_list(), bundle2.token_list())
+                passages = shared_passages(ids1, ids2, min_length=min_length)
+                for p in passages:
+                    end1 = p['start1'] + p['length'] - 1
+                    end2 = p['start2'] + p['length'] - 1
+                    details.append({
+                        'similarity': 1.0,
+                        'start': int(spans1[p['start1']][0]),
+                        'end': int(spans1[end1][1]),
+                        'match_start': int(spans2[p['start2']][0]),
+                        'match_end': int(spans2[end2][1]),
+                        'token_length': p['length']
+                    })
+                covered = [{'query_token_start': p['start1'], 'query_token_end': p['start1'] + p['length']}
+                           for p in passages]
+                percentage = token_coverage(covered, bundle1.token_count) * 100
+            else:
+                sentences1, sentences2 = bundle1.sentence_lists(), bundle2.sentence_lists()
+                if sentences1 and sentences2:
+                    kernel = AdvancedSimilarityService().sentence_match_kernel
+                    row_max, row_argmax = kernel(sentences1, sentences2)
+                    for i in np.flatnonzero(row_max >= threshold):
+                        j = int(row_argmax[i])
+                        (start1, end1), (start2, end2) = ranges1[i], ranges2[j]
+                        if end1 <= start1 or end2 <= start2:
+                            continue
+                        details.append({
+                            'similarity': round(float(row_max[i]), 3),
+                            'sentence_index': int(i),
+                            'match_index': j,
+                            'start': int(spans1[start1][0]),
+                            'end': int(spans1[end1 - 1][1]),
+                            'match_start': int(spans2[start2][0]),
+                            'match_end': int(spans2[end2 - 1][1])
+                        })
+                percentage = (len(details) / len(sentences1) * 100) if sentences1 else 0
+            
+            if text is not None:
+                for detail in details:
+                    detail['sentence'] = text[detail['start']:detail['end']]
+            
+            return {
+                'total_sentences': len(ranges1),
+                'highlighted_sentences': len(details),
+                'plagiarism_percentage': percentage,
+                'similarity_details': details,
+                'highlighted_html': self.highlight_spans(text, [(d['start'], d['end']) for d in details])
+                                    if text is not None else None
+            }
+        
+        except Exception as e:
+            print(f"Error highlighting from bundles: {e}")
+            record_error('highlighting.bundle')
+            return {
+                'error': str(e),
+                'highlighted_html': text,
+                'similarity_details': []
+            }
+    
+    def highlight_spans(self, text: str, spans: List[Tuple[int, int]], css_class: str = 'passage-highlight') -> str:
+        """
+        Wrap character spans of text in <mark> tags (overlapping spans are merged).
+        
+        Args:
+            text: Text to highlight
+            spans: (start, end) character offsets
+            css_class: CSS class of the highlight
+        
+        Returns:
+            HTML string with highlighted spans
+        """
+        merged = []
+        for start, end in sorted(spans):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        
+        html_parts = ['<div class="highlighted-text">']
+        cursor = 0
+        for start, end in merged:
+            html_parts.append(html.escape(text[cursor:start]))
+            html_parts.append(f'<mark class="{css_class}">{html.escape(text[start:end])}</mark>')
+            cursor = end
+        html_parts.append(html.escape(text[cursor:]))
+        html_parts.append('</div>')
+        return ''.join(html_parts)
+
+    def highlight_sentence_scores(self, text: str, sentences: List[Dict], threshold: float = 0.5) -> str:
+        """
+        Highlight sentences by a per-sentence score, e.g. the ghostwriting
+        detector's likelihood that a sentence was machine-generated.
+
+        Args:
+            text: Scored text
+            sentences: Dicts with 'start', 'end' and 'score' (None if unscored)
+            threshold: Lowest score that is highlighted
+
+        Returns:
+            HTML string with the sentences at or above threshold highlighted
+        """
+        html_parts = ['<div class="highlighted-text">']
+        cursor = 0
+        for sentence in sentences:
+            score = sentence.get('score')
+            start, end = sentence['start'], sentence['end']
+            if score is None or score < threshold or start < cursor:
+                continue
+
+            if score >= 0.95:
+                color_class = 'highlight-critical'
+            elif score >= 0.85:
+                color_class = 'highlight-high'
+            elif score >= 0.75:
+                color_class = 'highlight-medium'
+            else:
+                color_class = 'highlight-low'
+
+            html_parts.append(html.escape(text[cursor:start]))
+            html_parts.append(
+                f'<span class="highlighted-sentence {color_class}" data-score="{score}" '
+                f'title="Generated-text likelihood: {int(score * 100)}%">'
+                f'{html.escape(text[start:end])}</span>'
+            )
+            cursor = end
+        html_parts.append(html.escape(text[cursor:]))
+        html_parts.append('</div>')
+        return ''.join(html_parts)
+
     def _find_similar_sentences(self, sentences1: List[str], sentences2: List[str], threshold: float) -> List[Dict]:
         """
         Find sentences from text1 that are similar to sentences in text2.
@@ -0,0 +1,491 @@
+"""
+Chunk-level vector index for semantic plagiarism search.
+Keeps a persisted FAISS (CPU) index of embedded chunks for every uploaded
+document, supports incremental add/delete and top-k chunk search.
+"""
+
+import json
+import math
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import faiss
+
+# Codes the FAISS index keeps per vector: float32, float16 (half the memory) or
+# product-quantized bytes (pq, lossy; used once the index is trained, float16 before)
+INDEX_STORAGE_MODES = ('float16', 'float32', 'pq')
+
+# PQ codebooks and PCA need a corpus to train on; the IVF threshold must be at least this
+LOSSY_MIN_TRAINING = 1024
+
+from src.utils.fileLock import file_lock, file_stamp
+
+
+def split_with_offsets(text: str, chunker: Callable[[str], List[str]]):
+    """Split text into (chunk, start, end) tuples with character offsets."""
+    chunks = []
+    cursor = 0
+    for chunk in chunker(text):
+        start = text.find(chunk, cursor)
+        if start < 0:
+            start = cursor
+        chunks.append((chunk, start, start + len(chunk)))
+        cursor = start + 1
+    return chunks
+
+
+def embed_texts(embeddings, texts: List[str]) -> np.ndarray:
+    """L2-normalised float32 embeddings (inner product = cosine similarity)."""
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def _ivf(index):
+    """The IVF index inside an index (behind a pre-transform), or None."""
+    if index is None:
+        return None
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+
+class ChunkVectorIndex:
+    """
+    Persisted FAISS index over document chunks.
+
+    Small corpora use an exact inner-product index. Once the number of chunks
+    reaches ivf_threshold, the index is rebuilt as an IVF index (retrained when
+    the corpus has grown 4x since the last training) so query cost stays
+    sub-linear. Vectors are L2-normalised, so scores are cosine similarities.
+    With float16 storage (the default) both index types keep scalar-quantized
+    half-precision codes instead of float32 vectors, and a retraining reads
+    the vectors back from the index itself; float16 codes re-encode exactly,
+    so rebuilds add no further error.
+
+    Two lossy options shrink the trained (IVF) index further: pq storage
+    keeps product-quantized codes of pq_bytes bytes per vector, and pca_dim
+    projects the vectors onto their first principal components before
+    indexing (searched by L2 distance, which PCA's centring preserves, and
+    reported as cosine). Both are trained when the IVF index is built and
+    retrained from their own reconstructions, so every retraining adds some
+    error; measure the recall with benchmarks/embedding_storage.py.
+
+    With mmap the index file is memory-mapped read-only instead of read
+    into RAM, so worker processes share its pages through the page cache.
+    A write reads the index fully, saves it and maps the new file again.
+
+    Several worker processes may share index_dir: writes hold an exclusive
+    file lock and every operation first reloads the files if another process
+    saved them since this one last read or wrote them.
+    """
+
+    INDEX_FILENAME = 'chunks.faiss'
+    META_FILENAME = 'chunks_meta.json'
+    LOCK_FILENAME = 'chunks.lock'
+
+    def __init__(self, embeddings, index_dir: str, chunker: Callable[[str], List[str]],
+                 ivf_threshold: int = 4096, nprobe: int = 8, storage: Optional[str] = None,
+                 pca_dim: Optional[int] = None, pq_bytes: Optional[int] = None, mmap: Optional[bool] = None):
+        """
+        Initialize the chunk index.
+
+        Args:
+            embeddings: Object exposing embed_documents(texts)
+            index_dir: Directory holding the index and metadata files
+            chunker: Callable splitting a text into chunks
+            ivf_threshold: Number of chunks at which to switch to an IVF index
+            nprobe: Number of IVF lists probed per query
+            storage: 'float16', 'float32' or 'pq' codes; defaults to the
+                     CHUNK_INDEX_STORAGE environment variable, then 'float16'.
+                     An index saved with other codes is converted on open.
+            pca_dim: Dimensions kept by PCA in the IVF index (CHUNK_INDEX_PCA_DIM;
+                     0 keeps them all)
+            pq_bytes: Bytes per vector of pq codes (CHUNK_INDEX_PQ_BYTES; default
+                      one per 8 dimensions)
+            mmap: Memory-map the index file (CHUNK_INDEX_MMAP, on unless '0')
+        """
+        storage = storage or os.environ.get('CHUNK_INDEX_STORAGE', 'float16')
+        if storage not in INDEX_STORAGE_MODES:
+            raise ValueError(f"Unknown index storage '{storage}', expected one of {INDEX_STORAGE_MODES}")
+        if pca_dim is None:
+            pca_dim = int(os.environ.get('CHUNK_INDEX_PCA_DIM', 0))
+        if pq_bytes is None:
+            pq_bytes = int(os.environ.get('CHUNK_INDEX_PQ_BYTES', 0))
+        if mmap is None:
+            mmap = os.environ.get('CHUNK_INDEX_MMAP', '1') != '0'
+        if (storage == 'pq' or pca_dim) and ivf_threshold < LOSSY_MIN_TRAINING:
+            raise ValueError(f"pq storage and PCA need ivf_threshold >= {LOSSY_MIN_TRAINING} to train on")
+        self.embeddings = embeddings
+        self.index_dir = index_dir
+        self.chunker = chunker
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.storage = storage
+        self.pca_dim = pca_dim
+        self.pq_bytes = pq_bytes
+        self.mmap = mmap
+        self._lock = threading.RLock()
+
+        os.makedirs(index_dir, exist_ok=True)
+        self._index_path = os.path.join(index_dir, self.INDEX_FILENAME)
+        self._meta_path = os.path.join(index_dir, self.META_FILENAME)
+        self._lock_path = os.path.join(index_dir, self.LOCK_FILENAME)
+        self._stamp = None  # file_stamp() of the metadata this process last loaded or saved
+
+        self.index = None
+        self.chunks = {}        # chunk_id -> chunk metadata
+        self.documents = {}     # file_id -> [chunk_id, ...]
+        self.next_id = 0
+        self.trained_size = 0
+        self._stored_as = self._layout  # (codes, PCA dimensions) of the loaded index
+        self._mapped = False  # Whether self.index is a read-only mapping of the file
+        with file_lock(self._lock_path):
+            self._load(mapped=False)
+            if self._stored_as != self._layout:
+                self._convert()
+                self._save()
+            elif self.mmap:
+                self._load()
+
+    @property
+    def _layout(self):
+        return self.storage, self.pca_dim
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _load(self, mapped: Optional[bool] = None):
+        """
+        Load index and metadata from disk, or start empty.
+
+        Args:
+            mapped: Memory-map the index read-only (default self.mmap); writes need False
+        """
+        mapped = self.mmap if mapped is None else mapped
+        self._stamp = file_stamp(self._meta_path)
+        if os.path.exists(self._index_path) and os.path.exists(self._meta_path):
+            try:
+                with open(self._meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                self.index = faiss.read_index(self._index_path, self._mmap_flags(meta) if mapped else 0)
+                self._mapped = mapped
+                self.chunks = {int(k): v for k, v in meta['chunks'].items()}
+                self.documents = meta['documents']
+                self.next_id = meta['next_id']
+                self.trained_size = meta.get('trained_size', 0)
+                # Indexes saved before the storage option held float32 vectors
+                self._stored_as = (meta.get('storage', 'float32'), meta.get('pca_dim', 0))
+                self._configure()
+                return
+            except Exception as e:
+                print(f"Error loading chunk index, starting empty: {e}")
+
+        self.index = None
+        self._mapped = False
+        self.chunks = {}
+        self.documents = {}
+        self.next_id = 0
+        self.trained_size = 0
+        self._stored_as = self._layout
+
+    @staticmethod
+    def _mmap_flags(meta: Dict) -> int:
+        """
+        read_index flags mapping the codes of a saved index: IVF inverted lists
+        or the flat index's code array. A mapped index must not be modified.
+        """
+        return faiss.IO_FLAG_MMAP if meta.get('trained_size') else faiss.IO_FLAG_MMAP_IFC
+
+    def _writable(self):
+        """Replace a mapped index by a full in-memory copy before a write (call under the file lock)."""
+        if self._mapped:
+            self._load(mapped=False)
+
+    def _convert(self):
+        """Re-add every vector of the loaded index to a new index with this instance's codes."""
+        ids, vectors = self._all_vectors()
+        ivf = _ivf(self.index)
+        if ivf is not None and ivf is self.index and not self.pca_dim and len(ids):
+            # Keep the trained lists, so the converted index answers like the old one
+            quantizer = ivf.quantizer
+            self.index = self._new_ivf_index(vectors, quantizer.reconstruct_n(0, quantizer.ntotal))
+        elif len(ids) >= self.ivf_threshold:
+            self.index = self._new_ivf_index(vectors)
+            self.trained_size = len(ids)
+        else:
+            self.index = self._new_flat_index(self.index.d)
+            self.trained_size = 0
+        if len(ids):
+            self.index.add_with_ids(vectors, ids)
+        self._stored_as = self._layout
+        self._configure()
+
+    def _save(self):
+        """Write index and metadata atomically."""
+        if self.index is not None:
+            tmp_index = self._index_path + '.tmp'
+            faiss.write_index(self.index, tmp_index)
+            os.replace(tmp_index, self._index_path)
+
+        tmp_meta = self._meta_path + '.tmp'
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump({
+                'chunks': self.chunks,
+                'documents': self.documents,
+                'next_id': self.next_id,
+                'trained_size': self.trained_size,
+                'storage': self._stored_as[0],
+                'pca_dim': self._stored_as[1]
+            }, f)
+        os.replace(tmp_meta, self._meta_path)
+        self._stamp = file_stamp(self._meta_path)
+        if self.mmap:
+            # Drop the in-memory copy for a mapping of the file just written
+            self._load()
+
+    def _refresh(self, write: bool = False):
+        """
+        Reload the index if another process saved it (call under the file lock).
+
+        With write, the index is loaded fully so it can be modified.
+        """
+        if file_stamp(self._meta_path) != self._stamp:
+            self._load(mapped=False if write else None)
+            if self._stored_as != self._layout:
+                self._writable()
+                self._convert()
+        if write:
+            self._writable()
+
+    # ------------------------------------------------------------------
+    # Index structure
+    # ------------------------------------------------------------------
+
+    def _configure(self):
+        """Apply query-time parameters to the loaded index."""
+        ivf = _ivf(self.index)
+        if ivf is not None:
+            ivf.nprobe = self.nprobe
+
+    def _new_flat_index(self, dim: int):
+        # pq codes need a trained codebook; until the IVF index is built they are float16
+        if self.storage in ('float16', 'pq'):
+            return faiss.IndexIDMap2(faiss.IndexScalarQuantizer(
+                dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT
+            ))
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+    def _new_ivf_index(self, vectors: np.ndarray, centroids: Optional[np.ndarray] = None):
+        """Train an IVF index on the given vectors (or reuse already trained list centroids)."""
+        dim = vectors.shape[1]
+        nlist = max(1, min(int(4 * math.sqrt(len(vectors))), len(vectors) // 39))
+        pca = None
+        metric = faiss.METRIC_INNER_PRODUCT
+        if self.pca_dim and self.pca_dim < dim:
+            # PCA centres the vectors, which changes inner products but not L2 distances
+            pca = faiss.PCAMatrix(dim, self.pca_dim)
+            dim, metric = self.pca_dim, faiss.METRIC_L2
+        quantizer = faiss.IndexFlatIP(dim) if metric == faiss.METRIC_INNER_PRODUCT else faiss.IndexFlatL2(dim)
+        if centroids is not None:
+            # A quantizer holding nlist centroids is not retrained by train()
+            nlist = len(centroids)
+            quantizer.add(np.ascontiguousarray(centroids, dtype=np.float32))
+        if self.storage == 'pq':
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, self._pq_subquantizers(dim), 8, metric)
+        elif self.storage == 'float16':
+            # Codes of the vectors themselves, not of residuals, so they re-encode exactly
+            index = faiss.IndexIVFScalarQuantizer(
+                quantizer, dim, nlist, faiss.ScalarQuantizer.QT_fp16, metric, False
+            )
+        else:
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        if pca is not None:
+            index = faiss.IndexPreTransform(pca, index)
+        index.train(vectors)
+        return index
+
+    def _pq_subquantizers(self, dim: int) -> int:
+        """Bytes per pq code: the largest divisor of dim up to pq_bytes (default dim / 8)."""
+        target = min(self.pq_bytes or max(1, dim // 8), dim)
+        return max(m for m in range(1, target + 1) if dim % m == 0)
+
+    def _all_vectors(self):
+        """Every live vector with its id, reconstructed from the index."""
+        ids = np.array(sorted(self.chunks.keys()), dtype=np.int64)
+        if not len(ids):
+            return ids, np.zeros((0, self.index.d), dtype=np.float32)
+        return ids, np.ascontiguousarray(self.index.reconstruct_batch(ids), dtype=np.float32)
+
+    def _maybe_rebuild(self):
+        """Switch to (or retrain) the IVF index when the corpus has grown enough."""
+        total = self.index.ntotal
+        if total < self.ivf_threshold:
+            return
+        if self.trained_size and total < 4 * self.trained_size:
+            return
+
+        ids, vectors = self._all_vectors()
+        index = self._new_ivf_index(vectors)
+        index.add_with_ids(vectors, ids)
+        self.index = index
+        self.trained_size = total
+        self._configure()
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        return embed_texts(self.embeddings, texts)
+
+    def _split(self, text: str):
+        """Split text into chunks with their character offsets."""
+        return split_with_offsets(text, self.chunker)
+
+    def has_document(self, file_id: str) -> bool:
+        """Check whether a document is indexed."""
+        with self._lock, file_lock(self._lock_path, shared=True):
+            self._refresh()
+            return file_id in self.documents
+
+    def add_document(self, file_id: str, text: str) -> int:
+        """
+        Chunk, embed and add a document to the index.
+
+        Returns:
+            Number of chunks indexed
+        """
+        chunks = self._split(text)
+        if not chunks:
+            return 0
+
+        vectors = self._embed([chunk for chunk, _, _ in chunks])
+        return self.add_chunks(file_id, chunks, vectors)
+
+    def add_chunks(self, file_id: str, chunks: List, vectors: np.ndarray) -> int:
+        """Add a document from its (chunk, start, end) tuples and normalised vectors."""
+        with self._lock, file_lock(self._lock_path):
+            self._refresh(write=True)
+            if file_id in self.documents:
+                self._remove(file_id)
+
+            if self.index is None:
+                self.index = self._new_flat_index(vectors.shape[1])
+
+            ids = np.arange(self.next_id, self.next_id + len(chunks), dtype=np.int64)
+            self.next_id += len(chunks)
+            self.index.add_with_ids(vectors, ids)
+
+            for chunk_id, (chunk, start, end), position in zip(ids, chunks, range(len(chunks))):
+                self.chunks[int(chunk_id)] = {
+                    'file_id': file_id,
+                    'chunk_index': position,
+                    'start': start,
+                    'end': end,
+                    'preview': chunk[:200]
+                }
+            self.documents[file_id] = [int(i) for i in ids]
+
+            self._maybe_rebuild()
+            self._save()
+
+        return len(chunks)
+
+    def _remove(self, file_id: str) -> int:
+        chunk_ids = self.documents.pop(file_id, [])
+        if chunk_ids and self.index is not None:
+            self.index.remove_ids(np.array(chunk_ids, dtype=np.int64))
+        for chunk_id in chunk_ids:
+            self.chunks.pop(chunk_id, None)
+        return len(chunk_ids)
+
+    def remove_document(self, file_id: str) -> int:
+        """
+        Remove all chunks of a document.
+
+        Returns:
+            Number of chunks removed
+        """
+        with self._lock, file_lock(self._lock_path):
+            self._refresh(write=True)
+            removed = self._remove(file_id)
+            if removed:
+                self._save()
+            return removed
+
+    def search_text(self, text: str, k: int = 5, exclude_file_id: Optional[str] = None) -> List[Dict]:
+        """
+        Find the indexed chunks most similar to the chunks of a text.
+
+        Args:
+            text: Query text (chunked the same way as indexed documents)
+            k: Number of matches to return
+            exclude_file_id: Document to leave out (usually the query document)
+
+        Returns:
+            Top-k chunk matches sorted by similarity
+        """
+        query_chunks = self._split(text)
+        if not query_chunks:
+            return []
+
+        vectors = self._embed([chunk for chunk, _, _ in query_chunks])
+        return self.search_vectors(query_chunks, vectors, k, exclude_file_id)
+
+    def search_vectors(self, query_chunks: List, vectors: np.ndarray, k: int = 5,
+                       exclude_file_id: Optional[str] = None) -> List[Dict]:
+        """search_text() for a query already split and embedded."""
+        with self._lock, file_lock(self._lock_path, shared=True):
+            self._refresh()
+            if self.index is None or self.index.ntotal == 0:
+                return []
+
+            # Over-fetch so the excluded document cannot crowd out other matches
+            excluded = len(self.documents.get(exclude_file_id, [])) if exclude_file_id else 0
+            fetch = min(self.index.ntotal, k + excluded)
+            scores, ids = self.index.search(vectors, fetch)
+            if self.index.metric_type == faiss.METRIC_L2:
+                # Squared distances of unit vectors: cosine = 1 - d / 2
+                scores = 1.0 - scores / 2.0
+
+            best = {}
+            for query_pos, (row_scores, row_ids) in enumerate(zip(scores, ids)):
+                for score, chunk_id in zip(row_scores, row_ids):
+                    meta = self.chunks.get(int(chunk_id))
+                    if chunk_id < 0 or meta is None or meta['file_id'] == exclude_file_id:
+                        continue
+                    if chunk_id not in best or score > best[chunk_id]['similarity']:
+                        chunk_text, start, end = query_chunks[query_pos]
+                        best[chunk_id] = {
+                            'file_id': meta['file_id'],
+                            'chunk_index': meta['chunk_index'],
+                            'match_start': meta['start'],
+                            'match_end': meta['end'],
+                            'matched_preview': meta['preview'],
+                            'query_chunk_index': query_pos,
+                            'query_start': start,
+                            'query_end': end,
+                            'similarity': round(float(score), 3)
+                        }
+
+        matches = sorted(best.values(), key=lambda m: m['similarity'], reverse=True)
+        return matches[:k]
+
+    def stats(self) -> Dict:
+        """Index size and structure summary."""
+        with self._lock, file_lock(self._lock_path, shared=True):
+            self._refresh()
+            return {
+                'documents': len(self.documents),
+                'chunks': len(self.chunks),
+                'index_type': type(self.index).__name__ if self.index is not None else None,
+                'storage': self._stored_as[0],
+                'pca_dim': self._stored_as[1],
+                'memory_mapped': self._mapped
+            }
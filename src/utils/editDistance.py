@@ -0,0 +1,176 @@
+"""
+Bounded edit-distance engine for similarity scoring.
+Implements Myers/Hyyrö bit-parallel Levenshtein distance over characters or
+token sequences, with threshold-based early exit, a per-call time cap and a
+chunked approximation for long inputs.
+"""
+
+import time
+from typing import Dict, Hashable, Optional, Sequence
+
+# Inputs longer than this (in symbols) go straight to the chunked approximation
+MAX_EXACT_LENGTH = 20000
+# Chunk length used by the approximation
+CHUNK_SIZE = 2000
+# Columns processed between deadline checks
+_DEADLINE_CHECK_INTERVAL = 256
+
+
+def _pattern_masks(pattern: Sequence[Hashable]) -> Dict[Hashable, int]:
+    """Bit mask of the positions of every symbol in the pattern."""
+    masks = {}
+    bit = 1
+    for symbol in pattern:
+        masks[symbol] = masks.get(symbol, 0) | bit
+        bit <<= 1
+    return masks
+
+
+def bounded_levenshtein(seq1: Sequence[Hashable], seq2: Sequence[Hashable],
+                        max_distance: Optional[int] = None,
+                        deadline: Optional[float] = None) -> Optional[int]:
+    """
+    Levenshtein distance using the Myers/Hyyrö bit-vector algorithm.
+
+    The shorter sequence is encoded as Python integer bit-vectors, so each
+    column of the DP matrix costs a handful of big-integer operations
+    (O(n * m / 64) word operations overall). Works on strings or on any
+    sequence of hashable tokens (e.g. token IDs).
+
+    Args:
+        seq1: First sequence
+        seq2: Second sequence
+        max_distance: Stop early and return None once the distance is known to exceed this
+        deadline: time.perf_counter() value after which to give up and return None
+
+    Returns:
+        Exact edit distance, or None if it exceeds max_distance or the deadline passed
+    """
+    if len(seq1) > len(seq2):
+        seq1, seq2 = seq2, seq1
+    m, n = len(seq1), len(seq2)
+
+    # The length difference is a lower bound on the distance
+    if max_distance is not None and n - m > max_distance:
+        return None
+    if m == 0:
+        return n
+
+    masks = _pattern_masks(seq1)
+    full = (1 << m) - 1
+    last = 1 << (m - 1)
+    pv, mv = full, 0
+    score = m
+
+    for j, symbol in enumerate(seq2, 1):
+        eq = masks.get(symbol, 0)
+        xv = eq | mv
+        xh = ((((eq & pv) + pv) & full) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+
+        if max_distance is not None and score - (n - j) > max_distance:
+            # Each remaining column can lower the score by at most one
+            return None
+        if deadline is not None and j % _DEADLINE_CHECK_INTERVAL == 0 and time.perf_counter() > deadline:
+            return None
+
+    if max_distance is not None and score > max_distance:
+        return None
+    return score
+
+
+def chunked_levenshtein(seq1: Sequence[Hashable], seq2: Sequence[Hashable],
+                        chunk_size: int = CHUNK_SIZE,
+                        deadline: Optional[float] = None) -> float:
+    """
+    Approximate Levenshtein distance for long sequences.
+
+    The longer sequence is cut into chunks and each chunk is aligned with the
+    proportional slice of the other sequence. The summed chunk distances form
+    a valid alignment, so the result is an upper bound on the true distance.
+    If the deadline passes, the remaining chunks are extrapolated from the
+    distance per symbol measured so far.
+    """
+    if len(seq1) < len(seq2):
+        seq1, seq2 = seq2, seq1
+    n1, n2 = len(seq1), len(seq2)
+    if n1 == 0:
+        return 0.0
+
+    chunks = max(1, -(-n1 // chunk_size))
+    distance = 0
+    covered = 0
+    for c in range(chunks):
+        start1, end1 = c * n1 // chunks, (c + 1) * n1 // chunks
+        start2, end2 = c * n2 // chunks, (c + 1) * n2 // chunks
+        part = bounded_levenshtein(seq1[start1:end1], seq2[start2:end2], deadline=deadline)
+        if part is None:
+            break
+        distance += part
+        covered = end1
+
+    if covered < n1:
+        # Out of time: extrapolate from the distance per symbol seen so far
+        rate = distance / covered if covered else 1.0
+        distance += rate * (n1 - covered)
+    return float(distance)
+
+
+def levenshtein_similarity(seq1: Sequence[Hashable], seq2: Sequence[Hashable],
+                           min_similarity: Optional[float] = None,
+                           time_limit: Optional[float] = 1.0,
+                           max_exact_length: int = MAX_EXACT_LENGTH,
+                           chunk_size: int = CHUNK_SIZE) -> float:
+    """
+    Normalized Levenshtein similarity (1 - distance / max length).
+
+    Args:
+        seq1: First sequence (string or token IDs)
+        seq2: Second sequence
+        min_similarity: If given, return 0.0 as soon as the similarity is known to be lower
+        time_limit: Seconds allowed for the call (None for no cap)
+        max_exact_length: Longer inputs use the chunked approximation
+        chunk_size: Chunk length for the approximation
+
+    Returns:
+        Similarity score (0-1)
+    """
+    max_length = max(len(seq1), len(seq2))
+    if max_length == 0:
+        return 1.0
+
+    # The exact pass gets most of the budget, the approximation the rest
+    start = time.perf_counter()
+    deadline = start + time_limit if time_limit is not None else None
+    exact_deadline = start + 0.75 * time_limit if time_limit is not None else None
+    max_distance = None
+    if min_similarity is not None:
+        max_distance = int((1.0 - min_similarity) * max_length)
+
+    distance = None
+    if max(len(seq1), len(seq2)) <= max_exact_length:
+        distance = bounded_levenshtein(seq1, seq2, max_distance=max_distance, deadline=exact_deadline)
+        if distance is None and max_distance is not None and (
+                exact_deadline is None or time.perf_counter() <= exact_deadline):
+            # Stopped by the threshold, not the clock
+            return 0.0
+
+    if distance is None:
+        # Exact pass was too long or ran out of time; spend what is left on chunks
+        distance = chunked_levenshtein(seq1, seq2, chunk_size=chunk_size, deadline=deadline)
+
+    similarity = max(0.0, 1.0 - distance / max_length)
+    if min_similarity is not None and similarity < min_similarity:
+        return 0.0
+    return similarity
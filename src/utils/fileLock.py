@@ -0,0 +1,46 @@
+"""
+Advisory file locks for state shared by the worker processes of one host.
+Gunicorn workers each hold their own copy of the persisted indexes; writers
+take an exclusive flock around read-modify-write cycles and readers a shared
+one around reloads, so no worker saves over changes made by another.
+"""
+
+import contextlib
+import os
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+
+@contextlib.contextmanager
+def file_lock(path: str, shared: bool = False):
+    """
+    Hold an flock on path (created if missing) for the duration of the block.
+
+    Every call opens its own descriptor, so the lock also excludes other
+    threads of the same process. Not reentrant: do not nest two locks on the
+    same path in one thread. Without fcntl (Windows, single-process servers)
+    this is a no-op.
+    """
+    if not FCNTL_AVAILABLE:
+        yield
+        return
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+    finally:
+        # Closing the descriptor releases the lock
+        os.close(fd)
+
+
+def file_stamp(path: str):
+    """(inode, mtime_ns, size) of a file, None if missing; changes on every atomic replace."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
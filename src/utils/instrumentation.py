@@ -0,0 +1,352 @@
+"""
+Lightweight latency and memory instrumentation for the analysis pipeline.
+Records wall time, CPU time, peak allocation and input size per metric and
+pipeline stage into process-wide histograms, rendered in Prometheus text
+format, with optional per-request timing collection. With
+METRICS_MULTIPROC_DIR set, every worker process also writes its histograms to
+that directory and the rendered metrics sum all workers.
+"""
+
+import atexit
+import functools
+import glob
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = (1e4, 1e5, 1e6, 1e7, 5e7, 1e8, 5e8, 1e9)
+SIZE_BUCKETS = (100, 1000, 10000, 50000, 100000, 500000, 1000000, 5000000)
+
+# tracemalloc slows allocation-heavy code noticeably, so memory tracking is opt-in
+TRACK_MEMORY = os.environ.get('METRICS_TRACK_MEMORY') == '1'
+
+# Shared by the worker processes of one server; seconds between snapshot writes
+MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR')
+FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1.0))
+
+_request_timings: ContextVar[Optional[List[Dict]]] = ContextVar('request_timings', default=None)
+_memory_frames: ContextVar[tuple] = ContextVar('memory_frames', default=())
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of per-stage histograms and error counters.
+
+    Without a directory the data is per process. With one, each process
+    writes a snapshot of its own data to metrics_<pid>.json there at most
+    every flush_interval seconds (and right before it forks), and
+    render_prometheus() sums the snapshots of all processes. A scrape can
+    then reach any worker and still see the whole server, at most
+    flush_interval seconds behind. Snapshots of exited workers keep counting,
+    like any cumulative counter. Clear the directory when the server starts.
+    """
+
+    SERIES = (
+        ('duration_seconds', 'Wall-clock time per call', DURATION_BUCKETS),
+        ('cpu_seconds', 'CPU time of the calling thread per call', DURATION_BUCKETS),
+        ('peak_allocation_bytes', 'Peak traced allocation per call (METRICS_TRACK_MEMORY=1)', BYTES_BUCKETS),
+        ('input_chars', 'Input size in characters per call', SIZE_BUCKETS),
+    )
+
+    def __init__(self, prefix: str = 'plagiarism_stage', directory: Optional[str] = None,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.prefix = prefix
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._histograms = {}   # (series, stage) -> Histogram
+        self._errors = {}       # stage -> count
+        self._pid = os.getpid()
+        self._flushed = 0.0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            # The parent's data goes into its own file; the child starts empty
+            os.register_at_fork(before=self.flush, after_in_child=self._forget_parent)
+            atexit.register(self.flush)
+
+    def _forget_parent(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._errors = {}
+        self._pid = os.getpid()
+        self._flushed = 0.0
+
+    def observe(self, stage: str, wall: float, cpu: float, input_size: int, peak_bytes: Optional[int] = None):
+        """Record one call of a stage."""
+        values = {'duration_seconds': wall, 'cpu_seconds': cpu, 'input_chars': input_size}
+        if peak_bytes is not None:
+            values['peak_allocation_bytes'] = peak_bytes
+        with self._lock:
+            for name, _, buckets in self.SERIES:
+                if name in values:
+                    key = (name, stage)
+                    if key not in self._histograms:
+                        self._histograms[key] = Histogram(buckets)
+                    self._histograms[key].observe(values[name])
+        self._maybe_flush()
+
+    def record_error(self, stage: str):
+        """Count a failed call of a stage (including errors a metric swallowed)."""
+        with self._lock:
+            self._errors[stage] = self._errors.get(stage, 0) + 1
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if self.directory and time.monotonic() - self._flushed >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write this process's snapshot to the shared directory (no-op without one)."""
+        if not self.directory:
+            return
+        with self._lock:
+            self._flushed = time.monotonic()
+            if not self._histograms and not self._errors:
+                return
+            snapshot = {
+                'histograms': [[series, stage, list(h.buckets), h.counts, h.total, h.count]
+                               for (series, stage), h in self._histograms.items()],
+                'errors': dict(self._errors)
+            }
+        path = os.path.join(self.directory, f'metrics_{self._pid}.json')
+        tmp_path = f'{path}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing metrics snapshot: {e}")
+
+    def _merged(self):
+        """(histograms, errors) summed over the snapshots of all processes."""
+        self.flush()
+        histograms, errors = {}, {}
+        for path in glob.glob(os.path.join(self.directory, 'metrics_*.json')):
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue  # Being replaced by its writer
+            for series, stage, buckets, counts, total, count in snapshot['histograms']:
+                histogram = histograms.setdefault((series, stage), Histogram(buckets))
+                histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                histogram.total += total
+                histogram.count += count
+            for stage, count in snapshot['errors'].items():
+                errors[stage] = errors.get(stage, 0) + count
+        return histograms, errors
+
+    def error_counts(self) -> Dict[str, int]:
+        """Failed calls per stage (of all processes, with a directory)."""
+        if self.directory:
+            return self._merged()[1]
+        with self._lock:
+            return dict(self._errors)
+
+    def render_prometheus(self) -> str:
+        """Render all series (of all processes, with a directory) in the Prometheus text exposition format."""
+        if self.directory:
+            return self._render(*self._merged())
+        with self._lock:
+            return self._render(self._histograms, self._errors)
+
+    def _render(self, histograms, errors) -> str:
+        lines = []
+        for name, description, _ in self.SERIES:
+            metric = f"{self.prefix}_{name}"
+            entries = sorted((stage, h) for (series, stage), h in histograms.items() if series == name)
+            if not entries:
+                continue
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} histogram")
+            for stage, histogram in entries:
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound:g}"}} {count}')
+                lines.append(f'{metric}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{metric}_sum{{stage="{stage}"}} {histogram.total:.6f}')
+                lines.append(f'{metric}_count{{stage="{stage}"}} {histogram.count}')
+
+        if errors:
+            metric = f"{self.prefix}_errors_total"
+            lines.append(f"# HELP {metric} Failed calls per stage")
+            lines.append(f"# TYPE {metric} counter")
+            for stage, count in sorted(errors.items()):
+                lines.append(f'{metric}{{stage="{stage}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        """Drop all data recorded by this process."""
+        with self._lock:
+            self._histograms.clear()
+            self._errors.clear()
+        if self.directory:
+            try:
+                os.remove(os.path.join(self.directory, f'metrics_{self._pid}.json'))
+            except FileNotFoundError:
+                pass
+
+
+registry = MetricsRegistry(directory=MULTIPROC_DIR)
+
+
+def record_error(stage: str):
+    """Count a failed call of a stage in the global registry."""
+    registry.record_error(stage)
+
+
+def _input_size(args, kwargs) -> int:
+    """Total length of the string (or list of strings) arguments."""
+    size = 0
+    for value in list(args) + list(kwargs.values()):
+        if isinstance(value, str):
+            size += len(value)
+        elif isinstance(value, (list, tuple)) and value and isinstance(value[0], str):
+            size += sum(len(v) for v in value)
+    return size
+
+
+@contextmanager
+def measure(stage: str, input_size: int = 0):
+    """
+    Measure a block of code as one call of a stage.
+
+    Peak allocation is tracked with tracemalloc when METRICS_TRACK_MEMORY=1;
+    nested stages propagate their peaks to the enclosing stage. Under
+    concurrent requests the traced peak is process-wide and therefore an
+    upper bound.
+    """
+    frame = None
+    if TRACK_MEMORY:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        current, peak = tracemalloc.get_traced_memory()
+        parents = _memory_frames.get()
+        if parents:
+            parents[-1]['peak'] = max(parents[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+        frame = {'start': current, 'peak': current}
+        token = _memory_frames.set(parents + (frame,))
+
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    failed = False
+    try:
+        yield
+    except Exception:
+        failed = True
+        raise
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.thread_time() - cpu_start
+
+        peak_bytes = None
+        if frame is not None:
+            _, peak = tracemalloc.get_traced_memory()
+            frame['peak'] = max(frame['peak'], peak)
+            peak_bytes = frame['peak'] - frame['start']
+            _memory_frames.reset(token)
+            parents = _memory_frames.get()
+            if parents:
+                parents[-1]['peak'] = max(parents[-1]['peak'], frame['peak'])
+
+        registry.observe(stage, wall, cpu, input_size, peak_bytes)
+        if failed:
+            registry.record_error(stage)
+
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append({
+                'stage': stage,
+                'wall_ms': wall * 1000,
+                'cpu_ms': cpu * 1000,
+                'input_chars': input_size,
+                'peak_bytes': peak_bytes
+            })
+
+
+def instrument(stage: str):
+    """Decorator recording every call of a function as a stage."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # Skip 'self' when sizing the input
+            with measure(stage, _input_size(args[1:] if args and not isinstance(args[0], str) else args, kwargs)):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def collect_request_timings():
+    """
+    Collect the stages measured in this context (thread / request).
+
+    Yields a list that is filled with one entry per measured call; use
+    summarize_timings() to aggregate it.
+    """
+    timings = []
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def start_request_timings() -> List[Dict]:
+    """
+    Begin collecting timings for the current request without a with-block.
+
+    Meant for framework hooks (e.g. Flask before_request); pair with
+    stop_request_timings() in the teardown hook.
+    """
+    timings = []
+    _request_timings.set(timings)
+    return timings
+
+
+def stop_request_timings():
+    """Stop collecting timings for the current request."""
+    _request_timings.set(None)
+
+
+def summarize_timings(timings: List[Dict]) -> Dict[str, Dict]:
+    """Aggregate collected timings per stage (calls, total wall/CPU ms, max peak)."""
+    summary = {}
+    for entry in timings:
+        stage = summary.setdefault(entry['stage'], {
+            'calls': 0, 'wall_ms': 0.0, 'cpu_ms': 0.0, 'input_chars': 0, 'peak_bytes': None
+        })
+        stage['calls'] += 1
+        stage['wall_ms'] += entry['wall_ms']
+        stage['cpu_ms'] += entry['cpu_ms']
+        stage['input_chars'] += entry['input_chars']
+        if entry['peak_bytes'] is not None:
+            stage['peak_bytes'] = max(stage['peak_bytes'] or 0, entry['peak_bytes'])
+
+    for stage in summary.values():
+        stage['wall_ms'] = round(stage['wall_ms'], 3)
+        stage['cpu_ms'] = round(stage['cpu_ms'], 3)
+    return summary
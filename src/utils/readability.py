@@ -0,0 +1,87 @@
+"""
+Single-pass readability indices.
+A text's words are counted once per distinct word, syllables come from a
+bounded LRU cache, and every index (Flesch reading ease, Flesch-Kincaid
+grade, Gunning fog, SMOG) is derived from that one shared set of counts
+instead of re-tokenizing and re-counting syllables per index.
+"""
+
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable
+
+# Distinct words whose syllable counts are kept (about 100 bytes per entry)
+SYLLABLE_CACHE_SIZE = 1 << 16
+
+_VOWEL_GROUPS = re.compile(r'[aeiouy]+')
+# Inflections that add a syllable without making a word hard (Gunning fog)
+_FOG_SUFFIXES = ('es', 'ed', 'ing')
+
+
+@lru_cache(maxsize=SYLLABLE_CACHE_SIZE)
+def syllable_count(word: str) -> int:
+    """Syllables of a lowercase word: vowel groups, less a silent final 'e', at least one."""
+    syllables = len(_VOWEL_GROUPS.findall(word))
+    if word.endswith('e') and syllables > 1:
+        syllables -= 1
+    return max(1, syllables)
+
+
+def _is_complex(word: str, syllables: int) -> bool:
+    """Gunning fog hard word: 3+ syllables, not a proper noun, not 3 only through -es/-ed/-ing."""
+    if syllables < 3 or word[0].isupper():
+        return False
+    lowered = word.lower()
+    for suffix in _FOG_SUFFIXES:
+        if lowered.endswith(suffix) and syllable_count(lowered[:-len(suffix)]) < 3:
+            return False
+    return True
+
+
+def text_counts(words: Iterable[str], sentence_count: int) -> Dict[str, int]:
+    """
+    Counts every index is computed from.
+
+    Args:
+        words: Alphabetic word tokens of the text, original case
+        sentence_count: Number of sentences
+
+    Returns:
+        Dict with sentences, words, letters, syllables, polysyllables
+        (3+ syllables) and complex_words (Gunning fog hard words)
+    """
+    counts = {'sentences': sentence_count, 'words': 0, 'letters': 0,
+              'syllables': 0, 'polysyllables': 0, 'complex_words': 0}
+    for word, occurrences in Counter(words).items():
+        syllables = syllable_count(word.lower())
+        counts['words'] += occurrences
+        counts['letters'] += len(word) * occurrences
+        counts['syllables'] += syllables * occurrences
+        if syllables >= 3:
+            counts['polysyllables'] += occurrences
+            if _is_complex(word, syllables):
+                counts['complex_words'] += occurrences
+    return counts
+
+
+def readability_indices(counts: Dict[str, int]) -> Dict[str, float]:
+    """
+    Readability indices from text_counts() (all 0 for a text without words or sentences).
+
+    SMOG is defined on samples of 30 sentences; below 3 sentences it is 0.
+    """
+    words, sentences = counts['words'], counts['sentences']
+    if not words or not sentences:
+        return {'flesch_reading_ease': 0.0, 'flesch_kincaid_grade': 0.0, 'gunning_fog': 0.0, 'smog_index': 0.0}
+
+    words_per_sentence = words / sentences
+    syllables_per_word = counts['syllables'] / words
+    smog = 1.043 * math.sqrt(counts['polysyllables'] * 30 / sentences) + 3.1291 if sentences >= 3 else 0.0
+    return {
+        'flesch_reading_ease': 206.835 - 1.015 * words_per_sentence - 84.6 * syllables_per_word,
+        'flesch_kincaid_grade': 0.39 * words_per_sentence + 11.8 * syllables_per_word - 15.59,
+        'gunning_fog': 0.4 * (words_per_sentence + 100 * counts['complex_words'] / words),
+        'smog_index': smog
+    }
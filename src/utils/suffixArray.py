@@ -0,0 +1,280 @@
+"""
+Suffix array engine for exact shared-passage detection.
+Builds array-backed suffix arrays (prefix doubling with NumPy) and LCP arrays
+(Kasai) over token-ID sequences, and extracts every maximal passage shared by
+two sequences above a minimum length in O(n log n).
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+def build_suffix_array(sequence: Sequence[int]) -> np.ndarray:
+    """
+    Suffix array of a sequence of non-negative integers by prefix doubling.
+
+    Each round sorts suffixes by (rank[i], rank[i + k]) with a NumPy argsort
+    and stops as soon as all ranks are distinct, which for natural-language
+    token streams happens after a few rounds.
+    """
+    n = len(sequence)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+
+    rank = np.unique(np.asarray(sequence, dtype=np.int64), return_inverse=True)[1].astype(np.int64)
+    sa = np.argsort(rank, kind='stable')
+    k = 1
+    while True:
+        second = np.full(n, -1, dtype=np.int64)
+        second[:n - k] = rank[k:] if k < n else second[:0]
+        keys = rank * (n + 1) + (second + 1)
+        sa = np.argsort(keys, kind='stable')
+        sorted_keys = keys[sa]
+        new_rank = np.empty(n, dtype=np.int64)
+        new_rank[sa] = np.concatenate(([0], np.cumsum(sorted_keys[1:] != sorted_keys[:-1])))
+        rank = new_rank
+        if rank[sa[-1]] == n - 1 or k >= n:
+            return sa
+        k *= 2
+
+
+def build_lcp_array(sequence: Sequence[int], sa: np.ndarray) -> np.ndarray:
+    """
+    Kasai's algorithm: lcp[r] is the longest common prefix of suffixes sa[r - 1] and sa[r].
+    """
+    n = len(sequence)
+    lcp = np.zeros(n, dtype=np.int64)
+    if n == 0:
+        return lcp
+
+    seq = list(sequence)
+    rank = [0] * n
+    for r, position in enumerate(sa.tolist()):
+        rank[position] = r
+    sa_list = sa.tolist()
+
+    h = 0
+    for i in range(n):
+        r = rank[i]
+        if r > 0:
+            j = sa_list[r - 1]
+            while i + h < n and j + h < n and seq[i + h] == seq[j + h]:
+                h += 1
+            lcp[r] = h
+            if h > 0:
+                h -= 1
+        else:
+            h = 0
+    return lcp
+
+
+def intern_sequences(*token_lists: Sequence[str]) -> Tuple[List[List[int]], Dict[str, int]]:
+    """Map token strings to dense integer IDs shared across all lists."""
+    vocabulary = {}
+    encoded = []
+    for tokens in token_lists:
+        encoded.append([vocabulary.setdefault(token, len(vocabulary)) for token in tokens])
+    return encoded, vocabulary
+
+
+def longest_matches(seq1: Sequence[int], seq2: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    For every position of seq1, the longest prefix that occurs anywhere in seq2.
+
+    Returns:
+        (lengths, partners): match length and a seq2 start position for each seq1 position
+    """
+    n1, n2 = len(seq1), len(seq2)
+    # Shift IDs so 0 can separate the two sequences without matching anything
+    combined = np.concatenate([
+        np.asarray(seq1, dtype=np.int64) + 1,
+        np.zeros(1, dtype=np.int64),
+        np.asarray(seq2, dtype=np.int64) + 1
+    ])
+    sa = build_suffix_array(combined)
+    lcp = build_lcp_array(combined.tolist(), sa)
+
+    lengths = np.zeros(n1, dtype=np.int64)
+    partners = np.full(n1, -1, dtype=np.int64)
+    sa_list = sa.tolist()
+    lcp_list = lcp.tolist()
+    boundary = n1 + 1
+
+    # Nearest seq2 suffix above each seq1 suffix in suffix order...
+    run_min, partner = 0, -1
+    for r, position in enumerate(sa_list):
+        if r > 0:
+            run_min = min(run_min, lcp_list[r])
+        if position >= boundary:
+            run_min, partner = n1 + n2 + 1, position - boundary
+        elif position < n1 and partner >= 0 and run_min > lengths[position]:
+            lengths[position], partners[position] = run_min, partner
+
+    # ...and below it
+    run_min, partner = 0, -1
+    for r in range(len(sa_list) - 1, -1, -1):
+        position = sa_list[r]
+        if position >= boundary:
+            run_min, partner = n1 + n2 + 1, position - boundary
+        elif position < n1 and partner >= 0 and run_min > lengths[position]:
+            lengths[position], partners[position] = run_min, partner
+        run_min = min(run_min, lcp_list[r])
+
+    return lengths, partners
+
+
+def shared_passages(seq1: Sequence[int], seq2: Sequence[int], min_length: int = 8) -> List[Dict]:
+    """
+    Maximal passages shared by two token-ID sequences.
+
+    Candidates are the left-maximal longest matches of seq1 positions; they
+    are accepted longest first and trimmed so passages do not overlap in seq1.
+
+    Args:
+        seq1: First token-ID sequence
+        seq2: Second token-ID sequence
+        min_length: Minimum passage length in tokens
+
+    Returns:
+        Passages as dicts with start1, start2 and length (tokens), longest first
+    """
+    if len(seq1) < min_length or len(seq2) < min_length:
+        return []
+
+    lengths, partners = longest_matches(seq1, seq2)
+
+    candidates = []
+    for i in np.nonzero(lengths >= min_length)[0].tolist():
+        j = int(partners[i])
+        # A passage that extends one token to the left is reported from there
+        if i > 0 and j > 0 and seq1[i - 1] == seq2[j - 1]:
+            continue
+        candidates.append((int(lengths[i]), i, j))
+    candidates.sort(key=lambda c: (-c[0], c[1]))
+
+    covered = np.zeros(len(seq1), dtype=bool)
+    passages = []
+    for length, i, j in candidates:
+        if covered[i]:
+            continue
+        blocked = np.nonzero(covered[i:i + length])[0]
+        if len(blocked):
+            length = int(blocked[0])
+        if length < min_length:
+            continue
+        covered[i:i + length] = True
+        passages.append({'start1': i, 'start2': j, 'length': length})
+
+    passages.sort(key=lambda p: (-p['length'], p['start1']))
+    return passages
+
+
+def repeated_passages(sequence: Sequence[int], min_length: int = 8) -> List[Dict]:
+    """
+    Maximal passages that occur more than once within one token-ID sequence.
+
+    The longest repeat starting at each position is the larger LCP with its
+    two neighbours in suffix order. Candidates are positions whose repeat
+    does not extend one token to the left; the occurrences of each are the
+    run of suffixes around it sharing that prefix. Candidates are accepted
+    longest first, and one whose occurrences all lie inside passages already
+    reported (a repeat within a longer repeat) is dropped. Every occurrence
+    is reported, overlapping ones included. A passage overlapping its own
+    copy (a tandem repeat) is cut to the shortest multiple of its period of
+    at least min_length, whose occurrences tile the same span. O(n log n)
+    plus the number of reported occurrences.
+
+    Args:
+        sequence: Token-ID sequence
+        min_length: Minimum passage length in tokens
+
+    Returns:
+        Passages as dicts with length (tokens) and starts (ascending, every occurrence), longest first
+    """
+    n = len(sequence)
+    if n < min_length + 1:
+        return []
+
+    seq = np.asarray(sequence, dtype=np.int64)
+    sa = build_suffix_array(seq)
+    lcp = build_lcp_array(seq.tolist(), sa)
+    rank = np.empty(n, dtype=np.int64)
+    rank[sa] = np.arange(n)
+    following = np.append(lcp[1:], 0)
+    lengths = np.maximum(lcp[rank], following[rank])
+
+    # A position inside a longer repeat has a predecessor whose repeat is at least one longer
+    left_maximal = np.ones(n, dtype=bool)
+    left_maximal[1:] = lengths[:-1] <= lengths[1:]
+    positions = np.nonzero((lengths >= min_length) & left_maximal)[0]
+    candidates = sorted(zip((-lengths[positions]).tolist(), positions.tolist()))
+
+    lcp_list = lcp.tolist()
+
+    def occurrences(position, length):
+        low = high = int(rank[position])
+        while low > 0 and lcp_list[low] >= length:
+            low -= 1
+        while high + 1 < n and lcp_list[high + 1] >= length:
+            high += 1
+        return sorted(sa[low:high + 1].tolist())
+
+    def spans(starts, length):
+        # Union of the occurrences as merged (start, end) intervals
+        merged = [[starts[0], starts[0] + length]]
+        for start in starts[1:]:
+            if start <= merged[-1][1]:
+                merged[-1][1] = start + length
+            else:
+                merged.append([start, start + length])
+        return merged
+
+    def contains(outer, inner):
+        k = 0
+        for start, end in inner:
+            while k < len(outer) and outer[k][1] < end:
+                k += 1
+            if k == len(outer) or outer[k][0] > start:
+                return False
+        return True
+
+    covered = np.zeros(n, dtype=bool)
+    reported = set()
+    passages = []
+    for negative_length, position in candidates:
+        length = -negative_length
+        if (position, length) in reported:
+            # Another occurrence of a passage already reported
+            continue
+        starts = occurrences(position, length)
+        period = min(b - a for a, b in zip(starts, starts[1:]))
+        if period < length:
+            # Tandem repeat: shorter passages of whole periods tile the same span
+            shorter = -(-min_length // period) * period
+            if shorter < length:
+                shorter_starts = occurrences(position, shorter)
+                if contains(spans(shorter_starts, shorter), spans(starts, length)):
+                    length, starts = shorter, shorter_starts
+        if (starts[0], length) in reported:
+            continue
+        if all(covered[start:start + length].all() for start in starts):
+            continue
+        for start in starts:
+            covered[start:start + length] = True
+            reported.add((start, length))
+        passages.append({'length': length, 'starts': starts})
+
+    passages.sort(key=lambda p: (-p['length'], p['starts'][0]))
+    return passages
+
+
+def repetition_coverage(passages: List[Dict], n: int) -> float:
+    """Share of n tokens that repeat an earlier occurrence of one of the passages."""
+    if not n:
+        return 0.0
+    repeated = np.zeros(n, dtype=bool)
+    for passage in passages:
+        for start in passage['starts'][1:]:
+            repeated[start:start + passage['length']] = True
+    return float(repeated.mean())
@@ -11,6 +11,7 @@ from nltk.stem import PorterStemmer, WordNetLemmatizer
 from nltk.chunk import ne_chunk
 from nltk.tag import pos_tag
 import unicodedata
+from src.utils.suffixArray import intern_sequences, repeated_passages
 
 class TextProcessor:
     """Utility class for text processing operations."""
@@ -213,32 +214,27 @@ class TextProcessor:
             return None
     
     def find_repeated_phrases(self, text, min_length=3, min_occurrences=2):
-        """Find repeated phrases in text."""
+        """
+        Find repeated phrases in text.
+        
+        Every maximal phrase of at least min_length words that occurs at least
+        min_occurrences times anywhere in the text (a suffix array over the
+        word stream, so near-linear in the text length).
+        """
         try:
-            sentences = self.tokenize_sentences(text)
-            repeated_phrases = []
+            words = self.tokenize_words(self.normalize_text(text))
+            (ids,), _ = intern_sequences(words)
             
-            for sentence in sentences:
-                words = self.tokenize_words(self.normalize_text(sentence))
-                
-                # Generate phrases of different lengths
-                for phrase_length in range(min_length, min(len(words) + 1, 10)):
-                    phrases = []
-                    for i in range(len(words) - phrase_length + 1):
-                        phrase = ' '.join(words[i:i+phrase_length])
-                        phrases.append(phrase)
-                    
-                    # Count phrase occurrences
-                    from collections import Counter
-                    phrase_counts = Counter(phrases)
-                    
-                    for phrase, count in phrase_counts.items():
-                        if count >= min_occurrences:
-                            repeated_phrases.append({
-                                'phrase': phrase,
-                                'occurrences': count,
-                                'length': phrase_length
-                            })
+            repeated_phrases = []
+            for passage in repeated_passages(ids, min_length=min_length):
+                if len(passage['starts']) >= min_occurrences:
+                    start = passage['starts'][0]
+                    repeated_phrases.append({
+                        'phrase': ' '.join(words[start:start + passage['length']]),
+                        'occurrences': len(passage['starts']),
+                        'length': passage['length'],
+                        'positions': passage['starts']
+                    })
             
             # Sort by number of occurrences
             repeated_phrases.sort(key=lambda x: x['occurrences'], reverse=True)
@@ -0,0 +1,117 @@
+"""
+Array-backed token sequences.
+Tokens are interned into int32 IDs and documents become NumPy arrays, so
+the token metrics work on integers: n-grams are packed 64-bit keys and the
+LCS runs bit-parallel over machine words instead of a Python DP table.
+A vocabulary lives for one comparison (a pair of texts or one query and
+its candidates), so its memory is bounded by the texts being compared.
+"""
+
+from typing import Dict, List
+
+import numpy as np
+
+# Multiplier of the n-gram key mix (64-bit golden ratio constant, odd)
+_NGRAM_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+class Vocabulary:
+    """
+    Token -> int32 ID table of one comparison.
+
+    IDs are only comparable between arrays encoded by the same instance;
+    create one per pair or batch rather than sharing one across requests,
+    which would keep every token ever seen for the life of the worker.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def encode(self, tokens) -> np.ndarray:
+        """int32 IDs of a token sequence, interning unseen tokens."""
+        ids = self._ids
+        return np.fromiter((ids.setdefault(token, len(ids)) for token in tokens),
+                           dtype=np.int32, count=len(tokens))
+
+
+def ngram_keys(ids: np.ndarray, n: int) -> np.ndarray:
+    """
+    One 64-bit key per n-gram of an ID array.
+
+    Bigrams of int32 IDs are packed exactly (high and low 32 bits); longer
+    n-grams and 64-bit IDs are mixed multiplicatively (wrapping), where a
+    collision of two distinct n-grams has probability about 2^-64.
+    """
+    if len(ids) < n:
+        return np.zeros(0, dtype=np.uint64)
+    if n == 1:
+        return ids.astype(np.uint64)
+    count = len(ids) - n + 1
+    if n == 2 and ids.dtype.itemsize <= 4:
+        return (ids[:count].astype(np.uint64) << np.uint64(32)) | ids[1:].astype(np.uint64)
+
+    keys = ids[:count].astype(np.uint64)
+    with np.errstate(over='ignore'):
+        for offset in range(1, n):
+            keys = keys * _NGRAM_MULTIPLIER ^ ids[offset:offset + count].astype(np.uint64)
+    return keys
+
+
+def jaccard(unique1: np.ndarray, unique2: np.ndarray) -> float:
+    """Jaccard similarity of two sets given as sorted unique arrays (0 when either is empty)."""
+    if len(unique1) == 0 or len(unique2) == 0:
+        return 0.0
+    intersection = len(np.intersect1d(unique1, unique2, assume_unique=True))
+    return intersection / (len(unique1) + len(unique2) - intersection)
+
+
+def jaccard_many(unique_query: np.ndarray, unique_candidates: List[np.ndarray]) -> np.ndarray:
+    """jaccard() of one set against many, with a single membership test over all candidates."""
+    sizes = np.array([len(candidate) for candidate in unique_candidates], dtype=np.int64)
+    scores = np.zeros(len(unique_candidates))
+    if len(unique_query) == 0 or not sizes.any():
+        return scores
+
+    members = np.isin(np.concatenate(unique_candidates), unique_query)
+    cumulative = np.concatenate([[0], np.cumsum(members)])
+    ends = np.cumsum(sizes)
+    intersections = cumulative[ends] - cumulative[ends - sizes]
+    nonempty = sizes > 0
+    scores[nonempty] = intersections[nonempty] / (len(unique_query) + sizes[nonempty] - intersections[nonempty])
+    return scores
+
+
+def ngram_jaccard(ids1: np.ndarray, ids2: np.ndarray, n: int) -> float:
+    """Jaccard similarity of the n-gram sets of two ID arrays."""
+    return jaccard(np.unique(ngram_keys(ids1, n)), np.unique(ngram_keys(ids2, n)))
+
+
+def lcs_length(ids1, ids2) -> int:
+    """
+    Length of the longest common subsequence of two ID sequences.
+
+    Bit-parallel (Allison-Dix / Hyyro): the DP row over ids2 is held as the
+    bits of one integer and each element of ids1 updates all of it with a
+    few word-parallel operations, i.e. O(len1 * len2 / 64) word steps.
+    """
+    if len(ids1) == 0 or len(ids2) == 0:
+        return 0
+    if len(ids1) < len(ids2):
+        ids1, ids2 = ids2, ids1
+
+    # Bit j of masks[t] is set where ids2[j] == t
+    masks = {}
+    for position, token in enumerate(ids2.tolist() if isinstance(ids2, np.ndarray) else ids2):
+        masks[token] = masks.get(token, 0) | (1 << position)
+
+    full = (1 << len(ids2)) - 1
+    row = full
+    for token in (ids1.tolist() if isinstance(ids1, np.ndarray) else ids1):
+        match = masks.get(token)
+        if match:
+            low = row & match
+            row = ((row + low) | (row - low)) & full
+    return len(ids2) - row.bit_count()
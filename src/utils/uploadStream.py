@@ -0,0 +1,110 @@
+"""
+Single-pass upload ingestion.
+Uploads are written to the upload folder in fixed-size chunks while the
+SHA-256 digest, byte count and leading bytes (for MIME sniffing) are taken
+from the same buffers, so an upload is never spooled, re-read or stat'ed.
+Extraction then maps the stored file instead of reading it into memory.
+"""
+
+import hashlib
+import mmap
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Copy buffer size and the number of leading bytes kept for MIME sniffing
+CHUNK_SIZE = 64 * 1024
+SNIFF_BYTES = 1024
+
+
+class UploadTooLarge(ValueError):
+    """Raised while writing an upload that exceeds the size limit."""
+
+
+class UploadSink:
+    """
+    Writable upload target: a temporary file in the upload folder that
+    hashes, counts and sniffs every chunk written to it.
+
+    Used as the multipart stream factory (the request body is parsed straight
+    into it) or filled from another stream with copy_stream(). commit() moves
+    the file to its final name; closing an uncommitted sink removes it.
+    """
+
+    def __init__(self, directory: str, max_size: int = None):
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix='.part')
+        self._file = os.fdopen(fd, 'w+b')
+        self._hash = hashlib.sha256()
+        self.max_size = max_size
+        self.size = 0
+        self.head = b''
+        self.committed = False
+
+    def write(self, data) -> int:
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            self.close()
+            raise UploadTooLarge(f"Upload exceeds {self.max_size} bytes")
+        if len(self.head) < SNIFF_BYTES:
+            self.head += bytes(data[:SNIFF_BYTES - len(self.head)])
+        self._hash.update(data)
+        return self._file.write(data)
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    def __getattr__(self, name):
+        # read/seek/tell/flush etc. go to the underlying file
+        return getattr(self._file, name)
+
+    def commit(self, path: str):
+        """Close the file and move it to its final path."""
+        self._file.close()
+        os.replace(self.path, path)
+        self.path = path
+        self.committed = True
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        if not self.committed and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def copy_stream(source, sink: UploadSink, chunk_size: int = CHUNK_SIZE) -> UploadSink:
+    """Copy a readable binary stream into a sink through one reusable buffer."""
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    readinto = getattr(source, 'readinto', None)
+    while True:
+        if readinto is not None:
+            count = readinto(buffer)
+        else:
+            chunk = source.read(chunk_size)
+            count = len(chunk)
+            view[:count] = chunk
+        if not count:
+            return sink
+        sink.write(view[:count])
+
+
+class MappedFile(mmap.mmap):
+    """mmap with the file-object predicates zipfile/python-docx check for."""
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+
+@contextmanager
+def mapped_file(path: str):
+    """Read-only memory map of a file; yields None for an empty file."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield None
+            return
+        with MappedFile(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
@@ -4,9 +4,14 @@ Document Validator utility for validating uploaded files and content.
 
 import os
 import mimetypes
-import magic
 from werkzeug.datastructures import FileStorage
 
+try:
+    import magic
+    MAGIC_AVAILABLE = True
+except ImportError:
+    MAGIC_AVAILABLE = False
+
 class DocumentValidator:
     """Utility class for validating documents and files."""
     
@@ -86,25 +91,37 @@ class DocumentValidator:
     
     def _validate_mime_type(self, file):
         """Validate MIME type."""
+        try:
+            file.seek(0)
+            file_content = file.read(1024)  # Read first 1KB
+            file.seek(0)  # Reset to beginning
+            
+            return self.validate_mime_bytes(file.filename, file_content)
+        
+        except Exception as e:
+            print(f"Error validating MIME type: {e}")
+            return False
+    
+    def validate_mime_bytes(self, filename, head):
+        """Validate MIME type from the filename and the leading bytes of the content."""
         try:
             # Get MIME type from filename
-            mime_type, _ = mimetypes.guess_type(file.filename)
+            mime_type, _ = mimetypes.guess_type(filename)
             
             if mime_type in self.allowed_mime_types:
                 return True
             
             # Additional check using file content (if python-magic is available)
+            if not MAGIC_AVAILABLE:
+                return self._validate_extension(filename)
+            
             try:
-                file.seek(0)
-                file_content = file.read(1024)  # Read first 1KB
-                file.seek(0)  # Reset to beginning
-                
-                detected_mime = magic.from_buffer(file_content, mime=True)
+                detected_mime = magic.from_buffer(head, mime=True)
                 return detected_mime in self.allowed_mime_types
             
-            except (ImportError, Exception):
-                # Fall back to extension-based validation if python-magic is not available
-                return self._validate_extension(file.filename)
+            except Exception:
+                # Fall back to extension-based validation if detection fails
+                return self._validate_extension(filename)
         
         except Exception as e:
             print(f"Error validating MIME type: {e}")
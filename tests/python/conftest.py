@@ -0,0 +1,6 @@
+"""Python test suite: run from the repository root with `python -m pytest tests/python`."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
@@ -0,0 +1,84 @@
+"""Bit-parallel bounded Levenshtein against a dynamic-programming reference."""
+
+import random
+import time
+
+import pytest
+
+from src.utils.editDistance import bounded_levenshtein, chunked_levenshtein, levenshtein_similarity
+
+
+def levenshtein(seq1, seq2):
+    previous = list(range(len(seq2) + 1))
+    for i, a in enumerate(seq1, 1):
+        current = [i]
+        for j, b in enumerate(seq2, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a != b)))
+        previous = current
+    return previous[-1]
+
+
+def random_pair(rng):
+    alphabet = rng.choice(['ab', 'abcd', 'abcdefghij'])
+    first = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 90)))
+    # A mutated copy, so distances range from small to large
+    second = list(first)
+    for _ in range(rng.randint(0, 40)):
+        position = rng.randint(0, len(second))
+        action = rng.random()
+        if action < 0.4 or not second:
+            second.insert(position, rng.choice(alphabet))
+        elif action < 0.7:
+            del second[min(position, len(second) - 1)]
+        else:
+            second[min(position, len(second) - 1)] = rng.choice(alphabet)
+    return first, ''.join(second)
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_bounded_levenshtein_matches_dp(seed):
+    rng = random.Random(seed)
+    first, second = random_pair(rng)
+    expected = levenshtein(first, second)
+
+    assert bounded_levenshtein(first, second) == expected
+    # Token sequences (e.g. token IDs) behave like strings
+    assert bounded_levenshtein([ord(c) for c in first], [ord(c) for c in second]) == expected
+
+    limit = rng.randint(0, 60)
+    assert bounded_levenshtein(first, second, max_distance=limit) == (expected if expected <= limit else None)
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_levenshtein_similarity_matches_dp(seed):
+    rng = random.Random(seed)
+    first, second = random_pair(rng)
+    longest = max(len(first), len(second))
+    expected = 1.0 - levenshtein(first, second) / longest if longest else 1.0
+
+    assert levenshtein_similarity(first, second, time_limit=None) == pytest.approx(expected)
+
+    threshold = rng.random()
+    thresholded = levenshtein_similarity(first, second, min_similarity=threshold, time_limit=None)
+    assert thresholded == (pytest.approx(expected) if expected >= threshold else 0.0)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_chunked_levenshtein_is_an_upper_bound(seed):
+    rng = random.Random(seed)
+    first, second = random_pair(rng)
+
+    assert chunked_levenshtein(first, second, chunk_size=rng.randint(1, 30)) >= levenshtein(first, second)
+
+
+def test_time_limit_caps_long_inputs():
+    rng = random.Random(0)
+    first = ''.join(rng.choice('abcdefgh') for _ in range(20000))
+    second = ''.join(rng.choice('abcdefgh') for _ in range(20000))
+
+    start = time.perf_counter()
+    similarity = levenshtein_similarity(first, second, time_limit=0.05)
+    elapsed = time.perf_counter() - start
+
+    assert 0.0 <= similarity <= 1.0
+    assert elapsed < 0.5
@@ -0,0 +1,55 @@
+"""Bundle-based scoring against the text-based ensemble, metric by metric."""
+
+import pytest
+from nltk.tokenize import sent_tokenize
+
+from benchmarks.corpus import SyntheticCorpus
+from src.services.advancedSimilarityService import AdvancedSimilarityService
+from src.services.featureBundle import FeatureStore
+from src.services.scoringCascade import ScoringCascade
+
+TOKEN_METRICS = ['cosine', 'sequence', 'token_overlap', 'bigram', 'trigram', 'lcs', 'word_freq', 'semantic']
+
+
+def punkt_available():
+    try:
+        sent_tokenize('One. Two.')
+        return True
+    except LookupError:
+        return False
+
+
+@pytest.fixture(scope='module')
+def service():
+    return AdvancedSimilarityService()
+
+
+@pytest.fixture
+def store(service, tmp_path):
+    return FeatureStore(str(tmp_path / 'features'), service, ScoringCascade(service))
+
+
+@pytest.mark.parametrize('seed, words, overlap', [(0, 200, 0.3), (1, 600, 0.6), (2, 150, 0.0)])
+def test_bundle_similarity_matches_text_similarity(service, store, seed, words, overlap):
+    pair = SyntheticCorpus(seed=seed).pair(words, overlap=overlap, edit_rate=0.05)
+    store.write('suspicious', pair['suspicious'])
+    store.write('source', pair['source'])
+
+    # latency_budget=0 runs every metric exactly on both paths
+    expected = service.calculate_overall_similarity(pair['suspicious'], pair['source'], latency_budget=0)
+    with store.open('suspicious') as bundle1, store.open('source') as bundle2:
+        result = service.calculate_bundle_similarity(bundle1, bundle2, latency_budget=0)
+
+    for metric in TOKEN_METRICS + ['shared_passages']:
+        assert result[metric] == pytest.approx(expected[metric], abs=1e-3), metric
+    if punkt_available():
+        assert result['sentence'] == pytest.approx(expected['sentence'], abs=1e-3)
+        assert result['overall'] == pytest.approx(expected['overall'], abs=1e-3)
+
+
+def test_stale_bundle_is_not_opened(service, store):
+    store.write('doc', 'Some text that is long enough to be scored.')
+    other = FeatureStore(store.directory, service, ScoringCascade(service, num_perm=64))
+
+    assert store.open('doc') is not None
+    assert other.open('doc') is None
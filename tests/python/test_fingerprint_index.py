@@ -0,0 +1,69 @@
+"""Winnowing fingerprint index: planted passages are found at their offsets."""
+
+import random
+import re
+
+import pytest
+
+from src.services.fingerprintIndex import FingerprintIndex, kgram_hashes, winnow
+
+
+def tokenize(text):
+    return [(m.group().lower(), m.start(), m.end()) for m in re.finditer(r'\w+', text)]
+
+
+def words(rng, count):
+    # A large vocabulary, so unrelated text shares no k-grams by chance
+    return [f"w{rng.randrange(10 ** 6)}" for _ in range(count)]
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_winnowing_guarantee(seed):
+    rng = random.Random(seed)
+    hashes = kgram_hashes(words(rng, 200), 5)
+    window = rng.randint(1, 8)
+
+    positions = [position for _, position in winnow(hashes, window)]
+
+    assert positions == sorted(set(positions))
+    # Every window of consecutive hashes contributes a fingerprint
+    for start in range(len(hashes) - window + 1):
+        assert any(start <= p < start + window for p in positions)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_query_finds_planted_passage(tmp_path, seed):
+    rng = random.Random(seed)
+    index = FingerprintIndex(str(tmp_path / 'fingerprints.db'), tokenizer=tokenize)
+    source = words(rng, 300)
+    index.add_document('source', ' '.join(source))
+    index.add_document('other', ' '.join(words(rng, 300)))
+
+    # 60 source tokens from position 100, planted at query position 50
+    query = words(rng, 50) + source[100:160] + words(rng, 50)
+    query_text = ' '.join(query)
+    result = index.query(query_text, exclude_file_id=None)
+
+    assert [d['file_id'] for d in result['documents']] == ['source']
+    [passage] = result['documents'][0]['passages']
+    assert passage['source_token_start'] - passage['query_token_start'] == 50
+    # Winnowing selects one of the first and last `window` k-grams of the passage
+    assert 50 <= passage['query_token_start'] < 50 + index.window
+    assert 110 - index.window < passage['query_token_end'] <= 110
+    copied = query_text[passage['query_start']:passage['query_end']]
+    assert copied == ' '.join(source)[passage['source_start']:passage['source_end']]
+    assert copied in ' '.join(source[100:160])
+    assert result['coverage'] == pytest.approx(passage['token_length'] / len(query), abs=1e-3)
+
+
+def test_excluded_and_removed_documents_are_not_matched(tmp_path):
+    rng = random.Random(0)
+    index = FingerprintIndex(str(tmp_path / 'fingerprints.db'), tokenizer=tokenize)
+    text = ' '.join(words(rng, 100))
+    index.add_document('a', text)
+    index.add_document('b', text)
+
+    assert [d['file_id'] for d in index.query(text, exclude_file_id='a')['documents']] == ['b']
+    assert index.remove_document('b') > 0
+    assert index.query(text, exclude_file_id='a')['documents'] == []
+    assert index.stats()['documents'] == 1
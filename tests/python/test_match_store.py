@@ -0,0 +1,91 @@
+"""Incremental match records: deltas reach the matched documents and are undone on delete."""
+
+import random
+import re
+
+import pytest
+
+from src.services.fingerprintIndex import FingerprintIndex
+from src.services.matchStore import MatchStore
+
+
+def tokenize(text):
+    return [(m.group().lower(), m.start(), m.end()) for m in re.finditer(r'\w+', text)]
+
+
+def words(rng, count):
+    return [f"w{rng.randrange(10 ** 6)}" for _ in range(count)]
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    index = FingerprintIndex(str(tmp_path / 'fingerprints.db'), tokenizer=tokenize)
+    return index, MatchStore(str(tmp_path / 'matches'), index)
+
+
+def add(corpus, file_id, text):
+    index, store = corpus
+    index.add_document(file_id, text)
+    return store.add_document(file_id, text)
+
+
+def test_delta_is_mirrored_into_the_matched_record(corpus):
+    _, store = corpus
+    rng = random.Random(0)
+    source = words(rng, 200)
+    source_text = ' '.join(source)
+    new_text = ' '.join(words(rng, 30) + source[40:100] + words(rng, 30))
+
+    assert add(corpus, 'source', source_text)['matches'] == 0
+    update = add(corpus, 'new', new_text)
+
+    assert update['updated_documents'] == ['source']
+    [found] = store.get('new')['matches']
+    [delta] = store.get('source')['matches']
+    assert (found['file_id'], found['origin']) == ('source', 'incremental')
+    assert (delta['file_id'], delta['origin']) == ('new', 'delta')
+
+    [passage], [mirrored] = found['passages'], delta['passages']
+    assert mirrored['query_token_start'] == passage['source_token_start']
+    assert mirrored['source_token_start'] == passage['query_token_start']
+    assert mirrored['token_length'] == passage['token_length']
+    # Spans point at the same words in both documents
+    copied = new_text[passage['query_start']:passage['query_end']]
+    assert copied == source_text[mirrored['query_start']:mirrored['query_end']]
+    assert copied == source_text[passage['source_start']:passage['source_end']]
+    assert copied == new_text[mirrored['source_start']:mirrored['source_end']]
+    assert delta['coverage'] == pytest.approx(passage['token_length'] / len(source), abs=1e-3)
+    assert store.get('source')['coverage'] == delta['coverage']
+
+
+def test_delete_removes_the_delta(corpus):
+    index, store = corpus
+    rng = random.Random(1)
+    source = words(rng, 200)
+    add(corpus, 'source', ' '.join(source))
+    add(corpus, 'new', ' '.join(source[:80] + words(rng, 40)))
+    add(corpus, 'unrelated', ' '.join(words(rng, 100)))
+    assert [m['file_id'] for m in store.get('source')['matches']] == ['new']
+
+    index.remove_document('new')
+    assert store.remove_document('new') == 1
+
+    assert store.get('new') is None
+    assert store.get('source')['matches'] == []
+    assert store.get('source')['coverage'] == 0.0
+    assert store.get('unrelated')['matches'] == []
+    assert store.remove_document('new') == 0
+
+
+def test_analysis_is_kept_and_later_matches_are_flagged(corpus):
+    _, store = corpus
+    rng = random.Random(2)
+    source = words(rng, 200)
+    add(corpus, 'source', ' '.join(source))
+    store.save_analysis('source', {'overall_score': 0.0})
+
+    add(corpus, 'new', ' '.join(source[50:150]))
+
+    record = store.get('source')
+    assert record['analysis'] == {'overall_score': 0.0}
+    assert record['new_since_analysis'] == ['new']
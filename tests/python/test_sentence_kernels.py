@@ -0,0 +1,78 @@
+"""Sparse sentence-matching kernels against the per-pair SequenceMatcher reference."""
+
+import random
+import re
+
+import numpy as np
+import pytest
+
+from src.services import advancedSimilarityService
+from src.services.advancedSimilarityService import AdvancedSimilarityService
+
+
+def random_sentences(rng, count, vocabulary=12):
+    words = [f"w{i}" for i in range(vocabulary)]
+    return [' '.join(rng.choice(words) for _ in range(rng.randint(0, 10))) for _ in range(count)]
+
+
+def pairwise(service, sentences1, sentences2):
+    return np.array([[service.sequence_matcher_similarity(s1, s2) for s2 in sentences2] for s1 in sentences1])
+
+
+@pytest.fixture(scope='module')
+def service():
+    return AdvancedSimilarityService()
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_sentence_match_kernel_matches_pairwise_reference(service, seed):
+    rng = random.Random(seed)
+    sentences1 = random_sentences(rng, rng.randint(1, 15))
+    sentences2 = random_sentences(rng, rng.randint(1, 15))
+
+    # Tiny blocks exercise the row blocking as well
+    row_max, row_argmax = service.sentence_match_kernel(sentences1, sentences2, max_block_cells=rng.choice([1, 7, 10**6]))
+
+    expected = pairwise(service, sentences1, sentences2)
+    np.testing.assert_array_equal(row_max, expected.max(axis=1))
+    np.testing.assert_array_equal(expected[np.arange(len(sentences1)), row_argmax], expected.max(axis=1))
+
+
+def test_sentence_match_kernel_accepts_token_id_lists(service):
+    sentences1 = ['a b c a', 'd e']
+    sentences2 = ['c b x a', 'e d', 'a a b c']
+    ids = {'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5, 'x': 6}
+    as_ids = lambda sentences: [[ids[t] for t in s.split()] for s in sentences]
+
+    by_text = service.sentence_match_kernel(sentences1, sentences2)[0]
+    by_ids = service.sentence_match_kernel(as_ids(sentences1), as_ids(sentences2))[0]
+    np.testing.assert_allclose(by_text, by_ids)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_sentence_match_many_matches_kernel_per_candidate(service, seed):
+    rng = random.Random(seed)
+    sentences1 = random_sentences(rng, rng.randint(1, 10))
+    candidates = [random_sentences(rng, rng.randint(0, 6)) for _ in range(rng.randint(1, 6))]
+
+    best = service.sentence_match_many(sentences1, candidates, max_block_cells=rng.choice([1, 20, 10**6]))
+
+    for c, candidate in enumerate(candidates):
+        expected = service.sentence_match_kernel(sentences1, candidate)[0] if candidate else np.zeros(len(sentences1))
+        np.testing.assert_array_equal(best[:, c], expected)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_sentence_similarity_matches_reference(service, monkeypatch, seed):
+    # Both paths segment with the same splitter, so punkt is not needed
+    monkeypatch.setattr(advancedSimilarityService, 'sent_tokenize', lambda text: re.split(r'(?<=\.) ', text))
+    rng = random.Random(seed)
+    source = random_sentences(rng, 12, vocabulary=30)
+    # Copied, reordered and edited sentences of the source plus unrelated ones
+    copied = [' '.join(rng.sample(s.split(), len(s.split()))) if rng.random() < 0.3 else s
+              for s in rng.sample(source, 6)]
+    text1 = '. '.join(s or 'w0' for s in copied + random_sentences(rng, 6, vocabulary=30)) + '.'
+    text2 = '. '.join(s or 'w1' for s in source) + '.'
+
+    assert service.sentence_similarity(text1, text2) == pytest.approx(
+        service._sentence_similarity_reference(text1, text2), abs=1e-12)
@@ -0,0 +1,95 @@
+"""Scatter-gather over local shard processes against a single FingerprintIndex."""
+
+import random
+import re
+import socket
+
+import pytest
+
+from src.services.fingerprintIndex import FingerprintIndex
+from src.services.shardedIndex import ShardedIndex, spawn_local_shards
+
+
+def tokenize(text):
+    return [(m.group().lower(), m.start(), m.end()) for m in re.finditer(r'\w+', text)]
+
+
+def free_base_port(count):
+    """A port p such that p .. p + count - 1 were free a moment ago."""
+    for _ in range(50):
+        base = random.randint(20000, 60000)
+        try:
+            sockets = []
+            for port in range(base, base + count):
+                s = socket.socket()
+                sockets.append(s)
+                s.bind(('127.0.0.1', port))
+            return base
+        except OSError:
+            continue
+        finally:
+            for s in sockets:
+                s.close()
+    pytest.skip('no free ports')
+
+
+WORDS = [f"w{i}" for i in range(400)]
+
+
+def document(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def ranked(result):
+    return sorted(((-d['coverage'], d['file_id'], d['passages']) for d in result['documents']),
+                  key=lambda entry: entry[:2])
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    rng = random.Random(0)
+    documents = {f"doc_{i:03d}": document(rng, 300) for i in range(40)}
+    queries = []
+    for i in range(8):
+        sources = rng.sample(sorted(documents), 2)
+        # Passages of two corpus documents spliced into unrelated text
+        parts = [document(rng, 80)]
+        for source in sources:
+            words = documents[source].split()
+            start = rng.randrange(len(words) - 60)
+            parts.append(' '.join(words[start:start + rng.randint(20, 60)]))
+            parts.append(document(rng, 40))
+        queries.append(' '.join(parts))
+    return documents, queries
+
+
+def test_sharded_top_k_matches_single_index(corpus, tmp_path, monkeypatch):
+    documents, queries = corpus
+    monkeypatch.setenv('INDEX_SHARD_AUTHKEY', 'test-shard-key')
+
+    single = FingerprintIndex(str(tmp_path / 'single.db'), tokenizer=tokenize)
+    for file_id, text in documents.items():
+        single.add_document(file_id, text)
+
+    processes, addresses = spawn_local_shards(2, str(tmp_path / 'shards'), base_port=free_base_port(2))
+    try:
+        sharded = ShardedIndex(addresses, tokenizer=tokenize, timeout=30)
+        for file_id, text in documents.items():
+            sharded.add_document(file_id, text)
+
+        assert sharded.stats()['documents'] == len(documents)
+        assert all(s['documents'] < len(documents) for s in sharded.stats()['shards'])
+        for i, query in enumerate(queries):
+            exclude = 'doc_000' if i % 2 else None
+            expected = single.query(query, exclude_file_id=exclude, max_documents=5)
+            merged = sharded.query(query, exclude_file_id=exclude, max_documents=5)
+
+            assert expected['documents'], 'planted passages must be found'
+            assert merged['coverage'] == expected['coverage']
+            # Documents tied on coverage may come back in either order
+            assert ranked(merged) == ranked(expected)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
@@ -0,0 +1,102 @@
+"""Repeated-passage detection against a brute-force n-gram reference."""
+
+import random
+
+import pytest
+
+from src.utils.suffixArray import repeated_passages, repetition_coverage
+from src.utils.textProcessor import TextProcessor
+
+
+def occurrences(sequence, passage):
+    """Every start of passage in sequence, overlapping ones included."""
+    length = len(passage)
+    return [i for i in range(len(sequence) - length + 1) if list(sequence[i:i + length]) == list(passage)]
+
+
+def repeated_tokens(sequence, min_length):
+    """Positions inside some occurrence of a min_length-gram that occurs at least twice."""
+    starts = {}
+    for i in range(len(sequence) - min_length + 1):
+        starts.setdefault(tuple(sequence[i:i + min_length]), []).append(i)
+    positions = set()
+    for found in starts.values():
+        if len(found) > 1:
+            for start in found:
+                positions.update(range(start, start + min_length))
+    return positions
+
+
+def check_passages(sequence, min_length):
+    passages = repeated_passages(sequence, min_length=min_length)
+    covered = set()
+    seen = set()
+    for p in passages:
+        start, length = p['starts'][0], p['length']
+        assert length >= min_length
+        assert p['starts'] == occurrences(sequence, sequence[start:start + length])
+        assert len(p['starts']) > 1
+        assert (length, tuple(p['starts'])) not in seen
+        seen.add((length, tuple(p['starts'])))
+        for s in p['starts']:
+            covered.update(range(s, s + length))
+    assert covered == repeated_tokens(sequence, min_length)
+    return passages
+
+
+def test_tandem_repeat_with_period_below_min_length():
+    tokens = ('buy cheap essays now ' * 50).split()
+    ids = [['buy', 'cheap', 'essays', 'now'].index(t) for t in tokens]
+
+    passages = check_passages(ids, 8)
+
+    assert [(p['length'], len(p['starts'])) for p in passages] == [(8, 49)]
+    assert repetition_coverage(passages, len(ids)) == pytest.approx(196 / 200)
+
+
+def test_single_token_run():
+    passages = check_passages([0] * 30, 4)
+
+    assert passages == [{'length': 4, 'starts': list(range(27))}]
+
+
+def test_overlapping_and_separate_occurrences():
+    # 'a b c' repeated with period 3, plus a separate copy further on
+    sequence = [1, 2, 3, 1, 2, 3, 1, 9, 9, 9, 1, 2, 3, 1]
+    check_passages(sequence, 4)
+
+
+def test_no_repeats():
+    assert repeated_passages(list(range(40)), min_length=3) == []
+
+
+@pytest.mark.parametrize('seed', range(400))
+def test_repeated_passages_match_brute_force(seed):
+    rng = random.Random(seed)
+    alphabet = rng.choice([2, 3, 5, 20])
+    sequence = [rng.randrange(alphabet) for _ in range(rng.randint(0, 60))]
+    # Plant copies (sometimes overlapping) of a random passage
+    if sequence and rng.random() < 0.7:
+        length = rng.randint(1, len(sequence))
+        passage = sequence[:length]
+        for _ in range(rng.randint(1, 3)):
+            at = rng.randrange(len(sequence))
+            sequence[at:at + length] = passage
+    check_passages(sequence, rng.randint(1, 8))
+
+
+def test_find_repeated_phrases_reports_every_occurrence():
+    processor = TextProcessor()
+    text = 'Buy cheap essays now ' * 6 + 'and more text here. Buy cheap essays today.'
+    words = processor.tokenize_words(processor.normalize_text(text))
+
+    phrases = processor.find_repeated_phrases(text, min_length=3)
+
+    assert phrases
+    for phrase in phrases:
+        tokens = phrase['phrase'].split()
+        assert phrase['length'] == len(tokens) >= 3
+        assert phrase['positions'] == occurrences(words, tokens)
+        assert phrase['occurrences'] == len(phrase['positions'])
+    found = {tuple(phrase['phrase'].split()) for phrase in phrases}
+    assert ('buy', 'cheap', 'essays', 'now') in found or ('buy', 'cheap', 'essays') in found
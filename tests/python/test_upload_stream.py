@@ -0,0 +1,79 @@
+"""Single-pass upload sink: digest, size limit and cleanup of uncommitted files."""
+
+import hashlib
+import io
+import os
+
+import pytest
+
+from src.utils.uploadStream import SNIFF_BYTES, UploadSink, UploadTooLarge, copy_stream, mapped_file
+
+
+class ChunkedReader:
+    """A stream without readinto that returns short reads."""
+
+    def __init__(self, data, size):
+        self.data, self.size, self.position = data, size, 0
+
+    def read(self, limit):
+        chunk = self.data[self.position:self.position + min(limit, self.size)]
+        self.position += len(chunk)
+        return chunk
+
+
+@pytest.fixture
+def payload():
+    return os.urandom(300 * 1024 + 17)
+
+
+@pytest.mark.parametrize('source', ['readinto', 'read'])
+def test_copy_hashes_counts_and_sniffs(tmp_path, payload, source):
+    stream = io.BytesIO(payload) if source == 'readinto' else ChunkedReader(payload, 1000)
+    sink = copy_stream(stream, UploadSink(str(tmp_path)), chunk_size=4096)
+
+    assert sink.sha256 == hashlib.sha256(payload).hexdigest()
+    assert sink.size == len(payload)
+    assert sink.head == payload[:SNIFF_BYTES]
+
+    final = str(tmp_path / 'upload.bin')
+    sink.commit(final)
+    sink.close()
+    assert os.listdir(tmp_path) == ['upload.bin']
+    with open(final, 'rb') as f:
+        assert f.read() == payload
+    with mapped_file(final) as mapped:
+        assert mapped[:] == payload
+
+
+def test_uncommitted_sink_is_removed(tmp_path, payload):
+    sink = copy_stream(io.BytesIO(payload), UploadSink(str(tmp_path)))
+    assert os.path.exists(sink.path)
+
+    sink.close()
+    sink.close()
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_oversize_upload_is_rejected_and_removed(tmp_path, payload):
+    sink = UploadSink(str(tmp_path), max_size=len(payload) - 1)
+
+    with pytest.raises(UploadTooLarge):
+        copy_stream(io.BytesIO(payload), sink)
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_upload_of_exactly_the_limit_is_accepted(tmp_path, payload):
+    sink = copy_stream(io.BytesIO(payload), UploadSink(str(tmp_path), max_size=len(payload)))
+
+    assert sink.size == len(payload)
+    sink.close()
+
+
+def test_empty_file_maps_to_none(tmp_path):
+    path = tmp_path / 'empty.txt'
+    path.write_bytes(b'')
+
+    with mapped_file(str(path)) as mapped:
+        assert mapped is None